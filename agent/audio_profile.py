@@ -0,0 +1,156 @@
+import os
+import asyncio
+import logging
+from livekit import rtc
+from livekit.agents.pipeline import human_input, pipeline_agent
+from livekit.plugins import deepgram, cartesia
+
+from vad_model import load_vad
+
+logger = logging.getLogger(__name__)
+
+# Profil audio utilisé par défaut (les appels passent tous par le trunk SIP)
+AUDIO_PROFILE = os.getenv("AUDIO_PROFILE", "telephony")
+
+class AudioProfile:
+    """
+    Profil audio appliqué de bout en bout au pipeline vocal (entrée micro, VAD, STT, TTS)
+    """
+
+    def __init__(self, name, input_sample_rate, vad_sample_rate, stt_sample_rate, tts_sample_rate,
+                 tts_encoding="pcm_s16le"):
+        """
+        Initialisation du profil audio
+
+        Args:
+            name: Nom du profil
+            input_sample_rate: Fréquence de l'AudioStream du participant SIP
+            vad_sample_rate: Fréquence d'inférence du modèle Silero (8000 ou 16000)
+            stt_sample_rate: Fréquence envoyée à Deepgram
+            tts_sample_rate: Fréquence demandée à Cartesia (et donc de l'AudioSource publiée)
+            tts_encoding: Encodage PCM demandé à Cartesia
+        """
+        self.name = name
+        self.input_sample_rate = input_sample_rate
+        self.vad_sample_rate = vad_sample_rate
+        self.stt_sample_rate = stt_sample_rate
+        self.tts_sample_rate = tts_sample_rate
+        self.tts_encoding = tts_encoding
+
+    @property
+    def resampling_free(self):
+        """Vrai si aucune étape côté Python ne doit rééchantillonner l'audio de l'appelant"""
+        return self.input_sample_rate == self.vad_sample_rate == self.stt_sample_rate
+
+    def load_vad(self, **kwargs):
+        """Charger le modèle VAD à la fréquence du profil (appel bloquant, à faire au prewarm)"""
+        return load_vad(self.vad_sample_rate, **kwargs)
+
+    def build_stt(self, **kwargs):
+        """Créer le STT Deepgram à la fréquence du profil"""
+        return deepgram.STT(sample_rate=self.stt_sample_rate, **kwargs)
+
+    def build_tts(self, **kwargs):
+        """Créer le TTS Cartesia à la fréquence et à l'encodage du profil"""
+        return cartesia.TTS(
+            sample_rate=self.tts_sample_rate,
+            encoding=self.tts_encoding,
+            **kwargs
+        )
+
+    def install(self):
+        """
+        Aligner l'AudioStream du participant sur la fréquence du profil
+
+        VoicePipelineAgent ouvre toujours l'AudioStream de l'appelant à 16 kHz. On remplace
+        HumanInput dans le module du pipeline pour que les trames arrivent directement
+        à la fréquence du profil : le VAD et le STT n'ont alors plus de resampler à créer.
+        """
+        _ProfileHumanInput.sample_rate = self.input_sample_rate
+        pipeline_agent.HumanInput = _ProfileHumanInput
+        logger.info(
+            f"Profil audio '{self.name}' installé - entrée: {self.input_sample_rate} Hz, "
+            f"VAD: {self.vad_sample_rate} Hz, STT: {self.stt_sample_rate} Hz, "
+            f"TTS: {self.tts_sample_rate} Hz ({self.tts_encoding})"
+        )
+
+    def __repr__(self):
+        return f"AudioProfile({self.name!r})"
+
+
+class _ProfileHumanInput(human_input.HumanInput):
+    """
+    HumanInput dont l'AudioStream est ouvert à la fréquence du profil audio
+    """
+
+    sample_rate = 16000
+
+    def _subscribe_to_microphone(self, *args, **kwargs):
+        for publication in self._participant.track_publications.values():
+            if publication.source != rtc.TrackSource.SOURCE_MICROPHONE:
+                continue
+
+            if not publication.subscribed:
+                publication.set_subscribed(True)
+
+            track = publication.track
+            if track is not None and track != self._subscribed_track:
+                self._subscribed_track = track
+                if self._recognize_atask is not None:
+                    self._recognize_atask.cancel()
+
+                # Le rééchantillonnage depuis la piste WebRTC est fait une seule fois, en Rust
+                self._recognize_atask = asyncio.create_task(
+                    self._recognize_task(
+                        rtc.AudioStream(
+                            track,
+                            sample_rate=self.sample_rate,
+                            num_channels=1,
+                            noise_cancellation=self._noise_cancellation,
+                        )
+                    )
+                )
+                break
+
+
+# Le trunk Twilio transporte du G.711 à 8 kHz : au-delà, l'audio n'apporte rien à l'appelant
+TELEPHONY = AudioProfile(
+    name="telephony",
+    input_sample_rate=8000,
+    vad_sample_rate=8000,
+    stt_sample_rate=8000,
+    tts_sample_rate=8000,
+)
+
+# Réglages par défaut des plugins (comportement historique)
+WIDEBAND = AudioProfile(
+    name="wideband",
+    input_sample_rate=16000,
+    vad_sample_rate=16000,
+    stt_sample_rate=16000,
+    tts_sample_rate=24000,
+)
+
+PROFILES = {
+    TELEPHONY.name: TELEPHONY,
+    WIDEBAND.name: WIDEBAND,
+}
+
+def get_audio_profile(name=None):
+    """
+    Récupérer un profil audio par son nom
+
+    Args:
+        name: Nom du profil (AUDIO_PROFILE par défaut)
+
+    Returns:
+        AudioProfile correspondant
+
+    Raises:
+        ValueError si le profil est inconnu
+    """
+    name = name or AUDIO_PROFILE
+    try:
+        return PROFILES[name]
+    except KeyError:
+        raise ValueError(f"Profil audio inconnu: {name} (disponibles: {', '.join(PROFILES)})")
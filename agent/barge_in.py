@@ -0,0 +1,172 @@
+import os
+import time
+import asyncio
+import logging
+import statistics
+
+from livekit.agents import llm, metrics
+from livekit.agents.pipeline.pipeline_agent import SpeechDataContextVar
+
+logger = logging.getLogger(__name__)
+
+# Durée de parole de l'appelant avant d'interrompre l'agent (secondes, 0.5 par défaut dans le pipeline)
+BARGE_IN_SPEECH_DURATION = float(os.getenv("BARGE_IN_SPEECH_DURATION", "0.5"))
+
+# Nombre maximal d'interruptions détaillées jointes au CDR
+_MAX_SAMPLES = 50
+
+class _Synthesis:
+    """
+    Texte envoyé au TTS pour une prise de parole de l'agent
+    """
+
+    __slots__ = ("speech", "chunks", "chars", "audio")
+
+    def __init__(self):
+        self.speech = None
+        self.chunks = 0
+        self.chars = 0
+        self.audio = 0.0
+
+class BargeInTracker:
+    """
+    Coupure de l'agent quand l'appelant lui parle par-dessus, et travail perdu à chaque coupure
+
+    Le pipeline coupe la lecture et vide la file audio à l'interruption, mais un flux LLM
+    interrompu avant son premier token n'est jamais fermé (la requête continue jusqu'au bout) :
+    le flux de la prise de parole interrompue est fermé explicitement.
+
+    Par interruption : délai de détection (début de parole -> interruption) et délai jusqu'au
+    silence (début de parole -> arrêt de la lecture). Par appel : tokens, caractères et secondes
+    d'audio générés mais jamais entendus.
+    """
+
+    def __init__(self):
+        self.agent = None
+        self._syntheses = {}
+        self._speech_started_at = None
+        self._speaking = False
+        self._interrupted_at = None
+        self._tasks = set()
+
+        # Bilan de l'appel
+        self.interruptions = 0
+        self.before_audio = 0
+        self.detect_ms = []
+        self.silence_ms = []
+
+    def attach(self, agent):
+        """
+        Suivre les interruptions du VoicePipelineAgent de l'appel
+
+        Args:
+            agent: VoicePipelineAgent de l'appel (créé avec before_tts_cb=self.before_tts_cb)
+        """
+        self.agent = agent
+
+        # Toutes les interruptions par la voix de l'appelant passent par cette méthode du pipeline
+        interrupt_if_possible = agent._interrupt_if_possible
+
+        def _interrupt_if_possible():
+            speech = agent._playing_speech
+            was_interrupted = speech is not None and speech.interrupted
+            interrupt_if_possible()
+            if speech is not None and not was_interrupted and speech.interrupted:
+                self._on_interrupted(speech)
+
+        agent._interrupt_if_possible = _interrupt_if_possible
+
+        @agent.on("user_started_speaking")
+        def _on_user_started_speaking():
+            self._speech_started_at = time.perf_counter()
+
+        @agent.on("agent_started_speaking")
+        def _on_agent_started_speaking():
+            self._speaking = True
+
+        @agent.on("agent_stopped_speaking")
+        def _on_agent_stopped_speaking():
+            self._speaking = False
+            if self._interrupted_at is not None:
+                # Lecture arrêtée et file audio vidée par le pipeline
+                if len(self.silence_ms) < _MAX_SAMPLES:
+                    self.silence_ms.append(round((time.perf_counter() - self._speech_started_at) * 1000))
+                self._interrupted_at = None
+
+        @agent.on("metrics_collected")
+        def _on_metrics_collected(collected):
+            if isinstance(collected, metrics.PipelineTTSMetrics):
+                synthesis = self._syntheses.get(collected.sequence_id)
+                if synthesis is not None:
+                    synthesis.audio += collected.audio_duration
+
+    def before_tts_cb(self, agent, source):
+        """Compter le texte envoyé au TTS pour chaque prise de parole"""
+        synthesis = _Synthesis()
+        speech_data = SpeechDataContextVar.get(None)
+        if speech_data is not None:
+            self._syntheses[speech_data.sequence_id] = synthesis
+        if isinstance(source, str):
+            synthesis.chars = len(source)
+            return source
+        return self._count(source, synthesis)
+
+    async def _count(self, source, synthesis):
+        try:
+            async for text in source:
+                # Un fragment du flux LLM correspond à peu près à un token
+                synthesis.chunks += 1
+                synthesis.chars += len(text)
+                yield text
+        finally:
+            # Fermer la source ferme aussi le flux LLM une fois la transcription terminée
+            await source.aclose()
+
+    def _on_interrupted(self, speech):
+        now = time.perf_counter()
+        self.interruptions += 1
+        synthesis = self._syntheses.get(speech.id)
+        if synthesis is not None:
+            synthesis.speech = speech
+        if self._speech_started_at is not None and len(self.detect_ms) < _MAX_SAMPLES:
+            self.detect_ms.append(round((now - self._speech_started_at) * 1000))
+        if self._speaking:
+            self._interrupted_at = now
+        else:
+            self.before_audio += 1
+
+        if isinstance(speech.source, llm.LLMStream):
+            task = asyncio.create_task(speech.source.aclose())
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def aclose(self):
+        """Attendre la fermeture des flux LLM interrompus"""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def summary(self):
+        """Bilan de l'appel : délais de coupure et travail perdu"""
+        wasted_tokens = wasted_chars = 0
+        wasted_audio = 0.0
+        for synthesis in self._syntheses.values():
+            if synthesis.speech is None:
+                continue
+            handle = synthesis.speech.synthesis_handle
+            played_chars = len(handle.tts_forwarder.played_text)
+            played_audio = handle.play_handle.time_played if handle.play_handle is not None else 0.0
+            wasted = max(0, synthesis.chars - played_chars)
+            wasted_chars += wasted
+            if synthesis.chars:
+                wasted_tokens += round(synthesis.chunks * wasted / synthesis.chars)
+            wasted_audio += max(0.0, synthesis.audio - played_audio)
+        return {
+            "interruptions": self.interruptions,
+            "before_audio": self.before_audio,
+            "detect_ms": self.detect_ms,
+            "silence_ms": self.silence_ms,
+            "median_silence_ms": round(statistics.median(self.silence_ms)) if self.silence_ms else None,
+            "wasted_tokens": wasted_tokens,
+            "wasted_chars": wasted_chars,
+            "wasted_audio_s": round(wasted_audio, 2),
+        }
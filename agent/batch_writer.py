@@ -0,0 +1,95 @@
+import os
+import time
+import queue
+import asyncio
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Répertoire des bases locales (partagé avec l'API qui les consulte)
+DATA_DIR = os.getenv("DATA_DIR", os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "data")))
+
+class BatchWriter:
+    """
+    Écriture SQLite (WAL) par lots depuis un thread dédié
+
+    `submit` ne fait qu'empiler l'élément : aucune écriture disque n'a lieu sur la boucle
+    d'événements de l'appel. Les sous-classes définissent le schéma et `write_batch`.
+    """
+
+    schema = ""
+
+    def __init__(self, path, batch_size=500, flush_interval=0.5):
+        """
+        Initialisation de l'écrivain
+
+        Args:
+            path: Chemin du fichier SQLite
+            batch_size: Nombre maximal d'éléments par transaction
+            flush_interval: Délai maximal (secondes) avant l'écriture d'un lot incomplet
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        self._queue = queue.SimpleQueue()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self.schema)
+        self._thread = threading.Thread(target=self._writer, name=f"{type(self).__name__}-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        """Empiler un élément pour écriture (non bloquant)"""
+        self._queue.put(item)
+
+    def flush(self, timeout=5):
+        """
+        Attendre l'écriture des éléments déjà soumis
+
+        Returns:
+            True si tout a été écrit dans le délai
+        """
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    async def aflush(self, timeout=5):
+        """Version asynchrone de flush (exécutée hors de la boucle d'événements)"""
+        return await asyncio.get_running_loop().run_in_executor(None, self.flush, timeout)
+
+    def write_batch(self, conn, batch):
+        """Écrire un lot dans une transaction ouverte (à définir par les sous-classes)"""
+        raise NotImplementedError
+
+    def _writer(self):
+        while True:
+            item = self._queue.get()
+            batch, waiters = [], []
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+
+            if batch:
+                try:
+                    with self._conn:
+                        self.write_batch(self._conn, batch)
+                    self.written += len(batch)
+                except Exception as e:
+                    logger.error(f"Erreur lors de l'écriture d'un lot de {len(batch)} éléments ({type(self).__name__}) : {e}")
+            for waiter in waiters:
+                waiter.set()
@@ -1,19 +1,39 @@
 import logging
 import asyncio
 import json
+import os
+import dataclasses
+import aiohttp
 from typing import Annotated, Optional
-from livekit.agents.llm import FunctionContext
+from livekit.agents.llm import FunctionContext, ai_callable
 from livekit.api import RoomParticipantIdentity
+from livekit.protocol.sip import TransferSIPParticipantRequest
 from livekit import rtc
 
 logger = logging.getLogger(__name__)
 
+# URL de l'API (base des rappels)
+API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:8080")
+# URL de la file de transfert vers les agents humains (processus scheduler)
+TRANSFER_QUEUE_URL = os.getenv("TRANSFER_QUEUE_URL", "http://localhost:8081")
+# Intervalle entre deux annonces du temps d'attente pendant la mise en attente (secondes)
+TRANSFER_ANNOUNCE_INTERVAL = float(os.getenv("TRANSFER_ANNOUNCE_INTERVAL", "45"))
+
+def format_wait(seconds):
+    """Formuler un temps d'attente estimé pour l'appelant"""
+    minutes = round(seconds / 60)
+    if minutes < 1:
+        return "moins d'une minute"
+    if minutes == 1:
+        return "environ une minute"
+    return f"environ {minutes} minutes"
+
 class CallActions(FunctionContext):
     """
     Actions que l'agent peut effectuer pendant un appel téléphonique
     """
     
-    def __init__(self, api, participant, room):
+    def __init__(self, api, participant, room, agent=None, tools=None):
         """
         Initialisation des actions d'appel
         
@@ -21,11 +41,78 @@ class CallActions(FunctionContext):
             api: Instance API LiveKit
             participant: Participant SIP (peut être None au début)
             room: Room LiveKit actuelle
+            agent: VoicePipelineAgent (annonces pendant la mise en attente)
+            tools: Outils précompilés par `compile_tools` (tous les outils, analysés à la volée, par défaut)
         """
-        super().__init__()
+        if tools is None:
+            super().__init__()
+        else:
+            # Schémas déjà analysés : seules les méthodes sont liées à cette instance
+            self._fncs = {
+                name: dataclasses.replace(info, callable=getattr(self, name))
+                for name, info in tools.items()
+            }
         self.api = api
         self.participant = participant
         self.room = room
+        self.agent = agent
+        # CallWatchdog de l'appel, suspendu pendant l'attente d'un agent humain
+        self.watchdog = None
+        # Valeur client (0 à 1) utilisée pour prioriser les transferts
+        self.customer_value = 0.0
+        self._session = None
+        self._transfer_id = None
+        self._transfer_task = None
+    
+    @classmethod
+    def compile_tools(cls, enabled=None):
+        """
+        Analyser une fois les outils exposés au LLM (à faire au prewarm)
+        
+        Args:
+            enabled: Noms des outils activés (tous par défaut)
+            
+        Returns:
+            Dictionnaire nom -> FunctionInfo, à passer à `CallActions(tools=...)`
+        """
+        template = cls.__new__(cls)
+        FunctionContext.__init__(template)
+        unknown = set(enabled or ()) - set(template.ai_functions)
+        if unknown:
+            raise ValueError(f"Outils inconnus: {', '.join(sorted(unknown))}")
+        return {
+            name: info for name, info in template.ai_functions.items()
+            if enabled is None or name in enabled
+        }
+    
+    def _http_session(self):
+        """Session HTTP partagée par les actions de l'appel"""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=TRANSFER_ANNOUNCE_INTERVAL + 10))
+        return self._session
+    
+    async def aclose(self):
+        """
+        Libérer les ressources de l'appel (fin de la mise en attente, session HTTP)
+        """
+        if self._transfer_task and not self._transfer_task.done():
+            self._transfer_task.cancel()
+            try:
+                await self._transfer_task
+            except asyncio.CancelledError:
+                pass
+        
+        if self._transfer_id is not None:
+            # L'appelant a raccroché avant d'être transféré : libérer sa place dans la file
+            try:
+                async with self._http_session().delete(f"{TRANSFER_QUEUE_URL}/transfers/{self._transfer_id}") as response:
+                    await response.read()
+            except Exception as e:
+                logger.error(f"Erreur lors de l'annulation du transfert {self._transfer_id} : {e}")
+            self._transfer_id = None
+        
+        if self._session is not None:
+            await self._session.close()
     
     async def hangup(self):
         """
@@ -46,13 +133,13 @@ class CallActions(FunctionContext):
         except Exception as e:
             logger.error(f"Erreur lors du raccrochage : {e}")
     
-    @FunctionContext.ai_callable()
+    @ai_callable()
     async def end_call(self):
         """Called when the user wants to end the call"""
         logger.info(f"Fin de l'appel avec {self.participant.identity}")
         await self.hangup()
     
-    @FunctionContext.ai_callable()
+    @ai_callable()
     async def detected_voicemail(self):
         """Called when the agent detects it has reached a voicemail instead of a person"""
         logger.info(f"Messagerie vocale détectée pour {self.participant.identity}")
@@ -63,35 +150,128 @@ class CallActions(FunctionContext):
         # Laisser un message
         return "Voicemail message left"
     
-    @FunctionContext.ai_callable()
+    @ai_callable()
     async def schedule_callback(self, 
-                              time: Annotated[str, "Time to call back"] = None,
-                              date: Annotated[str, "Date to call back"] = None):
+                              time: Annotated[str, "Time to call back, formatted HH:MM (24h)"] = None,
+                              date: Annotated[str, "Date to call back, formatted YYYY-MM-DD"] = None):
         """Called when the user requests to be called back at a specific time or date"""
         logger.info(f"Programmation d'un rappel pour {self.participant.identity} à {date} {time}")
         
-        # Cette fonction simulerait l'enregistrement d'un rappel dans une base de données
         callback_info = {
-            "phone_number": self.participant.identity.replace("phone_user_", ""),
+            "phone": self.participant.identity.replace("phone_user_", ""),
             "date": date,
-            "time": time
+            "time": time,
+            "context": {"room": self.room.name},
         }
         
-        # Simuler l'enregistrement dans une base de données
-        logger.info(f"Rappel programmé: {json.dumps(callback_info)}")
+        # Enregistrement dans la base des rappels de l'API (persistante, lancée par le scheduler)
+        try:
+            async with self._http_session().post(
+                f"{API_BASE_URL}/api/callbacks", json=callback_info, timeout=aiohttp.ClientTimeout(total=5)
+            ) as response:
+                result = await response.json()
+        except Exception as e:
+            logger.error(f"Erreur lors de l'enregistrement du rappel : {e}")
+            return "Callback could not be scheduled because of a technical error"
         
+        if not result.get("success"):
+            logger.warning(f"Rappel refusé: {result.get('error')}")
+            return f"Callback could not be scheduled: {result.get('error')}. Ask the user for a valid date and time."
+        
+        logger.info(f"Rappel programmé: {json.dumps(result)}")
         return "Callback scheduled successfully"
     
-    @FunctionContext.ai_callable()
+    @ai_callable()
     async def transfer_to_human(self, 
-                              reason: Annotated[str, "Reason for transferring to a human agent"] = None):
+                              reason: Annotated[str, "Reason for transferring to a human agent"] = None,
+                              category: Annotated[str, "Category of the request: urgent, complaint, sales, billing, technical or other"] = "other"):
         """Called when the agent needs to transfer the call to a human agent"""
         logger.info(f"Transfert vers un agent humain demandé pour {self.participant.identity}: {reason}")
         
-        # Dans une vraie implémentation, ici on pourrait:
-        # 1. Placer l'appel dans une file d'attente
-        # 2. Notifier un agent humain
-        # 3. Transférer l'appel vers un autre système
+        if self._transfer_id is not None:
+            return "The caller is already waiting for a human agent."
         
-        # Pour cette démonstration, on simule seulement
-        return "Transfer to human requested. Note: This is a simulation for demo purposes."
+        transfer_info = {
+            "room_name": self.room.name,
+            "participant_identity": self.participant.identity,
+            "phone_number": self.participant.identity.replace("phone_user_", ""),
+            "reason": reason,
+            "category": category,
+            "customer_value": self.customer_value,
+        }
+        
+        try:
+            async with self._http_session().post(
+                f"{TRANSFER_QUEUE_URL}/transfers", json=transfer_info, timeout=aiohttp.ClientTimeout(total=5)
+            ) as response:
+                ticket = await response.json()
+        except Exception as e:
+            logger.error(f"Erreur lors de la mise en file du transfert : {e}")
+            return "Transfer to a human agent is not available right now. Offer to schedule a callback instead."
+        
+        if not ticket.get("success"):
+            return f"Transfer to a human agent failed: {ticket.get('error')}"
+        
+        self._transfer_id = ticket["id"]
+        self._transfer_task = asyncio.create_task(self._hold_for_transfer(ticket))
+        
+        if ticket["status"] == "assigned":
+            return "A human agent is available. Tell the caller they are being transferred now."
+        return (
+            f"The caller is now in the queue for a human agent. Estimated wait: {format_wait(ticket['estimatedWait'])}. "
+            "Tell the caller and ask them to stay on the line."
+        )
+    
+    async def _hold_for_transfer(self, ticket):
+        """
+        Attendre qu'un agent humain soit attribué, en annonçant le temps d'attente, puis transférer
+        
+        Args:
+            ticket: Ticket renvoyé par la file de transfert
+        """
+        # L'appelant attend en silence entre deux annonces : pas de raccrochage pour inactivité
+        if self.watchdog is not None:
+            self.watchdog.pause()
+        try:
+            while ticket["status"] == "waiting":
+                # Requête longue : la file répond dès l'attribution d'un agent
+                async with self._http_session().get(
+                    f"{TRANSFER_QUEUE_URL}/transfers/{ticket['id']}",
+                    params={"wait": str(TRANSFER_ANNOUNCE_INTERVAL)},
+                ) as response:
+                    ticket = await response.json()
+                
+                if ticket.get("status") == "waiting" and self.agent is not None:
+                    await self.agent.say(
+                        f"Merci de patienter, un conseiller va vous répondre. "
+                        f"Temps d'attente estimé : {format_wait(ticket['estimatedWait'])}.",
+                        allow_interruptions=True,
+                    )
+            
+            if ticket.get("status") != "assigned":
+                logger.info(f"Transfert {self._transfer_id} annulé")
+                self._transfer_id = None
+                return
+            
+            human = ticket["agent"]
+            self._transfer_id = None
+            logger.info(f"Transfert de {self.participant.identity} vers l'agent {human['id']} ({human['sipUri']})")
+            if self.agent is not None:
+                await self.agent.say("Je vous transfère maintenant à un conseiller.", allow_interruptions=False)
+            
+            await self.api.sip.transfer_sip_participant(
+                TransferSIPParticipantRequest(
+                    room_name=self.room.name,
+                    participant_identity=self.participant.identity,
+                    transfer_to=human["sipUri"],
+                    play_dialtone=True,
+                )
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Erreur lors du transfert vers un agent humain : {e}")
+            logger.exception("Détails de l'erreur:")
+        finally:
+            if self.watchdog is not None:
+                self.watchdog.resume()
@@ -0,0 +1,126 @@
+import os
+import json
+import time
+import logging
+
+from batch_writer import BatchWriter, DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+CALL_RECORDS_DB_PATH = os.getenv("CALL_RECORDS_DB_PATH", os.path.join(DATA_DIR, "calls.db"))
+
+OUTCOME_ANSWERED = "answered"
+OUTCOME_NOT_ANSWERED = "not_answered"
+OUTCOME_FAILED = "failed"
+OUTCOME_INVALID = "invalid"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS call_records (
+    id INTEGER PRIMARY KEY,
+    room_name TEXT NOT NULL,
+    job_id TEXT,
+    phone_number TEXT,
+    trunk_id TEXT,
+    dispatched_at REAL,
+    started_at REAL NOT NULL,
+    dial_at REAL,
+    answered_at REAL,
+    first_audio_at REAL,
+    hangup_at REAL,
+    outcome TEXT,
+    end_reason TEXT,
+    turns INTEGER NOT NULL DEFAULT 0,
+    tool_calls INTEGER NOT NULL DEFAULT 0,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_call_records_room ON call_records(room_name);
+CREATE INDEX IF NOT EXISTS idx_call_records_phone ON call_records(phone_number, started_at);
+CREATE INDEX IF NOT EXISTS idx_call_records_started ON call_records(started_at);
+"""
+
+_COLUMNS = (
+    "room_name", "job_id", "phone_number", "trunk_id", "dispatched_at", "started_at", "dial_at",
+    "answered_at", "first_audio_at", "hangup_at", "outcome", "end_reason", "turns", "tool_calls", "extra",
+)
+
+_INSERT = f"INSERT INTO call_records ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})"
+
+class CallRecord:
+    """
+    Enregistrement détaillé d'un appel (CDR), rempli au fil de l'appel
+    """
+
+    __slots__ = _COLUMNS
+
+    def __init__(self, room_name, job_id=None, started_at=None):
+        self.room_name = room_name
+        self.job_id = job_id
+        self.phone_number = None
+        self.trunk_id = None
+        self.dispatched_at = None
+        self.started_at = started_at or time.time()
+        self.dial_at = None
+        self.answered_at = None
+        self.first_audio_at = None
+        self.hangup_at = None
+        self.outcome = None
+        self.end_reason = None
+        self.turns = 0
+        self.tool_calls = 0
+        # Données complémentaires (sérialisées en JSON) ajoutées par les autres modules
+        self.extra = {}
+
+    def mark(self, field):
+        """Horodater une étape de l'appel (une seule fois)"""
+        if getattr(self, field) is None:
+            setattr(self, field, time.time())
+
+    def attach(self, agent):
+        """
+        Alimenter l'enregistrement avec les événements de l'agent vocal
+
+        Args:
+            agent: VoicePipelineAgent de l'appel
+        """
+        @agent.on("agent_started_speaking")
+        def _on_agent_started_speaking(*_):
+            self.mark("first_audio_at")
+
+        @agent.on("user_speech_committed")
+        def _on_user_speech_committed(*_):
+            self.turns += 1
+
+        @agent.on("function_calls_finished")
+        def _on_function_calls_finished(called_functions):
+            self.tool_calls += len(called_functions)
+
+    def to_row(self):
+        values = [getattr(self, column) for column in _COLUMNS]
+        values[-1] = json.dumps(self.extra) if self.extra else None
+        return tuple(values)
+
+class CallRecordStore(BatchWriter):
+    """
+    Stockage des CDR en SQLite (WAL), écrits par lots dans un thread dédié
+    """
+
+    schema = _SCHEMA
+
+    def __init__(self, path=CALL_RECORDS_DB_PATH, batch_size=500, flush_interval=0.5):
+        super().__init__(path, batch_size=batch_size, flush_interval=flush_interval)
+
+    def submit(self, record):
+        """Empiler un CDR pour écriture (non bloquant)"""
+        super().submit(record.to_row())
+
+    def write_batch(self, conn, batch):
+        conn.executemany(_INSERT, batch)
+
+_store = None
+
+def get_call_record_store():
+    """Stockage des CDR du processus (un seul thread d'écriture par processus)"""
+    global _store
+    if _store is None:
+        _store = CallRecordStore()
+    return _store
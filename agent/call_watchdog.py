@@ -0,0 +1,141 @@
+import os
+import asyncio
+import logging
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+# Silence maximal (secondes) avant de raccrocher, 0 pour désactiver
+CALL_SILENCE_TIMEOUT = float(os.getenv("CALL_SILENCE_TIMEOUT", "30"))
+# Durée maximale d'un appel (secondes), 0 pour désactiver
+CALL_MAX_DURATION = float(os.getenv("CALL_MAX_DURATION", "900"))
+
+REASON_SILENCE = "silence"
+REASON_MAX_DURATION = "max_duration"
+
+# Nombre d'appels raccrochés par le watchdog dans ce processus, par raison
+reaped_calls = Counter()
+
+class CallWatchdog:
+    """
+    Surveillance d'un appel en cours : raccroche après un silence prolongé ou une durée maximale
+    """
+
+    def __init__(self, agent, call_actions, silence_timeout=CALL_SILENCE_TIMEOUT,
+                 max_duration=CALL_MAX_DURATION):
+        """
+        Initialisation du watchdog
+
+        Args:
+            agent: VoicePipelineAgent dont on écoute l'activité vocale (VAD et lecture)
+            call_actions: CallActions utilisé pour raccrocher
+            silence_timeout: Silence maximal en secondes (0 pour désactiver)
+            max_duration: Durée maximale de l'appel en secondes (0 pour désactiver)
+        """
+        self.agent = agent
+        self.call_actions = call_actions
+        self.silence_timeout = silence_timeout
+        self.max_duration = max_duration
+        self.reason = None
+
+        self._loop = asyncio.get_event_loop()
+        self._started_at = None
+        self._last_activity = None
+        self._user_speaking = False
+        self._agent_speaking = False
+        # Silence toléré tant que l'appelant est en attente d'un agent humain
+        self._paused = False
+        self._task = None
+
+        # Les callbacks ne font que noter l'horodatage : aucun timer n'est recréé par événement
+        agent.on("user_started_speaking", self._on_user_started_speaking)
+        agent.on("user_stopped_speaking", self._on_user_stopped_speaking)
+        agent.on("agent_started_speaking", self._on_agent_started_speaking)
+        agent.on("agent_stopped_speaking", self._on_agent_stopped_speaking)
+
+    def start(self):
+        """Démarrer la surveillance (à appeler une fois l'appel décroché)"""
+        self._started_at = self._last_activity = self._loop.time()
+        self._task = asyncio.create_task(self._run())
+        return self._task
+
+    async def stop(self):
+        """Arrêter la surveillance à la fin de l'appel"""
+        self.agent.off("user_started_speaking", self._on_user_started_speaking)
+        self.agent.off("user_stopped_speaking", self._on_user_stopped_speaking)
+        self.agent.off("agent_started_speaking", self._on_agent_started_speaking)
+        self.agent.off("agent_stopped_speaking", self._on_agent_stopped_speaking)
+
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def pause(self):
+        """Suspendre le raccrochage sur silence (mise en attente), la durée maximale reste appliquée"""
+        self._paused = True
+
+    def resume(self):
+        """Reprendre la surveillance du silence, qui repart de maintenant"""
+        self._paused = False
+        self._touch()
+
+    def _touch(self):
+        self._last_activity = self._loop.time()
+
+    def _on_user_started_speaking(self, *_):
+        self._user_speaking = True
+        self._touch()
+
+    def _on_user_stopped_speaking(self, *_):
+        self._user_speaking = False
+        self._touch()
+
+    def _on_agent_started_speaking(self, *_):
+        self._agent_speaking = True
+        self._touch()
+
+    def _on_agent_stopped_speaking(self, *_):
+        self._agent_speaking = False
+        self._touch()
+
+    def _next_deadline(self):
+        """Calculer la prochaine échéance et la raison associée"""
+        now = self._loop.time()
+        # Revérification périodique : la fin d'une prise de parole ne réveille pas la tâche
+        deadlines = [(now + (self.silence_timeout or 60), None)]
+        if self.max_duration > 0:
+            deadlines.append((self._started_at + self.max_duration, REASON_MAX_DURATION))
+        if self.silence_timeout > 0 and not (self._paused or self._user_speaking or self._agent_speaking):
+            deadlines.append((self._last_activity + self.silence_timeout, REASON_SILENCE))
+        return min(deadlines, key=lambda d: d[0])
+
+    async def _run(self):
+        try:
+            while True:
+                deadline, reason = self._next_deadline()
+                delay = deadline - self._loop.time()
+                if delay > 0:
+                    # Un seul réveil par échéance ; l'activité survenue entre-temps la repousse
+                    await asyncio.sleep(delay)
+                    continue
+                if reason is None:
+                    continue
+
+                self.reason = reason
+                reaped_calls[reason] += 1
+                duration = self._loop.time() - self._started_at
+                identity = self.call_actions.participant.identity if self.call_actions.participant else None
+                logger.warning(
+                    f"Appel avec {identity} raccroché par le watchdog - raison: {reason}, "
+                    f"durée: {duration:.1f}s, silence: {self._loop.time() - self._last_activity:.1f}s"
+                )
+                await self.call_actions.hangup()
+                return reason
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Erreur dans le watchdog d'appel : {e}")
+            logger.exception("Détails de l'erreur:")
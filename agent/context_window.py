@@ -0,0 +1,181 @@
+import os
+import asyncio
+import logging
+
+from livekit.agents.llm import ChatContext, ChatMessage
+from livekit.plugins import openai
+
+logger = logging.getLogger(__name__)
+
+# Nombre de tours conservés mot pour mot (un tour = message de l'appelant et réponses qui suivent)
+CONTEXT_KEEP_TURNS = int(os.getenv("CONTEXT_KEEP_TURNS", "8"))
+# Tours accumulés au-delà avant de lancer un résumé (évite un appel LLM à chaque tour)
+CONTEXT_FOLD_BATCH = int(os.getenv("CONTEXT_FOLD_BATCH", "4"))
+# Budget du contexte envoyé au LLM (tokens estimés, hors définitions des outils)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+CONTEXT_SUMMARY_MODEL = os.getenv("CONTEXT_SUMMARY_MODEL", "gpt-4o-mini")
+
+SUMMARY_PREFIX = "Résumé de la conversation jusqu'ici : "
+
+SUMMARY_INSTRUCTIONS = (
+    "Tu résumes un appel téléphonique en cours entre un assistant et un client. "
+    "Mets à jour le résumé existant avec les nouveaux échanges. Conserve les faits utiles pour la suite : "
+    "identité et demandes du client, informations données, engagements pris, rendez-vous et actions effectuées. "
+    "Réponds uniquement par le résumé, en français, en 120 mots maximum."
+)
+
+def estimate_tokens(messages):
+    """Estimation du nombre de tokens (environ 4 caractères par token, plus l'enveloppe de chaque message)"""
+    total = 0
+    for message in messages:
+        content = message.content if isinstance(message.content, str) else ""
+        total += len(content) // 4 + 4
+        for call in message.tool_calls or ():
+            total += len(str(call.arguments)) // 4 + 8
+    return total
+
+def _render(message):
+    if message.tool_calls:
+        calls = ", ".join(f"{call.function_info.name}({call.arguments})" for call in message.tool_calls)
+        return f"assistant (action): {calls}"
+    content = message.content if isinstance(message.content, str) else ""
+    return f"{message.role}: {content}"
+
+class ContextWindow:
+    """
+    Contexte de conversation borné pour les appels longs
+
+    Le prompt système et les derniers tours restent mot pour mot ; les tours plus anciens sont
+    résumés en tâche de fond entre deux tours, dans un message système placé après le prompt.
+    Le budget de tokens est appliqué à chaque réponse validée en retirant les tours les plus
+    anciens si le résumé n'a pas encore suffi.
+    """
+
+    def __init__(self, keep_turns=CONTEXT_KEEP_TURNS, fold_batch=CONTEXT_FOLD_BATCH,
+                 token_budget=CONTEXT_TOKEN_BUDGET, summary_llm=None):
+        """
+        Initialisation du contexte borné
+
+        Args:
+            keep_turns: Tours conservés mot pour mot
+            fold_batch: Tours supplémentaires tolérés avant un résumé
+            token_budget: Budget de tokens estimés du contexte
+            summary_llm: LLM utilisé pour les résumés (gpt-4o-mini par défaut)
+        """
+        self.keep_turns = keep_turns
+        self.fold_batch = fold_batch
+        self.token_budget = token_budget
+        self.summary_llm = summary_llm
+
+        self.agent = None
+        self._summary = None
+        self._summary_task = None
+
+        # Bilan de l'appel
+        self.summaries = 0
+        self.dropped_turns = 0
+
+    def attach(self, agent):
+        """
+        Borner le contexte de l'agent vocal après chaque réponse
+
+        Args:
+            agent: VoicePipelineAgent de l'appel
+        """
+        self.agent = agent
+        agent.on("agent_speech_committed", self._on_reply_committed)
+        agent.on("agent_speech_interrupted", self._on_reply_committed)
+
+    def _split(self):
+        """Séparer l'en-tête (messages système) et les tours de la conversation"""
+        messages = self.agent.chat_ctx.messages
+        head = 0
+        while head < len(messages) and messages[head].role == "system":
+            head += 1
+        turns = []
+        for message in messages[head:]:
+            if message.role == "user" or not turns:
+                turns.append([])
+            turns[-1].append(message)
+        return messages[:head], turns
+
+    def _on_reply_committed(self, *_):
+        _, turns = self._split()
+        if len(turns) > self.keep_turns + self.fold_batch and (self._summary_task is None or self._summary_task.done()):
+            folded = [message for turn in turns[:len(turns) - self.keep_turns] for message in turn]
+            self._summary_task = asyncio.create_task(self._fold(folded))
+        self._enforce_budget()
+
+    def _enforce_budget(self):
+        head, turns = self._split()
+        tokens = estimate_tokens(head) + sum(estimate_tokens(turn) for turn in turns)
+        dropped = []
+        while tokens > self.token_budget and len(turns) > 1:
+            turn = turns.pop(0)
+            tokens -= estimate_tokens(turn)
+            dropped.extend(turn)
+        if dropped:
+            self.dropped_turns += 1
+            self._remove(dropped)
+            logger.warning(f"Budget de contexte atteint ({self.token_budget} tokens): {len(dropped)} messages retirés")
+
+    def _remove(self, folded):
+        ids = {message.id for message in folded}
+        self.agent.chat_ctx.messages[:] = [message for message in self.agent.chat_ctx.messages if message.id not in ids]
+
+    async def _fold(self, folded):
+        try:
+            summary = await self._summarize(folded)
+        except Exception as e:
+            logger.error(f"Erreur lors du résumé du contexte: {e}")
+            return
+        if not summary:
+            return
+
+        # Remplacement sans point d'attente : le pipeline ne voit jamais de contexte partiel
+        self._remove(folded)
+        messages = self.agent.chat_ctx.messages
+        if self._summary is not None and self._summary in messages:
+            messages.remove(self._summary)
+        self._summary = ChatMessage.create(text=SUMMARY_PREFIX + summary, role="system")
+        head, _ = self._split()
+        messages.insert(len(head), self._summary)
+        self.summaries += 1
+        logger.info(f"Contexte résumé: {len(folded)} messages remplacés par {len(summary)} caractères")
+
+    async def _summarize(self, folded):
+        if self.summary_llm is None:
+            self.summary_llm = openai.LLM(model=CONTEXT_SUMMARY_MODEL)
+
+        previous = self._summary.content[len(SUMMARY_PREFIX):] if self._summary is not None else "(aucun)"
+        transcript = "\n".join(_render(message) for message in folded)
+        chat_ctx = ChatContext().append(role="system", text=SUMMARY_INSTRUCTIONS).append(
+            role="user", text=f"Résumé existant : {previous}\n\nNouveaux échanges :\n{transcript}"
+        )
+
+        parts = []
+        stream = self.summary_llm.chat(chat_ctx=chat_ctx)
+        try:
+            async for chunk in stream:
+                for choice in chunk.choices:
+                    if choice.delta.content:
+                        parts.append(choice.delta.content)
+        finally:
+            await stream.aclose()
+        return "".join(parts).strip()
+
+    async def aclose(self):
+        """Annuler le résumé en cours"""
+        if self._summary_task is not None and not self._summary_task.done():
+            self._summary_task.cancel()
+            try:
+                await self._summary_task
+            except asyncio.CancelledError:
+                pass
+
+    def summary(self):
+        return {
+            "summaries": self.summaries,
+            "dropped_turns": self.dropped_turns,
+            "context_tokens": estimate_tokens(self.agent.chat_ctx.messages) if self.agent else 0,
+        }
@@ -0,0 +1,297 @@
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import logging
+
+import aiohttp
+from livekit.agents.llm import ChatMessage
+
+from batch_writer import DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+# Source des fiches client : file (fichier JSON local), http (service de fiches) ou none
+CUSTOMER_LOOKUP = os.getenv("CUSTOMER_LOOKUP", "file").lower()
+CUSTOMER_FILE_PATH = os.getenv("CUSTOMER_FILE_PATH", os.path.join(DATA_DIR, "customers.json"))
+CUSTOMER_LOOKUP_URL = os.getenv("CUSTOMER_LOOKUP_URL", "http://localhost:8082/customers")
+CUSTOMER_LOOKUP_TIMEOUT = float(os.getenv("CUSTOMER_LOOKUP_TIMEOUT", "2.0"))
+# Durée de validité d'une fiche en cache, partagée par les processus du worker (secondes)
+CUSTOMER_CACHE_TTL = float(os.getenv("CUSTOMER_CACHE_TTL", "300"))
+CUSTOMER_CACHE_DB_PATH = os.getenv("CUSTOMER_CACHE_DB_PATH", os.path.join(DATA_DIR, "customer_cache.db"))
+# Attente maximale de la fiche après le décroché, avant le message d'accueil (secondes)
+CUSTOMER_ANSWER_WAIT = float(os.getenv("CUSTOMER_ANSWER_WAIT", "0.3"))
+
+CONTEXT_PREFIX = "Informations sur le client (à utiliser avec discrétion, sans les réciter) : "
+
+def normalize_phone(phone_number):
+    """Numéro au format E.164 (clé des fiches et du cache)"""
+    phone_number = ''.join(c for c in phone_number if c.isdigit() or c == '+')
+    return phone_number if phone_number.startswith('+') else f"+{phone_number}"
+
+class FileCustomerSource:
+    """
+    Fiches client d'un fichier JSON local ({"+33612345678": {"name": ..., ...}}), rechargé s'il change
+    """
+
+    def __init__(self, path=CUSTOMER_FILE_PATH):
+        self.path = path
+        self._mtime = None
+        self._customers = {}
+
+    def _read(self, phone_number):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return None
+        if mtime != self._mtime:
+            with open(self.path, encoding="utf-8") as customers:
+                self._customers = {normalize_phone(phone): record for phone, record in json.load(customers).items()}
+            self._mtime = mtime
+        return self._customers.get(phone_number)
+
+    async def fetch(self, phone_number):
+        return await asyncio.to_thread(self._read, phone_number)
+
+    async def aclose(self):
+        pass
+
+class HttpCustomerSource:
+    """
+    Fiches client d'un service HTTP (GET <url>/<numéro>, 404 si le client est inconnu)
+    """
+
+    def __init__(self, url=CUSTOMER_LOOKUP_URL, timeout=CUSTOMER_LOOKUP_TIMEOUT):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self._session = None
+
+    async def fetch(self, phone_number):
+        if self._session is None:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+        async with self._session.get(f"{self.url}/{phone_number}") as response:
+            if response.status == 404:
+                return None
+            response.raise_for_status()
+            return await response.json()
+
+    async def aclose(self):
+        if self._session is not None:
+            await self._session.close()
+
+SOURCES = {
+    "file": FileCustomerSource,
+    "http": HttpCustomerSource,
+}
+
+class CustomerCache:
+    """
+    Cache SQLite (WAL) des fiches client avec durée de validité, y compris les clients inconnus
+
+    Chaque appel tourne dans son propre processus : le cache est sur disque pour servir les
+    appels suivants vers le même numéro (rappels, relances de campagne).
+    """
+
+    def __init__(self, path=CUSTOMER_CACHE_DB_PATH, ttl=CUSTOMER_CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS customer_cache ("
+                "phone_number TEXT PRIMARY KEY, fetched_at REAL NOT NULL, record TEXT) WITHOUT ROWID"
+            )
+        return self._conn
+
+    def get(self, phone_number):
+        """
+        Fiche en cache encore valide
+
+        Returns:
+            (True, fiche ou None si client inconnu) ou (False, None) si absente ou expirée
+        """
+        row = self._connect().execute(
+            "SELECT record FROM customer_cache WHERE phone_number = ? AND fetched_at >= ?",
+            (phone_number, time.time() - self.ttl)
+        ).fetchone()
+        if row is None:
+            return False, None
+        return True, json.loads(row[0]) if row[0] is not None else None
+
+    def put(self, phone_number, record):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO customer_cache (phone_number, fetched_at, record) VALUES (?, ?, ?)",
+                (phone_number, time.time(), json.dumps(record) if record is not None else None)
+            )
+
+class CustomerLookup:
+    """
+    Recherche de la fiche client, avec cache et regroupement des recherches simultanées
+
+    Les recherches en cours pour un même numéro partagent la même requête vers la source.
+    """
+
+    def __init__(self, source=None, cache=None):
+        """
+        Initialisation de la recherche
+
+        Args:
+            source: Source des fiches (objet avec `fetch(phone_number)`), selon CUSTOMER_LOOKUP par défaut
+            cache: CustomerCache (partagé par les processus)
+        """
+        if source is None and CUSTOMER_LOOKUP in SOURCES:
+            source = SOURCES[CUSTOMER_LOOKUP]()
+        self.source = source
+        self.cache = cache or CustomerCache()
+        self._inflight = {}
+
+        # Bilan de l'appel
+        self.cache_hits = 0
+        self.fetches = 0
+
+    @property
+    def enabled(self):
+        return self.source is not None
+
+    async def get(self, phone_number):
+        """
+        Fiche client d'un numéro (None si inconnu ou en cas d'erreur)
+
+        Args:
+            phone_number: Numéro de téléphone du client
+        """
+        phone_number = normalize_phone(phone_number)
+        task = self._inflight.get(phone_number)
+        if task is None:
+            task = asyncio.create_task(self._lookup(phone_number))
+            self._inflight[phone_number] = task
+            task.add_done_callback(lambda _: self._inflight.pop(phone_number, None))
+        # Une recherche abandonnée par un appelant reste disponible pour les autres
+        return await asyncio.shield(task)
+
+    async def _lookup(self, phone_number):
+        try:
+            found, record = await asyncio.to_thread(self.cache.get, phone_number)
+        except sqlite3.Error as e:
+            logger.warning(f"Cache des fiches client indisponible: {e}")
+            found, record = False, None
+        if found:
+            self.cache_hits += 1
+            return record
+
+        self.fetches += 1
+        try:
+            record = await asyncio.wait_for(self.source.fetch(phone_number), CUSTOMER_LOOKUP_TIMEOUT)
+        except Exception as e:
+            logger.warning(f"Fiche client de {phone_number} indisponible: {e!r}")
+            return None
+        try:
+            await asyncio.to_thread(self.cache.put, phone_number, record)
+        except sqlite3.Error as e:
+            logger.warning(f"Mise en cache de la fiche client impossible: {e}")
+        return record
+
+    async def aclose(self):
+        if self.source is not None:
+            await self.source.aclose()
+
+def customer_message(record):
+    """Message système décrivant le client, ajouté après le prompt système"""
+    details = "; ".join(f"{key}: {value}" for key, value in record.items() if value not in (None, "", [], {}))
+    return ChatMessage.create(text=CONTEXT_PREFIX + details, role="system")
+
+class CustomerPrefetch:
+    """
+    Recherche de la fiche client lancée avant la numérotation, pendant que le téléphone sonne
+
+    Au décroché, la fiche déjà disponible est ajoutée au contexte sans attente ; sinon
+    l'accueil attend au plus `answer_wait` secondes et la fiche est ajoutée dès son arrivée.
+    """
+
+    def __init__(self, lookup, answer_wait=CUSTOMER_ANSWER_WAIT):
+        self.lookup = lookup
+        self.answer_wait = answer_wait
+        self.record = None
+        self._task = None
+        self._started_at = None
+        self._ready_at = None
+        self._answered_at = None
+        self._waited = 0.0
+        self._chat_ctx = None
+        self._on_record = None
+        self._injected = False
+
+    def start(self, phone_number):
+        """Lancer la recherche (avant `OutboundCaller.start_call`)"""
+        if not self.lookup.enabled:
+            return
+        self._started_at = time.perf_counter()
+        self._task = asyncio.create_task(self.lookup.get(phone_number))
+        self._task.add_done_callback(self._on_done)
+
+    def _on_done(self, task):
+        self._ready_at = time.perf_counter()
+        if task.cancelled() or task.exception() is not None:
+            return
+        self.record = task.result()
+        if self._chat_ctx is not None:
+            # Fiche arrivée après l'accueil : disponible pour le prochain tour
+            self._inject()
+
+    async def inject(self, chat_ctx, on_record=None):
+        """
+        Ajouter la fiche au contexte de conversation au décroché
+
+        Args:
+            chat_ctx: ChatContext de l'agent
+            on_record: Fonction appelée avec la fiche quand elle est ajoutée
+        """
+        if self._task is None:
+            return
+        self._answered_at = time.perf_counter()
+        self._chat_ctx = chat_ctx
+        self._on_record = on_record
+        if not self._task.done():
+            try:
+                await asyncio.wait_for(asyncio.shield(self._task), self.answer_wait)
+            except asyncio.TimeoutError:
+                logger.info("Fiche client pas encore disponible au décroché, accueil sans attendre")
+            except Exception:
+                pass
+            self._waited = time.perf_counter() - self._answered_at
+        if self._task.done():
+            self._inject()
+
+    def _inject(self):
+        if self.record is None or self._chat_ctx is None or self._injected:
+            return
+        self._injected = True
+        messages = self._chat_ctx.messages
+        head = 0
+        while head < len(messages) and messages[head].role == "system":
+            head += 1
+        # Après le prompt système, pour garder le préfixe mis en cache identique d'un appel à l'autre
+        messages.insert(head, customer_message(self.record))
+        if self._on_record is not None:
+            self._on_record(self.record)
+
+    async def aclose(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        await self.lookup.aclose()
+
+    def summary(self):
+        return {
+            "found": self.record is not None,
+            "cache_hits": self.lookup.cache_hits,
+            "lookup_ms": round((self._ready_at - self._started_at) * 1000) if self._ready_at else None,
+            "ready_before_answer": bool(self._ready_at and self._answered_at and self._ready_at <= self._answered_at),
+            "answer_wait_ms": round(self._waited * 1000),
+        }
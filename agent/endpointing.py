@@ -0,0 +1,159 @@
+import os
+import time
+import logging
+from collections import deque
+
+from livekit.agents import metrics
+
+logger = logging.getLogger(__name__)
+
+# Fin de tour adaptative : délai ajouté au silence du VAD avant de valider la réponse (secondes)
+ADAPTIVE_ENDPOINTING = os.getenv("ADAPTIVE_ENDPOINTING", "1").lower() in ("1", "true", "yes")
+ENDPOINTING_INITIAL_DELAY = float(os.getenv("ENDPOINTING_INITIAL_DELAY", "0.5"))
+ENDPOINTING_MIN_DELAY = float(os.getenv("ENDPOINTING_MIN_DELAY", "0.2"))
+ENDPOINTING_MAX_DELAY = float(os.getenv("ENDPOINTING_MAX_DELAY", "2.0"))
+# Quantile des pauses de l'appelant couvert par le délai, et marge ajoutée
+ENDPOINTING_QUANTILE = float(os.getenv("ENDPOINTING_QUANTILE", "0.9"))
+ENDPOINTING_MARGIN = float(os.getenv("ENDPOINTING_MARGIN", "0.2"))
+# Réduction du délai après chaque tour sans reprise de parole (appelant rapide)
+ENDPOINTING_DECAY = float(os.getenv("ENDPOINTING_DECAY", "0.9"))
+
+class EndpointingController:
+    """
+    Délai de fin de tour appris sur les pauses de l'appelant
+
+    Les segments de parole du VAD donnent deux types de pauses : celles après lesquelles
+    l'appelant a repris avant la validation (pause en milieu de phrase) et celles où il a
+    repris après la validation, avant que l'agent ne parle (coupure prématurée). Le délai
+    couvre le quantile choisi de ces pauses ; chaque tour sans reprise le rapproche de ce quantile.
+
+    Les instants sont fournis par l'appelant (horloge monotone), ce qui permet de rejouer la
+    même logique hors ligne.
+    """
+
+    def __init__(self, initial_delay=ENDPOINTING_INITIAL_DELAY, min_delay=ENDPOINTING_MIN_DELAY,
+                 max_delay=ENDPOINTING_MAX_DELAY, quantile=ENDPOINTING_QUANTILE, margin=ENDPOINTING_MARGIN,
+                 decay=ENDPOINTING_DECAY, min_samples=2, window=30):
+        """
+        Initialisation du contrôleur
+
+        Args:
+            initial_delay: Délai avant toute observation
+            min_delay: Délai minimal
+            max_delay: Délai maximal
+            quantile: Quantile des pauses couvert par le délai
+            margin: Marge ajoutée au quantile
+            decay: Facteur de réduction après un tour sans reprise
+            min_samples: Nombre de pauses observées avant d'utiliser le quantile
+            window: Nombre de pauses récentes conservées
+        """
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.quantile = quantile
+        self.margin = margin
+        self.decay = decay
+        self.min_samples = min_samples
+        self.delay = initial_delay
+
+        self.pauses = deque(maxlen=window)
+        self.cutoffs = 0
+        self.turns = 0
+        self._speech_ended_at = None
+        self._validated = False
+
+    def _clamp(self, delay):
+        return min(self.max_delay, max(self.min_delay, delay))
+
+    def target(self):
+        """Délai couvrant le quantile des pauses observées (délai minimal sans observation)"""
+        if len(self.pauses) < self.min_samples:
+            return self.min_delay
+        ordered = sorted(self.pauses)
+        return self._clamp(ordered[int(self.quantile * (len(ordered) - 1))] + self.margin)
+
+    def speech_started(self, now):
+        """Début de parole détecté par le VAD"""
+        if self._speech_ended_at is not None:
+            pause = now - self._speech_ended_at
+            self.pauses.append(pause)
+            if self._validated:
+                # L'appelant n'avait pas fini : le délai doit couvrir au moins cette pause
+                self.cutoffs += 1
+                self.delay = self._clamp(max(self.delay, pause + self.margin))
+            else:
+                self.delay = self._clamp(max(self.delay, self.target()))
+        self._speech_ended_at = None
+        self._validated = False
+
+    def speech_ended(self, now):
+        """Fin de parole détectée par le VAD (après son propre silence minimal)"""
+        self._speech_ended_at = now
+
+    def turn_validated(self, now):
+        """Fin de tour validée par le pipeline"""
+        self._validated = True
+        self.turns += 1
+
+    def reply_started(self, now):
+        """L'agent commence à répondre : le tour validé n'a pas été coupé"""
+        if self._validated:
+            self.delay = self._clamp(max(self.target(), self.delay * self.decay))
+        self._speech_ended_at = None
+        self._validated = False
+
+    def summary(self):
+        return {
+            "delay": round(self.delay, 3),
+            "turns": self.turns,
+            "pauses": len(self.pauses),
+            "cutoffs": self.cutoffs,
+        }
+
+class AdaptiveEndpointing:
+    """
+    Application du contrôleur au VoicePipelineAgent d'un appel
+    """
+
+    def __init__(self, controller=None, enabled=ADAPTIVE_ENDPOINTING):
+        self.controller = controller or EndpointingController()
+        self.enabled = enabled
+        self.agent = None
+
+    def attach(self, agent):
+        """
+        Suivre la parole de l'appelant et ajuster le délai de fin de tour
+
+        Args:
+            agent: VoicePipelineAgent de l'appel
+        """
+        if not self.enabled:
+            return
+        self.agent = agent
+        controller = self.controller
+        self._apply()
+
+        @agent.on("user_started_speaking")
+        def _on_user_started_speaking():
+            controller.speech_started(time.perf_counter())
+            self._apply()
+
+        @agent.on("user_stopped_speaking")
+        def _on_user_stopped_speaking():
+            controller.speech_ended(time.perf_counter())
+
+        @agent.on("metrics_collected")
+        def _on_metrics_collected(collected):
+            if isinstance(collected, metrics.PipelineEOUMetrics):
+                controller.turn_validated(time.perf_counter())
+
+        @agent.on("agent_started_speaking")
+        def _on_agent_started_speaking():
+            controller.reply_started(time.perf_counter())
+            self._apply()
+
+    def _apply(self):
+        # Le délai est lu par la validation différée du pipeline à chaque fin de parole
+        validation = getattr(self.agent, "_deferred_validation", None)
+        if validation is not None and validation._end_of_speech_delay != self.controller.delay:
+            validation._end_of_speech_delay = self.controller.delay
+            logger.debug(f"Délai de fin de tour: {self.controller.delay:.2f} s")
@@ -0,0 +1,269 @@
+import os
+import time
+import array
+import asyncio
+import hashlib
+import logging
+
+from livekit import rtc
+from livekit.agents import metrics
+
+from batch_writer import DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+# Relances sonores pendant l'attente de la réponse du LLM
+FILLER_AUDIO = os.getenv("FILLER_AUDIO", "1").lower() in ("1", "true", "yes")
+# Silence toléré après la fin de tour avant de jouer une relance (secondes)
+FILLER_BUDGET = float(os.getenv("FILLER_BUDGET", "0.9"))
+FILLER_CACHE_DIR = os.getenv("FILLER_CACHE_DIR", os.path.join(DATA_DIR, "fillers"))
+FILLER_PHRASES = (
+    "D'accord...",
+    "Un instant...",
+    "Très bien, je regarde...",
+    "Hmm, voyons...",
+)
+
+# Nombre maximal de silences détaillés joints au CDR
+_MAX_SAMPLES = 50
+_FRAME_MS = 20
+# Durée du fondu de sortie quand la vraie réponse commence
+_FADE_MS = 60
+
+class FillerClips:
+    """
+    Relances pré-synthétisées, mises en cache sur disque (PCM 16 bits mono) et partagées par les processus
+    """
+
+    def __init__(self, sample_rate, cache_dir=FILLER_CACHE_DIR, phrases=FILLER_PHRASES, voice=None):
+        """
+        Initialisation des relances
+
+        Args:
+            sample_rate: Fréquence du TTS de l'agent
+            cache_dir: Répertoire du cache
+            phrases: Textes des relances
+            voice: Clé de la voix (modèle et voix du TTS), None pour la voix par défaut
+        """
+        self.sample_rate = sample_rate
+        self.cache_dir = cache_dir
+        self.phrases = phrases
+        self.voice = voice
+        self.clips = {}
+
+    def _path(self, text):
+        key = text if self.voice is None else f"{self.voice}:{text}"
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:12]
+        return os.path.join(self.cache_dir, str(self.sample_rate), f"{digest}.pcm")
+
+    def load(self):
+        """Charger les relances déjà synthétisées (appel bloquant, à faire au prewarm)"""
+        for text in self.phrases:
+            path = self._path(text)
+            if os.path.exists(path):
+                with open(path, "rb") as clip:
+                    self.clips[text] = clip.read()
+        return self
+
+    async def ensure(self, tts):
+        """
+        Synthétiser les relances manquantes avec le TTS de l'appel
+
+        Args:
+            tts: TTS de l'agent (même voix et même fréquence que les réponses)
+        """
+        for text in self.phrases:
+            if text in self.clips:
+                continue
+            try:
+                pcm = bytearray()
+                async for audio in tts.synthesize(text):
+                    pcm += bytes(audio.frame.data)
+            except Exception as e:
+                logger.warning(f"Synthèse de la relance '{text}' impossible: {e}")
+                continue
+            path = self._path(text)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Écriture atomique : d'autres processus peuvent lire le cache en même temps
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as clip:
+                clip.write(pcm)
+            os.replace(tmp_path, path)
+            self.clips[text] = bytes(pcm)
+
+class FillerPlayer:
+    """
+    Relance sonore jouée quand la réponse tarde, sur une piste audio dédiée de l'agent
+
+    La relance démarre si aucune réponse n'a commencé `budget` secondes après la fin de tour
+    (le premier token du LLM est l'attente principale), au plus une fois par tour. Elle s'arrête
+    en fondu dès que la vraie réponse commence, ou si l'appelant reprend la parole.
+    """
+
+    def __init__(self, clips, budget=FILLER_BUDGET, enabled=FILLER_AUDIO):
+        """
+        Initialisation du lecteur
+
+        Args:
+            clips: FillerClips du processus
+            budget: Silence toléré avant une relance (secondes)
+            enabled: Activer les relances
+        """
+        self.clips = clips
+        self.budget = budget
+        self.enabled = enabled and budget > 0
+        self._source = None
+        self._timer = None
+        self._play_task = None
+        self._ensure_task = None
+        # Arrêt de la lecture en cours (un événement par lecture)
+        self._stop = asyncio.Event()
+        self._validated_at = None
+        self._filler_at = None
+        self._next = 0
+
+        # Bilan de l'appel
+        self.turns = 0
+        self.fired = 0
+        self.silence_ms = []
+        self.silence_without_filler_ms = []
+
+    async def start(self, room, tts, publish=False):
+        """
+        Publier la piste des relances et compléter le cache si besoin
+
+        Args:
+            room: Room LiveKit de l'appel
+            tts: TTS de l'agent
+            publish: Publier la piste même sans relances (clip joué avec `play_clip`)
+        """
+        if not (self.enabled or publish):
+            return
+        self._source = rtc.AudioSource(self.clips.sample_rate, 1, queue_size_ms=_FRAME_MS * 5)
+        track = rtc.LocalAudioTrack.create_audio_track("filler", self._source)
+        await room.local_participant.publish_track(
+            track, rtc.TrackPublishOptions(source=rtc.TrackSource.SOURCE_MICROPHONE)
+        )
+        if self.enabled and len(self.clips.clips) < len(self.clips.phrases):
+            self._ensure_task = asyncio.create_task(self.clips.ensure(tts))
+
+    def attach(self, agent):
+        """
+        Suivre les fins de tour et le début des réponses de l'agent vocal
+
+        Args:
+            agent: VoicePipelineAgent de l'appel
+        """
+        if self.enabled:
+            @agent.on("metrics_collected")
+            def _on_metrics_collected(collected):
+                if isinstance(collected, metrics.PipelineEOUMetrics):
+                    self._on_turn_validated(collected.end_of_utterance_delay)
+
+        @agent.on("agent_started_speaking")
+        def _on_agent_started_speaking():
+            self._on_reply_started()
+
+        @agent.on("user_started_speaking")
+        def _on_user_started_speaking():
+            self._cancel()
+
+    def _on_turn_validated(self, end_of_utterance_delay):
+        self._cancel()
+        self.turns += 1
+        # Le silence perçu commence à la fin de parole de l'appelant
+        self._validated_at = time.perf_counter() - end_of_utterance_delay
+        self._filler_at = None
+        self._timer = asyncio.get_running_loop().call_later(self.budget, self._fire)
+
+    def _fire(self):
+        self._timer = None
+        phrases = [text for text in self.clips.phrases if text in self.clips.clips]
+        if self._source is None or not phrases:
+            return
+        # Rotation des relances pour éviter de répéter la même deux fois de suite
+        text = phrases[self._next % len(phrases)]
+        self._next += 1
+        self.fired += 1
+        self._filler_at = time.perf_counter()
+        self._start(self.clips.clips[text])
+
+    def play_clip(self, pcm):
+        """
+        Jouer un clip pré-synthétisé sur la piste des relances (arrêté en fondu si l'appelant parle)
+
+        Args:
+            pcm: Audio PCM 16 bits mono à la fréquence des relances
+        """
+        self._cancel()
+        return self._start(pcm)
+
+    def _start(self, pcm):
+        # La lecture précédente, déjà arrêtée, finit son fondu avant que celle-ci ne commence
+        self._stop = asyncio.Event()
+        self._play_task = asyncio.create_task(self._play(pcm, self._stop, self._play_task))
+        return self._play_task
+
+    async def _play(self, pcm, stop, previous=None):
+        if previous is not None and not previous.done():
+            await asyncio.wait((previous,))
+        if stop.is_set():
+            return
+        samples = array.array("h", pcm)
+        frame_size = self.clips.sample_rate * _FRAME_MS // 1000
+        fade_frames = max(1, _FADE_MS // _FRAME_MS)
+        fading = 0
+        for offset in range(0, len(samples) - frame_size + 1, frame_size):
+            chunk = samples[offset:offset + frame_size]
+            if stop.is_set():
+                # Fondu de sortie sur quelques trames avant de rendre la main à la réponse
+                fading += 1
+                if fading > fade_frames:
+                    break
+                gain = 1 - fading / (fade_frames + 1)
+                chunk = array.array("h", (int(sample * gain) for sample in chunk))
+            await self._source.capture_frame(
+                rtc.AudioFrame(chunk.tobytes(), self.clips.sample_rate, 1, frame_size)
+            )
+
+    def _on_reply_started(self):
+        if self._validated_at is None:
+            return
+        now = time.perf_counter()
+        reply_ms = (now - self._validated_at) * 1000
+        heard_ms = (self._filler_at - self._validated_at) * 1000 if self._filler_at else reply_ms
+        if len(self.silence_ms) < _MAX_SAMPLES:
+            self.silence_ms.append(round(heard_ms))
+            self.silence_without_filler_ms.append(round(reply_ms))
+        self._validated_at = None
+        self._cancel()
+
+    def _cancel(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._stop.set()
+
+    async def aclose(self):
+        """Arrêter la relance en cours et libérer la source audio"""
+        self._cancel()
+        if self._ensure_task is not None and not self._ensure_task.done():
+            # Les relances déjà synthétisées restent en cache, les autres le seront au prochain appel
+            self._ensure_task.cancel()
+            await asyncio.wait((self._ensure_task,))
+        if self._play_task is not None:
+            try:
+                await self._play_task
+            except Exception as e:
+                logger.warning(f"Erreur lors de la lecture de la relance: {e}")
+        if self._source is not None:
+            await self._source.aclose()
+
+    def summary(self):
+        return {
+            "budget_ms": round(self.budget * 1000),
+            "turns": self.turns,
+            "fired": self.fired,
+            "silence_ms": self.silence_ms,
+            "silence_without_filler_ms": self.silence_without_filler_ms,
+        }
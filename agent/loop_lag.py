@@ -0,0 +1,239 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import threading
+import traceback
+from collections import deque
+
+from batch_writer import DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+# Détection des callbacks qui bloquent la boucle d'événements (pile capturée pendant le blocage),
+# commune aux appels de l'agent (worker_load.py) et aux processus de l'API (api/loop_monitor.py)
+LOOP_SLOW_CALLBACKS = os.getenv("LOOP_SLOW_CALLBACKS", "1").lower() in ("1", "true", "yes")
+LOOP_SLOW_CALLBACK_MS = float(os.getenv("LOOP_SLOW_CALLBACK_MS", "100"))
+# Réglages modifiables à chaud (écrits par POST /api/loop-health), relus chaque seconde par toutes les boucles
+LOOP_MONITOR_CONTROL = os.getenv("LOOP_MONITOR_CONTROL", os.path.join(DATA_DIR, "loop_monitor.json"))
+
+_STACK_DEPTH = 12
+
+def read_control(path=LOOP_MONITOR_CONTROL):
+    """
+    Réglages de la détection : fichier de contrôle s'il existe, environnement sinon
+
+    Returns:
+        (détection activée, seuil en ms)
+    """
+    try:
+        with open(path) as control:
+            data = json.load(control)
+    except (OSError, ValueError):
+        data = {}
+    return (
+        bool(data.get("slow_callbacks", LOOP_SLOW_CALLBACKS)),
+        float(data.get("threshold_ms", LOOP_SLOW_CALLBACK_MS)),
+    )
+
+def write_control(slow_callbacks=None, threshold_ms=None, path=LOOP_MONITOR_CONTROL):
+    """Modifier à chaud les réglages de la détection (pris en compte en une seconde)"""
+    enabled, threshold = read_control(path)
+    data = {
+        "slow_callbacks": enabled if slow_callbacks is None else bool(slow_callbacks),
+        "threshold_ms": threshold if threshold_ms is None else float(threshold_ms),
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as control:
+        json.dump(data, control)
+    os.replace(tmp_path, path)
+    return data
+
+def read_reports(report_dir, ttl=5.0):
+    """
+    Rapports publiés par les boucles surveillées
+
+    Args:
+        report_dir: Répertoire des rapports
+        ttl: Âge maximal d'un rapport (les plus anciens viennent de processus arrêtés)
+
+    Returns:
+        Dictionnaire nom du rapport -> contenu
+    """
+    reports = {}
+    now = time.time()
+    try:
+        entries = list(os.scandir(report_dir))
+    except FileNotFoundError:
+        return reports
+    for entry in entries:
+        if not entry.name.endswith(".json"):
+            continue
+        try:
+            with open(entry.path) as report:
+                data = json.load(report)
+        except (OSError, ValueError):
+            continue
+        if now - data["at"] <= ttl:
+            reports[entry.name[:-len(".json")]] = data
+    return reports
+
+class SlowCallbackDetector:
+    """
+    Capture de la pile du thread de la boucle quand un callback la bloque au-delà du seuil
+
+    Remplace le mode debug d'asyncio : un thread vérifie que la boucle avance encore (battement
+    donné par l'échantillonneur de retard) et ne lit la pile qu'en cas de blocage.
+    """
+
+    def __init__(self, interval, threshold_ms=LOOP_SLOW_CALLBACK_MS, enabled=LOOP_SLOW_CALLBACKS, max_entries=20):
+        """
+        Initialisation de la détection
+
+        Args:
+            interval: Période des battements de la boucle (secondes)
+            threshold_ms: Blocage signalé (ms)
+            enabled: Activer la détection
+            max_entries: Blocages détaillés conservés
+        """
+        self.interval = interval
+        self.threshold_ms = threshold_ms
+        self.enabled = enabled
+        self.slow_callbacks = deque(maxlen=max_entries)
+        self.count = 0
+        self._thread_id = None
+        self._tick = time.monotonic()
+        self._reported_tick = None
+        self._pending = None
+        self._closed = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Surveiller la boucle du thread courant"""
+        self._thread_id = threading.get_ident()
+        self._tick = time.monotonic()
+        threading.Thread(target=self._run, daemon=True, name="slow_callback_detector").start()
+        return self
+
+    def tick(self, lag_ms):
+        """Battement de la boucle, avec le retard mesuré au réveil"""
+        self._tick = time.monotonic()
+        with self._lock:
+            if self._pending is not None:
+                # Durée totale du blocage, connue quand la boucle reprend la main
+                self._pending["ms"] = round(max(self._pending["ms"], lag_ms))
+                self._pending = None
+
+    def recent(self, count=None):
+        """Derniers blocages détaillés (copie lisible depuis la boucle)"""
+        with self._lock:
+            entries = list(self.slow_callbacks)
+        return entries if count is None else entries[-count:]
+
+    def _run(self):
+        while not self._closed.wait(max(0.01, self.threshold_ms / 2000)):
+            if not self.enabled:
+                continue
+            tick = self._tick
+            stalled_ms = (time.monotonic() - tick - self.interval) * 1000
+            if stalled_ms < self.threshold_ms or tick == self._reported_tick:
+                continue
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is None:
+                continue
+            stack = "".join(traceback.format_stack(frame, limit=_STACK_DEPTH))
+            self._reported_tick = tick
+            entry = {"at": time.time(), "ms": round(stalled_ms), "stack": stack}
+            with self._lock:
+                self.slow_callbacks.append(entry)
+                self.count += 1
+                self._pending = entry
+            logger.warning(f"Boucle d'événements bloquée depuis {stalled_ms:.0f} ms:\n{stack}")
+
+    def close(self):
+        self._closed.set()
+
+class LoopLagSampler:
+    """
+    Retard d'une boucle d'événements : écart entre le réveil prévu et le réveil réel d'une tâche
+
+    Deux tâches : l'échantillonneur, qui ne fait que mesurer (un passage par un thread le ferait
+    attendre et compterait cette attente comme du retard), et la publication du rapport de chaque
+    fenêtre, dont les lectures et écritures de fichiers passent par un thread.
+    Les sous-classes définissent le contenu du rapport (`report`).
+    """
+
+    def __init__(self, interval=0.05, window=1.0, path=None, samples=None, max_slow_callbacks=20):
+        """
+        Initialisation du suivi
+
+        Args:
+            interval: Période de la mesure (secondes)
+            window: Durée d'une fenêtre de publication (secondes)
+            path: Fichier du rapport (None pour ne rien publier)
+            samples: Conteneur des mesures (liste ou deque bornée)
+            max_slow_callbacks: Blocages détaillés conservés
+        """
+        self.interval = interval
+        self.window = window
+        self.samples = [] if samples is None else samples
+        self.detector = SlowCallbackDetector(interval, max_entries=max_slow_callbacks)
+        self._path = path
+        self._window_max = 0.0
+        self._tasks = []
+
+    def start(self):
+        self.detector.start()
+        self._tasks = [asyncio.create_task(self._sample()), asyncio.create_task(self._publish())]
+        return self
+
+    async def _sample(self):
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            lag_ms = max(0.0, (time.perf_counter() - expected) * 1000)
+            self.samples.append(lag_ms)
+            self.detector.tick(lag_ms)
+            self._window_max = max(self._window_max, lag_ms)
+
+    async def _publish(self):
+        while True:
+            await asyncio.sleep(self.window)
+            window_max, self._window_max = self._window_max, 0.0
+            # Rapport construit sur la boucle : les mesures ne sont jamais lues depuis un autre thread
+            await asyncio.to_thread(self._refresh, self.report(window_max))
+
+    def report(self, lag_ms):
+        """Contenu du rapport d'une fenêtre (retard maximal lag_ms)"""
+        return {"lag_ms": round(lag_ms, 1), "slow_callbacks": self.detector.count, "at": time.time()}
+
+    def _refresh(self, report):
+        self.detector.enabled, self.detector.threshold_ms = read_control()
+        if self._path is None:
+            return
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        tmp_path = f"{self._path}.tmp"
+        with open(tmp_path, "w") as report_file:
+            json.dump(report, report_file)
+        os.replace(tmp_path, self._path)
+
+    def percentile(self, q):
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    async def aclose(self):
+        self.detector.close()
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        if self._path is not None and os.path.exists(self._path):
+            os.remove(self._path)
@@ -3,14 +3,36 @@ import os
 import logging
 import json
 from livekit.agents import JobContext, WorkerOptions, cli
-from livekit.agents.llm import ChatContext, ChatMessage, FunctionContext
+from livekit.agents.llm import ChatMessage, FunctionContext
 from livekit.agents.pipeline import VoicePipelineAgent
 from livekit.agents import AutoSubscribe
-from livekit.plugins import deepgram, silero, openai, cartesia
 from dotenv import load_dotenv
 
-from outbound_caller import OutboundCaller
+# Chargement des variables d'environnement (avant les modules locaux qui lisent leur configuration)
+load_dotenv()
+
+from outbound_caller import (
+    OutboundCaller, CallFailed, SIP_ANSWERED, SIP_INVALID_NUMBER, SIP_NETWORK_ERROR, SIP_FAILED,
+)
 from call_actions import CallActions
+from audio_profile import get_audio_profile
+from call_watchdog import CallWatchdog
+from call_records import (
+    CallRecord, get_call_record_store,
+    OUTCOME_ANSWERED, OUTCOME_NOT_ANSWERED, OUTCOME_FAILED, OUTCOME_INVALID,
+)
+from transcripts import TranscriptRecorder, get_transcript_store, ROLE_AGENT
+from turn_latency import TurnLatencyTracker, get_latency_store
+from speculative_llm import SpeculativeReply
+from endpointing import AdaptiveEndpointing
+from context_window import ContextWindow
+from prompt_cache import PromptCacheTracker
+from filler_audio import FillerPlayer
+from barge_in import BargeInTracker, BARGE_IN_SPEECH_DURATION
+from customer_context import CustomerLookup, CustomerPrefetch
+from profiles import ProfileRegistry
+from worker_load import LoopLagMonitor, compute_load, worker_options
+from vad_model import vad_usage
 
 # Configuration du logging
 logging.basicConfig(
@@ -23,16 +45,28 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Chargement des variables d'environnement
-load_dotenv()
-
 # Trunk ID pour les appels sortants
 OUTBOUND_TRUNK_ID = os.getenv("OUTBOUND_TRUNK_ID")
 
 def prewarm(proc):
     """Fonction de préchauffage pour charger les modèles IA à l'avance"""
-    # Préchargement du modèle VAD
-    proc.userdata["vad"] = silero.VAD.load()
+    # Profil audio commun à tous les appels du processus (8 kHz natif pour le SIP)
+    audio_profile = get_audio_profile()
+    audio_profile.install()
+    proc.userdata["audio_profile"] = audio_profile
+
+    # Préchargement du modèle VAD à la fréquence du profil (modèle compilé au format ORT, VAD_SHARED_MODEL)
+    proc.userdata["vad"] = audio_profile.load_vad()
+    
+    # Profils d'agent compilés (prompt, outils, voix et audio pré-synthétisé), rechargés s'ils changent
+    proc.userdata["profiles"] = ProfileRegistry(audio_profile.tts_sample_rate).load()
+
+# Issue du CDR selon l'issue SIP de l'échec (les autres issues sont des appels non décrochés)
+_SIP_CALL_OUTCOMES = {
+    SIP_INVALID_NUMBER: OUTCOME_INVALID,
+    SIP_NETWORK_ERROR: OUTCOME_FAILED,
+    SIP_FAILED: OUTCOME_FAILED,
+}
 
 async def entrypoint(ctx: JobContext):
     """Point d'entrée principal de l'agent"""
@@ -40,18 +74,14 @@ async def entrypoint(ctx: JobContext):
     logger.info(f"DEBUT DE L'ENTRYPOINT")
     logger.info(f"Métadonnées du job brutes: {ctx.job.metadata}")
     
-    # Initialisation du contexte de conversation
-    initial_ctx = ChatContext().append(
-        role="system",
-        content=(
-            "Vous êtes un assistant téléphonique professionnel. "
-            "Vous parlez de manière naturelle et concise. "
-            "Vous êtes poli et serviable. "
-            "Vous êtes capable de comprendre les demandes des clients et d'y répondre efficacement. "
-            "Évitez d'utiliser des formulations robotiques comme 'je suis un assistant IA'. "
-            "Si le client pose une question complexe, demandez poliment plus de détails."
-        ),
-    )
+    # Enregistrement détaillé de l'appel (CDR), écrit à la fin de l'entrypoint
+    call_record = CallRecord(room_name=ctx.room.name, job_id=ctx.job.id)
+    # Chronologie des étapes de chaque tour (jointe au CDR, cumulée par worker)
+    latency_tracker = TurnLatencyTracker(call_record, worker_id=ctx.worker_id)
+    # Fiche client recherchée pendant la sonnerie
+    customer_prefetch = CustomerPrefetch(CustomerLookup())
+    # Retard de la boucle d'événements de l'appel (publié pour la charge du worker)
+    loop_lag = LoopLagMonitor().start()
 
     try:
         # Extraction du numéro de téléphone à partir des métadonnées
@@ -61,34 +91,89 @@ async def entrypoint(ctx: JobContext):
             metadata_dict = json.loads(job_metadata)
             phone_number = metadata_dict.get('phone_number', None)
             trunk_id = metadata_dict.get('trunk_id', None)
+            call_record.dispatched_at = metadata_dict.get('dispatched_at', None)
+            profile_name = metadata_dict.get('profile', None)
+            if metadata_dict.get('campaign'):
+                call_record.extra["campaign"] = metadata_dict['campaign']
+            # Appel lancé depuis la file : entrée et tentative reprises par le moteur de rappel
+            if metadata_dict.get('queue'):
+                call_record.extra["queue"] = {
+                    key: metadata_dict['queue'].get(key) for key in ("id", "attempt")
+                }
         except json.JSONDecodeError:
             # Si les métadonnées ne sont pas du JSON (cas simple), utiliser directement
             phone_number = job_metadata
             trunk_id = None
+            profile_name = None
         
         logger.info(f"Configuration de l'appel:")
         logger.info(f"Numéro de téléphone: {phone_number}")
         logger.info(f"Trunk ID: {trunk_id}")
         logger.info(f"Room: {ctx.room.name}")
+        call_record.phone_number = phone_number
+        call_record.trunk_id = trunk_id or OUTBOUND_TRUNK_ID
 
         # Vérification des valeurs extraites
         if not phone_number:
             logger.error("ERREUR CRITIQUE: Numéro de téléphone non trouvé dans les métadonnées")
+            call_record.outcome = OUTCOME_INVALID
             ctx.shutdown(reason="Numéro de téléphone manquant")
             return
 
+        # Profil d'agent de l'appel (compilé au prewarm)
+        profile = ctx.proc.userdata["profiles"].get(profile_name)
+        call_record.extra["profile"] = profile.name
+        logger.info(f"Profil d'agent: {profile!r}")
+        
         # Initialisation de l'agent vocal
+        audio_profile = ctx.proc.userdata["audio_profile"]
+        # Génération spéculative sur les transcriptions intermédiaires (SPECULATIVE_LLM)
+        speculative_reply = SpeculativeReply()
+        
+        # Initialisation des actions d'appel (outils du LLM dès la construction de l'agent,
+        # pour que chaque requête porte les mêmes définitions d'outils)
+        call_actions = CallActions(api=ctx.api, participant=None, room=ctx.room, tools=profile.tools)
+        
+        # Tokens de prompt servis depuis le cache du fournisseur
+        prompt_cache = PromptCacheTracker()
+        agent_llm = prompt_cache.instrument(profile.build_llm())
+        
+        # Coupure de l'agent quand l'appelant parle par-dessus (délais et travail perdu)
+        barge_in = BargeInTracker()
+        
         agent = VoicePipelineAgent(
             vad=ctx.proc.userdata["vad"],
-            stt=deepgram.STT(),
-            llm=openai.LLM(model="gpt-4o-mini"),
-            tts=cartesia.TTS(model="sonic-2"),  # Utilisation de Cartesia pour la synthèse vocale
-            chat_ctx=initial_ctx,
+            stt=audio_profile.build_stt(),
+            llm=agent_llm,
+            tts=profile.build_tts(audio_profile),  # Utilisation de Cartesia pour la synthèse vocale
+            chat_ctx=profile.chat_ctx.copy(),
+            fnc_ctx=call_actions,
             allow_interruptions=True,
+            interrupt_speech_duration=BARGE_IN_SPEECH_DURATION,
+            before_llm_cb=speculative_reply.before_llm_cb,
+            before_tts_cb=barge_in.before_tts_cb,
         )
-
-        # Initialisation des actions d'appel
-        call_actions = CallActions(api=ctx.api, participant=None, room=ctx.room)
+        call_actions.agent = agent
+        call_record.attach(agent)
+        latency_tracker.attach(agent)
+        speculative_reply.attach(agent)
+        barge_in.attach(agent)
+        
+        # Délai de fin de tour ajusté aux pauses de l'appelant
+        endpointing = AdaptiveEndpointing()
+        endpointing.attach(agent)
+        
+        # Contexte borné : derniers tours mot pour mot, tours anciens résumés entre deux tours
+        context_window = ContextWindow()
+        context_window.attach(agent)
+        
+        # Transcription tour par tour (journal de l'appel et index plein texte)
+        transcript_recorder = TranscriptRecorder(ctx.room.name, phone_number)
+        transcript_recorder.attach(agent)
+        
+        # Relance sonore quand la réponse tarde après la fin de tour
+        filler_player = FillerPlayer(profile.fillers)
+        filler_player.attach(agent)
         
         # Connexion à la room LiveKit
         await ctx.connect(auto_subscribe=AutoSubscribe.AUDIO_ONLY)
@@ -106,7 +191,12 @@ async def entrypoint(ctx: JobContext):
             # Log détaillé avant le démarrage de l'appel
             logger.info(f"Configuration de l'appel - Room: {ctx.room.name}, Trunk ID: {trunk_id or OUTBOUND_TRUNK_ID}")
             
+            call_record.mark("dial_at")
+            customer_prefetch.start(phone_number)
             participant = await outbound_caller.start_call(phone_number)
+            call_record.mark("answered_at")
+            call_record.outcome = OUTCOME_ANSWERED
+            call_record.extra["sip"] = {"outcome": SIP_ANSWERED}
             
             # Log après démarrage de l'appel
             logger.info(f"Appel démarré - Participant: {participant.identity}")
@@ -114,22 +204,29 @@ async def entrypoint(ctx: JobContext):
             # Mise à jour des actions d'appel avec le participant
             call_actions.participant = participant
             
-            # Configurer l'agent pour utiliser les actions d'appel
-            agent_llm = openai.LLM(
-                model="gpt-4o-mini",
-                fnc_ctx=call_actions,
-            )
-            agent.llm = agent_llm
-            
             # Démarrage de l'agent vocal
             agent.start(ctx.room, participant)
+            greeting_audio = profile.greeting_audio
+            await filler_player.start(ctx.room, agent.tts, publish=greeting_audio is not None)
             
-            # Premier message de l'agent
-            intro_message = (
-                f"Bonjour, je suis votre assistant virtuel. "
-                f"Comment puis-je vous aider aujourd'hui?"
-            )
-            await agent.say(intro_message, allow_interruptions=True)
+            # Fiche client ajoutée au contexte avant l'accueil (sans attente si elle est déjà là)
+            def _on_customer_record(record):
+                call_actions.customer_value = float(record.get("value") or 0.0)
+            await customer_prefetch.inject(agent.chat_ctx, on_record=_on_customer_record)
+            
+            # Premier message de l'agent : accueil pré-synthétisé s'il est en cache (pas d'attente du TTS)
+            if greeting_audio is not None:
+                agent.chat_ctx.append(role="assistant", text=profile.greeting)
+                transcript_recorder.record(ROLE_AGENT, profile.greeting)
+                filler_player.play_clip(greeting_audio)
+            else:
+                await agent.say(profile.greeting, allow_interruptions=True)
+                asyncio.create_task(profile.greeting_clip.ensure(agent.tts))
+            
+            # Raccrochage automatique après un silence prolongé ou une durée maximale
+            watchdog = CallWatchdog(agent, call_actions)
+            call_actions.watchdog = watchdog
+            watchdog.start()
             
             # Surveillance de l'état de l'appel
             call_monitoring_task = asyncio.create_task(
@@ -137,15 +234,69 @@ async def entrypoint(ctx: JobContext):
             )
             
             # Attendre la fin de l'appel
-            await call_monitoring_task
+            try:
+                await call_monitoring_task
+            finally:
+                await watchdog.stop()
+                await call_actions.aclose()
+                await speculative_reply.aclose()
+                if speculative_reply.started:
+                    call_record.extra["speculative"] = speculative_reply.summary()
+                if endpointing.enabled:
+                    call_record.extra["endpointing"] = endpointing.controller.summary()
+                await context_window.aclose()
+                call_record.extra["context"] = context_window.summary()
+                call_record.extra["prompt_cache"] = prompt_cache.summary()
+                await filler_player.aclose()
+                if filler_player.enabled:
+                    call_record.extra["fillers"] = filler_player.summary()
+                await barge_in.aclose()
+                call_record.extra["barge_in"] = barge_in.summary()
+                if customer_prefetch.lookup.enabled:
+                    call_record.extra["customer"] = customer_prefetch.summary()
+            
+            call_record.end_reason = watchdog.reason or "hangup"
+            if watchdog.reason:
+                # Libérer le job tout de suite pour rendre la capacité au worker
+                ctx.shutdown(reason=f"Appel raccroché par le watchdog: {watchdog.reason}")
             
         except Exception as e:
             logger.error(f"Erreur lors de l'appel : {e}")
+            if isinstance(e, CallFailed):
+                # Issue SIP (occupé, pas de réponse, erreur réseau...) : le moteur de rappel de l'API
+                # reprogramme l'appel d'après le CDR, le job est libéré tout de suite
+                call_record.extra["sip"] = e.to_dict()
+                call_record.outcome = _SIP_CALL_OUTCOMES.get(e.outcome, OUTCOME_NOT_ANSWERED)
+            if call_record.outcome is None:
+                call_record.outcome = OUTCOME_NOT_ANSWERED if call_record.dial_at else OUTCOME_FAILED
+            call_record.end_reason = str(e)
             ctx.shutdown(reason=f"Erreur d'appel: {e}")
     
     except Exception as e:
         logger.exception("Erreur dans l'entrypoint")
+        call_record.outcome = call_record.outcome or OUTCOME_FAILED
+        call_record.end_reason = str(e)
         ctx.shutdown(reason=f"Erreur dans l'entrypoint: {e}")
+    
+    finally:
+        call_record.mark("hangup_at")
+        latency_tracker.close()
+        await customer_prefetch.aclose()
+        await loop_lag.aclose()
+        call_record.extra["loop_lag"] = loop_lag.summary()
+        call_record.extra["vad"] = vad_usage()
+        call_record_store = get_call_record_store()
+        call_record_store.submit(call_record)
+        
+        # Les lots sont écrits par les threads des stockages ; on attend seulement avant l'arrêt du job
+        async def flush_call_records():
+            await asyncio.gather(
+                call_record_store.aflush(),
+                get_transcript_store().aflush(),
+                get_latency_store().aflush(),
+            )
+        
+        ctx.add_shutdown_callback(flush_call_records)
 
 if __name__ == "__main__":
     cli.run_app(
@@ -154,5 +305,9 @@ if __name__ == "__main__":
             prewarm_fnc=prewarm,
             # Désactivation de la répartition automatique pour utiliser l'API de dispatch explicite
             agent_name="outbound-caller",
+            # Charge calculée sur les appels en cours, le CPU, la mémoire et le retard des boucles d'événements
+            load_fnc=compute_load,
+            # Processus préchauffés en attente, seuil de charge et limites mémoire (WORKER_*)
+            **worker_options(),
         )
     )
@@ -1,10 +1,78 @@
 import asyncio
 import logging
+import aiohttp
+from google.protobuf.duration_pb2 import Duration
 from livekit import api, rtc
 from livekit.protocol.sip import CreateSIPParticipantRequest
 
 logger = logging.getLogger(__name__)
 
+# Issue SIP d'un appel sortant (reprise dans le CDR, utilisée par le moteur de rappel de l'API)
+SIP_ANSWERED = "answered"
+SIP_BUSY = "busy"
+SIP_NO_ANSWER = "no_answer"
+SIP_REJECTED = "rejected"
+SIP_INVALID_NUMBER = "invalid_number"
+SIP_NETWORK_ERROR = "network_error"
+SIP_FAILED = "failed"
+
+# Codes de réponse SIP finaux par issue (les 5xx sont des erreurs réseau ou opérateur)
+_SIP_STATUS_OUTCOMES = {
+    486: SIP_BUSY, 600: SIP_BUSY,
+    408: SIP_NO_ANSWER, 480: SIP_NO_ANSWER, 487: SIP_NO_ANSWER,
+    603: SIP_REJECTED, 607: SIP_REJECTED,
+    404: SIP_INVALID_NUMBER, 410: SIP_INVALID_NUMBER, 484: SIP_INVALID_NUMBER,
+    485: SIP_INVALID_NUMBER, 604: SIP_INVALID_NUMBER,
+}
+
+class CallFailed(Exception):
+    """
+    Échec d'un appel sortant, avec son issue SIP
+    """
+
+    def __init__(self, outcome, message, sip_status_code=None, sip_status=None):
+        super().__init__(message)
+        self.outcome = outcome
+        self.sip_status_code = sip_status_code
+        self.sip_status = sip_status
+
+    def to_dict(self):
+        return {
+            "outcome": self.outcome,
+            "status_code": self.sip_status_code,
+            "status": self.sip_status,
+        }
+
+def classify_call_error(error):
+    """
+    Issue SIP d'une erreur levée par la création du participant SIP
+
+    Args:
+        error: Exception levée par create_sip_participant
+
+    Returns:
+        CallFailed portant l'issue et le code SIP éventuel
+    """
+    if isinstance(error, CallFailed):
+        return error
+    if isinstance(error, api.TwirpError):
+        # Code SIP final transmis par LiveKit dans les métadonnées de l'erreur
+        status_code = error.metadata.get("sip_status_code")
+        status_code = int(status_code) if status_code and status_code.isdigit() else None
+        sip_status = error.metadata.get("sip_status")
+        if status_code is not None:
+            outcome = _SIP_STATUS_OUTCOMES.get(status_code)
+            if outcome is None:
+                outcome = SIP_NETWORK_ERROR if status_code >= 500 else SIP_FAILED
+        elif error.code in ("unavailable", "internal", "deadline_exceeded", "resource_exhausted"):
+            outcome = SIP_NETWORK_ERROR
+        else:
+            outcome = SIP_FAILED
+        return CallFailed(outcome, str(error), sip_status_code=status_code, sip_status=sip_status)
+    if isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError, ConnectionError)):
+        return CallFailed(SIP_NETWORK_ERROR, str(error) or type(error).__name__)
+    return CallFailed(SIP_FAILED, str(error))
+
 class OutboundCaller:
     """
     Classe gérant les appels sortants via SIP
@@ -29,13 +97,13 @@ class OutboundCaller:
         
         Args:
             phone_number: Numéro de téléphone à appeler
-            timeout: Délai maximum d'attente en secondes
+            timeout: Durée maximale de sonnerie en secondes
             
         Returns:
-            Participant SIP si l'appel est réussi
+            Participant SIP si l'appel est décroché
             
         Raises:
-            Exception si l'appel échoue ou expire
+            CallFailed (avec l'issue SIP) si l'appel échoue ou n'est pas décroché
         """
         # Logs détaillés de l'appel
         logger.info(f"====== DÉMARRAGE DE L'APPEL ======")
@@ -74,24 +142,29 @@ class OutboundCaller:
             participant_name=f"Customer {phone_number}",
             # Jouer une tonalité pendant que l'appel se connecte
             play_dialtone=True,
+            # Réponse de l'API au décroché, ou erreur portant le code SIP final (occupé, pas de réponse...)
+            wait_until_answered=True,
+            ringing_timeout=Duration(seconds=int(timeout)),
         )
         
         try:
             # Lancement de l'appel via l'API LiveKit
             logger.info(f"Envoi de la requête à LiveKit SIP: {request}")
-            sip_response = await self.api.sip.create_sip_participant(request)
+            sip_response = await self.api.sip.create_sip_participant(request, timeout=timeout + 10)
             logger.info(f"Réponse SIP reçue: {sip_response}")
-            
-            # Attente que le participant rejoigne la room
+        except Exception as e:
+            failure = classify_call_error(e)
+            logger.error(f"ERREUR lors du démarrage de l'appel ({failure.outcome}): {e}")
+            raise failure from e
+
+        # Appel décroché : le participant rejoint la room
+        try:
             participant = await self._wait_for_participant_to_join(user_identity, timeout)
-            
-            logger.info(f"Appel réussi. Participant: {participant.identity}")
-            return participant
-        
         except Exception as e:
-            logger.error(f"ERREUR lors du démarrage de l'appel: {e}")
-            logger.exception("Détails de l'erreur:")
-            raise
+            raise CallFailed(SIP_NETWORK_ERROR, str(e)) from e
+
+        logger.info(f"Appel réussi. Participant: {participant.identity}")
+        return participant
     
     async def _wait_for_participant_to_join(self, identity, timeout):
         """
@@ -0,0 +1,160 @@
+import os
+import json
+import logging
+
+from livekit.agents.llm import ChatContext
+from livekit.plugins import openai
+
+from batch_writer import DATA_DIR
+from call_actions import CallActions
+from filler_audio import FillerClips
+
+logger = logging.getLogger(__name__)
+
+# Répertoire des profils d'agent (un fichier <nom>.json par profil, rechargé s'il change)
+PROFILES_DIR = os.getenv("PROFILES_DIR", os.path.join(DATA_DIR, "profiles"))
+# Profil utilisé quand le dispatch n'en précise pas (ou en précise un inconnu)
+DEFAULT_PROFILE = os.getenv("DEFAULT_PROFILE", "default")
+
+# Prompt système identique pour tous les appels d'un profil : avec les définitions des outils, il
+# forme le préfixe stable des requêtes LLM mis en cache par le fournisseur. Tout contenu propre à
+# l'appel doit être ajouté après, dans la conversation.
+SYSTEM_PROMPT = (
+    "Vous êtes un assistant téléphonique professionnel. "
+    "Vous parlez de manière naturelle et concise. "
+    "Vous êtes poli et serviable. "
+    "Vous êtes capable de comprendre les demandes des clients et d'y répondre efficacement. "
+    "Évitez d'utiliser des formulations robotiques comme 'je suis un assistant IA'. "
+    "Si le client pose une question complexe, demandez poliment plus de détails."
+)
+
+GREETING = "Bonjour, je suis votre assistant virtuel. Comment puis-je vous aider aujourd'hui?"
+
+# Réglages d'un profil (les fichiers de profil ne précisent que ce qui change)
+DEFAULTS = {
+    "prompt": SYSTEM_PROMPT,
+    "greeting": GREETING,
+    "llm_model": "gpt-4o-mini",
+    "tts_model": "sonic-2",
+    # Voix Cartesia (ID), voix par défaut du plugin si absente
+    "voice": None,
+    # Outils de CallActions exposés au LLM, tous si absent
+    "tools": None,
+}
+
+class AgentProfile:
+    """
+    Profil d'agent compilé une fois par processus : contexte de base, schémas des outils et audio en cache
+    """
+
+    def __init__(self, name, config, sample_rate):
+        """
+        Compilation du profil
+
+        Args:
+            name: Nom du profil (clé `profile` des métadonnées du dispatch)
+            config: Réglages du profil (complétés par DEFAULTS)
+            sample_rate: Fréquence du TTS (profil audio du processus)
+        """
+        config = {**DEFAULTS, **config}
+        unknown = set(config) - set(DEFAULTS)
+        if unknown:
+            raise ValueError(f"Réglages inconnus: {', '.join(sorted(unknown))}")
+
+        self.name = name
+        self.prompt = config["prompt"]
+        self.greeting = config["greeting"]
+        self.llm_model = config["llm_model"]
+        self.tts_model = config["tts_model"]
+        self.voice = config["voice"]
+
+        self.tools = CallActions.compile_tools(config["tools"])
+        self.chat_ctx = ChatContext().append(role="system", text=self.prompt)
+
+        # Audio synthétisé avec la voix du profil, partagé par les processus via le cache disque
+        voice_key = f"{self.tts_model}/{self.voice or 'default'}"
+        self.fillers = FillerClips(sample_rate, voice=voice_key).load()
+        self.greeting_clip = FillerClips(sample_rate, phrases=(self.greeting,), voice=voice_key).load()
+
+    @property
+    def greeting_audio(self):
+        """Accueil pré-synthétisé (None tant qu'il n'est pas en cache)"""
+        return self.greeting_clip.clips.get(self.greeting)
+
+    def build_llm(self):
+        return openai.LLM(model=self.llm_model)
+
+    def build_tts(self, audio_profile):
+        kwargs = {"model": self.tts_model}
+        if self.voice:
+            kwargs["voice"] = self.voice
+        return audio_profile.build_tts(**kwargs)
+
+    def __repr__(self):
+        return f"<AgentProfile {self.name} llm={self.llm_model} tts={self.tts_model} tools={list(self.tools)}>"
+
+class ProfileRegistry:
+    """
+    Profils d'agent du processus, compilés au prewarm et recompilés quand leur fichier change
+
+    À chaque appel, `get` vérifie la date de modification des fichiers (quelques appels système)
+    et ne recompile que les profils modifiés : pas de redémarrage des workers.
+    """
+
+    def __init__(self, sample_rate, directory=PROFILES_DIR):
+        self.sample_rate = sample_rate
+        self.directory = directory
+        self.profiles = {}
+        self._mtimes = {}
+        # Profil intégré, utilisé si aucun fichier ne définit le profil par défaut
+        self._builtin = AgentProfile(DEFAULT_PROFILE, {}, sample_rate)
+
+    def load(self):
+        """Compiler tous les profils (appel bloquant, à faire au prewarm)"""
+        self.refresh()
+        logger.info(f"Profils d'agent chargés: {', '.join(sorted(self.profiles)) or '(aucun fichier)'}")
+        return self
+
+    def refresh(self):
+        """Recompiler les profils dont le fichier a changé"""
+        try:
+            entries = {
+                entry.name[:-len(".json")]: entry
+                for entry in os.scandir(self.directory) if entry.name.endswith(".json")
+            }
+        except FileNotFoundError:
+            entries = {}
+
+        for name in set(self._mtimes) - set(entries):
+            del self._mtimes[name]
+            if self.profiles.pop(name, None) is not None:
+                logger.info(f"Profil '{name}' supprimé")
+
+        for name, entry in entries.items():
+            mtime = entry.stat().st_mtime
+            if self._mtimes.get(name) == mtime:
+                continue
+            # Date retenue même en cas d'erreur : le fichier n'est relu qu'à sa prochaine modification
+            self._mtimes[name] = mtime
+            try:
+                with open(entry.path, encoding="utf-8") as profile_file:
+                    self.profiles[name] = AgentProfile(name, json.load(profile_file), self.sample_rate)
+            except (OSError, ValueError) as e:
+                logger.error(f"Profil '{name}' invalide, version précédente conservée: {e}")
+                continue
+            logger.info(f"Profil '{name}' compilé: {self.profiles[name]!r}")
+
+    def get(self, name=None):
+        """
+        Profil d'un appel
+
+        Args:
+            name: Nom du profil (profil par défaut si None ou inconnu)
+        """
+        self.refresh()
+        profile = self.profiles.get(name or DEFAULT_PROFILE)
+        if profile is None:
+            if name:
+                logger.warning(f"Profil '{name}' inconnu, utilisation du profil par défaut")
+            profile = self.profiles.get(DEFAULT_PROFILE, self._builtin)
+        return profile
@@ -0,0 +1,81 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+class _UsageTap:
+    """
+    Flux de complétion OpenAI relayé tel quel, en relevant l'usage du dernier fragment
+    """
+
+    def __init__(self, stream, on_usage):
+        self._stream = stream
+        self._on_usage = on_usage
+
+    async def __aenter__(self):
+        await self._stream.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return await self._stream.__aexit__(*exc_info)
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            if chunk.usage is not None:
+                self._on_usage(chunk.id, chunk.usage)
+            yield chunk
+
+class PromptCacheTracker:
+    """
+    Relevé des tokens de prompt servis depuis le cache du fournisseur (OpenAI)
+
+    Le cache porte sur le préfixe exact des requêtes : prompt système puis définitions des outils,
+    identiques d'un appel à l'autre, le contenu propre à l'appel venant après. Le plugin LLM ne
+    transmet pas `prompt_tokens_details.cached_tokens` : l'usage est relevé sur le client OpenAI.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+
+    def instrument(self, agent_llm):
+        """
+        Relever l'usage des requêtes d'un LLM du plugin OpenAI
+
+        Args:
+            agent_llm: Instance openai.LLM de l'agent
+
+        Returns:
+            Le même LLM
+        """
+        completions = agent_llm._client.chat.completions
+        create = completions.create
+
+        async def _create(*args, **kwargs):
+            response = await create(*args, **kwargs)
+            if kwargs.get("stream"):
+                return _UsageTap(response, self._on_usage)
+            return response
+
+        completions.create = _create
+        return agent_llm
+
+    def _on_usage(self, request_id, usage):
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", None) or 0
+        self.requests += 1
+        self.prompt_tokens += usage.prompt_tokens
+        self.cached_tokens += cached
+        logger.debug(f"Requête LLM {request_id}: {usage.prompt_tokens} tokens de prompt dont {cached} en cache")
+
+    @property
+    def hit_ratio(self):
+        return self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+
+    def summary(self):
+        return {
+            "requests": self.requests,
+            "prompt_tokens": self.prompt_tokens,
+            "cached_tokens": self.cached_tokens,
+            "hit_ratio": round(self.hit_ratio, 3),
+        }
@@ -0,0 +1,299 @@
+import os
+import re
+import time
+import asyncio
+import difflib
+import logging
+
+from livekit.agents import llm
+from livekit.agents.llm import ChatMessage
+from livekit.agents.types import DEFAULT_API_CONNECT_OPTIONS
+
+logger = logging.getLogger(__name__)
+
+# Mode spéculatif (désactivé par défaut) : la réponse est générée dès que la transcription
+# intermédiaire est stable, avant la validation de la fin de tour
+SPECULATIVE_LLM = os.getenv("SPECULATIVE_LLM", "0").lower() in ("1", "true", "yes")
+# Délai sans nouvelle transcription intermédiaire pour la considérer stable (secondes)
+SPECULATIVE_STABLE_DELAY = float(os.getenv("SPECULATIVE_STABLE_DELAY", "0.3"))
+# Similarité minimale (0-1, sur les mots) entre la transcription spéculée et la finale
+SPECULATIVE_MATCH_THRESHOLD = float(os.getenv("SPECULATIVE_MATCH_THRESHOLD", "0.9"))
+SPECULATIVE_MIN_WORDS = int(os.getenv("SPECULATIVE_MIN_WORDS", "2"))
+
+# Hésitations fréquentes au téléphone, ignorées dans la comparaison
+_FILLERS = {"euh", "heu", "hum", "hmm", "bah", "ben", "hein", "bon", "alors"}
+
+def normalize_words(text):
+    """Mots d'une transcription, en minuscules et sans hésitations"""
+    return [word for word in re.findall(r"\w+", text.lower()) if word not in _FILLERS]
+
+def transcript_similarity(a, b):
+    """Similarité (0-1) entre deux transcriptions, mot à mot"""
+    words_a, words_b = normalize_words(a), normalize_words(b)
+    if not words_a and not words_b:
+        return 1.0
+    return difflib.SequenceMatcher(None, words_a, words_b, autojunk=False).ratio()
+
+class _Speculation:
+    """
+    Génération LLM lancée sur une transcription intermédiaire, mise en mémoire en attendant la fin de tour
+    """
+
+    def __init__(self, text, context_key, prompt_chars, stream):
+        self.text = text
+        self.context_key = context_key
+        self.prompt_chars = prompt_chars
+        self.started_at = time.perf_counter()
+        self.first_token_at = None
+        self.chunks = []
+        self.usage = None
+        self.done = False
+        self.failed = False
+        self.changed = asyncio.Event()
+        self._stream = stream
+        self._task = asyncio.create_task(self._pump())
+
+    async def _pump(self):
+        try:
+            async for chunk in self._stream:
+                if self.first_token_at is None:
+                    self.first_token_at = time.perf_counter()
+                if chunk.usage is not None:
+                    self.usage = chunk.usage
+                self.chunks.append(chunk)
+                self.changed.set()
+        except Exception as e:
+            self.failed = True
+            logger.warning(f"Génération spéculative interrompue: {e}")
+        finally:
+            self.done = True
+            self.changed.set()
+
+    @property
+    def completion_tokens(self):
+        if self.usage is not None:
+            return self.usage.completion_tokens
+        # Flux non terminé : environ un token par fragment de texte reçu
+        return sum(1 for chunk in self.chunks for choice in chunk.choices if choice.delta.content)
+
+    @property
+    def prompt_tokens(self):
+        if self.usage is not None:
+            return self.usage.prompt_tokens
+        # Usage inconnu avant la fin du flux : estimation à 4 caractères par token
+        return self.prompt_chars // 4
+
+    async def cancel(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        await self._stream.aclose()
+
+class _SpeculativeStream(llm.LLMStream):
+    """
+    Flux LLM rejouant une génération spéculative adoptée, puis la suite de la génération en cours
+    """
+
+    def __init__(self, agent_llm, speculation, chat_ctx, fnc_ctx):
+        super().__init__(agent_llm, chat_ctx=chat_ctx, fnc_ctx=fnc_ctx, conn_options=DEFAULT_API_CONNECT_OPTIONS)
+        self._speculation = speculation
+
+    async def _run(self):
+        speculation = self._speculation
+        sent = 0
+        while True:
+            while sent < len(speculation.chunks):
+                chunk = speculation.chunks[sent]
+                sent += 1
+                for choice in chunk.choices:
+                    if choice.delta.tool_calls:
+                        self._function_calls_info.extend(choice.delta.tool_calls)
+                self._event_ch.send_nowait(chunk)
+            if speculation.done:
+                return
+            speculation.changed.clear()
+            if sent == len(speculation.chunks) and not speculation.done:
+                await speculation.changed.wait()
+
+    async def aclose(self):
+        await super().aclose()
+        await self._speculation.cancel()
+
+class SpeculativeReply:
+    """
+    Génération spéculative de la réponse sur les transcriptions intermédiaires du STT
+
+    La génération est lancée dès que la transcription intermédiaire ne change plus et que
+    l'appelant ne parle plus. À la fin de tour, `before_llm_cb` la réutilise si la transcription
+    finale est assez proche (et le contexte identique), sinon elle est annulée et comptée comme perdue.
+    """
+
+    def __init__(self, enabled=SPECULATIVE_LLM, stable_delay=SPECULATIVE_STABLE_DELAY,
+                 match_threshold=SPECULATIVE_MATCH_THRESHOLD, min_words=SPECULATIVE_MIN_WORDS):
+        """
+        Initialisation du mode spéculatif
+
+        Args:
+            enabled: Activer la génération spéculative
+            stable_delay: Délai de stabilité de la transcription intermédiaire (secondes)
+            match_threshold: Similarité minimale pour réutiliser la génération
+            min_words: Nombre minimal de mots pour spéculer
+        """
+        self.enabled = enabled
+        self.stable_delay = stable_delay
+        self.match_threshold = match_threshold
+        self.min_words = min_words
+
+        self.agent = None
+        self._finals = []
+        self._interim = ""
+        self._user_speaking = False
+        self._timer = None
+        self._speculation = None
+
+        # Bilan de l'appel
+        self.started = 0
+        self.adopted = 0
+        self.discarded = 0
+        self.wasted_completion_tokens = 0
+        self.wasted_prompt_tokens = 0
+        self.saved_ms = []
+
+    def attach(self, agent):
+        """
+        Suivre la parole et les transcriptions de l'appelant
+
+        Args:
+            agent: VoicePipelineAgent de l'appel (construit avec before_llm_cb=self.before_llm_cb)
+        """
+        if not self.enabled:
+            return
+        self.agent = agent
+        attached = False
+
+        @agent.on("user_started_speaking")
+        def _on_user_started_speaking():
+            nonlocal attached
+            self._user_speaking = True
+            if not attached and agent._human_input is not None:
+                # Les transcriptions intermédiaires ne sont émises que par l'entrée audio de l'agent
+                agent._human_input.on("interim_transcript", self._on_interim_transcript)
+                agent._human_input.on("final_transcript", self._on_final_transcript)
+                attached = True
+
+        @agent.on("user_stopped_speaking")
+        def _on_user_stopped_speaking():
+            self._user_speaking = False
+            self._arm()
+
+        @agent.on("user_speech_committed")
+        def _on_user_speech_committed(*_):
+            self._finals, self._interim = [], ""
+            # La fin de tour n'a pas repris la génération (before_llm_cb non appelé)
+            if self._speculation is not None:
+                self._discard()
+
+    def _on_interim_transcript(self, ev):
+        self._interim = ev.alternatives[0].text
+        self._arm()
+
+    def _on_final_transcript(self, ev):
+        if ev.alternatives[0].text:
+            self._finals.append(ev.alternatives[0].text)
+        self._interim = ""
+        self._arm()
+
+    def _arm(self):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = asyncio.get_running_loop().call_later(self.stable_delay, self._on_stable)
+
+    def _on_stable(self):
+        self._timer = None
+        if self._user_speaking:
+            # Relancé à la fin de parole détectée par le VAD
+            return
+        text = " ".join([*self._finals, self._interim]).strip()
+        if len(normalize_words(text)) < self.min_words:
+            return
+        if self._speculation is not None:
+            if normalize_words(self._speculation.text) == normalize_words(text):
+                return
+            self._discard()
+        self._speculate(text)
+
+    def _speculate(self, text):
+        chat_ctx = self.agent.chat_ctx.copy()
+        context_key = tuple(message.id for message in chat_ctx.messages)
+        chat_ctx.messages.append(ChatMessage.create(text=text, role="user"))
+        prompt_chars = sum(len(message.content) for message in chat_ctx.messages if isinstance(message.content, str))
+        stream = self.agent.llm.chat(chat_ctx=chat_ctx, fnc_ctx=self.agent.fnc_ctx)
+        self._speculation = _Speculation(text, context_key, prompt_chars, stream)
+        self.started += 1
+        logger.debug(f"Génération spéculative lancée sur: {text}")
+
+    def _discard(self):
+        speculation, self._speculation = self._speculation, None
+        self.discarded += 1
+        self.wasted_completion_tokens += speculation.completion_tokens
+        self.wasted_prompt_tokens += speculation.prompt_tokens
+        return asyncio.ensure_future(speculation.cancel())
+
+    def before_llm_cb(self, agent, chat_ctx):
+        """
+        Callback before_llm_cb du VoicePipelineAgent
+
+        Returns:
+            Le flux spéculatif adopté, ou None pour la génération par défaut
+        """
+        # Fin de tour validée : plus de nouvelle spéculation pour ce tour
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        speculation = self._speculation
+        if speculation is None:
+            return None
+
+        question = chat_ctx.messages[-1]
+        context_key = tuple(message.id for message in chat_ctx.messages[:-1])
+        similarity = transcript_similarity(speculation.text, question.content if isinstance(question.content, str) else "")
+        if speculation.failed or context_key != speculation.context_key or similarity < self.match_threshold:
+            logger.debug(f"Génération spéculative écartée (similarité {similarity:.2f})")
+            self._discard()
+            return None
+
+        self._speculation = None
+        self.adopted += 1
+        requested_at = time.perf_counter()
+
+        def _record_saving(_):
+            # Sans spéculation, le premier token serait arrivé une latence LLM après la fin de tour
+            if speculation.first_token_at is not None:
+                self.saved_ms.append((min(requested_at, speculation.first_token_at) - speculation.started_at) * 1000)
+
+        stream = _SpeculativeStream(agent.llm, speculation, chat_ctx, agent.fnc_ctx)
+        stream._task.add_done_callback(_record_saving)
+        return stream
+
+    async def aclose(self):
+        """Annuler la génération en attente et le minuteur"""
+        if self._timer is not None:
+            self._timer.cancel()
+        if self._speculation is not None:
+            await self._discard()
+
+    def summary(self):
+        """Bilan de l'appel : tokens perdus et latence gagnée"""
+        return {
+            "stable_delay": self.stable_delay,
+            "match_threshold": self.match_threshold,
+            "started": self.started,
+            "adopted": self.adopted,
+            "discarded": self.discarded,
+            "wasted_completion_tokens": self.wasted_completion_tokens,
+            "wasted_prompt_tokens": self.wasted_prompt_tokens,
+            "saved_ms": round(sum(self.saved_ms)),
+        }
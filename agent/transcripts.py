@@ -0,0 +1,146 @@
+import os
+import json
+import time
+import logging
+from collections import defaultdict
+
+from batch_writer import BatchWriter, DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+TRANSCRIPTS_DB_PATH = os.getenv("TRANSCRIPTS_DB_PATH", os.path.join(DATA_DIR, "transcripts.db"))
+# Journal des tours par appel : <TRANSCRIPTS_LOG_DIR>/<AAAA-MM-JJ>/<room>.jsonl
+TRANSCRIPTS_LOG_DIR = os.getenv("TRANSCRIPTS_LOG_DIR", os.path.join(DATA_DIR, "transcripts"))
+
+ROLE_USER = "user"
+ROLE_AGENT = "agent"
+
+# Index plein texte à contenu externe : le texte n'est stocké qu'une fois (transcript_turns),
+# la room et le numéro sont indexés pour servir de filtres dans la requête MATCH
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS transcript_turns (
+    id INTEGER PRIMARY KEY,
+    room_name TEXT NOT NULL,
+    phone_number TEXT,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    text TEXT NOT NULL,
+    ts REAL NOT NULL,
+    interrupted INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_transcript_turns_room ON transcript_turns(room_name, seq);
+CREATE INDEX IF NOT EXISTS idx_transcript_turns_phone ON transcript_turns(phone_number);
+CREATE VIRTUAL TABLE IF NOT EXISTS transcript_fts USING fts5(
+    text, room_name, phone_number,
+    content='transcript_turns', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS transcript_turns_ai AFTER INSERT ON transcript_turns BEGIN
+    INSERT INTO transcript_fts(rowid, text, room_name, phone_number)
+    VALUES (new.id, new.text, new.room_name, new.phone_number);
+END;
+"""
+
+_INSERT = (
+    "INSERT INTO transcript_turns (room_name, phone_number, seq, role, text, ts, interrupted) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?)"
+)
+
+def message_text(msg):
+    """Texte d'un ChatMessage (le contenu peut être une liste de parties)"""
+    content = msg.content
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return " ".join(part for part in content if isinstance(part, str))
+    return ""
+
+class TranscriptStore(BatchWriter):
+    """
+    Transcriptions des appels : journal JSONL par appel puis index plein texte SQLite (FTS5)
+
+    Les tours sont écrits par lots dans le thread du stockage : le journal de chaque appel
+    est complété, puis les tours sont insérés dans la même transaction que leur indexation.
+    """
+
+    schema = _SCHEMA
+
+    def __init__(self, path=TRANSCRIPTS_DB_PATH, log_dir=TRANSCRIPTS_LOG_DIR, batch_size=500, flush_interval=0.5):
+        self.log_dir = log_dir
+        super().__init__(path, batch_size=batch_size, flush_interval=flush_interval)
+
+    def log_path(self, room_name, ts):
+        """Chemin du journal d'un appel (classé par jour de l'appel)"""
+        return os.path.join(self.log_dir, time.strftime("%Y-%m-%d", time.localtime(ts)), f"{room_name}.jsonl")
+
+    def write_batch(self, conn, batch):
+        if self.log_dir:
+            by_call, started = defaultdict(list), {}
+            for room_name, phone_number, seq, role, text, ts, interrupted in batch:
+                started.setdefault(room_name, ts)
+                by_call[room_name].append(json.dumps({
+                    "seq": seq, "role": role, "text": text, "ts": ts,
+                    "interrupted": bool(interrupted), "phone_number": phone_number,
+                }, ensure_ascii=False))
+            for room_name, lines in by_call.items():
+                path = self.log_path(room_name, started[room_name])
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "a", encoding="utf-8") as log:
+                    log.write("\n".join(lines) + "\n")
+
+        conn.executemany(_INSERT, batch)
+
+class TranscriptRecorder:
+    """
+    Capture tour par tour de la conversation d'un appel
+    """
+
+    def __init__(self, room_name, phone_number=None, store=None):
+        """
+        Initialisation de l'enregistreur
+
+        Args:
+            room_name: Room de l'appel
+            phone_number: Numéro appelé
+            store: TranscriptStore (celui du processus par défaut)
+        """
+        self.room_name = room_name
+        self.phone_number = phone_number
+        self.store = store or get_transcript_store()
+        self.seq = 0
+
+    def record(self, role, text, interrupted=False):
+        """Ajouter un tour à la transcription (non bloquant)"""
+        text = text.strip()
+        if not text:
+            return
+        self.seq += 1
+        self.store.submit((self.room_name, self.phone_number, self.seq, role, text, time.time(), int(interrupted)))
+
+    def attach(self, agent):
+        """
+        Enregistrer les tours validés par l'agent vocal
+
+        Args:
+            agent: VoicePipelineAgent de l'appel
+        """
+        @agent.on("user_speech_committed")
+        def _on_user_speech_committed(msg):
+            self.record(ROLE_USER, message_text(msg))
+
+        @agent.on("agent_speech_committed")
+        def _on_agent_speech_committed(msg):
+            self.record(ROLE_AGENT, message_text(msg))
+
+        @agent.on("agent_speech_interrupted")
+        def _on_agent_speech_interrupted(msg):
+            self.record(ROLE_AGENT, message_text(msg), interrupted=True)
+
+_store = None
+
+def get_transcript_store():
+    """Stockage des transcriptions du processus (un seul thread d'écriture par processus)"""
+    global _store
+    if _store is None:
+        _store = TranscriptStore()
+    return _store
@@ -0,0 +1,208 @@
+import os
+import time
+import bisect
+import logging
+import statistics
+
+from livekit.agents import metrics
+
+from batch_writer import BatchWriter, DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+LATENCY_DB_PATH = os.getenv("LATENCY_DB_PATH", os.path.join(DATA_DIR, "latency.db"))
+# Nombre maximal de tours détaillés joints au CDR d'un appel
+LATENCY_MAX_TURNS = int(os.getenv("LATENCY_MAX_TURNS", "50"))
+
+# Étapes d'un tour, mesurées en millisecondes :
+# - end_of_utterance : fin de parole de l'appelant -> fin de tour validée (VAD + endpointing)
+# - transcription : fin de parole -> transcription finale du STT
+# - llm_ttft : requête LLM -> premier token
+# - tts_ttfb : requête TTS -> premier octet audio
+# - response : fin de tour validée -> première trame audio publiée
+# - total : fin de parole de l'appelant -> première trame audio publiée
+STAGES = ("end_of_utterance", "transcription", "llm_ttft", "tts_ttfb", "response", "total")
+
+# Bornes supérieures des classes des histogrammes (ms), la dernière classe est ouverte
+BUCKETS_MS = (50, 100, 150, 200, 300, 400, 500, 600, 800, 1000, 1250, 1500, 2000, 3000, 5000, 10000, float("inf"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS latency_buckets (
+    worker_id TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    le_ms REAL NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (worker_id, stage, le_ms)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS latency_totals (
+    worker_id TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    sum_ms REAL NOT NULL,
+    PRIMARY KEY (worker_id, stage)
+) WITHOUT ROWID;
+"""
+
+class LatencyHistogram:
+    """
+    Histogramme à classes fixes (fusionnable entre appels et entre processus)
+    """
+
+    __slots__ = ("counts", "count", "sum_ms")
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS_MS)
+        self.count = 0
+        self.sum_ms = 0.0
+
+    def observe(self, value_ms):
+        self.counts[bisect.bisect_left(BUCKETS_MS, value_ms)] += 1
+        self.count += 1
+        self.sum_ms += value_ms
+
+class LatencyStore(BatchWriter):
+    """
+    Histogrammes de latence cumulés par worker en SQLite (WAL), écrits par lots dans un thread dédié
+
+    Chaque appel (un processus par job) ajoute ses histogrammes à ceux de son worker.
+    """
+
+    schema = _SCHEMA
+
+    def __init__(self, path=LATENCY_DB_PATH, batch_size=500, flush_interval=0.5):
+        super().__init__(path, batch_size=batch_size, flush_interval=flush_interval)
+
+    def submit_histograms(self, worker_id, histograms):
+        """
+        Empiler les histogrammes d'un appel (non bloquant)
+
+        Args:
+            worker_id: ID du worker LiveKit
+            histograms: Dictionnaire étape -> LatencyHistogram
+        """
+        for stage, histogram in histograms.items():
+            if histogram.count:
+                self.submit((worker_id, stage, tuple(histogram.counts), histogram.count, histogram.sum_ms))
+
+    def write_batch(self, conn, batch):
+        conn.executemany(
+            "INSERT INTO latency_buckets (worker_id, stage, le_ms, count) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (worker_id, stage, le_ms) DO UPDATE SET count = count + excluded.count",
+            [
+                (worker_id, stage, le_ms, n)
+                for worker_id, stage, counts, _, _ in batch
+                for le_ms, n in zip(BUCKETS_MS, counts) if n
+            ]
+        )
+        conn.executemany(
+            "INSERT INTO latency_totals (worker_id, stage, count, sum_ms) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (worker_id, stage) DO UPDATE SET "
+            "count = count + excluded.count, sum_ms = sum_ms + excluded.sum_ms",
+            [(worker_id, stage, count, sum_ms) for worker_id, stage, _, count, sum_ms in batch]
+        )
+
+class TurnLatencyTracker:
+    """
+    Chronologie par tour des étapes du pipeline vocal d'un appel
+
+    Les métriques du pipeline portent l'ID de la réponse (sequence_id) : un tour est ouvert à la
+    validation de la fin de parole et complété par les métriques LLM/TTS et la première trame
+    audio de l'agent. Il est clôturé au tour suivant ou à la fin de l'appel.
+    """
+
+    def __init__(self, call_record=None, worker_id=None, store=None):
+        """
+        Initialisation du suivi
+
+        Args:
+            call_record: CallRecord auquel joindre les tours (extra["latency"])
+            worker_id: ID du worker LiveKit (clé des histogrammes cumulés)
+            store: LatencyStore (celui du processus par défaut)
+        """
+        self.call_record = call_record
+        self.worker_id = worker_id or "local"
+        self.store = store
+        self.histograms = {stage: LatencyHistogram() for stage in STAGES}
+        self.turns = []
+        self._pending = {}
+        self._awaiting_audio = None
+
+    def attach(self, agent):
+        """
+        Suivre les événements et métriques de l'agent vocal
+
+        Args:
+            agent: VoicePipelineAgent de l'appel
+        """
+        agent.on("metrics_collected", self._on_metrics)
+        agent.on("agent_started_speaking", self._on_agent_started_speaking)
+
+    def _on_metrics(self, collected):
+        if isinstance(collected, metrics.PipelineEOUMetrics):
+            # Nouveau tour : les tours précédents ont reçu leurs métriques
+            self._close_pending()
+            turn = {
+                "id": collected.sequence_id,
+                "validated_at": collected.timestamp,
+                "end_of_utterance": collected.end_of_utterance_delay * 1000,
+                "transcription": collected.transcription_delay * 1000,
+            }
+            self._pending[collected.sequence_id] = turn
+            self._awaiting_audio = turn
+        elif isinstance(collected, metrics.PipelineLLMMetrics):
+            turn = self._pending.get(collected.sequence_id)
+            if turn is not None and not collected.error:
+                turn.setdefault("llm_ttft", collected.ttft * 1000)
+                # Taille du prompt envoyé pour ce tour (contexte borné par context_window)
+                turn.setdefault("prompt_tokens", collected.prompt_tokens)
+        elif isinstance(collected, metrics.PipelineTTSMetrics):
+            turn = self._pending.get(collected.sequence_id)
+            if turn is not None and not collected.error:
+                turn.setdefault("tts_ttfb", collected.ttfb * 1000)
+
+    def _on_agent_started_speaking(self, *_):
+        turn, self._awaiting_audio = self._awaiting_audio, None
+        if turn is None:
+            return
+        turn["response"] = (time.time() - turn["validated_at"]) * 1000
+        turn["total"] = turn["end_of_utterance"] + turn["response"]
+
+    def _close_pending(self):
+        for turn in self._pending.values():
+            for stage in STAGES:
+                value = turn.get(stage)
+                if value is not None and value >= 0:
+                    self.histograms[stage].observe(value)
+            if len(self.turns) < LATENCY_MAX_TURNS:
+                self.turns.append({
+                    "id": turn["id"],
+                    **{stage: round(turn[stage]) for stage in STAGES if turn.get(stage) is not None},
+                    "prompt_tokens": turn.get("prompt_tokens"),
+                })
+        self._pending.clear()
+        self._awaiting_audio = None
+
+    def close(self):
+        """Clôturer le suivi : tours joints au CDR et histogrammes ajoutés à ceux du worker"""
+        self._close_pending()
+        totals = [turn["total"] for turn in self.turns if "total" in turn]
+        prompt_tokens = [turn["prompt_tokens"] for turn in self.turns if turn["prompt_tokens"]]
+        if self.call_record is not None and self.turns:
+            self.call_record.extra["latency"] = {
+                "turns": self.turns,
+                "median_total_ms": round(statistics.median(totals)) if totals else None,
+                "max_prompt_tokens": max(prompt_tokens) if prompt_tokens else None,
+            }
+        if any(histogram.count for histogram in self.histograms.values()):
+            (self.store or get_latency_store()).submit_histograms(self.worker_id, self.histograms)
+        if totals:
+            logger.info(f"Latence des réponses: médiane {statistics.median(totals):.0f} ms sur {len(totals)} tours")
+
+_store = None
+
+def get_latency_store():
+    """Stockage des histogrammes du processus (un seul thread d'écriture par processus)"""
+    global _store
+    if _store is None:
+        _store = LatencyStore()
+    return _store
@@ -0,0 +1,133 @@
+import os
+import time
+import logging
+import importlib.resources
+
+import psutil
+import onnxruntime
+from livekit.plugins import silero
+from livekit.plugins.silero import onnx_model
+
+from batch_writer import DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+# Modèle VAD pré-optimisé au format ORT, chargé sans copie des poids (sinon modèle ONNX du plugin)
+VAD_SHARED_MODEL = os.getenv("VAD_SHARED_MODEL", "1").lower() in ("1", "true", "yes")
+# Répertoire du modèle compilé, commun aux processus du worker
+VAD_MODEL_DIR = os.getenv("VAD_MODEL_DIR", os.path.join(DATA_DIR, "models"))
+
+# Consommation du VAD dans le processus (un seul appel par processus de job)
+_usage = {"model": None, "windows": 0, "cpu_s": 0.0}
+# Création de session d'origine du plugin (repli si le modèle compilé est indisponible)
+_plugin_new_inference_session = onnx_model.new_inference_session
+
+def _session_options():
+    # Réglages du plugin : un seul thread, sans attente active
+    opts = onnxruntime.SessionOptions()
+    opts.add_session_config_entry("session.intra_op.allow_spinning", "0")
+    opts.add_session_config_entry("session.inter_op.allow_spinning", "0")
+    opts.inter_op_num_threads = 1
+    opts.intra_op_num_threads = 1
+    opts.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+    return opts
+
+def _source_path():
+    res = importlib.resources.files("livekit.plugins.silero.resources") / "silero_vad.onnx"
+    with importlib.resources.as_file(res) as path:
+        return str(path)
+
+def compile_vad_model(model_dir=VAD_MODEL_DIR):
+    """
+    Modèle Silero optimisé une fois pour toutes au format ORT (appel bloquant, à faire au prewarm)
+
+    Le fichier dépend de la version d'onnxruntime ; le premier processus qui en a besoin le
+    produit, les suivants le relisent.
+
+    Returns:
+        Chemin du modèle compilé
+    """
+    path = os.path.join(model_dir, f"silero_vad.{onnxruntime.__version__}.ort")
+    if os.path.exists(path):
+        return path
+    os.makedirs(model_dir, exist_ok=True)
+    # Écriture atomique : les processus préchauffés démarrent en même temps
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    opts = _session_options()
+    opts.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_EXTENDED
+    opts.optimized_model_filepath = tmp_path
+    opts.add_session_config_entry("session.save_model_format", "ORT")
+    onnxruntime.InferenceSession(_source_path(), sess_options=opts, providers=["CPUExecutionProvider"])
+    os.replace(tmp_path, path)
+    logger.info(f"Modèle VAD compilé au format ORT: {path}")
+    return path
+
+class _MeteredSession:
+    """
+    Session ONNX du VAD dont les inférences sont comptées (temps CPU du thread d'inférence)
+    """
+
+    def __init__(self, session):
+        self._session = session
+
+    def run(self, *args, **kwargs):
+        start = time.thread_time()
+        try:
+            return self._session.run(*args, **kwargs)
+        finally:
+            _usage["cpu_s"] += time.thread_time() - start
+            _usage["windows"] += 1
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+def _new_inference_session(force_cpu):
+    if VAD_SHARED_MODEL:
+        try:
+            opts = _session_options()
+            # Modèle déjà optimisé : les poids sont lus directement dans le tampon du fichier ORT,
+            # sans graphe ONNX intermédiaire ni seconde copie des initialiseurs
+            opts.add_session_config_entry("session.load_model_format", "ORT")
+            opts.add_session_config_entry("session.use_ort_model_bytes_directly", "1")
+            opts.add_session_config_entry("session.use_ort_model_bytes_for_initializers", "1")
+            opts.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL
+            session = onnxruntime.InferenceSession(
+                compile_vad_model(), sess_options=opts, providers=["CPUExecutionProvider"]
+            )
+            _usage["model"] = "ort"
+            return _MeteredSession(session)
+        except Exception as e:
+            logger.warning(f"Modèle VAD compilé indisponible, modèle ONNX du plugin utilisé: {e}")
+    _usage["model"] = "onnx"
+    return _MeteredSession(_plugin_new_inference_session(force_cpu))
+
+def load_vad(sample_rate, **kwargs):
+    """
+    Charger le VAD Silero avec la session du modèle compilé (appel bloquant, à faire au prewarm)
+
+    Args:
+        sample_rate: Fréquence d'inférence (8000 ou 16000)
+        **kwargs: Réglages de silero.VAD.load
+    """
+    # VAD.load crée sa session via onnx_model.new_inference_session
+    onnx_model.new_inference_session = _new_inference_session
+    try:
+        return silero.VAD.load(sample_rate=sample_rate, **kwargs)
+    finally:
+        onnx_model.new_inference_session = _plugin_new_inference_session
+
+def vad_usage():
+    """Mémoire du processus et CPU d'inférence du VAD pour l'appel (bilan joint au CDR)"""
+    process = psutil.Process()
+    try:
+        memory = process.memory_full_info()
+        uss_mb = round(memory.uss / (1024 * 1024), 1)
+    except psutil.AccessDenied:
+        memory, uss_mb = process.memory_info(), None
+    return {
+        "model": _usage["model"],
+        "windows": _usage["windows"],
+        "cpu_ms": round(_usage["cpu_s"] * 1000),
+        "rss_mb": round(memory.rss / (1024 * 1024), 1),
+        "uss_mb": uss_mb,
+    }
@@ -0,0 +1,163 @@
+import os
+import logging
+import threading
+
+import psutil
+from livekit.agents.utils.hw import get_cpu_monitor
+
+from batch_writer import DATA_DIR
+from loop_lag import LoopLagSampler, read_reports
+
+logger = logging.getLogger(__name__)
+
+# Appels simultanés soutenables par cœur (mesurés avec scripts/bench_capacity.py)
+WORKER_CALLS_PER_CORE = float(os.getenv("WORKER_CALLS_PER_CORE", "4"))
+# Retard de la boucle d'événements d'un appel considéré comme pleine charge (ms)
+WORKER_LAG_BUDGET_MS = float(os.getenv("WORKER_LAG_BUDGET_MS", "100"))
+# Mémoire résidente du worker et de ses processus considérée comme pleine charge (Mo, 0 : mémoire du système)
+WORKER_MEMORY_MB = float(os.getenv("WORKER_MEMORY_MB", "0"))
+# Répertoire où chaque appel publie le retard de sa boucle d'événements
+WORKER_LOAD_DIR = os.getenv("WORKER_LOAD_DIR", os.path.join(DATA_DIR, "worker_load"))
+
+# Options du worker surchargées par l'environnement (réglages de la bibliothèque sinon)
+_WORKER_OPTIONS = {
+    "num_idle_processes": ("WORKER_IDLE_PROCESSES", int),
+    "load_threshold": ("WORKER_LOAD_THRESHOLD", float),
+    "job_memory_warn_mb": ("WORKER_JOB_MEMORY_WARN_MB", float),
+    "job_memory_limit_mb": ("WORKER_JOB_MEMORY_LIMIT_MB", float),
+}
+
+# Les rapports plus anciens viennent d'appels terminés
+_LAG_REPORT_TTL = 5.0
+# Blocages détaillés joints au CDR
+_MAX_SLOW_CALLBACKS = 10
+
+class LoopLagMonitor(LoopLagSampler):
+    """
+    Retard de la boucle d'événements d'un appel
+
+    Le retard maximal de chaque fenêtre est publié dans un fichier lu par la fonction de charge du worker,
+    et les callbacks qui bloquent la boucle sont signalés avec leur pile (SlowCallbackDetector).
+    """
+
+    def __init__(self, interval=0.05, window=1.0, report_dir=WORKER_LOAD_DIR):
+        """
+        Initialisation du suivi
+
+        Args:
+            interval: Période de la mesure (secondes)
+            window: Durée d'une fenêtre de publication (secondes)
+            report_dir: Répertoire des rapports (None pour ne rien publier)
+        """
+        super().__init__(
+            interval, window,
+            path=os.path.join(report_dir, f"{os.getpid()}.json") if report_dir else None,
+            max_slow_callbacks=_MAX_SLOW_CALLBACKS,
+        )
+
+    @property
+    def max_ms(self):
+        return max(self.samples, default=0.0)
+
+    def summary(self):
+        return {
+            "p50_ms": round(self.percentile(0.5), 1),
+            "p99_ms": round(self.percentile(0.99), 1),
+            "max_ms": round(self.max_ms, 1),
+            "slow_callbacks": self.detector.recent(),
+        }
+
+def read_loop_lag(report_dir=WORKER_LOAD_DIR):
+    """Retard maximal publié par les appels en cours (ms)"""
+    reports = read_reports(report_dir, _LAG_REPORT_TTL)
+    return max((report["lag_ms"] for report in reports.values()), default=0.0)
+
+class _CpuSampler:
+    """
+    Utilisation CPU moyenne (cgroups compris), mesurée dans un thread dédié
+    """
+
+    _instance = None
+
+    def __init__(self, samples=5):
+        self._monitor = get_cpu_monitor()
+        self._samples = []
+        self._size = samples
+        self._lock = threading.Lock()
+        threading.Thread(target=self._run, daemon=True, name="worker_load_cpu").start()
+
+    def _run(self):
+        while True:
+            value = self._monitor.cpu_percent(interval=0.5)
+            with self._lock:
+                self._samples = (self._samples + [value])[-self._size:]
+
+    @classmethod
+    def get(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        with cls._instance._lock:
+            samples = cls._instance._samples
+            return sum(samples) / len(samples) if samples else 0.0
+
+    @classmethod
+    def cpu_count(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance._monitor.cpu_count()
+
+def _rss_mb(worker):
+    pids = [os.getpid()] + [proc.pid for proc in worker._proc_pool.processes if getattr(proc, "pid", None)]
+    total = 0
+    for pid in pids:
+        try:
+            total += psutil.Process(pid).memory_info().rss
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            continue
+    return total / (1024 * 1024)
+
+def load_components(worker):
+    """
+    Signaux de charge du worker, chacun rapporté à son budget (1.0 = budget atteint)
+
+    Args:
+        worker: Worker LiveKit (appels en cours et processus des jobs)
+    """
+    max_calls = max(1.0, WORKER_CALLS_PER_CORE * _CpuSampler.cpu_count())
+    if WORKER_MEMORY_MB > 0:
+        memory = _rss_mb(worker) / WORKER_MEMORY_MB
+    else:
+        memory = psutil.virtual_memory().percent / 100
+    return {
+        "calls": len(worker.active_jobs) / max_calls,
+        "cpu": _CpuSampler.get(),
+        "memory": memory,
+        "loop_lag": read_loop_lag() / WORKER_LAG_BUDGET_MS,
+    }
+
+_last_signal = None
+
+def compute_load(worker):
+    """
+    Charge du worker (load_fnc) : le signal le plus proche de son budget
+
+    Le worker se déclare plein au-delà de load_threshold (0.75 par défaut en production).
+    """
+    global _last_signal
+    components = load_components(worker)
+    signal = max(components, key=components.get)
+    load = min(1.0, components[signal])
+    if signal != _last_signal:
+        details = ", ".join(f"{name} {value:.2f}" for name, value in components.items())
+        logger.info(f"Charge du worker {load:.2f} limitée par {signal} ({details})")
+        _last_signal = signal
+    return load
+
+def worker_options():
+    """Options de WorkerOptions définies dans l'environnement"""
+    options = {}
+    for option, (env, cast) in _WORKER_OPTIONS.items():
+        value = os.getenv(env)
+        if value:
+            options[option] = cast(value)
+    return options
@@ -0,0 +1,100 @@
+import os
+import json
+
+from sqlite_readonly import connect_readonly
+
+# Base des CDR écrite par les workers de l'agent (agent/call_records.py)
+DATA_DIR = os.getenv("DATA_DIR", os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "data")))
+CALL_RECORDS_DB_PATH = os.getenv("CALL_RECORDS_DB_PATH", os.path.join(DATA_DIR, "calls.db"))
+
+class CallHistory:
+    """
+    Consultation en lecture seule des CDR (index sur la room, le numéro et la date de début)
+    """
+
+    def __init__(self, path=CALL_RECORDS_DB_PATH):
+        self.path = path
+
+    def _connect(self):
+        return connect_readonly(self.path, rows=True)
+
+    def find(self, room_name=None, phone_number=None, since=None, until=None, limit=100, offset=0):
+        """
+        Rechercher des CDR
+
+        Args:
+            room_name: Room de l'appel
+            phone_number: Numéro appelé
+            since: Début de la période (timestamp UNIX, inclus)
+            until: Fin de la période (timestamp UNIX, exclu)
+            limit: Nombre maximal de résultats
+            offset: Décalage pour la pagination
+
+        Returns:
+            Liste de dictionnaires, du plus récent au plus ancien
+        """
+        if not os.path.exists(self.path):
+            return []
+
+        clauses, params = [], []
+        if room_name:
+            clauses.append("room_name = ?")
+            params.append(room_name)
+        if phone_number:
+            clauses.append("phone_number = ?")
+            params.append(phone_number)
+        if since is not None:
+            clauses.append("started_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("started_at < ?")
+            params.append(until)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                f"SELECT * FROM call_records {where} ORDER BY started_at DESC LIMIT ? OFFSET ?",
+                (*params, limit, offset)
+            ).fetchall()
+        finally:
+            conn.close()
+
+        records = []
+        for row in rows:
+            record = dict(row)
+            record["extra"] = json.loads(record["extra"]) if record["extra"] else {}
+            records.append(record)
+        return records
+
+    def since(self, after_id, limit=1000):
+        """
+        CDR écrits après un identifiant, dans l'ordre d'écriture (lecture incrémentale)
+
+        Args:
+            after_id: Dernier identifiant déjà lu
+            limit: Nombre maximal de CDR
+
+        Returns:
+            Liste de dictionnaires (extra décodé)
+        """
+        if not os.path.exists(self.path):
+            return []
+
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT id, room_name, phone_number, trunk_id, started_at, dial_at, answered_at, hangup_at, "
+                "outcome, end_reason, extra "
+                "FROM call_records WHERE id > ? ORDER BY id LIMIT ?",
+                (after_id, limit)
+            ).fetchall()
+        finally:
+            conn.close()
+
+        records = []
+        for row in rows:
+            record = dict(row)
+            record["extra"] = json.loads(record["extra"]) if record["extra"] else {}
+            records.append(record)
+        return records
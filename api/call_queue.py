@@ -0,0 +1,487 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.getenv("DATA_DIR", os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "data")))
+CALL_QUEUE_DB_PATH = os.getenv("CALL_QUEUE_DB_PATH", os.path.join(DATA_DIR, "call_queue.db"))
+
+# Cycle de vie d'un appel en file :
+# scheduled (fenêtre pas encore ouverte) -> pending (prêt) -> dispatching (réservé) -> dispatched
+# -> completed (CDR reçu), ou failed / expired (fenêtre dépassée) / cancelled
+STATUS_SCHEDULED = "scheduled"
+STATUS_PENDING = "pending"
+STATUS_DISPATCHING = "dispatching"
+STATUS_DISPATCHED = "dispatched"
+STATUS_COMPLETED = "completed"
+STATUS_FAILED = "failed"
+STATUS_EXPIRED = "expired"
+STATUS_CANCELLED = "cancelled"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS call_queue (
+    id INTEGER PRIMARY KEY,
+    phone_number TEXT NOT NULL,
+    trunk_id TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    not_before REAL NOT NULL,
+    not_after REAL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    recovered INTEGER NOT NULL DEFAULT 0,
+    dedupe_key TEXT,
+    payload TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    room_name TEXT,
+    dispatch_id TEXT,
+    dispatched_at REAL,
+    finished_at REAL,
+    outcome TEXT,
+    error TEXT
+);
+-- Appels prêts, dans l'ordre de lancement de chaque trunk (priorité décroissante puis ancienneté)
+CREATE INDEX IF NOT EXISTS idx_call_queue_ready ON call_queue(trunk_id, priority DESC, id) WHERE status = 'pending';
+-- Appels dont la fenêtre n'est pas encore ouverte, par heure d'ouverture
+CREATE INDEX IF NOT EXISTS idx_call_queue_scheduled ON call_queue(not_before) WHERE status = 'scheduled';
+-- Appels en cours, comptés pour la concurrence du trunk
+CREATE INDEX IF NOT EXISTS idx_call_queue_active ON call_queue(trunk_id) WHERE status IN ('dispatching', 'dispatched');
+-- Une requête rejouée par le client ne crée pas un second appel
+CREATE UNIQUE INDEX IF NOT EXISTS idx_call_queue_dedupe ON call_queue(dedupe_key) WHERE dedupe_key IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_call_queue_phone ON call_queue(phone_number);
+-- Historique des tentatives par numéro (une ligne par CDR, quelle que soit l'origine de l'appel)
+CREATE TABLE IF NOT EXISTS call_attempts (
+    id INTEGER PRIMARY KEY,
+    phone_number TEXT NOT NULL,
+    at REAL NOT NULL,
+    outcome TEXT NOT NULL,
+    sip_status_code INTEGER,
+    room_name TEXT,
+    queue_id INTEGER,
+    retry_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_call_attempts_phone ON call_attempts(phone_number, at);
+-- Un CDR relu (position de lecture perdue) n'ajoute pas une seconde tentative
+CREATE UNIQUE INDEX IF NOT EXISTS idx_call_attempts_room ON call_attempts(room_name);
+-- Position de lecture des CDR (reprise sans double traitement après un redémarrage)
+CREATE TABLE IF NOT EXISTS cursors (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+_INSERT = (
+    "INSERT OR IGNORE INTO call_queue (phone_number, trunk_id, priority, not_before, not_after, status, "
+    "dedupe_key, payload, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+class CallQueueStore:
+    """
+    File persistante des appels sortants (SQLite en mode WAL)
+
+    Chaque opération de la file (ajout, réservation du prochain appel d'un trunk, ouverture des
+    fenêtres) passe par un index partiel : coût en O(log n) quelle que soit la taille de la file.
+    """
+
+    def __init__(self, path=CALL_QUEUE_DB_PATH):
+        """
+        Ouverture (ou création) de la file
+
+        Args:
+            path: Chemin du fichier SQLite
+        """
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    @staticmethod
+    def _row(phone_number, trunk_id, priority, not_before, not_after, dedupe_key, payload, now):
+        not_before = not_before or now
+        status = STATUS_SCHEDULED if not_before > now else STATUS_PENDING
+        return (
+            phone_number, trunk_id, int(priority or 0), not_before, not_after, status,
+            dedupe_key, json.dumps(payload) if payload else None, now, now,
+        )
+
+    def enqueue(self, phone_number, trunk_id, priority=0, not_before=None, not_after=None,
+                payload=None, dedupe_key=None):
+        """
+        Ajouter un appel à la file
+
+        Args:
+            phone_number: Numéro normalisé à appeler
+            trunk_id: Trunk SIP sortant
+            priority: Priorité (les plus élevées sont lancées d'abord)
+            not_before: Ouverture de la fenêtre d'appel (timestamp UNIX, maintenant par défaut)
+            not_after: Fermeture de la fenêtre (timestamp UNIX, l'appel expire au-delà)
+            payload: Champs transmis à l'agent (campaign, profile, context)
+            dedupe_key: Clé d'idempotence fournie par le client
+
+        Returns:
+            (ID de l'appel, True s'il vient d'être créé)
+        """
+        row = self._row(phone_number, trunk_id, priority, not_before, not_after, dedupe_key, payload, time.time())
+        with self._lock:
+            cursor = self._conn.execute(_INSERT, row)
+            if cursor.rowcount:
+                return cursor.lastrowid, True
+            existing = self._conn.execute(
+                "SELECT id FROM call_queue WHERE dedupe_key = ?", (dedupe_key,)
+            ).fetchone()
+            return existing["id"], False
+
+    def enqueue_many(self, calls):
+        """
+        Ajouter des appels en une seule transaction
+
+        Args:
+            calls: Itérable de tuples (phone_number, trunk_id, priority, not_before, not_after, payload, dedupe_key)
+
+        Returns:
+            Nombre d'appels ajoutés (hors doublons de dedupe_key)
+        """
+        now = time.time()
+        rows = (
+            self._row(phone, trunk_id, priority, not_before, not_after, dedupe_key, payload, now)
+            for phone, trunk_id, priority, not_before, not_after, payload, dedupe_key in calls
+        )
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = self._conn.executemany(_INSERT, rows)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            return cursor.rowcount
+
+    def promote_due(self, now=None, limit=1000):
+        """
+        Rendre prêts les appels dont la fenêtre est ouverte
+
+        Returns:
+            Nombre d'appels devenus prêts
+        """
+        now = now or time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE call_queue SET status = 'pending', updated_at = ? WHERE id IN ("
+                "SELECT id FROM call_queue WHERE status = 'scheduled' AND not_before <= ? "
+                "ORDER BY not_before LIMIT ?)",
+                (now, now, limit)
+            )
+            return cursor.rowcount
+
+    def next_scheduled_at(self):
+        """Ouverture de la prochaine fenêtre (None si aucune) - lecture de la tête de l'index"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MIN(not_before) FROM call_queue WHERE status = 'scheduled'"
+            ).fetchone()
+            return row[0]
+
+    def ready_trunks(self):
+        """Trunks ayant des appels prêts (un saut dans l'index par trunk, sans parcourir la file)"""
+        trunks = []
+        with self._lock:
+            while True:
+                row = self._conn.execute(
+                    "SELECT MIN(trunk_id) FROM call_queue WHERE status = 'pending' AND trunk_id > ?",
+                    (trunks[-1] if trunks else "",)
+                ).fetchone()
+                if row[0] is None:
+                    return trunks
+                trunks.append(row[0])
+
+    def active_count(self, trunk_id):
+        """Appels réservés ou en cours sur un trunk"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM call_queue WHERE trunk_id = ? AND status IN ('dispatching', 'dispatched')",
+                (trunk_id,)
+            ).fetchone()
+            return row[0]
+
+    def claim(self, trunk_id, limit=1, now=None):
+        """
+        Réserver les prochains appels prêts d'un trunk
+
+        Les appels passent à l'état 'dispatching' dans la même transaction ; ceux dont la
+        fenêtre est fermée sont expirés au passage.
+
+        Args:
+            trunk_id: Trunk SIP
+            limit: Nombre maximal d'appels réservés
+            now: Timestamp de référence (maintenant par défaut)
+
+        Returns:
+            Liste de dictionnaires (attempts et room_name à jour)
+        """
+        now = now or time.time()
+        claimed = []
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "SELECT * FROM call_queue WHERE status = 'pending' AND trunk_id = ? "
+                    "ORDER BY priority DESC, id LIMIT ?",
+                    (trunk_id, limit)
+                ).fetchall()
+                expired = []
+                for row in rows:
+                    if row["not_after"] is not None and row["not_after"] < now:
+                        expired.append((now, row["id"]))
+                        continue
+                    call = dict(row)
+                    call["attempts"] += 1
+                    # Appel repris après une interruption : même room, pour vérifier qu'il n'est pas déjà parti
+                    if not call["recovered"]:
+                        call["room_name"] = f"queue-{call['id']}-{call['attempts']}"
+                    claimed.append(call)
+                if expired:
+                    self._conn.executemany(
+                        "UPDATE call_queue SET status = 'expired', updated_at = ? WHERE id = ?", expired
+                    )
+                if claimed:
+                    self._conn.executemany(
+                        "UPDATE call_queue SET status = 'dispatching', attempts = ?, recovered = 0, "
+                        "room_name = ?, updated_at = ? WHERE id = ?",
+                        [(call["attempts"], call["room_name"], now, call["id"]) for call in claimed]
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return claimed
+
+    def mark_dispatched(self, call_id, room_name, dispatch_id):
+        """Marquer un appel comme lancé"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE call_queue SET status = 'dispatched', room_name = ?, dispatch_id = ?, "
+                "dispatched_at = ?, error = NULL, updated_at = ? WHERE id = ?",
+                (room_name, dispatch_id, now, now, call_id)
+            )
+
+    def mark_failed(self, call_id, error, retry_at=None):
+        """
+        Enregistrer l'échec du lancement d'un appel
+
+        Args:
+            call_id: ID de l'appel
+            error: Message d'erreur
+            retry_at: Nouvelle ouverture de la fenêtre (l'appel reste en file) ou None pour l'abandonner
+        """
+        with self._lock:
+            if retry_at is None:
+                self._conn.execute(
+                    "UPDATE call_queue SET status = 'failed', error = ?, updated_at = ? WHERE id = ?",
+                    (str(error), time.time(), call_id)
+                )
+            else:
+                self._conn.execute(
+                    "UPDATE call_queue SET status = 'scheduled', not_before = ?, error = ?, updated_at = ? "
+                    "WHERE id = ?",
+                    (retry_at, str(error), time.time(), call_id)
+                )
+
+    def in_progress(self, trunk_id=None):
+        """Appels lancés dont la fin n'a pas encore été constatée (d'un trunk, ou de tous)"""
+        query = (
+            "SELECT id, trunk_id, status, room_name, dispatched_at FROM call_queue "
+            "WHERE status IN ('dispatching', 'dispatched')"
+        )
+        with self._lock:
+            if trunk_id is None:
+                return self._conn.execute(query).fetchall()
+            return self._conn.execute(f"{query} AND trunk_id = ?", (trunk_id,)).fetchall()
+
+    def finish(self, results):
+        """
+        Clore des appels terminés (libère leur place dans la concurrence du trunk)
+
+        Args:
+            results: Itérable de tuples (call_id, outcome, error)
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "UPDATE call_queue SET status = 'completed', outcome = ?, error = ?, finished_at = ?, "
+                    "updated_at = ? WHERE id = ? AND status = 'dispatched'",
+                    [(outcome, error, now, now, call_id) for call_id, outcome, error in results]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def attempts(self, phone_number, since=None, limit=50):
+        """
+        Tentatives d'appel d'un numéro, de la plus récente à la plus ancienne
+
+        Args:
+            phone_number: Numéro normalisé
+            since: Début de la période (timestamp UNIX)
+            limit: Nombre maximal de tentatives
+
+        Returns:
+            Liste de sqlite3.Row
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT * FROM call_attempts WHERE phone_number = ? AND at >= ? ORDER BY at DESC LIMIT ?",
+                (phone_number, since or 0, limit)
+            ).fetchall()
+
+    def attempt_for_room(self, room_name):
+        """Tentative enregistrée pour une room (son CDR a déjà été lu), None sinon"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT * FROM call_attempts WHERE room_name = ?", (room_name,)
+            ).fetchone()
+
+    def settle(self, call_id, outcome, retry_at=None):
+        """
+        Clore un appel repris dont l'issue est déjà connue (CDR lu pendant l'interruption)
+
+        Args:
+            call_id: ID de l'appel
+            outcome: Issue de la tentative
+            retry_at: Heure du rappel prévu par la tentative (None : appel terminé)
+        """
+        now = time.time()
+        with self._lock:
+            if retry_at is not None:
+                self._conn.execute(
+                    "UPDATE call_queue SET status = 'scheduled', not_before = ?, outcome = ?, updated_at = ? "
+                    "WHERE id = ?",
+                    (retry_at, outcome, now, call_id)
+                )
+            else:
+                self._conn.execute(
+                    "UPDATE call_queue SET status = 'completed', outcome = ?, finished_at = ?, updated_at = ? "
+                    "WHERE id = ?",
+                    (outcome, now, now, call_id)
+                )
+
+    def get_cursor(self, name):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM cursors WHERE name = ?", (name,)).fetchone()
+            return row[0] if row else 0
+
+    def apply_outcomes(self, cursor_name, cursor, attempts, finished=(), rescheduled=(), new_calls=()):
+        """
+        Enregistrer un lot d'issues d'appels en une seule transaction (avec la position de lecture des CDR)
+
+        Args:
+            cursor_name: Nom de la position de lecture
+            cursor: Dernier CDR traité
+            attempts: Tuples (phone_number, at, outcome, sip_status_code, room_name, queue_id, retry_at)
+            finished: Tuples (call_id, outcome, error) des appels en file terminés
+            rescheduled: Tuples (call_id, retry_at, outcome, error) des appels en file à rappeler
+            new_calls: Rappels d'appels lancés hors file, au format de enqueue_many
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO call_attempts (phone_number, at, outcome, sip_status_code, room_name, queue_id, retry_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    attempts
+                )
+                self._conn.executemany(
+                    "UPDATE call_queue SET status = 'completed', outcome = ?, error = ?, finished_at = ?, "
+                    "updated_at = ? WHERE id = ? AND status = 'dispatched'",
+                    [(outcome, error, now, now, call_id) for call_id, outcome, error in finished]
+                )
+                # Le rappel libère la place de l'appel dans la concurrence du trunk
+                self._conn.executemany(
+                    "UPDATE call_queue SET status = 'scheduled', not_before = ?, outcome = ?, error = ?, "
+                    "updated_at = ? WHERE id = ? AND status = 'dispatched'",
+                    [(retry_at, outcome, error, now, call_id) for call_id, retry_at, outcome, error in rescheduled]
+                )
+                self._conn.executemany(
+                    _INSERT,
+                    (
+                        self._row(phone, trunk_id, priority, not_before, not_after, dedupe_key, payload, now)
+                        for phone, trunk_id, priority, not_before, not_after, payload, dedupe_key in new_calls
+                    )
+                )
+                self._conn.execute(
+                    "INSERT INTO cursors (name, value) VALUES (?, ?) "
+                    "ON CONFLICT(name) DO UPDATE SET value = excluded.value",
+                    (cursor_name, cursor)
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def cancel(self, call_id):
+        """Retirer un appel pas encore lancé"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE call_queue SET status = 'cancelled', updated_at = ? "
+                "WHERE id = ? AND status IN ('scheduled', 'pending')",
+                (time.time(), call_id)
+            )
+            return cursor.rowcount > 0
+
+    def recover(self):
+        """
+        Remettre en file les appels réservés par un scheduler interrompu
+
+        La tentative n'est pas comptée une seconde fois et la room est conservée : le scheduler
+        vérifie qu'elle n'existe pas avant de relancer l'appel.
+
+        Returns:
+            Nombre d'appels récupérés
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE call_queue SET status = 'pending', attempts = attempts - 1, recovered = 1, "
+                "updated_at = ? WHERE status = 'dispatching'",
+                (time.time(),)
+            )
+            if cursor.rowcount:
+                logger.warning(f"{cursor.rowcount} appel(s) interrompu(s) remis en file")
+            return cursor.rowcount
+
+    def get(self, call_id):
+        with self._lock:
+            return self._conn.execute("SELECT * FROM call_queue WHERE id = ?", (call_id,)).fetchone()
+
+    def stats(self):
+        """Nombre d'appels par statut, appels en cours par trunk et prochaine ouverture de fenêtre"""
+        with self._lock:
+            counts = dict(self._conn.execute(
+                "SELECT status, COUNT(*) FROM call_queue GROUP BY status"
+            ).fetchall())
+            active = dict(self._conn.execute(
+                "SELECT trunk_id, COUNT(*) FROM call_queue WHERE status IN ('dispatching', 'dispatched') "
+                "GROUP BY trunk_id"
+            ).fetchall())
+        return {
+            "counts": counts,
+            "active": active,
+            "next_scheduled_at": self.next_scheduled_at(),
+        }
@@ -0,0 +1,354 @@
+import os
+import json
+import time
+import asyncio
+import logging
+from livekit import api
+
+from call_queue import CallQueueStore
+from redial import RedialEngine
+from predictive_pacing import AnswerStats, PredictivePacer, PACING_ABANDON_RATE
+from dispatch import create_call_dispatch
+from dnc import DncList, DNC_ERROR
+from rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Débit (appels par seconde), rafale et appels simultanés par trunk (sonnerie comprise)
+QUEUE_DISPATCH_CPS = float(os.getenv("QUEUE_DISPATCH_CPS", "1"))
+QUEUE_DISPATCH_BURST = int(os.getenv("QUEUE_DISPATCH_BURST", "1"))
+QUEUE_TRUNK_CONCURRENCY = int(os.getenv("QUEUE_TRUNK_CONCURRENCY", "10"))
+# Mode de lancement : "fixed" (un appel par ligne libre) ou "predictive" (appels en plus pendant les
+# sonneries, d'après le taux de décroché, pour occuper QUEUE_AGENT_CAPACITY conversations)
+QUEUE_PACING = os.getenv("QUEUE_PACING", "fixed")
+# 0 ou vide : la moitié des lignes du trunk, le reste servant aux appels en plus pendant les sonneries
+QUEUE_AGENT_CAPACITY = int(os.getenv("QUEUE_AGENT_CAPACITY") or 0)
+# Réglages propres à certains trunks, ex: {"ST_xxx": {"cps": 5, "burst": 2, "concurrency": 30,
+# "pacing": "predictive", "capacity": 12, "abandon_rate": 0.03}}
+QUEUE_TRUNK_LIMITS = json.loads(os.getenv("QUEUE_TRUNK_LIMITS", "{}") or "{}")
+# Délai maximal entre deux consultations de la file (appels ajoutés par l'API)
+QUEUE_POLL_INTERVAL = float(os.getenv("QUEUE_POLL_INTERVAL", "1"))
+# Lecture des CDR des appels terminés (place libérée dans la concurrence du trunk, rappel des échecs)
+QUEUE_RECONCILE_INTERVAL = float(os.getenv("QUEUE_RECONCILE_INTERVAL", "5"))
+# Place libérée sans CDR au-delà de cette durée (agent arrêté en cours d'appel)
+QUEUE_CALL_MAX_DURATION = float(os.getenv("QUEUE_CALL_MAX_DURATION", "1800"))
+QUEUE_MAX_ATTEMPTS = int(os.getenv("QUEUE_MAX_ATTEMPTS", "3"))
+QUEUE_RETRY_DELAY = float(os.getenv("QUEUE_RETRY_DELAY", "60"))
+
+class TrunkPacer:
+    """
+    Limites d'un trunk : débit (seau de jetons), appels simultanés et mode de lancement
+    """
+
+    def __init__(self, trunk_id, cps, burst, concurrency, pacing="fixed", capacity=None,
+                 abandon_rate=PACING_ABANDON_RATE):
+        self.trunk_id = trunk_id
+        self.bucket = TokenBucket(cps, burst)
+        self.concurrency = concurrency
+        self.predictive = pacing == "predictive"
+        # Conversations simultanées visées en mode prédictif
+        self.capacity = capacity or max(1, concurrency // 2)
+        if self.predictive and self.capacity >= concurrency:
+            logger.warning(f"Trunk {trunk_id} en mode prédictif avec {self.capacity} conversations pour "
+                           f"{concurrency} lignes : aucune ligne pour lancer des appels en plus pendant les sonneries")
+        self.abandon_rate = abandon_rate
+        # Appels lancés hors file sur ce trunk (rappels), par room : heure de lancement
+        self.active = {}
+        self.task = None
+
+    @classmethod
+    def for_trunk(cls, trunk_id, limits=None, defaults=None):
+        """Limites du trunk (QUEUE_TRUNK_LIMITS, sinon réglages par défaut)"""
+        limits = {**(defaults or {}), **(limits if limits is not None else QUEUE_TRUNK_LIMITS).get(trunk_id, {})}
+        return cls(
+            trunk_id,
+            float(limits.get("cps", QUEUE_DISPATCH_CPS)),
+            int(limits.get("burst", QUEUE_DISPATCH_BURST)),
+            int(limits.get("concurrency", QUEUE_TRUNK_CONCURRENCY)),
+            pacing=limits.get("pacing", QUEUE_PACING),
+            capacity=int(limits.get("capacity", QUEUE_AGENT_CAPACITY)),
+            abandon_rate=float(limits.get("abandon_rate", PACING_ABANDON_RATE)),
+        )
+
+    @property
+    def running(self):
+        return self.task is not None and not self.task.done()
+
+class TrunkPacers:
+    """
+    Limites des trunks partagées par les schedulers du processus (file d'appels et rappels)
+
+    Un seul seau de jetons par trunk, et des lignes occupées comptées toutes origines confondues :
+    appels de la file (CallQueueStore) et appels lancés hors file, suivis jusqu'à leur CDR.
+    """
+
+    def __init__(self, store=None, limits=None, defaults=None, max_duration=QUEUE_CALL_MAX_DURATION):
+        """
+        Initialisation des limites
+
+        Args:
+            store: CallQueueStore dont les appels en cours occupent les lignes (aucun si None)
+            limits: Réglages par trunk (QUEUE_TRUNK_LIMITS par défaut)
+            defaults: Réglages par défaut remplaçant ceux de l'environnement
+            max_duration: Ligne d'un appel hors file libérée sans CDR au-delà de cette durée
+        """
+        self.store = store
+        self.limits = limits
+        self.defaults = defaults
+        self.max_duration = max_duration
+        self._pacers = {}
+
+    def get(self, trunk_id):
+        pacer = self._pacers.get(trunk_id)
+        if pacer is None:
+            pacer = self._pacers[trunk_id] = TrunkPacer.for_trunk(trunk_id, self.limits, self.defaults)
+        return pacer
+
+    def values(self):
+        return self._pacers.values()
+
+    def lines(self, pacer, now=None):
+        """
+        Lignes occupées du trunk
+
+        Returns:
+            Âge (secondes) de chaque appel en cours, 0 pour un appel pas encore lancé
+        """
+        now = now or time.time()
+        ages = [now - started_at for started_at in pacer.active.values()]
+        if self.store is not None:
+            ages.extend(now - row["dispatched_at"] if row["dispatched_at"] else 0.0
+                        for row in self.store.in_progress(pacer.trunk_id))
+        return ages
+
+    def track(self, pacer, room_name, now=None):
+        """Occuper une ligne du trunk jusqu'au CDR de la room"""
+        pacer.active[room_name] = now or time.time()
+
+    def observe_record(self, record):
+        """Libérer la ligne d'un appel hors file terminé (écouteur des CDR du moteur de rappel)"""
+        for pacer in self._pacers.values():
+            if pacer.active.pop(record["room_name"], None) is not None:
+                return
+
+    def expire(self, now=None):
+        """Libérer les lignes des appels hors file sans CDR depuis max_duration"""
+        now = now or time.time()
+        for pacer in self._pacers.values():
+            for room_name, started_at in list(pacer.active.items()):
+                if now - started_at > self.max_duration:
+                    del pacer.active[room_name]
+
+class CallQueueScheduler:
+    """
+    Vidage de la file d'appels au débit et à la concurrence de chaque trunk, via le même dispatch que /api/call
+    """
+
+    def __init__(self, store=None, livekit_api=None, redial=None, stats=None, dnc=None, limits=None,
+                 poll_interval=QUEUE_POLL_INTERVAL, reconcile_interval=QUEUE_RECONCILE_INTERVAL,
+                 dispatch_fnc=None, pacers=None):
+        """
+        Initialisation du scheduler
+
+        Args:
+            store: CallQueueStore (file par défaut si None)
+            livekit_api: Instance LiveKitAPI partagée (créée au démarrage si None)
+            redial: RedialEngine (lecture des CDR : fin des appels et rappel des échecs)
+            stats: AnswerStats du mode prédictif (reprises de la dernière sauvegarde si None)
+            dnc: DncList consultée avant chaque lancement (liste compilée par défaut si None)
+            limits: Réglages par trunk (QUEUE_TRUNK_LIMITS par défaut)
+            poll_interval: Délai maximal entre deux consultations de la file
+            reconcile_interval: Période de recherche des appels terminés
+            dispatch_fnc: Fonction de dispatch (create_call_dispatch par défaut)
+            pacers: TrunkPacers partagés avec les autres schedulers du processus (créés si None)
+        """
+        self.store = store or CallQueueStore()
+        self.livekit_api = livekit_api
+        self.redial = redial or RedialEngine(store=self.store)
+        # Statistiques de décroché alimentées par les CDR lus par le moteur de rappel
+        self.stats = stats or AnswerStats().load()
+        self.redial.listeners.append(self.stats.observe_record)
+        self.pacers = pacers or TrunkPacers(self.store, limits)
+        # Les CDR libèrent aussi les lignes des appels lancés hors file
+        self.redial.listeners.append(self.pacers.observe_record)
+        self.predictive = PredictivePacer(self.stats)
+        self.dnc = dnc or DncList()
+        self.poll_interval = poll_interval
+        self.reconcile_interval = reconcile_interval
+        self.dispatch_fnc = dispatch_fnc or create_call_dispatch
+        self.dispatched = 0
+        self.failed = 0
+        self.blocked = 0
+        self._dispatches = set()
+        self._reconciled_at = 0.0
+        self._wakeup = asyncio.Event()
+
+    def notify(self):
+        """Réveiller le scheduler (appel ajouté ou place libérée dans le même processus)"""
+        self._wakeup.set()
+
+    def pacer(self, trunk_id):
+        return self.pacers.get(trunk_id)
+
+    async def _room_exists(self, room_name):
+        rooms = await self.livekit_api.room.list_rooms(api.ListRoomsRequest(names=[room_name]))
+        return len(rooms.rooms) > 0
+
+    async def _dispatch(self, call):
+        """Lancer un appel réservé et enregistrer le résultat"""
+        room_name = call["room_name"]
+        try:
+            # Appel repris après une interruption : ne pas rappeler s'il a déjà eu lieu ou s'il est en cours
+            if call["recovered"]:
+                attempt = self.store.attempt_for_room(room_name)
+                if attempt is not None:
+                    # CDR déjà lu pendant l'interruption : l'issue de l'appel est connue
+                    logger.info(f"Appel {call['id']} déjà terminé dans {room_name} ({attempt['outcome']}), "
+                                f"pas de nouveau dispatch")
+                    self.store.settle(call["id"], attempt["outcome"], attempt["retry_at"])
+                    return
+                if self.redial.history.find(room_name=room_name, limit=1) or await self._room_exists(room_name):
+                    # CDR pas encore lu ou appel en cours : le moteur de rappel clora l'appel
+                    logger.info(f"Appel {call['id']} déjà lancé dans {room_name}, pas de nouveau dispatch")
+                    self.store.mark_dispatched(call["id"], room_name, call["dispatch_id"])
+                    return
+
+            # Numéro ajouté à la liste d'opposition depuis sa mise en file (ou rappel d'un appel échoué)
+            if self.dnc.blocked(call["phone_number"]):
+                self.blocked += 1
+                logger.warning(f"Appel {call['id']} vers {call['phone_number']} abandonné: numéro sur liste d'opposition")
+                self.store.mark_failed(call["id"], DNC_ERROR)
+                return
+
+            payload = json.loads(call["payload"]) if call["payload"] else {}
+            extra_metadata = {key: payload[key] for key in ("campaign", "profile") if payload.get(key)}
+            extra_metadata["queue"] = {
+                "id": call["id"],
+                "attempt": call["attempts"],
+                "priority": call["priority"],
+                "context": payload.get("context"),
+            }
+            dispatch = await self.dispatch_fnc(
+                self.livekit_api,
+                call["phone_number"],
+                call["trunk_id"],
+                room_name=room_name,
+                extra_metadata=extra_metadata,
+            )
+            self.store.mark_dispatched(call["id"], dispatch.room, dispatch.id)
+            self.dispatched += 1
+            logger.info(f"Appel {call['id']} lancé vers {call['phone_number']} sur {call['trunk_id']} "
+                        f"(attente: {time.time() - call['created_at']:.1f}s)")
+        except Exception as e:
+            self.failed += 1
+            retry_at = None
+            if call["attempts"] < QUEUE_MAX_ATTEMPTS:
+                retry_at = time.time() + QUEUE_RETRY_DELAY * call["attempts"]
+            logger.error(f"Erreur lors du lancement de l'appel {call['id']}: {e}")
+            self.store.mark_failed(call["id"], e, retry_at=retry_at)
+
+    def dial_budget(self, pacer, now=None):
+        """Appels que le trunk peut lancer maintenant (lignes libres, limitées en mode prédictif)"""
+        now = now or time.time()
+        # Lignes occupées par la file et par les appels lancés hors file (rappels)
+        ages = self.pacers.lines(pacer, now)
+        budget = pacer.concurrency - len(ages)
+        if budget > 0 and pacer.predictive:
+            budget = min(budget, self.predictive.dial_budget(
+                pacer.trunk_id, ages, pacer.capacity, pacer.abandon_rate, now
+            ))
+        return budget
+
+    async def _drain(self, pacer):
+        """Lancer les appels prêts d'un trunk, à son débit, tant qu'il reste de la place"""
+        while True:
+            budget = self.dial_budget(pacer)
+            if budget <= 0:
+                return
+            for _ in range(budget):
+                await pacer.bucket.acquire()
+                # Réservation après le jeton : un appel prioritaire ajouté entre-temps passe devant
+                calls = self.store.claim(pacer.trunk_id, limit=1)
+                if not calls:
+                    return
+                task = asyncio.create_task(self._dispatch(calls[0]))
+                self._dispatches.add(task)
+                task.add_done_callback(self._dispatches.discard)
+
+    def expire(self, now=None):
+        """
+        Libérer la place des appels lancés depuis trop longtemps sans CDR (agent arrêté en cours d'appel)
+
+        Returns:
+            Nombre d'appels clos
+        """
+        now = now or time.time()
+        stale = [
+            (row["id"], None, "Aucun CDR reçu")
+            for row in self.store.in_progress()
+            if row["status"] == "dispatched" and now - row["dispatched_at"] > QUEUE_CALL_MAX_DURATION
+        ]
+        if stale:
+            self.store.finish(stale)
+        return len(stale)
+
+    async def run_once(self):
+        """
+        Ouvrir les fenêtres échues, traiter les appels terminés et relancer le vidage des trunks
+
+        Returns:
+            Nombre de trunks ayant des appels prêts
+        """
+        self.store.promote_due()
+        now = time.time()
+        if now - self._reconciled_at >= self.reconcile_interval:
+            self._reconciled_at = now
+            self.expire(now)
+            self.pacers.expire(now)
+            # Rafale d'échecs : lots successifs, en rendant la main à la boucle entre deux lots
+            while self.redial.poll(now) >= self.redial.batch_size:
+                await asyncio.sleep(0)
+            self.stats.save()
+
+        trunks = self.store.ready_trunks()
+        for trunk_id in trunks:
+            pacer = self.pacer(trunk_id)
+            if not pacer.running:
+                pacer.task = asyncio.create_task(self._drain(pacer))
+        return len(trunks)
+
+    async def _sleep(self):
+        """Dormir jusqu'à la prochaine fenêtre, sans dépasser l'intervalle de consultation"""
+        next_at = self.store.next_scheduled_at()
+        delay = self.poll_interval if next_at is None else min(next_at - time.time(), self.poll_interval)
+        if delay <= 0:
+            return
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+
+    async def run(self):
+        """Boucle principale du scheduler"""
+        own_api = self.livekit_api is None
+        if own_api:
+            # Une seule connexion LiveKit (pool HTTP keep-alive) réutilisée pour tous les dispatchs
+            self.livekit_api = api.LiveKitAPI()
+
+        self.store.recover()
+        logger.info(f"Scheduler de la file d'appels démarré ({QUEUE_DISPATCH_CPS} appels/s, "
+                    f"{QUEUE_TRUNK_CONCURRENCY} appels simultanés par trunk par défaut)")
+        try:
+            while True:
+                await self.run_once()
+                await self._sleep()
+        finally:
+            for pacer in self.pacers.values():
+                if pacer.running:
+                    pacer.task.cancel()
+            # Les dispatchs en vol se terminent ; un appel interrompu sera repris par recover()
+            if self._dispatches:
+                await asyncio.gather(*self._dispatches, return_exceptions=True)
+            if own_api:
+                await self.livekit_api.aclose()
@@ -0,0 +1,161 @@
+import os
+import json
+import time
+import asyncio
+import logging
+from livekit import api
+
+from callback_store import CallbackStore
+from call_history import CallHistory
+from call_queue_scheduler import TrunkPacers
+from dispatch import create_call_dispatch
+from dnc import DncList, DNC_ERROR
+
+logger = logging.getLogger(__name__)
+
+# Délai maximal entre deux consultations de la base (nouveaux rappels insérés par l'API)
+CALLBACK_POLL_INTERVAL = float(os.getenv("CALLBACK_POLL_INTERVAL", "5"))
+CALLBACK_MAX_ATTEMPTS = int(os.getenv("CALLBACK_MAX_ATTEMPTS", "3"))
+CALLBACK_RETRY_DELAY = float(os.getenv("CALLBACK_RETRY_DELAY", "60"))
+# Délai entre deux vérifications des lignes du trunk quand elles sont toutes occupées
+CALLBACK_LINE_WAIT = float(os.getenv("CALLBACK_LINE_WAIT", "1"))
+
+class CallbackScheduler:
+    """
+    Lancement des rappels échus via le même dispatch que /api/call, au débit et à la concurrence du trunk
+
+    Le seau de jetons et les lignes de chaque trunk sont ceux de la file d'appels (TrunkPacers partagés) :
+    les rappels et la file ne dépassent pas ensemble les limites du trunk.
+    """
+
+    def __init__(self, store=None, livekit_api=None, pacers=None, poll_interval=CALLBACK_POLL_INTERVAL,
+                 batch_size=50, dnc=None, dispatch_fnc=None, history=None):
+        """
+        Initialisation du scheduler
+
+        Args:
+            store: CallbackStore (base par défaut si None)
+            livekit_api: Instance LiveKitAPI partagée (créée au démarrage si None)
+            pacers: TrunkPacers de la file d'appels (limites des trunks sans les appels de la file si None)
+            poll_interval: Délai maximal entre deux consultations de la base
+            batch_size: Nombre de rappels réservés par transaction
+            dnc: DncList consultée avant chaque lancement (liste compilée par défaut si None)
+            dispatch_fnc: Fonction de dispatch (create_call_dispatch par défaut)
+            history: CallHistory des CDR, pour ne pas relancer un rappel repris déjà passé
+        """
+        self.store = store or CallbackStore()
+        self.livekit_api = livekit_api
+        self.pacers = pacers or TrunkPacers()
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.dispatch_fnc = dispatch_fnc or create_call_dispatch
+        self.dnc = dnc or DncList()
+        self.history = history or CallHistory()
+        self.dispatched = 0
+        self.failed = 0
+        self.blocked = 0
+        self._wakeup = asyncio.Event()
+
+    def notify(self):
+        """Réveiller le scheduler (rappel ajouté dans le même processus)"""
+        self._wakeup.set()
+
+    async def _sleep_until_due(self):
+        """Dormir jusqu'à la prochaine échéance, sans dépasser l'intervalle de consultation"""
+        next_due = self.store.next_due_at()
+        delay = self.poll_interval if next_due is None else min(next_due - time.time(), self.poll_interval)
+        if delay <= 0:
+            return
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _room_exists(self, room_name):
+        rooms = await self.livekit_api.room.list_rooms(api.ListRoomsRequest(names=[room_name]))
+        return len(rooms.rooms) > 0
+
+    async def _acquire_line(self, pacer):
+        """Attendre une ligne libre sur le trunk, puis un jeton de son débit"""
+        while len(self.pacers.lines(pacer)) >= pacer.concurrency:
+            await asyncio.sleep(CALLBACK_LINE_WAIT)
+        await pacer.bucket.acquire()
+
+    async def _dispatch(self, row, pacer):
+        """Lancer un rappel réservé et enregistrer le résultat"""
+        room_name = f"callback-{row['id']}"
+        try:
+            # Rappel repris après une interruption : ne pas rappeler s'il a déjà eu lieu ou s'il est en cours
+            if row["attempts"] > 1:
+                queue_store = self.pacers.store
+                if (queue_store is not None and queue_store.attempt_for_room(room_name) is not None) \
+                        or self.history.find(room_name=room_name, limit=1):
+                    logger.info(f"Rappel {row['id']} déjà passé dans {room_name}, pas de nouveau dispatch")
+                    self.store.mark_dispatched(row["id"], room_name, None)
+                    return
+                if await self._room_exists(room_name):
+                    logger.info(f"Rappel {row['id']} déjà en cours dans {room_name}, pas de nouveau dispatch")
+                    self.pacers.track(pacer, room_name)
+                    self.store.mark_dispatched(row["id"], room_name, None)
+                    return
+
+            # Numéro inscrit sur la liste d'opposition depuis la demande de rappel
+            if self.dnc.blocked(row["phone_number"]):
+                self.blocked += 1
+                logger.warning(f"Rappel {row['id']} vers {row['phone_number']} abandonné: numéro sur liste d'opposition")
+                self.store.mark_failed(row["id"], DNC_ERROR)
+                return
+
+            payload = json.loads(row["payload"]) if row["payload"] else {}
+            payload.update({"callback_id": row["id"], "scheduled_for": row["due_at"]})
+            dispatch = await self.dispatch_fnc(
+                self.livekit_api,
+                row["phone_number"],
+                row["trunk_id"],
+                room_name=room_name,
+                extra_metadata={"callback": payload},
+            )
+            self.pacers.track(pacer, dispatch.room)
+            self.store.mark_dispatched(row["id"], dispatch.room, dispatch.id)
+            self.dispatched += 1
+            logger.info(f"Rappel {row['id']} lancé vers {row['phone_number']} (retard: {time.time() - row['due_at']:.1f}s)")
+        except Exception as e:
+            self.failed += 1
+            retry_at = None
+            if row["attempts"] < CALLBACK_MAX_ATTEMPTS:
+                retry_at = time.time() + CALLBACK_RETRY_DELAY * row["attempts"]
+            logger.error(f"Erreur lors du lancement du rappel {row['id']}: {e}")
+            self.store.mark_failed(row["id"], e, retry_at=retry_at)
+
+    async def run_once(self):
+        """
+        Réserver et lancer un lot de rappels échus
+
+        Returns:
+            Nombre de rappels traités
+        """
+        rows = self.store.claim_due(limit=self.batch_size)
+        for row in rows:
+            pacer = self.pacers.get(row["trunk_id"] or os.getenv("OUTBOUND_TRUNK_ID"))
+            # La rafale de 9h00 est étalée au débit du trunk, sans dépasser ses lignes
+            await self._acquire_line(pacer)
+            await self._dispatch(row, pacer)
+        return len(rows)
+
+    async def run(self):
+        """Boucle principale du scheduler"""
+        own_api = self.livekit_api is None
+        if own_api:
+            # Une seule connexion LiveKit réutilisée pour tous les dispatchs
+            self.livekit_api = api.LiveKitAPI()
+
+        self.store.recover()
+        logger.info("Scheduler de rappels démarré (débit et lignes des trunks partagés avec la file d'appels)")
+        try:
+            while True:
+                if not await self.run_once():
+                    await self._sleep_until_due()
+        finally:
+            if own_api:
+                await self.livekit_api.aclose()
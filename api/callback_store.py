@@ -0,0 +1,280 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import logging
+import threading
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+logger = logging.getLogger(__name__)
+
+# Répertoire des bases locales (partagé par l'API et le scheduler)
+DATA_DIR = os.getenv("DATA_DIR", os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "data")))
+CALLBACK_DB_PATH = os.getenv("CALLBACK_DB_PATH", os.path.join(DATA_DIR, "callbacks.db"))
+# Fuseau horaire dans lequel les clients expriment l'heure du rappel
+CALLBACK_TIMEZONE = os.getenv("CALLBACK_TIMEZONE", "Europe/Paris")
+
+STATUS_PENDING = "pending"
+STATUS_DISPATCHING = "dispatching"
+STATUS_DISPATCHED = "dispatched"
+STATUS_FAILED = "failed"
+STATUS_CANCELLED = "cancelled"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS callbacks (
+    id INTEGER PRIMARY KEY,
+    phone_number TEXT NOT NULL,
+    due_at REAL NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    trunk_id TEXT,
+    payload TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    room_name TEXT,
+    dispatch_id TEXT,
+    error TEXT
+);
+-- Index partiel : seuls les rappels en attente sont indexés par échéance
+CREATE INDEX IF NOT EXISTS idx_callbacks_pending_due ON callbacks(due_at) WHERE status = 'pending';
+CREATE INDEX IF NOT EXISTS idx_callbacks_phone ON callbacks(phone_number);
+"""
+
+_TIME_RE = re.compile(r"^\s*(\d{1,2})\s*(?:[:hH]\s*(\d{2})?)?\s*$")
+
+def parse_callback_time(date=None, time_of_day=None, timezone=CALLBACK_TIMEZONE, now=None):
+    """
+    Convertir la date et l'heure demandées par le client en timestamp UNIX
+
+    Args:
+        date: Date au format AAAA-MM-JJ (aujourd'hui ou demain si absente)
+        time_of_day: Heure au format HH:MM, HHhMM ou HHh
+        timezone: Fuseau horaire de la demande
+        now: Heure de référence (datetime aware, pour les tests)
+
+    Returns:
+        Timestamp UNIX de l'échéance
+
+    Raises:
+        ValueError si la date ou l'heure est invalide ou déjà passée
+    """
+    if not date and not time_of_day:
+        raise ValueError("Date ou heure de rappel requise")
+
+    tz = ZoneInfo(timezone)
+    now = now or datetime.now(tz)
+
+    hour, minute = 9, 0
+    if time_of_day:
+        match = _TIME_RE.match(time_of_day)
+        if not match:
+            raise ValueError(f"Heure de rappel invalide: {time_of_day}")
+        hour, minute = int(match.group(1)), int(match.group(2) or 0)
+
+    if date:
+        day = datetime.strptime(date.strip(), "%Y-%m-%d").date()
+    else:
+        day = now.date()
+
+    due = datetime(day.year, day.month, day.day, hour, minute, tzinfo=tz)
+    if not date and due <= now:
+        # "Rappelez-moi à 9h" après 9h : le lendemain
+        due += timedelta(days=1)
+    if due <= now:
+        raise ValueError(f"L'heure de rappel est déjà passée: {due.isoformat()}")
+    return due.timestamp()
+
+class CallbackStore:
+    """
+    Stockage persistant des rappels programmés (SQLite en mode WAL, indexé par échéance)
+    """
+
+    def __init__(self, path=CALLBACK_DB_PATH):
+        """
+        Ouverture (ou création) de la base des rappels
+
+        Args:
+            path: Chemin du fichier SQLite
+        """
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def add(self, phone_number, due_at, trunk_id=None, payload=None):
+        """
+        Programmer un rappel
+
+        Args:
+            phone_number: Numéro normalisé à rappeler
+            due_at: Timestamp UNIX de l'échéance
+            trunk_id: Trunk SIP à utiliser (optionnel)
+            payload: Contexte libre transmis à l'agent (dict)
+
+        Returns:
+            ID du rappel
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO callbacks (phone_number, due_at, trunk_id, payload, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (phone_number, due_at, trunk_id, json.dumps(payload) if payload else None, now, now)
+            )
+            return cursor.lastrowid
+
+    def add_many(self, callbacks):
+        """
+        Programmer des rappels en une seule transaction
+
+        Args:
+            callbacks: Itérable de tuples (phone_number, due_at, trunk_id, payload)
+
+        Returns:
+            Nombre de rappels insérés
+        """
+        now = time.time()
+        rows = (
+            (phone, due_at, trunk_id, json.dumps(payload) if payload else None, now, now)
+            for phone, due_at, trunk_id, payload in callbacks
+        )
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = self._conn.executemany(
+                    "INSERT INTO callbacks (phone_number, due_at, trunk_id, payload, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            return cursor.rowcount
+
+    def next_due_at(self):
+        """Échéance du prochain rappel en attente (None si aucun) - lecture de la tête de l'index"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MIN(due_at) FROM callbacks WHERE status = 'pending'"
+            ).fetchone()
+            return row[0]
+
+    def claim_due(self, now=None, limit=50):
+        """
+        Réserver les rappels échus, par ordre d'échéance
+
+        Les rappels passent à l'état 'dispatching' dans la même transaction, ce qui évite
+        qu'un autre scheduler ne les prenne aussi.
+
+        Args:
+            now: Timestamp de référence (maintenant par défaut)
+            limit: Nombre maximal de rappels réservés
+
+        Returns:
+            Liste de sqlite3.Row
+        """
+        now = now or time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "SELECT * FROM callbacks WHERE status = 'pending' AND due_at <= ? "
+                    "ORDER BY due_at LIMIT ?",
+                    (now, limit)
+                ).fetchall()
+                if rows:
+                    self._conn.executemany(
+                        "UPDATE callbacks SET status = 'dispatching', attempts = attempts + 1, "
+                        "updated_at = ? WHERE id = ?",
+                        [(now, row["id"]) for row in rows]
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            return rows
+
+    def mark_dispatched(self, callback_id, room_name, dispatch_id):
+        """Marquer un rappel comme lancé"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE callbacks SET status = 'dispatched', room_name = ?, dispatch_id = ?, "
+                "error = NULL, updated_at = ? WHERE id = ?",
+                (room_name, dispatch_id, time.time(), callback_id)
+            )
+
+    def mark_failed(self, callback_id, error, retry_at=None):
+        """
+        Enregistrer l'échec du lancement d'un rappel
+
+        Args:
+            callback_id: ID du rappel
+            error: Message d'erreur
+            retry_at: Nouvelle échéance (le rappel reste en attente) ou None pour l'abandonner
+        """
+        with self._lock:
+            if retry_at is None:
+                self._conn.execute(
+                    "UPDATE callbacks SET status = 'failed', error = ?, updated_at = ? WHERE id = ?",
+                    (str(error), time.time(), callback_id)
+                )
+            else:
+                self._conn.execute(
+                    "UPDATE callbacks SET status = 'pending', due_at = ?, error = ?, updated_at = ? "
+                    "WHERE id = ?",
+                    (retry_at, str(error), time.time(), callback_id)
+                )
+
+    def cancel(self, callback_id):
+        """Annuler un rappel en attente"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE callbacks SET status = 'cancelled', updated_at = ? "
+                "WHERE id = ? AND status = 'pending'",
+                (time.time(), callback_id)
+            )
+            return cursor.rowcount > 0
+
+    def recover(self):
+        """
+        Remettre en attente les rappels réservés par un scheduler interrompu
+
+        Returns:
+            Nombre de rappels récupérés
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE callbacks SET status = 'pending', updated_at = ? WHERE status = 'dispatching'",
+                (time.time(),)
+            )
+            if cursor.rowcount:
+                logger.warning(f"{cursor.rowcount} rappel(s) interrompu(s) remis en attente")
+            return cursor.rowcount
+
+    def get(self, callback_id):
+        with self._lock:
+            return self._conn.execute("SELECT * FROM callbacks WHERE id = ?", (callback_id,)).fetchone()
+
+    def stats(self):
+        """Nombre de rappels par statut et prochaine échéance"""
+        with self._lock:
+            counts = dict(self._conn.execute(
+                "SELECT status, COUNT(*) FROM callbacks GROUP BY status"
+            ).fetchall())
+        return {
+            "counts": counts,
+            "next_due_at": self.next_due_at(),
+        }
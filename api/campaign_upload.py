@@ -0,0 +1,414 @@
+import os
+import csv
+import gzip
+import json
+import time
+import shutil
+import socket
+import logging
+import secrets
+import threading
+from array import array
+
+from dispatch import parse_e164
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.getenv("DATA_DIR", os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "data")))
+# Appels insérés par transaction
+CAMPAIGN_UPLOAD_BATCH = int(os.getenv("CAMPAIGN_UPLOAD_BATCH", "5000"))
+# Lignes invalides détaillées dans le compte rendu (les suivantes sont seulement comptées)
+CAMPAIGN_UPLOAD_MAX_ERRORS = int(os.getenv("CAMPAIGN_UPLOAD_MAX_ERRORS", "20"))
+# Taille des lectures dans le corps de la requête et longueur maximale d'une ligne (octets)
+CAMPAIGN_UPLOAD_CHUNK = int(os.getenv("CAMPAIGN_UPLOAD_CHUNK", str(64 * 1024)))
+CAMPAIGN_UPLOAD_MAX_LINE = int(os.getenv("CAMPAIGN_UPLOAD_MAX_LINE", str(64 * 1024)))
+# Fichiers reçus et état des imports, lus par tous les workers de l'API (GET /api/queue/upload/<job_id>)
+CAMPAIGN_UPLOAD_DIR = os.getenv("CAMPAIGN_UPLOAD_DIR", os.path.join(DATA_DIR, "campaign_uploads"))
+# Conservation de l'état d'un import terminé (secondes)
+CAMPAIGN_UPLOAD_JOB_TTL = float(os.getenv("CAMPAIGN_UPLOAD_JOB_TTL", str(7 * 86400)))
+# Battement d'un import en cours (secondes) : sans battement depuis 4 périodes, ou si le worker qui
+# l'exécutait n'existe plus (redémarrage, timeout, déploiement), l'import est marqué en échec
+CAMPAIGN_UPLOAD_HEARTBEAT = float(os.getenv("CAMPAIGN_UPLOAD_HEARTBEAT", "15"))
+
+FORMAT_CSV = "csv"
+FORMAT_NDJSON = "ndjson"
+
+# En-têtes reconnus pour la colonne du numéro (CSV) ; les autres colonnes forment le contexte de l'appel
+_PHONE_FIELDS = ("phone", "phone_number", "number", "numero", "numéro", "telephone", "téléphone", "tel")
+_MULTIPLIER = 0x9E3779B97F4A7C15
+_MASK64 = (1 << 64) - 1
+
+class PhoneSet:
+    """
+    Ensemble de numéros E.164 (entiers) en adressage ouvert dans un tableau d'entiers 64 bits
+
+    Environ 16 octets par numéro, contre une centaine pour un set Python de chaînes.
+    """
+
+    __slots__ = ("_table", "_bits", "count")
+
+    def __init__(self, capacity=1 << 16):
+        self._bits = max(4, (2 * capacity - 1).bit_length())
+        self._table = array("Q", [0]) * (1 << self._bits)
+        self.count = 0
+
+    def _slot(self, number):
+        """Case du numéro, ou première case libre de sa suite (sondage linéaire)"""
+        table, mask = self._table, (1 << self._bits) - 1
+        index = ((number * _MULTIPLIER) & _MASK64) >> (64 - self._bits)
+        while table[index] and table[index] != number:
+            index = (index + 1) & mask
+        return index
+
+    def add(self, number):
+        """
+        Ajouter un numéro (entier non nul)
+
+        Returns:
+            True si le numéro n'y était pas encore
+        """
+        index = self._slot(number)
+        if self._table[index]:
+            return False
+        self._table[index] = number
+        self.count += 1
+        # Taux de remplissage maximal de 1/2
+        if self.count * 2 > len(self._table):
+            self._grow()
+        return True
+
+    def _grow(self):
+        old = self._table
+        self._bits += 1
+        self._table = array("Q", [0]) * (1 << self._bits)
+        for number in old:
+            if number:
+                self._table[self._slot(number)] = number
+
+    def __contains__(self, number):
+        return bool(self._table[self._slot(number)])
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def nbytes(self):
+        return len(self._table) * self._table.itemsize
+
+def iter_lines(stream, chunk_size=CAMPAIGN_UPLOAD_CHUNK, max_line=CAMPAIGN_UPLOAD_MAX_LINE):
+    """
+    Lignes d'un flux d'octets UTF-8, lu par blocs (seul le bloc en cours est en mémoire)
+
+    Raises:
+        ValueError: Ligne plus longue que max_line
+    """
+    pending = b""
+    first = True
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        if first:
+            chunk = chunk.removeprefix(b"\xef\xbb\xbf")
+            first = False
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        if len(pending) > max_line:
+            raise ValueError(f"Ligne de plus de {max_line} octets")
+        for line in lines:
+            yield line.decode("utf-8", "replace") + "\n"
+    if pending:
+        yield pending.decode("utf-8", "replace")
+
+def iter_records(lines, fmt=FORMAT_CSV):
+    """
+    Contacts d'un fichier CSV (avec ou sans en-tête) ou NDJSON
+
+    Returns:
+        Itérateur de (numéro de ligne, dictionnaire des champs ou None, erreur ou None)
+    """
+    if fmt == FORMAT_NDJSON:
+        for line_number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                yield line_number, None, "JSON invalide"
+                continue
+            if not isinstance(record, dict):
+                yield line_number, None, "Objet JSON attendu"
+                continue
+            yield line_number, record, None
+        return
+
+    reader = csv.reader(lines)
+    header = next(reader, None)
+    if header is None:
+        return
+    names = [name.strip().lower() for name in header]
+    if not any(name in _PHONE_FIELDS for name in names):
+        # Pas d'en-tête : le numéro est dans la première colonne, la première ligne est un contact
+        if header:
+            yield reader.line_num, {"phone": header[0]}, None
+        for row in reader:
+            if row:
+                yield reader.line_num, {"phone": row[0]}, None
+        return
+    # Le numéro est lu sous le nom "phone", quel que soit l'en-tête reconnu
+    names = ["phone" if name in _PHONE_FIELDS else name for name in names]
+    for row in reader:
+        if row:
+            yield reader.line_num, {name: value for name, value in zip(names, row) if value}, None
+
+def _field(record, name, cast, default):
+    value = record.pop(name, None)
+    return cast(value) if value not in (None, "") else default
+
+def import_campaign(stream, store, trunk_id, fmt=FORMAT_CSV, campaign=None, profile=None, priority=0,
+                    not_before=None, not_after=None, dnc=None, batch_size=CAMPAIGN_UPLOAD_BATCH,
+                    max_errors=CAMPAIGN_UPLOAD_MAX_ERRORS):
+    """
+    Mettre en file les contacts d'un fichier lu en flux, par transactions de batch_size appels
+
+    La mémoire utilisée ne dépend que du lot en cours et du nombre de numéros distincts (PhoneSet).
+    Avec une campagne, chaque numéro a une clé d'idempotence : renvoyer le même fichier n'ajoute rien.
+
+    Args:
+        stream: Flux d'octets (corps de la requête, fichier ouvert en binaire)
+        store: CallQueueStore
+        trunk_id: Trunk SIP des appels
+        fmt: FORMAT_CSV ou FORMAT_NDJSON
+        campaign: Campagne des appels
+        profile: Profil de l'agent
+        priority, not_before, not_after: Valeurs par défaut, remplaçables contact par contact
+        dnc: DncList des numéros à ne pas appeler (écartés et comptés)
+        batch_size: Appels insérés par transaction
+        max_errors: Lignes invalides détaillées dans le compte rendu
+
+    Returns:
+        Compte rendu de l'import (lignes lues, appels ajoutés, doublons, numéros bloqués, lignes invalides, débit)
+    """
+    start = time.perf_counter()
+    report = {"rows": 0, "queued": 0, "duplicates": 0, "already_queued": 0, "blocked": 0, "invalid": 0,
+              "errors": []}
+    seen = PhoneSet()
+    batch = []
+
+    def reject(line_number, value, error):
+        report["invalid"] += 1
+        if len(report["errors"]) < max_errors:
+            report["errors"].append({"line": line_number, "value": value, "error": error})
+
+    def flush():
+        queued = store.enqueue_many(batch)
+        report["queued"] += queued
+        report["already_queued"] += len(batch) - queued
+        batch.clear()
+
+    for line_number, record, error in iter_records(iter_lines(stream), fmt):
+        report["rows"] += 1
+        if error:
+            reject(line_number, None, error)
+            continue
+        raw = record.pop("phone", None)
+        if isinstance(raw, int) and not isinstance(raw, bool):
+            raw = str(raw)
+        if not isinstance(raw, str) or not raw:
+            reject(line_number, raw, "Numéro manquant")
+            continue
+        number = parse_e164(raw)
+        if number is None:
+            reject(line_number, raw, "Numéro invalide")
+            continue
+
+        try:
+            call_priority = _field(record, "priority", int, priority)
+            call_not_before = _field(record, "not_before", float, not_before)
+            call_not_after = _field(record, "not_after", float, not_after)
+        except (TypeError, ValueError) as e:
+            reject(line_number, raw, str(e))
+            continue
+        if call_not_before and call_not_after and call_not_after <= call_not_before:
+            reject(line_number, raw, "La fenêtre d'appel se ferme avant de s'ouvrir")
+            continue
+        if not seen.add(number):
+            report["duplicates"] += 1
+            continue
+        if dnc is not None and dnc.blocked(number):
+            report["blocked"] += 1
+            continue
+
+        phone_number = f"+{number}"
+        payload = {key: value for key, value in (("campaign", campaign), ("profile", profile)) if value}
+        # Contexte de l'appel : objet "context" (NDJSON) ou autres colonnes du contact
+        context = record.pop("context") if isinstance(record.get("context"), dict) else record
+        if context:
+            payload["context"] = context
+        batch.append((phone_number, trunk_id, call_priority, call_not_before, call_not_after, payload,
+                      f"campaign:{campaign}:{phone_number}" if campaign else None))
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+
+    elapsed = time.perf_counter() - start
+    report["elapsed_s"] = round(elapsed, 3)
+    report["rows_per_s"] = round(report["rows"] / elapsed) if elapsed > 0 else None
+    logger.info(f"Import de campagne {campaign or '-'} : {report['queued']} appel(s) en file sur "
+                f"{report['rows']} ligne(s), {report['duplicates']} doublon(s), {report['blocked']} bloqué(s), "
+                f"{report['invalid']} invalide(s) "
+                f"en {elapsed:.1f} s")
+    return report
+
+class ImportJobs:
+    """
+    Imports de campagne en tâche de fond : le fichier est reçu sur disque pendant la requête,
+    puis mis en file dans un thread (la requête ne dépend plus de la durée de l'import)
+
+    L'état de chaque import est un fichier JSON, lisible par n'importe quel worker de l'API.
+    Le thread d'import ne survit pas à son worker : un import "running" dont le worker a disparu
+    ou qui ne bat plus est marqué en échec à la lecture, et son fichier reçu est supprimé.
+    """
+
+    def __init__(self, directory=CAMPAIGN_UPLOAD_DIR, job_ttl=CAMPAIGN_UPLOAD_JOB_TTL,
+                 heartbeat=CAMPAIGN_UPLOAD_HEARTBEAT):
+        self.directory = directory
+        self.job_ttl = job_ttl
+        self.heartbeat = heartbeat
+        self._host = socket.gethostname()
+
+    def _path(self, job_id, suffix=".json"):
+        return os.path.join(self.directory, f"{job_id}{suffix}")
+
+    def _write(self, job_id, state):
+        tmp_path = self._path(job_id, ".json.tmp")
+        with open(tmp_path, "w") as state_file:
+            json.dump(state, state_file)
+        os.replace(tmp_path, self._path(job_id))
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _orphaned(self, state, mtime, now):
+        """Import "running" abandonné : worker disparu (même machine) ou plus de battement"""
+        if state.get("status") != "running":
+            return False
+        if now - mtime > 4 * self.heartbeat:
+            return True
+        if state.get("host") != self._host or not state.get("pid"):
+            return False
+        try:
+            os.kill(state["pid"], 0)
+        except ProcessLookupError:
+            return True
+        except PermissionError:
+            pass
+        return False
+
+    def _fail_orphan(self, job_id, state, now):
+        logger.warning(f"Import de campagne {job_id} abandonné par le worker {state.get('pid')}")
+        state.update(status="failed", error="Import interrompu par l'arrêt du worker", finished_at=now)
+        self._write(job_id, state)
+        self._remove(self._path(job_id, ".upload"))
+        return state
+
+    def _purge(self, now):
+        """
+        Supprimer l'état des imports terminés depuis plus de job_ttl, marquer en échec les imports
+        abandonnés et supprimer les fichiers reçus sans import (envoi ou worker interrompu)
+        """
+        for entry in os.scandir(self.directory):
+            try:
+                mtime = entry.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            if entry.name.endswith(".json"):
+                if now - mtime > self.job_ttl:
+                    self._remove(entry.path)
+                else:
+                    self.get(entry.name[:-len(".json")])
+            elif entry.name.endswith(".upload") and now - mtime > 4 * self.heartbeat \
+                    and not os.path.exists(self._path(entry.name[:-len(".upload")])):
+                self._remove(entry.path)
+
+    def start(self, stream, store, trunk_id, compressed=False, **options):
+        """
+        Recevoir le fichier puis lancer son import
+
+        Args:
+            stream: Flux d'octets du fichier (corps de la requête)
+            store: CallQueueStore
+            trunk_id: Trunk SIP des appels
+            compressed: Fichier compressé en gzip (décompressé pendant l'import)
+            options: Arguments de import_campaign (fmt, campaign, profile, priority, not_before, not_after, dnc)
+
+        Returns:
+            ID de l'import
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        now = time.time()
+        self._purge(now)
+        job_id = secrets.token_hex(8)
+        upload_path = self._path(job_id, ".upload")
+        try:
+            with open(upload_path, "wb") as upload:
+                shutil.copyfileobj(stream, upload, CAMPAIGN_UPLOAD_CHUNK)
+        except Exception:
+            # Envoi interrompu par le client
+            os.remove(upload_path)
+            raise
+        self._write(job_id, {"jobId": job_id, "status": "running", "campaign": options.get("campaign"),
+                             "bytes": os.path.getsize(upload_path), "started_at": now,
+                             "host": self._host, "pid": os.getpid()})
+        threading.Thread(
+            target=self._run, args=(job_id, upload_path, compressed, store, trunk_id, options),
+            daemon=True, name=f"campaign_upload_{job_id}",
+        ).start()
+        return job_id
+
+    def _beat(self, job_id, done):
+        """Battement de l'import : date de modification de son état, rafraîchie jusqu'à sa fin"""
+        while not done.wait(self.heartbeat):
+            try:
+                os.utime(self._path(job_id))
+            except FileNotFoundError:
+                pass
+
+    def _run(self, job_id, upload_path, compressed, store, trunk_id, options):
+        state = self.get(job_id)
+        done = threading.Event()
+        threading.Thread(target=self._beat, args=(job_id, done), daemon=True,
+                         name=f"campaign_upload_{job_id}_heartbeat").start()
+        try:
+            with open(upload_path, "rb") as upload:
+                stream = gzip.GzipFile(fileobj=upload, mode="rb") if compressed else upload
+                report = import_campaign(stream, store, trunk_id, **options)
+            state.update(status="completed", **report)
+        except Exception as e:
+            # Les lots déjà insérés restent en file ; renvoyer le fichier avec une campagne ne les duplique pas
+            logger.error(f"Import de campagne {job_id} interrompu: {e}")
+            state.update(status="failed", error=str(e))
+        finally:
+            done.set()
+            self._remove(upload_path)
+        state["finished_at"] = time.time()
+        self._write(job_id, state)
+
+    def get(self, job_id):
+        """État d'un import (None s'il est inconnu)"""
+        if not job_id.isalnum():
+            return None
+        try:
+            with open(self._path(job_id)) as state_file:
+                mtime = os.fstat(state_file.fileno()).st_mtime
+                state = json.load(state_file)
+        except (OSError, ValueError):
+            return None
+        now = time.time()
+        if self._orphaned(state, mtime, now):
+            return self._fail_orphan(job_id, state, now)
+        return state
@@ -0,0 +1,102 @@
+import os
+import json
+import logging
+import secrets
+import time
+from livekit import api
+
+logger = logging.getLogger(__name__)
+
+# Nom de l'agent enregistré par le worker (agent/main.py)
+AGENT_NAME = "outbound-caller"
+
+# Indicatif ajouté aux numéros nationaux (0X XX XX XX XX) importés en masse ; vide pour les refuser
+PHONE_COUNTRY_CODE = os.getenv("PHONE_COUNTRY_CODE", "33")
+_SEPARATORS = str.maketrans("", "", " -.()/\t\u00a0")
+
+def normalize_phone_number(phone_number):
+    """
+    Normaliser un numéro au format E.164 (préfixe '+', chiffres uniquement)
+
+    Args:
+        phone_number: Numéro brut
+
+    Returns:
+        Numéro normalisé
+    """
+    if not phone_number.startswith('+'):
+        phone_number = f"+{phone_number}"
+
+    # Supprimer les caractères spéciaux comme tirets ou espaces
+    return ''.join(c for c in phone_number if c.isdigit() or c == '+')
+
+def parse_e164(phone_number, country_code=PHONE_COUNTRY_CODE):
+    """
+    Valider un numéro et le convertir au format E.164
+
+    Accepte '+33 6 12 34 56 78', '0033612345678' ou '06.12.34.56.78' (indicatif country_code ajouté).
+
+    Args:
+        phone_number: Numéro brut
+        country_code: Indicatif des numéros nationaux (None pour les refuser)
+
+    Returns:
+        Chiffres du numéro après le '+' (entier), ou None si le numéro est invalide
+    """
+    digits = phone_number.strip().translate(_SEPARATORS)
+    if digits.startswith('+'):
+        digits = digits[1:]
+    elif digits.startswith('00'):
+        digits = digits[2:]
+    elif digits.startswith('0'):
+        if not country_code:
+            return None
+        digits = country_code + digits[1:]
+    # Indicatif sans zéro initial, 15 chiffres au plus
+    if not (digits.isascii() and digits.isdigit()) or not 7 <= len(digits) <= 15 or digits[0] == '0':
+        return None
+    return int(digits)
+
+async def create_call_dispatch(livekit_api, phone_number, trunk_id=None, room_name=None,
+                               room_prefix="call", extra_metadata=None):
+    """
+    Créer le dispatch de l'agent d'appels sortants pour un numéro
+
+    Args:
+        livekit_api: Instance LiveKitAPI (réutilisée d'un appel à l'autre)
+        phone_number: Numéro normalisé à appeler
+        trunk_id: ID du trunk SIP sortant (OUTBOUND_TRUNK_ID par défaut)
+        room_name: Nom de room imposé (sinon généré avec room_prefix)
+        room_prefix: Préfixe du nom de room généré
+        extra_metadata: Champs supplémentaires transmis à l'agent
+
+    Returns:
+        Le dispatch créé
+
+    Raises:
+        ValueError si aucun trunk n'est configuré
+    """
+    trunk_id = trunk_id or os.getenv('OUTBOUND_TRUNK_ID')
+    if not trunk_id:
+        raise ValueError("Aucun trunk SIP configuré. Utilisez /api/trunk/setup/direct d'abord.")
+
+    room_name = room_name or f"{room_prefix}-{secrets.token_hex(4)}"
+    metadata = {
+        "phone_number": phone_number,
+        "trunk_id": trunk_id,
+        # Horodatage repris dans le CDR de l'appel
+        "dispatched_at": time.time(),
+    }
+    if extra_metadata:
+        metadata.update(extra_metadata)
+
+    dispatch_request = api.CreateAgentDispatchRequest(
+        agent_name=AGENT_NAME,
+        room=room_name,
+        metadata=json.dumps(metadata)
+    )
+
+    logger.info(f"Envoi de la requête de dispatch: {dispatch_request}")
+    dispatch = await livekit_api.agent_dispatch.create_dispatch(dispatch_request)
+    logger.info(f"Dispatch créé: {dispatch}")
+    return dispatch
@@ -0,0 +1,286 @@
+import os
+import gzip
+import math
+import mmap
+import time
+import heapq
+import struct
+import logging
+import tempfile
+from array import array
+from bisect import bisect_left
+
+from dispatch import parse_e164
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.getenv("DATA_DIR", os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "data")))
+# Liste d'opposition compilée, partagée en lecture seule (mmap) par tous les workers
+DNC_PATH = os.getenv("DNC_PATH", os.path.join(DATA_DIR, "dnc.bin"))
+# Fichiers sources (un numéro par ligne ou en première colonne d'un CSV, .gz accepté) ou dossiers, séparés par des virgules
+DNC_SOURCES = os.getenv("DNC_SOURCES", os.path.join(DATA_DIR, "dnc"))
+# Bits du filtre de Bloom par numéro, 0 pour s'en passer. La recherche dichotomique est plus rapide tant que
+# le tableau reste dans le cache du système ; le filtre (10 bits : 1 % de faux positifs) évite de lire le tableau
+# pour les numéros absents quand la mémoire manque (mesure : scripts/bench_dnc.py)
+DNC_BLOOM_BITS = float(os.getenv("DNC_BLOOM_BITS", "0"))
+# Délai entre deux vérifications du fichier compilé (reconstruit par scripts/build_dnc.py)
+DNC_RELOAD_INTERVAL = float(os.getenv("DNC_RELOAD_INTERVAL", "10"))
+# Numéros triés en mémoire par étape de la construction (8 octets chacun, plus le tri)
+DNC_BUILD_RUN_SIZE = int(os.getenv("DNC_BUILD_RUN_SIZE", "2000000"))
+
+DNC_ERROR = "Numéro sur liste d'opposition"
+
+# En-tête : signature, nombre de numéros, taille du filtre de Bloom (bits), nombre de hachages, date de construction.
+# Suivent les numéros (entiers 64 bits triés, sans doublon, dans l'ordre d'octets de la machine) puis le filtre de Bloom.
+_MAGIC = b"DNCSET01"
+_HEADER = struct.Struct("<8sQQId")
+_HEADER_SIZE = 64
+_MASK32 = (1 << 32) - 1
+_MASK64 = (1 << 64) - 1
+_BLOCK = 65536
+
+def _mix(number):
+    """Hachage 64 bits d'un numéro (finaliseur de splitmix64)"""
+    z = (number + 0x9E3779B97F4A7C15) & _MASK64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return z ^ (z >> 31)
+
+def _to_number(phone_number):
+    """Numéro E.164 en entier ('+33612345678' sans repasser par la validation complète)"""
+    if isinstance(phone_number, int):
+        return phone_number
+    if phone_number[:1] == "+" and phone_number[1:].isdigit():
+        return int(phone_number[1:])
+    return parse_e164(phone_number)
+
+class DncList:
+    """
+    Liste d'opposition compilée, projetée en mémoire en lecture seule
+
+    Les pages du fichier sont partagées par tous les processus qui l'ouvrent (cache du système) :
+    chaque worker ne paie que l'en-tête. Une consultation lit quelques cases du filtre de Bloom,
+    puis, s'il ne l'écarte pas, fait une recherche dichotomique dans le tableau trié.
+    Le fichier reconstruit (remplacement atomique) est repris au plus tard DNC_RELOAD_INTERVAL après.
+    """
+
+    def __init__(self, path=DNC_PATH, reload_interval=DNC_RELOAD_INTERVAL):
+        self.path = path
+        self.reload_interval = reload_interval
+        # (identité du fichier, mmap, numéros, filtre, masque du filtre, hachages, nombre, date de construction)
+        self._table = None
+        self._file_key = None
+        self._checked_at = float("-inf")
+
+    def _refresh(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval:
+            return
+        self._checked_at = now
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            if self._table is not None:
+                logger.warning(f"Liste d'opposition {self.path} supprimée, plus aucun numéro filtré")
+            self._table, self._file_key = None, None
+            return
+        file_key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if file_key == self._file_key:
+            return
+        try:
+            self._table = self._open()
+        except (OSError, ValueError) as e:
+            logger.error(f"Liste d'opposition {self.path} illisible, version précédente conservée: {e}")
+            return
+        self._file_key = file_key
+        logger.info(f"Liste d'opposition chargée: {self._table[6]} numéro(s)")
+
+    def _open(self):
+        with open(self.path, "rb") as dnc_file:
+            # La projection reste valide après la fermeture du fichier et son remplacement
+            mapped = mmap.mmap(dnc_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count, bloom_bits, hashes, built_at = _HEADER.unpack_from(mapped)
+        keys_end = _HEADER_SIZE + 8 * count
+        if magic != _MAGIC or len(mapped) != keys_end + bloom_bits // 8:
+            raise ValueError("format inconnu ou fichier tronqué")
+        view = memoryview(mapped)
+        keys = view[_HEADER_SIZE:keys_end].cast("Q")
+        bloom = view[keys_end:] if bloom_bits else None
+        return mapped, keys, bloom, bloom_bits - 1, hashes, count, built_at
+
+    def blocked(self, phone_number):
+        """
+        Numéro présent sur la liste d'opposition
+
+        Args:
+            phone_number: Numéro E.164 ('+33612345678') ou entier (chiffres après le '+')
+        """
+        self._refresh()
+        table = self._table
+        if table is None:
+            return False
+        number = _to_number(phone_number)
+        if number is None:
+            return False
+        _, keys, bloom, mask, hashes, count, _ = table
+        if bloom is not None:
+            z = _mix(number)
+            h1, h2 = z & _MASK32, (z >> 32) | 1
+            for i in range(hashes):
+                bit = (h1 + i * h2) & mask
+                if not bloom[bit >> 3] & (1 << (bit & 7)):
+                    return False
+        index = bisect_left(keys, number)
+        return index < count and keys[index] == number
+
+    __contains__ = blocked
+
+    def stats(self):
+        self._refresh()
+        if self._table is None:
+            return {"path": self.path, "loaded": False, "numbers": 0}
+        mapped, _, _, mask, hashes, count, built_at = self._table
+        return {
+            "path": self.path,
+            "loaded": True,
+            "numbers": count,
+            "bloom_bits": mask + 1 if hashes else 0,
+            "hashes": hashes,
+            "bytes": len(mapped),
+            "built_at": built_at,
+        }
+
+def source_files(sources=DNC_SOURCES):
+    """Fichiers sources : chemins séparés par des virgules, un dossier désigne tous ses fichiers"""
+    files = []
+    for source in (part.strip() for part in sources.split(",")):
+        if not source:
+            continue
+        if os.path.isdir(source):
+            files.extend(os.path.join(source, name) for name in sorted(os.listdir(source))
+                         if not name.startswith(".") and os.path.isfile(os.path.join(source, name)))
+        else:
+            files.append(source)
+    return files
+
+def _read_numbers(path, counts):
+    """Numéros d'un fichier source (lignes vides et commentaires '#' ignorés)"""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8", errors="replace") as source:
+        for line in source:
+            value = line.split(",", 1)[0].split(";", 1)[0].strip().strip('"')
+            if not value or value.startswith("#"):
+                continue
+            number = parse_e164(value)
+            if number is None:
+                counts["invalid"] += 1
+                continue
+            counts["valid"] += 1
+            yield number
+
+def _write_run(numbers, directory):
+    run = tempfile.TemporaryFile(dir=directory)
+    array("Q", sorted(numbers)).tofile(run)
+    run.seek(0)
+    return run
+
+def _iter_run(run):
+    while True:
+        block = array("Q")
+        try:
+            block.fromfile(run, _BLOCK)
+        except EOFError:
+            # Dernier bloc incomplet : les numéros lus sont tout de même dans le tableau
+            yield from block
+            return
+        yield from block
+
+def build_dnc(sources=DNC_SOURCES, path=DNC_PATH, bloom_bits=DNC_BLOOM_BITS, run_size=DNC_BUILD_RUN_SIZE):
+    """
+    Compiler la liste d'opposition à partir des fichiers sources et remplacer le fichier atomiquement
+
+    Les numéros sont triés par tranches de run_size (fichiers temporaires) puis fusionnés :
+    la mémoire utilisée ne dépend pas de la taille de la liste, hors filtre de Bloom.
+
+    Args:
+        sources: Fichiers ou dossiers sources, séparés par des virgules
+        path: Fichier compilé
+        bloom_bits: Bits du filtre de Bloom par numéro (0 pour ne pas en construire)
+        run_size: Numéros triés en mémoire par tranche
+
+    Returns:
+        Compte rendu (fichiers, numéros valides, invalides, distincts, taille)
+    """
+    start = time.perf_counter()
+    files = source_files(sources)
+    if not files:
+        # Ne pas remplacer la liste en service par une liste vide
+        raise FileNotFoundError(f"Aucun fichier source dans {sources}")
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    counts = {"valid": 0, "invalid": 0}
+
+    runs, chunk = [], array("Q")
+    for source in files:
+        for number in _read_numbers(source, counts):
+            chunk.append(number)
+            if len(chunk) >= run_size:
+                runs.append(_write_run(chunk, directory))
+                chunk = array("Q")
+    if chunk:
+        runs.append(_write_run(chunk, directory))
+    del chunk
+
+    # Taille du filtre : puissance de 2 (masque au lieu d'un modulo), d'après le nombre de numéros avec doublons
+    size, hashes = 0, 0
+    if bloom_bits > 0 and counts["valid"]:
+        size = min(1 << 32, max(64, 1 << math.ceil(math.log2(bloom_bits * counts["valid"]))))
+        # Nombre de hachages optimal pour bloom_bits (la taille arrondie ne fait que baisser les faux positifs)
+        hashes = max(1, min(16, round(bloom_bits * math.log(2))))
+    bloom = bytearray(size // 8)
+    mask = size - 1
+
+    tmp_path = f"{path}.tmp"
+    count = 0
+    with open(tmp_path, "wb") as out:
+        out.write(bytes(_HEADER_SIZE))
+        block, last = array("Q"), None
+        for number in heapq.merge(*(_iter_run(run) for run in runs)):
+            if number == last:
+                continue
+            last = number
+            block.append(number)
+            if hashes:
+                z = _mix(number)
+                h1, h2 = z & _MASK32, (z >> 32) | 1
+                for i in range(hashes):
+                    bit = (h1 + i * h2) & mask
+                    bloom[bit >> 3] |= 1 << (bit & 7)
+            if len(block) >= _BLOCK:
+                count += len(block)
+                block.tofile(out)
+                block = array("Q")
+        count += len(block)
+        block.tofile(out)
+        out.write(bloom)
+        out.seek(0)
+        out.write(_HEADER.pack(_MAGIC, count, size, hashes, time.time()))
+        out.flush()
+        os.fsync(out.fileno())
+    for run in runs:
+        run.close()
+    # Les workers gardent l'ancienne version projetée jusqu'à leur prochaine vérification
+    os.replace(tmp_path, path)
+
+    elapsed = time.perf_counter() - start
+    logger.info(f"Liste d'opposition compilée: {count} numéro(s) depuis {len(files)} fichier(s) en {elapsed:.1f} s")
+    return {
+        "files": len(files),
+        "valid": counts["valid"],
+        "invalid": counts["invalid"],
+        "numbers": count,
+        "bloom_bits": size,
+        "hashes": hashes,
+        "bytes": os.path.getsize(path),
+        "elapsed_s": round(elapsed, 1),
+    }
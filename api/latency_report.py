@@ -0,0 +1,115 @@
+import os
+from collections import defaultdict
+
+from sqlite_readonly import connect_readonly
+
+# Histogrammes de latence cumulés par les workers de l'agent (agent/turn_latency.py)
+DATA_DIR = os.getenv("DATA_DIR", os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "data")))
+LATENCY_DB_PATH = os.getenv("LATENCY_DB_PATH", os.path.join(DATA_DIR, "latency.db"))
+
+def _percentile(buckets, count, q):
+    """Borne supérieure de la classe contenant le quantile q (buckets cumulés, triés)"""
+    rank = q * count
+    for le_ms, cumulative in buckets:
+        if cumulative >= rank:
+            return le_ms
+    return None
+
+def _le_label(le_ms):
+    return "+Inf" if le_ms == float("inf") else f"{le_ms:g}"
+
+class LatencyReport:
+    """
+    Consultation en lecture seule des histogrammes de latence par worker et par étape
+    """
+
+    def __init__(self, path=LATENCY_DB_PATH):
+        self.path = path
+
+    def _connect(self):
+        return connect_readonly(self.path)
+
+    def histograms(self, worker_id=None):
+        """
+        Histogrammes cumulés
+
+        Args:
+            worker_id: Limiter à un worker (tous les workers sinon, plus l'agrégat '*')
+
+        Returns:
+            Dictionnaire worker -> étape -> {count, sum_ms, mean_ms, p50_ms, p90_ms, p99_ms, buckets}
+            où buckets est la liste [borne supérieure (ms), effectif cumulé]
+        """
+        if not os.path.exists(self.path):
+            return {}
+
+        where, params = ("WHERE worker_id = ?", (worker_id,)) if worker_id else ("", ())
+        conn = self._connect()
+        try:
+            bucket_rows = conn.execute(
+                f"SELECT worker_id, stage, le_ms, count FROM latency_buckets {where}", params
+            ).fetchall()
+            total_rows = conn.execute(
+                f"SELECT worker_id, stage, count, sum_ms FROM latency_totals {where}", params
+            ).fetchall()
+        finally:
+            conn.close()
+
+        # Bornes des classes lues dans la base (seules les classes non vides y sont écrites), classe ouverte comprise
+        bounds = sorted({le_ms for _, _, le_ms, _ in bucket_rows} | {float("inf")})
+        counts = defaultdict(lambda: defaultdict(lambda: defaultdict(int)))
+        totals = defaultdict(lambda: defaultdict(lambda: [0, 0.0]))
+        for worker, stage, le_ms, count in bucket_rows:
+            for key in ((worker,) if worker_id else (worker, "*")):
+                counts[key][stage][le_ms] += count
+        for worker, stage, count, sum_ms in total_rows:
+            for key in ((worker,) if worker_id else (worker, "*")):
+                totals[key][stage][0] += count
+                totals[key][stage][1] += sum_ms
+
+        report = {}
+        for worker, stages in totals.items():
+            report[worker] = {}
+            for stage, (count, sum_ms) in stages.items():
+                buckets, cumulative = [], 0
+                for le_ms in bounds:
+                    cumulative += counts[worker][stage][le_ms]
+                    buckets.append([le_ms, cumulative])
+                report[worker][stage] = {
+                    "count": count,
+                    "sum_ms": round(sum_ms, 1),
+                    "mean_ms": round(sum_ms / count, 1) if count else None,
+                    "p50_ms": _percentile(buckets, count, 0.5),
+                    "p90_ms": _percentile(buckets, count, 0.9),
+                    "p99_ms": _percentile(buckets, count, 0.99),
+                    "buckets": buckets,
+                }
+        return report
+
+    def to_json(self, worker_id=None):
+        """Histogrammes sérialisables en JSON (la classe ouverte est notée '+Inf')"""
+        report = self.histograms(worker_id)
+        for stages in report.values():
+            for stage in stages.values():
+                stage["buckets"] = [[_le_label(le_ms), cumulative] for le_ms, cumulative in stage["buckets"]]
+                for key in ("p50_ms", "p90_ms", "p99_ms"):
+                    if stage[key] == float("inf"):
+                        stage[key] = "+Inf"
+        return report
+
+    def to_prometheus(self, worker_id=None):
+        """Histogrammes au format d'exposition texte Prometheus"""
+        lines = [
+            "# HELP voice_turn_latency_ms Latence par tour des étapes du pipeline vocal (ms)",
+            "# TYPE voice_turn_latency_ms histogram",
+        ]
+        for worker, stages in sorted(self.histograms(worker_id).items()):
+            if worker == "*":
+                continue
+            for stage, data in sorted(stages.items()):
+                labels = f'worker="{worker}",stage="{stage}"'
+                for le_ms, cumulative in data["buckets"]:
+                    lines.append(f'voice_turn_latency_ms_bucket{{{labels},le="{_le_label(le_ms)}"}} {cumulative}')
+                lines.append(f"voice_turn_latency_ms_sum{{{labels}}} {data['sum_ms']}")
+                lines.append(f"voice_turn_latency_ms_count{{{labels}}} {data['count']}")
+        return "\n".join(lines) + "\n"
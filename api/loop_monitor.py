@@ -0,0 +1,67 @@
+import os
+import sys
+import time
+from collections import deque
+
+# Mesure du retard et détection des blocages partagées avec les appels de l'agent (agent/loop_lag.py)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "agent")))
+
+from loop_lag import LoopLagSampler, read_control, read_reports, write_control
+
+DATA_DIR = os.getenv("DATA_DIR", os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "data")))
+# Rapports des processus de l'API et des appels de l'agent
+LOOP_HEALTH_DIR = os.getenv("LOOP_HEALTH_DIR", os.path.join(DATA_DIR, "loop_health"))
+WORKER_LOAD_DIR = os.getenv("WORKER_LOAD_DIR", os.path.join(DATA_DIR, "worker_load"))
+
+# Les rapports plus anciens viennent de processus arrêtés
+_REPORT_TTL = 5.0
+# Blocages détaillés conservés par boucle
+_MAX_SLOW_CALLBACKS = 20
+
+class LoopMonitor(LoopLagSampler):
+    """
+    Santé d'une boucle d'événements : percentiles du retard et callbacks bloquants
+
+    Le rapport est publié chaque seconde dans LOOP_HEALTH_DIR (lu par /api/loop-health).
+    """
+
+    def __init__(self, name, interval=0.05, window=1.0, history=60.0, report_dir=LOOP_HEALTH_DIR):
+        """
+        Initialisation du suivi
+
+        Args:
+            name: Nom du processus dans les rapports
+            interval: Période de la mesure (secondes)
+            window: Durée d'une fenêtre de publication (secondes)
+            history: Durée couverte par les percentiles (secondes)
+            report_dir: Répertoire des rapports (None pour ne rien publier)
+        """
+        super().__init__(
+            interval, window,
+            path=os.path.join(report_dir, f"{name}.json") if report_dir else None,
+            samples=deque(maxlen=int(history / interval)),
+            max_slow_callbacks=_MAX_SLOW_CALLBACKS,
+        )
+        self.name = name
+
+    def report(self, lag_ms):
+        return {**self.summary(), "lag_ms": round(lag_ms, 1), "at": time.time()}
+
+    def summary(self):
+        return {
+            "p50_ms": round(self.percentile(0.5), 1),
+            "p99_ms": round(self.percentile(0.99), 1),
+            "max_ms": round(max(self.samples, default=0.0), 1),
+            "slow_callbacks": self.detector.count,
+            "recent_slow_callbacks": self.detector.recent(5),
+        }
+
+def read_loop_health():
+    """Derniers rapports des boucles de l'API et des appels en cours de l'agent"""
+    enabled, threshold_ms = read_control()
+    return {
+        "slow_callbacks": enabled,
+        "threshold_ms": threshold_ms,
+        "api": read_reports(LOOP_HEALTH_DIR, _REPORT_TTL),
+        "calls": read_reports(WORKER_LOAD_DIR, _REPORT_TTL),
+    }
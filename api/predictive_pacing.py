@@ -0,0 +1,327 @@
+import os
+import json
+import time
+import logging
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.getenv("DATA_DIR", os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "data")))
+# Taux d'abandon visé : part des appels décrochés qui ne trouvent pas de place de conversation libre
+PACING_ABANDON_RATE = float(os.getenv("PACING_ABANDON_RATE", "0.03"))
+# Demi-vie des statistiques du trunk entier (secondes) : les issues anciennes pèsent deux fois moins après cette durée
+PACING_HALF_LIFE = float(os.getenv("PACING_HALF_LIFE", "3600"))
+# Demi-vie des statistiques par heure de la journée (jours) : une heure n'est observée qu'une fois par jour
+PACING_HOUR_HALF_LIFE_DAYS = float(os.getenv("PACING_HOUR_HALF_LIFE_DAYS", "7"))
+# Durée maximale de sonnerie, délai de dispatch compris (au-delà, un appel sans CDR est en conversation)
+PACING_RING_TIMEOUT = float(os.getenv("PACING_RING_TIMEOUT", "40"))
+# Valeurs de départ, pesant autant que PACING_PRIOR_WEIGHT appels, tant que les issues observées manquent
+PACING_PRIOR_ANSWER_RATE = float(os.getenv("PACING_PRIOR_ANSWER_RATE", "0.3"))
+PACING_PRIOR_WEIGHT = float(os.getenv("PACING_PRIOR_WEIGHT", "20"))
+PACING_TIMEZONE = os.getenv("PACING_TIMEZONE", os.getenv("CALLBACK_TIMEZONE", "Europe/Paris"))
+PACING_STATS_PATH = os.getenv("PACING_STATS_PATH", os.path.join(DATA_DIR, "pacing_stats.json"))
+# Intervalle minimal entre deux calculs complets du budget d'un trunk (secondes, calcul en O(n²) sur la boucle)
+PACING_RECOMPUTE_INTERVAL = float(os.getenv("PACING_RECOMPUTE_INTERVAL", "1"))
+
+# Appels en plus de la capacité au-delà desquels on ne cherche plus (taux de décroché très faible)
+_MAX_OVERDIAL = 4
+
+class RollingRate:
+    """
+    Taux de décroché, répartition du temps de décroché et de la durée des sonneries sans réponse,
+    avec oubli exponentiel (mise à jour en O(1))
+    """
+
+    __slots__ = ("calls", "answered", "tta", "ring", "updated_at")
+
+    def __init__(self, bins, calls=0.0, answered=0.0, tta=None, ring=None, updated_at=0.0):
+        self.calls = calls
+        self.answered = answered
+        # Décrochés par seconde de sonnerie
+        self.tta = tta or [0.0] * bins
+        # Appels sans réponse par durée de la tentative (occupé, messagerie refusée, fin de sonnerie)
+        self.ring = ring or [0.0] * bins
+        self.updated_at = updated_at
+
+    def decay(self, at, half_life):
+        """Facteur d'oubli des effectifs entre la dernière mise à jour et `at`"""
+        if not self.updated_at or at <= self.updated_at:
+            return 1.0
+        return 0.5 ** ((at - self.updated_at) / half_life)
+
+    def observe(self, at, answered, duration, half_life):
+        if at > self.updated_at:
+            decay = self.decay(at, half_life)
+            if decay < 1.0:
+                self.calls *= decay
+                self.answered *= decay
+                self.tta = [count * decay for count in self.tta]
+                self.ring = [count * decay for count in self.ring]
+            self.updated_at = at
+        self.calls += 1
+        if answered:
+            self.answered += 1
+        if duration is not None:
+            histogram = self.tta if answered else self.ring
+            histogram[min(len(histogram) - 1, max(0, int(duration)))] += 1
+
+    def to_dict(self):
+        return {"calls": self.calls, "answered": self.answered, "tta": self.tta, "ring": self.ring,
+                "updated_at": self.updated_at}
+
+class AnswerStats:
+    """
+    Statistiques de décroché par trunk et par heure de la journée, tenues à jour à chaque CDR
+
+    Une heure peu observée emprunte au trunk entier, lui-même aux valeurs de départ.
+    """
+
+    def __init__(self, half_life=PACING_HALF_LIFE, hour_half_life=PACING_HOUR_HALF_LIFE_DAYS * 86400,
+                 ring_timeout=PACING_RING_TIMEOUT,
+                 prior_rate=PACING_PRIOR_ANSWER_RATE, prior_weight=PACING_PRIOR_WEIGHT,
+                 timezone=PACING_TIMEZONE, path=PACING_STATS_PATH):
+        """
+        Initialisation des statistiques
+
+        Args:
+            half_life: Demi-vie de l'oubli du trunk entier (secondes)
+            hour_half_life: Demi-vie de l'oubli des heures de la journée (secondes)
+            ring_timeout: Durée maximale de sonnerie (taille de l'histogramme, secondes)
+            prior_rate: Taux de décroché de départ
+            prior_weight: Poids des valeurs de départ et du trunk entier, en appels
+            timezone: Fuseau des heures de la journée
+            path: Fichier de sauvegarde (None pour ne pas sauvegarder)
+        """
+        self.half_life = half_life
+        self.hour_half_life = hour_half_life
+        self.bins = max(1, int(ring_timeout))
+        self.prior_rate = prior_rate
+        self.prior_weight = prior_weight
+        self.tz = ZoneInfo(timezone)
+        self.path = path
+        # (trunk, heure) ; heure None pour le trunk entier
+        self.rates = {}
+        # Décroché de départ étalé sur la première moitié de la sonnerie, fins sans réponse sur toute la sonnerie
+        half = max(1, self.bins // 2)
+        self._prior_tta = [1.0 / half if i < half else 0.0 for i in range(self.bins)]
+        self._prior_ring = [1.0 / self.bins] * self.bins
+
+    def hour(self, at):
+        return datetime.fromtimestamp(at, self.tz).hour
+
+    def _rate(self, trunk_id, hour):
+        key = (trunk_id, hour)
+        rate = self.rates.get(key)
+        if rate is None:
+            rate = self.rates[key] = RollingRate(self.bins)
+        return rate
+
+    def observe(self, trunk_id, at, answered, duration=None):
+        """
+        Ajouter l'issue d'un appel
+
+        Args:
+            trunk_id: Trunk de l'appel
+            at: Début de la numérotation (timestamp UNIX)
+            answered: Appel décroché
+            duration: Temps de décroché, ou durée de la tentative sans réponse (secondes)
+        """
+        for hour in (None, self.hour(at)):
+            self._rate(trunk_id, hour).observe(at, answered, duration, self._half_life(hour))
+
+    def _half_life(self, hour):
+        return self.half_life if hour is None else self.hour_half_life
+
+    def observe_record(self, record):
+        """Ajouter l'issue d'un CDR (les appels sans numérotation sont ignorés)"""
+        if not record.get("trunk_id") or not record.get("dial_at"):
+            return
+        answered = record["outcome"] == "answered"
+        ended_at = record.get("answered_at") if answered else record.get("hangup_at")
+        duration = ended_at - record["dial_at"] if ended_at else None
+        self.observe(record["trunk_id"], record["dial_at"], answered, duration)
+
+    def _blend(self, trunk_id, at):
+        """(taux de décroché, histogrammes normalisés du décroché et des fins sans réponse) pour l'heure de `at`"""
+        rate, tta, ring = self.prior_rate, self._prior_tta, self._prior_ring
+        for hour in (None, self.hour(at)):
+            observed = self.rates.get((trunk_id, hour))
+            if observed is None or observed.calls <= 0:
+                continue
+            # Effectifs oubliés jusqu'à `at` : une heure sans observation récente pèse moins que ses valeurs générales
+            decay = observed.decay(at, self._half_life(hour))
+            # Moyenne pondérée par le nombre d'appels observés, la valeur plus générale pesant prior_weight
+            rate = (observed.answered * decay + self.prior_weight * rate) / (observed.calls * decay + self.prior_weight)
+            tta = _shrink(observed.tta, tta, self.prior_weight, decay)
+            ring = _shrink(observed.ring, ring, self.prior_weight, decay)
+        return rate, tta, ring
+
+    def answer_rate(self, trunk_id, at=None):
+        return self._blend(trunk_id, at or time.time())[0]
+
+    def estimate(self, trunk_id, at=None):
+        """
+        Taux de décroché et fonctions de répartition
+
+        Returns:
+            (taux, F, G) où F[s] est la part des décrochés survenus avant s+1 secondes de sonnerie
+            et G[s] la part des appels sans réponse terminés avant s+1 secondes
+        """
+        rate, tta, ring = self._blend(trunk_id, at or time.time())
+        return rate, _cumulate(tta), _cumulate(ring)
+
+    def summary(self, trunk_id=None):
+        """Taux de décroché et temps de décroché médian par trunk et par heure"""
+        summary = {}
+        for (trunk, hour), rate in self.rates.items():
+            if trunk_id and trunk != trunk_id:
+                continue
+            median = None
+            if rate.answered > 0:
+                total, half = 0.0, sum(rate.tta) / 2
+                for second, count in enumerate(rate.tta):
+                    total += count
+                    if total >= half:
+                        median = second
+                        break
+            summary.setdefault(trunk, {})["all" if hour is None else str(hour)] = {
+                "calls": round(rate.calls, 1),
+                "answer_rate": round(rate.answered / rate.calls, 3) if rate.calls else None,
+                "median_tta_s": median,
+            }
+        return summary
+
+    def save(self):
+        if self.path is None:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        data = {
+            "at": time.time(),
+            "rates": [[trunk, hour, rate.to_dict()] for (trunk, hour), rate in self.rates.items()],
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as stats_file:
+            json.dump(data, stats_file)
+        os.replace(tmp_path, self.path)
+
+    def load(self):
+        """Reprendre les statistiques sauvegardées (si l'histogramme a la même taille)"""
+        if self.path is None:
+            return self
+        try:
+            with open(self.path) as stats_file:
+                data = json.load(stats_file)
+        except (OSError, ValueError):
+            return self
+        for trunk, hour, rate in data.get("rates", []):
+            if len(rate["tta"]) == self.bins:
+                self.rates[(trunk, hour)] = RollingRate(self.bins, **rate)
+        return self
+
+def _shrink(counts, prior, weight, scale=1.0):
+    """Histogramme normalisé des effectifs (multipliés par `scale`), les valeurs générales pesant `weight` observations"""
+    total = sum(counts) * scale
+    return [(count * scale + weight * share) / (total + weight) for count, share in zip(counts, prior)]
+
+def _cumulate(shares):
+    cdf, total = [], 0.0
+    for share in shares:
+        total += share
+        cdf.append(min(1.0, total))
+    return cdf
+
+def poisson_binomial(probabilities):
+    """Loi du nombre de succès d'épreuves indépendantes de probabilités différentes"""
+    pmf = [1.0]
+    for p in probabilities:
+        pmf = add_trial(pmf, p)
+    return pmf
+
+def add_trial(pmf, p):
+    """Loi après une épreuve de plus, de probabilité p"""
+    result = [0.0] * (len(pmf) + 1)
+    for k, mass in enumerate(pmf):
+        result[k] += mass * (1 - p)
+        result[k + 1] += mass * p
+    return result
+
+def expected_overflow(pmf, free):
+    """Décrochés en trop en moyenne quand `free` places de conversation sont libres"""
+    return sum(mass * (k - free) for k, mass in enumerate(pmf) if k > free)
+
+class PredictivePacer:
+    """
+    Nombre d'appels à lancer pour occuper les places de conversation sans dépasser le taux d'abandon visé
+
+    Le scheduler ne sait pas si un appel en cours sonne encore ou a décroché : d'après son âge, il
+    occupe une place avec la probabilité qu'un appel encore en cours à cet âge soit (ou devienne)
+    décroché, les appels sans réponse se terminant selon la durée observée des sonneries. Au-delà
+    de la sonnerie maximale il est en conversation. On ajoute des appels tant que les décrochés
+    en trop attendus restent sous le taux d'abandon visé.
+    """
+
+    def __init__(self, stats, ring_timeout=PACING_RING_TIMEOUT, recompute_interval=PACING_RECOMPUTE_INTERVAL):
+        self.stats = stats
+        self.ring_timeout = ring_timeout
+        self.recompute_interval = recompute_interval
+        # Dernier calcul par trunk : (timestamp, budget)
+        self._budgets = {}
+
+    def dial_budget(self, trunk_id, ages, capacity, abandon_rate=PACING_ABANDON_RATE, now=None):
+        """
+        Appels à lancer maintenant
+
+        Le budget complet est recalculé au plus une fois par recompute_interval ; entre deux calculs,
+        le dernier budget est diminué des appels lancés depuis (les places libérées attendent le calcul suivant).
+
+        Args:
+            trunk_id: Trunk SIP
+            ages: Âge (secondes depuis le dispatch) des appels en cours du trunk
+            capacity: Places de conversation
+            abandon_rate: Taux d'abandon visé
+            now: Timestamp de référence (heure de la journée)
+
+        Returns:
+            Nombre d'appels à lancer (0 si la capacité est occupée ou sur le point de l'être)
+        """
+        now = now or time.time()
+        cached = self._budgets.get(trunk_id)
+        if cached is not None and 0 <= now - cached[0] < self.recompute_interval:
+            computed_at, budget = cached
+            launched = sum(1 for age in ages if age < now - computed_at)
+            return max(0, budget - launched)
+        budget = self._compute(trunk_id, ages, capacity, abandon_rate, now)
+        self._budgets[trunk_id] = (now, budget)
+        return budget
+
+    def _compute(self, trunk_id, ages, capacity, abandon_rate, now):
+        rate, _, ended = self.stats.estimate(trunk_id, now)
+        if rate <= 0:
+            return 0
+        talking, pending = 0, []
+        for age in ages:
+            if age >= self.ring_timeout:
+                talking += 1
+                continue
+            # Un appel décroché reste en cours ; un appel sans réponse encore en cours avec la part 1 - G(âge)
+            ringing = (1 - rate) * (1 - ended[min(len(ended) - 1, int(age))] if age >= 1 else 1.0)
+            pending.append(rate / (rate + ringing))
+        free = capacity - talking
+        if free <= 0:
+            return 0
+
+        pmf = poisson_binomial(pending)
+        expected = sum(pending)
+        budget = 0
+        while budget < capacity * _MAX_OVERDIAL:
+            candidate = add_trial(pmf, rate)
+            if expected_overflow(candidate, free) > abandon_rate * (expected + rate):
+                break
+            pmf, expected, budget = candidate, expected + rate, budget + 1
+        return budget
+
+def read_pacing_stats(path=PACING_STATS_PATH):
+    """Statistiques de décroché sauvegardées par le scheduler"""
+    stats = AnswerStats(path=path).load()
+    return stats.summary()
@@ -0,0 +1,51 @@
+import asyncio
+import time
+
+class TokenBucket:
+    """
+    Limiteur de débit à seau de jetons (ex: appels par seconde autorisés par le trunk)
+    """
+
+    def __init__(self, rate, burst=1):
+        """
+        Initialisation du limiteur
+
+        Args:
+            rate: Nombre de jetons ajoutés par seconde
+            burst: Nombre maximal de jetons accumulés
+        """
+        if rate <= 0:
+            raise ValueError("Le débit doit être strictement positif")
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def try_acquire(self, tokens=1):
+        """
+        Prendre des jetons sans attendre
+
+        Returns:
+            True si les jetons ont été pris
+        """
+        self._refill()
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return True
+        return False
+
+    def delay(self, tokens=1):
+        """Temps d'attente (secondes) avant que des jetons soient disponibles"""
+        self._refill()
+        missing = tokens - self._tokens
+        return max(0.0, missing / self.rate)
+
+    async def acquire(self, tokens=1):
+        """Attendre puis prendre des jetons (un seul réveil par jeton manquant)"""
+        while not self.try_acquire(tokens):
+            await asyncio.sleep(self.delay(tokens))
@@ -0,0 +1,215 @@
+import os
+import json
+import time
+import random
+import logging
+
+from call_queue import CallQueueStore
+from call_history import CallHistory
+
+logger = logging.getLogger(__name__)
+
+# Rappel automatique des appels en échec, d'après l'issue SIP enregistrée dans le CDR
+REDIAL_ENABLED = os.getenv("REDIAL_ENABLED", "1").lower() in ("1", "true", "yes")
+# Rappel aussi des appels lancés hors file (/api/call, rappels programmés) : nouvel appel en file
+REDIAL_DIRECT_CALLS = os.getenv("REDIAL_DIRECT_CALLS", "1").lower() in ("1", "true", "yes")
+# Part aléatoire du délai (0.2 : +/- 20 %), pour ne pas rappeler une rafale d'échecs au même instant
+REDIAL_JITTER = float(os.getenv("REDIAL_JITTER", "0.2"))
+# Échecs consécutifs comptés sur cette période (secondes) ; un appel décroché remet le compte à zéro
+REDIAL_HISTORY_WINDOW = float(os.getenv("REDIAL_HISTORY_WINDOW", str(7 * 86400)))
+REDIAL_BATCH_SIZE = int(os.getenv("REDIAL_BATCH_SIZE", "1000"))
+
+# Issues SIP écrites par l'agent (agent/outbound_caller.py)
+SIP_ANSWERED = "answered"
+SIP_BUSY = "busy"
+SIP_NO_ANSWER = "no_answer"
+SIP_REJECTED = "rejected"
+SIP_INVALID_NUMBER = "invalid_number"
+SIP_NETWORK_ERROR = "network_error"
+SIP_FAILED = "failed"
+
+# Délai avant la première relance (secondes), facteur entre deux relances et nombre maximal de tentatives
+# (appel initial compris). Un numéro invalide ou un appel refusé n'est jamais rappelé.
+DEFAULT_REDIAL_POLICY = {
+    SIP_BUSY: {"delay": 300, "factor": 2, "max_attempts": 4},
+    SIP_NO_ANSWER: {"delay": 1800, "factor": 2, "max_attempts": 3},
+    SIP_NETWORK_ERROR: {"delay": 60, "factor": 3, "max_attempts": 5},
+    SIP_FAILED: {"delay": 600, "factor": 2, "max_attempts": 2},
+}
+# Réglages par issue fusionnés avec les valeurs par défaut, ex: {"busy": {"delay": 120}, "failed": null}
+REDIAL_POLICY = json.loads(os.getenv("REDIAL_POLICY", "{}") or "{}")
+
+# Issue du CDR quand l'agent n'a pas enregistré d'issue SIP (appel interrompu, ancienne version)
+_CALL_OUTCOMES = {
+    "answered": SIP_ANSWERED,
+    "not_answered": SIP_NO_ANSWER,
+    "invalid": SIP_INVALID_NUMBER,
+    "failed": SIP_FAILED,
+}
+
+_CURSOR = "redial"
+
+def call_outcome(record):
+    """
+    Issue SIP d'un CDR
+
+    Returns:
+        (issue, code SIP ou None)
+    """
+    sip = record["extra"].get("sip")
+    if sip and sip.get("outcome"):
+        return sip["outcome"], sip.get("status_code")
+    return _CALL_OUTCOMES.get(record["outcome"], SIP_FAILED), None
+
+class RedialPolicy:
+    """
+    Délais de rappel par issue : attente exponentielle avec part aléatoire, nombre de tentatives borné
+    """
+
+    def __init__(self, policy=None, jitter=REDIAL_JITTER, rng=None):
+        """
+        Initialisation de la politique
+
+        Args:
+            policy: Réglages par issue (fusionnés avec DEFAULT_REDIAL_POLICY, None pour ne pas rappeler)
+            jitter: Part aléatoire du délai
+            rng: Générateur aléatoire (random par défaut)
+        """
+        self.rules = {outcome: dict(rule) for outcome, rule in DEFAULT_REDIAL_POLICY.items()}
+        for outcome, rule in (REDIAL_POLICY if policy is None else policy).items():
+            if rule is None:
+                self.rules.pop(outcome, None)
+            else:
+                self.rules[outcome] = {**self.rules.get(outcome, {"delay": 600, "factor": 2, "max_attempts": 2}), **rule}
+        self.jitter = jitter
+        self.rng = rng or random
+
+    def max_attempts(self):
+        """Nombre de tentatives à lire dans l'historique pour décider de tous les rappels"""
+        return max((rule["max_attempts"] for rule in self.rules.values()), default=1)
+
+    def retry_at(self, outcome, failures, now=None):
+        """
+        Heure du prochain appel après un échec
+
+        Args:
+            outcome: Issue SIP de la dernière tentative
+            failures: Échecs consécutifs du numéro, dernière tentative comprise
+            now: Timestamp de référence
+
+        Returns:
+            Timestamp UNIX du rappel, ou None s'il ne faut pas rappeler
+        """
+        rule = self.rules.get(outcome)
+        if rule is None or failures >= rule["max_attempts"]:
+            return None
+        delay = rule["delay"] * rule["factor"] ** (failures - 1)
+        delay *= 1 + self.rng.uniform(-self.jitter, self.jitter)
+        return (now or time.time()) + delay
+
+class RedialEngine:
+    """
+    Reprogrammation des appels en échec à partir des CDR, sans occuper de job ni la boucle pendant l'attente
+
+    Les CDR sont lus par lots dans l'ordre d'écriture ; chaque lot (historique des tentatives,
+    appels reprogrammés et position de lecture) est enregistré dans une seule transaction.
+    Le rappel est un appel en file, lancé par CallQueueScheduler à son heure.
+    """
+
+    def __init__(self, store=None, history=None, policy=None, batch_size=REDIAL_BATCH_SIZE,
+                 enabled=REDIAL_ENABLED, direct_calls=REDIAL_DIRECT_CALLS, listeners=None):
+        """
+        Initialisation du moteur
+
+        Args:
+            store: CallQueueStore (file par défaut si None)
+            history: CallHistory des CDR
+            policy: RedialPolicy
+            batch_size: Nombre de CDR traités par transaction
+            enabled: Reprogrammer les échecs (sinon l'historique est seulement tenu à jour)
+            direct_calls: Rappeler aussi les appels lancés hors file
+            listeners: Fonctions appelées avec chaque CDR lu (statistiques de décroché)
+        """
+        self.store = store or CallQueueStore()
+        self.history = history or CallHistory()
+        self.policy = policy or RedialPolicy()
+        self.batch_size = batch_size
+        self.enabled = enabled
+        self.direct_calls = direct_calls
+        self.listeners = list(listeners or [])
+        self.counts = {"records": 0, "rescheduled": 0, "redialed": 0, "abandoned": 0}
+
+    def _failures(self, phone_number, now, batch):
+        """Échecs consécutifs du numéro avant cette tentative (historique, puis lot en cours)"""
+        if phone_number in batch:
+            return batch[phone_number]
+        failures = 0
+        for attempt in self.store.attempts(phone_number, since=now - REDIAL_HISTORY_WINDOW,
+                                           limit=self.policy.max_attempts()):
+            if attempt["outcome"] == SIP_ANSWERED:
+                break
+            failures += 1
+        return failures
+
+    def poll(self, now=None):
+        """
+        Traiter le prochain lot de CDR
+
+        Returns:
+            Nombre de CDR traités
+        """
+        now = now or time.time()
+        records = self.history.since(self.store.get_cursor(_CURSOR), limit=self.batch_size)
+        if not records:
+            return 0
+
+        attempts, finished, rescheduled, new_calls = [], [], [], []
+        # Échecs consécutifs par numéro, mis à jour au fil du lot
+        batch = {}
+        for record in records:
+            for listener in self.listeners:
+                listener(record)
+            phone_number = record["phone_number"]
+            if not phone_number:
+                continue
+            outcome, status_code = call_outcome(record)
+            queue_id = (record["extra"].get("queue") or {}).get("id")
+
+            if outcome == SIP_ANSWERED:
+                failures, retry_at = 0, None
+            else:
+                failures = self._failures(phone_number, now, batch) + 1
+                retry_at = self.policy.retry_at(outcome, failures, now) if self.enabled else None
+            batch[phone_number] = failures
+
+            error = None if outcome == SIP_ANSWERED else record["end_reason"]
+            if queue_id is not None:
+                if retry_at is not None:
+                    rescheduled.append((queue_id, retry_at, outcome, error))
+                else:
+                    finished.append((queue_id, outcome, error))
+            elif retry_at is not None and self.direct_calls and record["trunk_id"]:
+                extra = record["extra"]
+                payload = {key: extra[key] for key in ("campaign", "profile") if extra.get(key)}
+                payload["context"] = {"redial_of": record["room_name"], "outcome": outcome}
+                # La clé d'idempotence évite un second rappel si le lot est rejoué
+                new_calls.append((phone_number, record["trunk_id"], 0, retry_at, None, payload,
+                                  f"redial:{record['room_name']}"))
+            else:
+                retry_at = None
+
+            if retry_at is None and outcome != SIP_ANSWERED:
+                self.counts["abandoned"] += 1
+            attempts.append((
+                phone_number, record["hangup_at"] or record["started_at"], outcome, status_code,
+                record["room_name"], queue_id, retry_at,
+            ))
+
+        self.store.apply_outcomes(_CURSOR, records[-1]["id"], attempts, finished, rescheduled, new_calls)
+        self.counts["records"] += len(records)
+        self.counts["rescheduled"] += len(rescheduled)
+        self.counts["redialed"] += len(new_calls)
+        if rescheduled or new_calls:
+            logger.info(f"{len(rescheduled) + len(new_calls)} appel(s) en échec reprogrammé(s) "
+                        f"sur {len(records)} CDR lus")
+        return len(records)
@@ -3,19 +3,102 @@ import json
 import subprocess
 import sys
 import logging
-from flask import request, jsonify
+from flask import request, jsonify, Response
 from threading import Thread
 import asyncio
 import traceback
 import aiohttp
 import secrets
 
-# Configuration pour fermer proprement les sessions aiohttp
-asyncio.get_event_loop().set_debug(True)
+from dispatch import normalize_phone_number, create_call_dispatch
+from callback_store import CallbackStore, parse_callback_time
+from call_queue import CallQueueStore
+from campaign_upload import ImportJobs, FORMAT_CSV, FORMAT_NDJSON
+from dnc import DncList, DNC_ERROR
+from predictive_pacing import read_pacing_stats
+from call_history import CallHistory
+from transcript_search import TranscriptSearch
+from latency_report import LatencyReport
+from loop_monitor import read_loop_health, write_control
+
+# Mode debug d'asyncio désactivé (coûteux en production) : santé des boucles via loop_monitor,
+# PYTHONASYNCIODEBUG=1 pour le réactiver ponctuellement
 aiohttp.ClientSession.DEFAULT_TIMEOUT = 30
 
 logger = logging.getLogger(__name__)
 
+_callback_store = None
+
+def get_callback_store():
+    """Base des rappels, ouverte une seule fois par worker"""
+    global _callback_store
+    if _callback_store is None:
+        _callback_store = CallbackStore()
+    return _callback_store
+
+_call_queue = None
+
+def get_call_queue():
+    """File d'appels sortants, ouverte une seule fois par worker"""
+    global _call_queue
+    if _call_queue is None:
+        _call_queue = CallQueueStore()
+    return _call_queue
+
+_dnc = None
+
+def get_dnc():
+    """Liste d'opposition projetée en mémoire, partagée par les workers"""
+    global _dnc
+    if _dnc is None:
+        _dnc = DncList()
+    return _dnc
+
+_import_jobs = ImportJobs()
+
+def enqueue_call(phone_number, data):
+    """
+    Mettre un appel en file (lancé par le scheduler au débit du trunk)
+
+    Args:
+        phone_number: Numéro normalisé
+        data: Corps de la requête (trunk_id, priority, not_before, not_after, campaign, profile, context, dedupe_key)
+
+    Returns:
+        Réponse JSON et code HTTP
+    """
+    trunk_id = data.get("trunk_id") or os.getenv('OUTBOUND_TRUNK_ID')
+    if not trunk_id:
+        return jsonify({
+            "success": False,
+            "error": "Aucun trunk SIP configuré. Utilisez /api/trunk/setup/direct d'abord."
+        }), 400
+
+    try:
+        priority = int(data.get("priority", 0))
+        not_before = float(data["not_before"]) if data.get("not_before") is not None else None
+        not_after = float(data["not_after"]) if data.get("not_after") is not None else None
+    except (TypeError, ValueError) as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    if not_before and not_after and not_after <= not_before:
+        return jsonify({"success": False, "error": "La fenêtre d'appel se ferme avant de s'ouvrir"}), 400
+
+    payload = {key: data[key] for key in ("campaign", "profile", "context") if data.get(key)}
+    call_id, created = get_call_queue().enqueue(
+        phone_number, trunk_id, priority=priority, not_before=not_before, not_after=not_after,
+        payload=payload, dedupe_key=data.get("dedupe_key"),
+    )
+    if created:
+        logger.info(f"Appel {call_id} mis en file pour {phone_number} (trunk {trunk_id}, priorité {priority})")
+
+    return jsonify({
+        "success": True,
+        "queued": True,
+        "callId": call_id,
+        "created": created,
+        "phoneNumber": phone_number
+    }), 200
+
 def register_routes(app):
     @app.route("/health", methods=["GET"])
     def health_check():
@@ -376,17 +459,21 @@ def register_routes(app):
         if not data or "phone" not in data:
             return jsonify({"error": "Numéro de téléphone manquant"}), 400
         
-        phone_number = data["phone"]
-        
         # Vérifier et normaliser le format du numéro
-        if not phone_number.startswith('+'):
-            phone_number = f"+{phone_number}"
-        
-        # Supprimer les caractères spéciaux comme tirets ou espaces
-        phone_number = ''.join(c for c in phone_number if c.isdigit() or c == '+')
+        phone_number = normalize_phone_number(data["phone"])
         logger.info(f"Numéro formaté pour l'appel API: {phone_number}")
+        if get_dnc().blocked(phone_number):
+            logger.warning(f"Appel vers {phone_number} refusé: numéro sur liste d'opposition")
+            return jsonify({"success": False, "error": DNC_ERROR, "phoneNumber": phone_number}), 403
         
+        # Option "queue" : appel mis en file et lancé au débit du trunk par le scheduler
+        if data.get("queue"):
+            return enqueue_call(phone_number, data)
+
         verbose = data.get("verbose", False)  # Option pour avoir plus de détails
+        # Campagne de l'appel (reprise dans le CDR pour les rapports par campagne)
+        # et profil d'agent (prompt, accueil, voix, modèles et outils)
+        extra_metadata = {key: data[key] for key in ("campaign", "profile") if data.get(key)}
         
         try:
             from livekit import api
@@ -418,19 +505,11 @@ def register_routes(app):
                     logger.info(f"Room: {unique_room_name}")
                     
                     # Création du dispatch
-                    dispatch_request = api.CreateAgentDispatchRequest(
-                        agent_name="outbound-caller",
-                        room=unique_room_name,
-                        metadata=json.dumps({
-                            "phone_number": phone_number,
-                            "trunk_id": trunk_id
-                        })
+                    dispatch = await create_call_dispatch(
+                        livekit_api, phone_number, trunk_id, room_name=unique_room_name,
+                        extra_metadata=extra_metadata or None
                     )
                     
-                    logger.info(f"Envoi de la requête de dispatch: {dispatch_request}")
-                    dispatch = await livekit_api.agent_dispatch.create_dispatch(dispatch_request)
-                    logger.info(f"Dispatch créé: {dispatch}")
-                    
                     # Attendre brièvement pour vérifier si la room est créée
                     await asyncio.sleep(1)
                     rooms_check = await livekit_api.room.list_rooms(api.ListRoomsRequest(names=[unique_room_name]))
@@ -643,6 +722,8 @@ def register_routes(app):
             # Supprimer les caractères spéciaux comme tirets ou espaces
             phone_number = ''.join(c for c in phone_number if c.isdigit() or c == '+')
             logger.info(f"Numéro formaté pour l'appel SIP direct: {phone_number}")
+            if get_dnc().blocked(phone_number):
+                return jsonify({"success": False, "error": DNC_ERROR, "phoneNumber": phone_number}), 403
             
             async def make_direct_call():
                 livekit_api = None
@@ -716,6 +797,8 @@ def register_routes(app):
             # Supprimer les caractères spéciaux comme tirets ou espaces
             phone_number = ''.join(c for c in phone_number if c.isdigit() or c == '+')
             logger.info(f"Numéro formaté pour le test direct: {phone_number}")
+            if get_dnc().blocked(phone_number):
+                return jsonify({"success": False, "error": DNC_ERROR, "phoneNumber": phone_number}), 403
             
             # Importation depuis le module (assurez-vous que scripts/test_direct_sip_call.py existe)
             from livekit import api
@@ -959,3 +1042,248 @@ def register_routes(app):
                 "error": str(e),
                 "traceback": traceback.format_exc()
             }), 500
+
+    @app.route("/api/callbacks", methods=["POST"])
+    def schedule_callback():
+        """Programmer un rappel (lancé par le scheduler via le même dispatch que /api/call)"""
+        data = request.json
+        if not data or "phone" not in data:
+            return jsonify({"error": "Numéro de téléphone manquant"}), 400
+
+        phone_number = normalize_phone_number(data["phone"])
+        if get_dnc().blocked(phone_number):
+            return jsonify({"success": False, "error": DNC_ERROR, "phoneNumber": phone_number}), 403
+
+        try:
+            if data.get("due_at") is not None:
+                due_at = float(data["due_at"])
+            else:
+                due_at = parse_callback_time(data.get("date"), data.get("time"))
+        except (TypeError, ValueError) as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+
+        callback_id = get_callback_store().add(
+            phone_number,
+            due_at,
+            trunk_id=data.get("trunk_id"),
+            payload=data.get("context"),
+        )
+        logger.info(f"Rappel {callback_id} programmé pour {phone_number} à {due_at}")
+
+        return jsonify({
+            "success": True,
+            "callbackId": callback_id,
+            "phoneNumber": phone_number,
+            "dueAt": due_at
+        })
+
+    @app.route("/api/callbacks/<int:callback_id>", methods=["DELETE"])
+    def cancel_callback(callback_id):
+        """Annuler un rappel encore en attente"""
+        if not get_callback_store().cancel(callback_id):
+            return jsonify({"success": False, "error": "Rappel introuvable ou déjà lancé"}), 404
+        return jsonify({"success": True, "callbackId": callback_id})
+
+    @app.route("/api/callbacks/stats", methods=["GET"])
+    def callback_stats():
+        """Nombre de rappels par statut et prochaine échéance"""
+        return jsonify({"success": True, **get_callback_store().stats()})
+
+    @app.route("/api/queue", methods=["POST"])
+    def queue_call():
+        """Mettre un appel en file, avec priorité et fenêtre d'appel (lancé par le scheduler)"""
+        data = request.json
+        if not data or "phone" not in data:
+            return jsonify({"error": "Numéro de téléphone manquant"}), 400
+        phone_number = normalize_phone_number(data["phone"])
+        if get_dnc().blocked(phone_number):
+            return jsonify({"success": False, "error": DNC_ERROR, "phoneNumber": phone_number}), 403
+        return enqueue_call(phone_number, data)
+
+    @app.route("/api/queue/upload", methods=["POST"])
+    def upload_campaign():
+        """
+        Mettre en file une liste de contacts CSV ou NDJSON envoyée comme corps de la requête
+
+        Le fichier est reçu sur disque puis importé en tâche de fond (lu en flux) : la réponse (202) donne
+        l'ID de l'import, dont le compte rendu se consulte avec GET /api/queue/upload/<job_id>.
+
+        Paramètres : trunk_id, campaign, profile, priority, not_before, not_after, format (csv ou ndjson,
+        déduit du Content-Type par défaut). Corps compressé accepté avec Content-Encoding: gzip.
+        """
+        args = request.args
+        trunk_id = args.get("trunk_id") or os.getenv('OUTBOUND_TRUNK_ID')
+        if not trunk_id:
+            return jsonify({
+                "success": False,
+                "error": "Aucun trunk SIP configuré. Utilisez /api/trunk/setup/direct d'abord."
+            }), 400
+        fmt = args.get("format") or (FORMAT_NDJSON if "json" in (request.mimetype or "") else FORMAT_CSV)
+        if fmt not in (FORMAT_CSV, FORMAT_NDJSON):
+            return jsonify({"success": False, "error": f"Format inconnu: {fmt}"}), 400
+        try:
+            priority = int(args.get("priority", 0))
+            not_before = float(args["not_before"]) if args.get("not_before") else None
+            not_after = float(args["not_after"]) if args.get("not_after") else None
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+
+        try:
+            job_id = _import_jobs.start(
+                request.stream, get_call_queue(), trunk_id,
+                compressed=request.headers.get("Content-Encoding") == "gzip", fmt=fmt,
+                campaign=args.get("campaign"), profile=args.get("profile"), priority=priority,
+                not_before=not_before, not_after=not_after, dnc=get_dnc(),
+            )
+        except OSError as e:
+            logger.error(f"Réception du fichier de campagne interrompue: {e}")
+            return jsonify({"success": False, "error": str(e)}), 400
+        return jsonify({"success": True, "jobId": job_id, "status": "running"}), 202
+
+    @app.route("/api/queue/upload/<job_id>", methods=["GET"])
+    def upload_campaign_status(job_id):
+        """Avancement et compte rendu d'un import de campagne"""
+        job = _import_jobs.get(job_id)
+        if job is None:
+            return jsonify({"success": False, "error": "Import introuvable"}), 404
+        return jsonify({"success": job["status"] != "failed", **job})
+
+    @app.route("/api/queue/<int:call_id>", methods=["DELETE"])
+    def cancel_queued_call(call_id):
+        """Retirer de la file un appel pas encore lancé"""
+        if not get_call_queue().cancel(call_id):
+            return jsonify({"success": False, "error": "Appel introuvable ou déjà lancé"}), 404
+        return jsonify({"success": True, "callId": call_id})
+
+    @app.route("/api/queue/stats", methods=["GET"])
+    def queue_stats():
+        """Nombre d'appels en file par statut et appels en cours par trunk"""
+        return jsonify({"success": True, **get_call_queue().stats()})
+
+    @app.route("/api/queue/pacing", methods=["GET"])
+    def queue_pacing():
+        """Taux de décroché et temps de décroché médian par trunk et par heure (mode prédictif)"""
+        return jsonify({"success": True, "trunks": read_pacing_stats()})
+
+    @app.route("/api/dnc", methods=["GET"])
+    def dnc_stats():
+        """Liste d'opposition en service : nombre de numéros, filtre de Bloom, date de construction"""
+        return jsonify({"success": True, **get_dnc().stats()})
+
+    @app.route("/api/dnc/<phone_number>", methods=["GET"])
+    def dnc_check(phone_number):
+        """Savoir si un numéro est sur la liste d'opposition"""
+        phone_number = normalize_phone_number(phone_number)
+        return jsonify({"success": True, "phoneNumber": phone_number, "blocked": get_dnc().blocked(phone_number)})
+
+    @app.route("/api/redial/history/<phone_number>", methods=["GET"])
+    def redial_history(phone_number):
+        """Tentatives d'appel d'un numéro (issue SIP, rappel prévu), de la plus récente à la plus ancienne"""
+        phone_number = normalize_phone_number(phone_number)
+        limit = min(request.args.get("limit", 50, type=int), 500)
+        attempts = [dict(row) for row in get_call_queue().attempts(phone_number, limit=limit)]
+        return jsonify({"success": True, "phoneNumber": phone_number, "attempts": attempts})
+
+    @app.route("/api/calls", methods=["GET"])
+    def list_call_records():
+        """Consulter les CDR par room, numéro et période (timestamps UNIX)"""
+        try:
+            phone_number = request.args.get("phone")
+            records = CallHistory().find(
+                room_name=request.args.get("room"),
+                phone_number=normalize_phone_number(phone_number) if phone_number else None,
+                since=request.args.get("since", type=float),
+                until=request.args.get("until", type=float),
+                limit=min(request.args.get("limit", 100, type=int), 1000),
+                offset=request.args.get("offset", 0, type=int),
+            )
+            return jsonify({"success": True, "count": len(records), "calls": records})
+        except Exception as e:
+            logger.exception("Erreur lors de la consultation des CDR")
+            return jsonify({
+                "success": False,
+                "error": str(e),
+                "traceback": traceback.format_exc()
+            }), 500
+
+    @app.route("/api/transcripts/search", methods=["GET"])
+    def search_transcripts():
+        """Recherche plein texte dans les transcriptions (pagination par curseur 'before')"""
+        try:
+            query = request.args.get("q", "")
+            room_name = request.args.get("room")
+            phone_number = request.args.get("phone")
+            if not query and not room_name and not phone_number:
+                return jsonify({"success": False, "error": "Paramètre 'q', 'room' ou 'phone' requis"}), 400
+
+            page = TranscriptSearch().search(
+                query,
+                room_name=room_name,
+                phone_number=normalize_phone_number(phone_number) if phone_number else None,
+                limit=min(request.args.get("limit", 50, type=int), 500),
+                before=request.args.get("before", type=int),
+            )
+            return jsonify({"success": True, "count": len(page["turns"]), **page})
+        except Exception as e:
+            logger.exception("Erreur lors de la recherche dans les transcriptions")
+            return jsonify({
+                "success": False,
+                "error": str(e),
+                "traceback": traceback.format_exc()
+            }), 500
+
+    @app.route("/api/transcripts/<room_name>", methods=["GET"])
+    def get_transcript(room_name):
+        """Transcription complète d'un appel"""
+        try:
+            turns = TranscriptSearch().get_transcript(room_name)
+            if not turns:
+                return jsonify({"success": False, "error": f"Aucune transcription pour la room {room_name}"}), 404
+            return jsonify({"success": True, "room_name": room_name, "turns": turns})
+        except Exception as e:
+            logger.exception("Erreur lors de la lecture d'une transcription")
+            return jsonify({
+                "success": False,
+                "error": str(e),
+                "traceback": traceback.format_exc()
+            }), 500
+
+    @app.route("/api/latency", methods=["GET"])
+    def get_turn_latency():
+        """Histogrammes de latence par tour, par worker et par étape (JSON ou format Prometheus)"""
+        try:
+            report = LatencyReport()
+            worker_id = request.args.get("worker")
+            if request.args.get("format") == "prometheus":
+                return Response(report.to_prometheus(worker_id), mimetype="text/plain; version=0.0.4")
+            return jsonify({"success": True, "workers": report.to_json(worker_id)})
+        except Exception as e:
+            logger.exception("Erreur lors de la lecture des histogrammes de latence")
+            return jsonify({
+                "success": False,
+                "error": str(e),
+                "traceback": traceback.format_exc()
+            }), 500
+
+    @app.route("/api/loop-health", methods=["GET"])
+    def get_loop_health():
+        """Retard des boucles d'événements (processus de l'API, appels en cours) et callbacks bloquants"""
+        try:
+            return jsonify({"success": True, **read_loop_health()})
+        except Exception as e:
+            logger.exception("Erreur lors de la lecture de la santé des boucles")
+            return jsonify({
+                "success": False,
+                "error": str(e),
+                "traceback": traceback.format_exc()
+            }), 500
+
+    @app.route("/api/loop-health", methods=["POST"])
+    def set_loop_health():
+        """Activer ou désactiver à chaud la détection des callbacks bloquants, ou changer son seuil (ms)"""
+        data = request.json or {}
+        threshold_ms = data.get("threshold_ms")
+        if threshold_ms is not None and (not isinstance(threshold_ms, (int, float)) or threshold_ms <= 0):
+            return jsonify({"success": False, "error": "threshold_ms doit être un nombre positif"}), 400
+        control = write_control(slow_callbacks=data.get("slow_callbacks"), threshold_ms=threshold_ms)
+        return jsonify({"success": True, **control})
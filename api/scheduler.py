@@ -0,0 +1,38 @@
+import asyncio
+import logging
+from dotenv import load_dotenv
+
+# Chargement des variables d'environnement (avant les modules qui lisent leur configuration)
+load_dotenv()
+
+from callback_scheduler import CallbackScheduler
+from call_queue_scheduler import CallQueueScheduler
+from transfer_server import run_transfer_server
+from loop_monitor import LoopMonitor
+
+# Configuration du logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+async def run_schedulers():
+    """Lancer les tâches de fond de dispatch (un seul processus pour tout le déploiement)"""
+    call_queue_scheduler = CallQueueScheduler()
+    # Rappels lancés au débit et dans les lignes des trunks de la file d'appels
+    callback_scheduler = CallbackScheduler(pacers=call_queue_scheduler.pacers)
+    # Retard de la boucle partagée par les rappels, la file d'appels et la file de transfert (/api/loop-health)
+    loop_monitor = LoopMonitor("scheduler").start()
+    try:
+        await asyncio.gather(
+            callback_scheduler.run(),
+            call_queue_scheduler.run(),
+            run_transfer_server(),
+        )
+    finally:
+        await loop_monitor.aclose()
+
+def main():
+    logger.info("Démarrage du processus de dispatch planifié")
+    asyncio.run(run_schedulers())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+import sqlite3
+
+def connect_readonly(path, rows=False, timeout=10):
+    """
+    Connexion en lecture seule à une base écrite par les workers de l'agent
+
+    Les écritures restent au thread d'écriture des workers (agent/batch_writer.py) : l'API ne fait que
+    lire, sans jamais créer la base ni prendre de verrou d'écriture.
+
+    Args:
+        path: Chemin de la base SQLite
+        rows: Lignes renvoyées en sqlite3.Row (accès par nom de colonne) plutôt qu'en tuples
+        timeout: Attente maximale d'un verrou (secondes)
+    """
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=timeout)
+    if rows:
+        conn.row_factory = sqlite3.Row
+    return conn
@@ -0,0 +1,120 @@
+import os
+import re
+
+from sqlite_readonly import connect_readonly
+
+# Index des transcriptions écrit par les workers de l'agent (agent/transcripts.py)
+DATA_DIR = os.getenv("DATA_DIR", os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "data")))
+TRANSCRIPTS_DB_PATH = os.getenv("TRANSCRIPTS_DB_PATH", os.path.join(DATA_DIR, "transcripts.db"))
+
+_TURN_COLUMNS = "t.id, t.room_name, t.phone_number, t.seq, t.role, t.text, t.ts, t.interrupted"
+
+def _phrase(value):
+    """Phrase FTS5 entre guillemets (les guillemets internes sont doublés)"""
+    return '"' + value.replace('"', '""') + '"'
+
+def build_match(query=None, room_name=None, phone_number=None):
+    """
+    Construire l'expression MATCH FTS5
+
+    Les mots de la requête sont cherchés dans le texte (tous requis, un '*' final active la
+    recherche par préfixe) ; la room et le numéro sont des filtres de colonne résolus par l'index.
+
+    Returns:
+        Expression MATCH, ou None si la requête ne contient aucun mot
+    """
+    clauses = []
+    if query:
+        terms = [
+            _phrase(word) + ("*" if star else "")
+            for word, star in re.findall(r"(\w+)(\*?)", query)
+        ]
+        if not terms:
+            return None
+        clauses.append(f"text : ({' AND '.join(terms)})")
+    if room_name:
+        clauses.append(f"room_name : {_phrase(room_name)}")
+    if phone_number:
+        clauses.append(f"phone_number : {_phrase(phone_number)}")
+    return " AND ".join(clauses)
+
+class TranscriptSearch:
+    """
+    Recherche plein texte en lecture seule dans les transcriptions des appels
+    """
+
+    def __init__(self, path=TRANSCRIPTS_DB_PATH):
+        self.path = path
+
+    def _connect(self):
+        return connect_readonly(self.path, rows=True)
+
+    def search(self, query, room_name=None, phone_number=None, limit=50, before=None):
+        """
+        Rechercher des tours de conversation
+
+        La pagination se fait par curseur (id du dernier résultat) pour rester en temps
+        constant quelle que soit la profondeur de page.
+
+        Args:
+            query: Mots recherchés
+            room_name: Limiter à une room
+            phone_number: Limiter à un numéro
+            limit: Nombre maximal de résultats
+            before: Curseur renvoyé par la page précédente (id exclu)
+
+        Returns:
+            Dictionnaire {"turns": [...], "next": curseur de la page suivante ou None}
+        """
+        match = build_match(query, room_name, phone_number)
+        if not match or not os.path.exists(self.path):
+            return {"turns": [], "next": None}
+
+        params = [match]
+        cursor = ""
+        if before is not None:
+            cursor = "AND transcript_fts.rowid < ?"
+            params.append(before)
+
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                f"""
+                SELECT {_TURN_COLUMNS},
+                       snippet(transcript_fts, 0, '[', ']', '…', 16) AS snippet
+                FROM transcript_fts
+                JOIN transcript_turns t ON t.id = transcript_fts.rowid
+                WHERE transcript_fts MATCH ? {cursor}
+                ORDER BY transcript_fts.rowid DESC
+                LIMIT ?
+                """,
+                (*params, limit)
+            ).fetchall()
+        finally:
+            conn.close()
+
+        turns = [dict(row) for row in rows]
+        return {"turns": turns, "next": turns[-1]["id"] if len(turns) == limit else None}
+
+    def get_transcript(self, room_name):
+        """
+        Transcription complète d'un appel
+
+        Args:
+            room_name: Room de l'appel
+
+        Returns:
+            Liste des tours dans l'ordre de la conversation
+        """
+        if not os.path.exists(self.path):
+            return []
+
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                f"SELECT {_TURN_COLUMNS} FROM transcript_turns t WHERE t.room_name = ? ORDER BY t.seq",
+                (room_name,)
+            ).fetchall()
+        finally:
+            conn.close()
+        return [dict(row) for row in rows]
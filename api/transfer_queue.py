@@ -0,0 +1,340 @@
+import os
+import heapq
+import time
+import logging
+import itertools
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Priorité par catégorie de transfert, exprimée en secondes d'attente "offertes"
+CATEGORY_BOOSTS = {
+    "urgent": 300,
+    "complaint": 180,
+    "sales": 120,
+    "billing": 60,
+    "technical": 30,
+    "other": 0,
+}
+# Bonus maximal (secondes) accordé aux clients à forte valeur (customer_value entre 0 et 1)
+TRANSFER_VALUE_BOOST = float(os.getenv("TRANSFER_VALUE_BOOST", "120"))
+# Durée moyenne de traitement supposée tant qu'aucun transfert n'a été observé
+TRANSFER_DEFAULT_HANDLE_TIME = float(os.getenv("TRANSFER_DEFAULT_HANDLE_TIME", "240"))
+# Durée après laquelle un transfert attribué est oublié si son agent ne s'est pas libéré (secondes)
+TRANSFER_ASSIGNED_TTL = float(os.getenv("TRANSFER_ASSIGNED_TTL", "7200"))
+
+STATUS_WAITING = "waiting"
+STATUS_ASSIGNED = "assigned"
+STATUS_CANCELLED = "cancelled"
+
+AGENT_FREE = "free"
+AGENT_BUSY = "busy"
+AGENT_OFFLINE = "offline"
+
+class TransferTicket:
+    """
+    Appel en attente d'un agent humain
+    """
+
+    __slots__ = (
+        "id", "room_name", "participant_identity", "phone_number", "reason", "category",
+        "customer_value", "enqueued_at", "key", "status", "agent", "assigned_at", "listeners",
+    )
+
+    def __init__(self, ticket_id, room_name, participant_identity, phone_number, reason,
+                 category, customer_value, enqueued_at, key):
+        self.id = ticket_id
+        self.room_name = room_name
+        self.participant_identity = participant_identity
+        self.phone_number = phone_number
+        self.reason = reason
+        self.category = category
+        self.customer_value = customer_value
+        self.enqueued_at = enqueued_at
+        self.key = key
+        self.status = STATUS_WAITING
+        self.agent = None
+        self.assigned_at = None
+        self.listeners = []
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "roomName": self.room_name,
+            "participantIdentity": self.participant_identity,
+            "phoneNumber": self.phone_number,
+            "reason": self.reason,
+            "category": self.category,
+            "customerValue": self.customer_value,
+            "status": self.status,
+            "enqueuedAt": self.enqueued_at,
+            "assignedAt": self.assigned_at,
+            "agent": self.agent.to_dict() if self.agent else None,
+        }
+
+class HumanAgent:
+    """
+    Agent humain pouvant recevoir des transferts
+    """
+
+    __slots__ = ("id", "sip_uri", "status", "ticket", "since", "generation")
+
+    def __init__(self, agent_id, sip_uri, now):
+        self.id = agent_id
+        self.sip_uri = sip_uri
+        self.status = AGENT_OFFLINE
+        self.ticket = None
+        self.since = now
+        # Incrémenté à chaque changement d'état : invalide les entrées périmées des agents libres
+        self.generation = 0
+
+    def to_dict(self):
+        return {"id": self.id, "sipUri": self.sip_uri, "status": self.status}
+
+class TransferQueue:
+    """
+    File de priorité des appels à transférer vers des agents humains
+
+    La priorité combine la catégorie, la valeur client et le temps d'attente. Tous les appels
+    vieillissent à la même vitesse : la clé `enqueued_at - bonus` ne change donc jamais et
+    l'ordre du tas reste valide sans réévaluation. Ajout et retrait sont en O(log n), les
+    annulations sont retirées paresseusement au moment du dépilement.
+    """
+
+    def __init__(self, clock=time.time, frontier_window=50, assigned_ttl=TRANSFER_ASSIGNED_TTL):
+        """
+        Initialisation de la file
+
+        Args:
+            clock: Horloge utilisée (remplaçable pour la simulation)
+            frontier_window: Nombre de transferts servis utilisés pour estimer l'attente
+            assigned_ttl: Durée de conservation d'un transfert attribué (secondes)
+        """
+        self.clock = clock
+        self.assigned_ttl = assigned_ttl
+        # (instant, ticket) des transferts attribués, dans l'ordre d'attribution
+        self._assigned = deque()
+        self._heap = []
+        self._tickets = {}
+        self._agents = {}
+        self._free_agents = deque()
+        self._ids = itertools.count(1)
+        self._waiting = 0
+        self._handle_time = TRANSFER_DEFAULT_HANDLE_TIME
+        # (instant, clé) des derniers transferts servis : vitesse d'avancement du front de service
+        self._served = deque(maxlen=frontier_window)
+        self.assigned_total = 0
+        self.cancelled_total = 0
+
+    def priority_boost(self, category, customer_value):
+        """Bonus de priorité (secondes) d'un appel"""
+        boost = CATEGORY_BOOSTS.get(category, CATEGORY_BOOSTS["other"])
+        return boost + TRANSFER_VALUE_BOOST * min(max(customer_value or 0.0, 0.0), 1.0)
+
+    def enqueue(self, room_name, participant_identity, phone_number=None, reason=None,
+                category="other", customer_value=0.0):
+        """
+        Placer un appel dans la file (ou l'attribuer tout de suite si un agent est libre)
+
+        Returns:
+            TransferTicket créé
+        """
+        now = self.clock()
+        self.expire(now)
+        category = category if category in CATEGORY_BOOSTS else "other"
+        key = now - self.priority_boost(category, customer_value)
+        ticket = TransferTicket(
+            next(self._ids), room_name, participant_identity, phone_number, reason,
+            category, customer_value, now, key,
+        )
+        self._tickets[ticket.id] = ticket
+
+        agent = self._pop_free_agent()
+        if agent is not None:
+            self._assign(ticket, agent, now)
+        else:
+            heapq.heappush(self._heap, (key, ticket.id))
+            self._waiting += 1
+        logger.info(f"Transfert {ticket.id} ({category}) en file pour {participant_identity} - {self._waiting} en attente")
+        return ticket
+
+    def cancel(self, ticket_id):
+        """
+        Retirer un appel de la file (appelant qui raccroche)
+
+        Returns:
+            True si le ticket était en attente
+        """
+        ticket = self._tickets.get(ticket_id)
+        if ticket is None or ticket.status != STATUS_WAITING:
+            return False
+        ticket.status = STATUS_CANCELLED
+        self._waiting -= 1
+        self.cancelled_total += 1
+        self._notify(ticket)
+        # Le tas garde l'entrée : elle sera ignorée au dépilement
+        del self._tickets[ticket_id]
+        if len(self._heap) > 2 * self._waiting + 64:
+            # Trop d'entrées annulées : compaction amortie
+            self._heap = [entry for entry in self._heap if entry[1] in self._tickets]
+            heapq.heapify(self._heap)
+        return True
+
+    def get(self, ticket_id):
+        return self._tickets.get(ticket_id)
+
+    def agent_available(self, agent_id, sip_uri=None):
+        """
+        Déclarer un agent humain disponible ; il reçoit immédiatement l'appel prioritaire
+
+        Returns:
+            TransferTicket attribué ou None si la file est vide
+        """
+        now = self.clock()
+        self.expire(now)
+        agent = self._agents.get(agent_id)
+        if agent is None:
+            agent = self._agents[agent_id] = HumanAgent(agent_id, sip_uri, now)
+        elif sip_uri:
+            agent.sip_uri = sip_uri
+
+        if agent.ticket is not None:
+            # Fin du transfert précédent : mise à jour de la durée moyenne de traitement
+            handle_time = now - agent.ticket.assigned_at
+            self._handle_time = 0.9 * self._handle_time + 0.1 * handle_time
+            self._tickets.pop(agent.ticket.id, None)
+            agent.ticket = None
+        if agent.status == AGENT_FREE:
+            return None
+
+        ticket = self._pop_waiting()
+        if ticket is not None:
+            self._assign(ticket, agent, now)
+            return ticket
+
+        agent.status = AGENT_FREE
+        agent.since = now
+        agent.generation += 1
+        self._free_agents.append((agent, agent.generation))
+        return None
+
+    def agent_offline(self, agent_id):
+        """Retirer un agent humain (retiré paresseusement de la liste des agents libres)"""
+        agent = self._agents.get(agent_id)
+        if agent is None:
+            return False
+        agent.status = AGENT_OFFLINE
+        agent.since = self.clock()
+        agent.generation += 1
+        # Le transfert en cours ne sera jamais clos par un agent_available
+        if agent.ticket is not None:
+            self._tickets.pop(agent.ticket.id, None)
+            agent.ticket = None
+        return True
+
+    def expire(self, now=None):
+        """
+        Oublier les transferts attribués depuis plus de assigned_ttl (agent parti sans se libérer)
+
+        Returns:
+            Nombre de transferts oubliés
+        """
+        now = now or self.clock()
+        expired = 0
+        while self._assigned and now - self._assigned[0][0] > self.assigned_ttl:
+            _, ticket = self._assigned.popleft()
+            if self._tickets.pop(ticket.id, None) is None:
+                # Déjà clos par l'agent
+                continue
+            expired += 1
+            agent = ticket.agent
+            if agent is not None and agent.ticket is ticket:
+                agent.ticket = None
+        if expired:
+            logger.warning(f"{expired} transfert(s) attribué(s) depuis plus de {self.assigned_ttl:.0f}s oublié(s)")
+        return expired
+
+    def _pop_free_agent(self):
+        while self._free_agents:
+            agent, generation = self._free_agents.popleft()
+            # Entrée périmée si l'agent est passé hors ligne depuis son inscription
+            if agent.status == AGENT_FREE and agent.generation == generation:
+                return agent
+        return None
+
+    def _pop_waiting(self):
+        while self._heap:
+            _, ticket_id = heapq.heappop(self._heap)
+            ticket = self._tickets.get(ticket_id)
+            if ticket is not None and ticket.status == STATUS_WAITING:
+                self._waiting -= 1
+                return ticket
+        return None
+
+    def _assign(self, ticket, agent, now):
+        ticket.status = STATUS_ASSIGNED
+        ticket.agent = agent
+        ticket.assigned_at = now
+        agent.status = AGENT_BUSY
+        agent.ticket = ticket
+        agent.since = now
+        self.assigned_total += 1
+        self._served.append((now, ticket.key))
+        self._assigned.append((now, ticket))
+        logger.info(f"Transfert {ticket.id} attribué à l'agent {agent.id} après {now - ticket.enqueued_at:.0f}s")
+        self._notify(ticket)
+
+    def _notify(self, ticket):
+        listeners, ticket.listeners = ticket.listeners, []
+        for callback in listeners:
+            callback(ticket)
+
+    def subscribe(self, ticket, callback):
+        """Être notifié du prochain changement d'état d'un ticket"""
+        ticket.listeners.append(callback)
+
+    def unsubscribe(self, ticket, callback):
+        if callback in ticket.listeners:
+            ticket.listeners.remove(callback)
+
+    def online_agents(self):
+        return sum(1 for agent in self._agents.values() if agent.status != AGENT_OFFLINE)
+
+    def estimated_wait(self, ticket):
+        """
+        Estimer l'attente restante d'un ticket, en O(1)
+
+        Les appels sont servis par clé croissante. On mesure à quelle vitesse la clé du
+        dernier appel servi (le front de service) avance, et on en déduit quand il atteindra
+        la clé du ticket. Tant qu'aucun historique n'existe, on se base sur la durée moyenne
+        de traitement et le nombre d'agents.
+
+        Returns:
+            Attente estimée en secondes (0 si le ticket n'est plus en attente)
+        """
+        if ticket.status != STATUS_WAITING:
+            return 0.0
+
+        if len(self._served) >= 2:
+            (t0, k0), (t1, k1) = self._served[0], self._served[-1]
+            if t1 > t0 and k1 > k0:
+                speed = (k1 - k0) / (t1 - t0)
+                # Le front continue d'avancer depuis le dernier service
+                frontier = k1 + speed * (self.clock() - t1)
+                return max(0.0, (ticket.key - frontier) / speed)
+
+        agents = max(1, self.online_agents())
+        return self._handle_time * (self._waiting / agents)
+
+    def stats(self):
+        self.expire()
+        statuses = {AGENT_FREE: 0, AGENT_BUSY: 0, AGENT_OFFLINE: 0}
+        for agent in self._agents.values():
+            statuses[agent.status] += 1
+        return {
+            "waiting": self._waiting,
+            "agents": statuses,
+            "assigned": self.assigned_total,
+            "cancelled": self.cancelled_total,
+            "averageHandleTime": self._handle_time,
+        }
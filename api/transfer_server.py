@@ -0,0 +1,143 @@
+import os
+import json
+import asyncio
+import logging
+from aiohttp import web
+
+from transfer_queue import TransferQueue
+
+logger = logging.getLogger(__name__)
+
+# Port du service de file de transfert (processus scheduler)
+TRANSFER_QUEUE_PORT = int(os.getenv("TRANSFER_QUEUE_PORT", "8081"))
+# Attente maximale d'une requête longue (secondes)
+TRANSFER_MAX_WAIT = float(os.getenv("TRANSFER_MAX_WAIT", "60"))
+
+def _ticket_response(queue, ticket):
+    return web.json_response({
+        "success": True,
+        **ticket.to_dict(),
+        "estimatedWait": queue.estimated_wait(ticket),
+    })
+
+def _bad_request(error):
+    return web.HTTPBadRequest(text=json.dumps({"success": False, "error": error}), content_type="application/json")
+
+def _parse(cast, value, name):
+    """Convertir un paramètre de la requête (400 plutôt qu'une erreur 500 si la valeur est invalide)"""
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        raise _bad_request(f"{name} invalide: {value!r}")
+
+async def _json_body(request):
+    """Corps JSON de la requête, objet vide sans corps"""
+    if not request.can_read_body:
+        return {}
+    try:
+        data = await request.json()
+    except ValueError:
+        raise _bad_request("JSON invalide")
+    if not isinstance(data, dict):
+        raise _bad_request("Objet JSON attendu")
+    return data
+
+def create_transfer_app(queue=None):
+    """
+    Créer l'application HTTP exposant la file de transfert aux agents vocaux et humains
+
+    Args:
+        queue: TransferQueue (nouvelle file si None)
+
+    Returns:
+        Application aiohttp
+    """
+    queue = queue or TransferQueue()
+    routes = web.RouteTableDef()
+
+    @routes.post("/transfers")
+    async def enqueue_transfer(request):
+        """Placer un appel en attente d'un agent humain"""
+        data = await _json_body(request)
+        if not data.get("room_name") or not data.get("participant_identity"):
+            return web.json_response({"success": False, "error": "room_name et participant_identity requis"}, status=400)
+
+        ticket = queue.enqueue(
+            data["room_name"],
+            data["participant_identity"],
+            phone_number=data.get("phone_number"),
+            reason=data.get("reason"),
+            category=data.get("category") or "other",
+            customer_value=_parse(float, data.get("customer_value") or 0.0, "customer_value"),
+        )
+        return _ticket_response(queue, ticket)
+
+    @routes.get("/transfers/{ticket_id}")
+    async def get_transfer(request):
+        """
+        État d'un transfert ; avec ?wait=N, attendre jusqu'à N secondes un changement d'état
+        (requête longue : aucun polling côté agent vocal)
+        """
+        ticket_id = _parse(int, request.match_info["ticket_id"], "ticket_id")
+        wait = min(_parse(float, request.query.get("wait", 0), "wait"), TRANSFER_MAX_WAIT)
+        ticket = queue.get(ticket_id)
+        if ticket is None:
+            return web.json_response({"success": False, "status": "cancelled"}, status=404)
+
+        if wait > 0 and ticket.status == "waiting":
+            changed = asyncio.get_running_loop().create_future()
+
+            def on_change(_):
+                if not changed.done():
+                    changed.set_result(None)
+
+            queue.subscribe(ticket, on_change)
+            try:
+                await asyncio.wait_for(changed, wait)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                queue.unsubscribe(ticket, on_change)
+
+        return _ticket_response(queue, ticket)
+
+    @routes.delete("/transfers/{ticket_id}")
+    async def cancel_transfer(request):
+        """Retirer un appel de la file (l'appelant a raccroché)"""
+        cancelled = queue.cancel(_parse(int, request.match_info["ticket_id"], "ticket_id"))
+        return web.json_response({"success": cancelled})
+
+    @routes.post("/agents/{agent_id}/available")
+    async def agent_available(request):
+        """Un agent humain se libère : il reçoit immédiatement l'appel prioritaire"""
+        data = await _json_body(request)
+        ticket = queue.agent_available(request.match_info["agent_id"], data.get("sip_uri"))
+        return web.json_response({
+            "success": True,
+            "transfer": ticket.to_dict() if ticket else None,
+        })
+
+    @routes.post("/agents/{agent_id}/offline")
+    async def agent_offline(request):
+        return web.json_response({"success": queue.agent_offline(request.match_info["agent_id"])})
+
+    @routes.get("/transfers")
+    async def transfer_stats(request):
+        return web.json_response({"success": True, **queue.stats()})
+
+    app = web.Application()
+    app.add_routes(routes)
+    app["queue"] = queue
+    return app
+
+async def run_transfer_server(queue=None, port=TRANSFER_QUEUE_PORT):
+    """Servir la file de transfert jusqu'à l'arrêt du processus"""
+    runner = web.AppRunner(create_transfer_app(queue))
+    await runner.setup()
+    site = web.TCPSite(runner, "0.0.0.0", port)
+    await site.start()
+    logger.info(f"File de transfert disponible sur le port {port}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
@@ -0,0 +1,65 @@
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+
+# Délais de coupure de l'agent et travail perdu aux interruptions, enregistrés dans les CDR (extra.barge_in)
+root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(root_dir, "api"))
+
+from call_history import CALL_RECORDS_DB_PATH
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def main():
+    parser = argparse.ArgumentParser(description="Interruptions de l'agent : délais de coupure et travail perdu")
+    parser.add_argument('--db', default=CALL_RECORDS_DB_PATH, help='Base des CDR')
+    parser.add_argument('--days', type=float, default=7, help='Période analysée (jours)')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"Base introuvable: {args.db}")
+        return
+
+    conn = sqlite3.connect(f"file:{args.db}?mode=ro", uri=True)
+    rows = conn.execute(
+        "SELECT json_extract(extra, '$.barge_in') FROM call_records "
+        "WHERE started_at >= ? AND json_extract(extra, '$.barge_in') IS NOT NULL",
+        (time.time() - args.days * 86400,)
+    ).fetchall()
+    conn.close()
+
+    calls = interruptions = before_audio = wasted_tokens = wasted_chars = 0
+    wasted_audio = 0.0
+    detect, silence = [], []
+    for (barge_in,) in rows:
+        barge_in = json.loads(barge_in)
+        calls += 1
+        interruptions += barge_in["interruptions"]
+        before_audio += barge_in["before_audio"]
+        wasted_tokens += barge_in["wasted_tokens"]
+        wasted_chars += barge_in["wasted_chars"]
+        wasted_audio += barge_in["wasted_audio_s"]
+        detect.extend(barge_in["detect_ms"])
+        silence.extend(barge_in["silence_ms"])
+
+    if not interruptions:
+        print(f"Aucune interruption sur la période ({calls} appels)")
+        return
+
+    print(f"Appels: {calls} - interruptions: {interruptions} (dont {before_audio} avant le premier son)")
+    print(f"{'délai':<28} {'p50':>8} {'p90':>8} {'p99':>8}")
+    for label, values in (("parole -> interruption", detect), ("parole -> silence", silence)):
+        stats = [percentile(values, q) for q in (0.5, 0.9, 0.99)]
+        print(f"{label:<28} " + " ".join(f"{value:>5} ms" if value is not None else f"{'-':>8}" for value in stats))
+    print(f"Travail perdu: {wasted_tokens} tokens, {wasted_chars} caractères, {wasted_audio:.1f} s d'audio")
+    print(f"Par interruption: {wasted_tokens / interruptions:.1f} tokens, {wasted_chars / interruptions:.0f} caractères")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+import asyncio
+import argparse
+import math
+import os
+import sys
+import time
+
+# Les profils audio sont définis dans le code de l'agent
+root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(root_dir, "agent"))
+
+from livekit import rtc
+from audio_profile import PROFILES
+
+WEBRTC_SAMPLE_RATE = 48000
+FRAME_MS = 10
+
+def make_frames(sample_rate, seconds):
+    """
+    Générer un signal proche de la voix (porteuse modulée, alternance parole/silence)
+
+    Args:
+        sample_rate: Fréquence d'échantillonnage
+        seconds: Durée totale
+
+    Returns:
+        Liste de rtc.AudioFrame de 10 ms
+    """
+    samples_per_frame = sample_rate * FRAME_MS // 1000
+    frames = []
+    for i in range(int(seconds * 1000 / FRAME_MS)):
+        t0 = i * samples_per_frame
+        speaking = (i // 150) % 2 == 0  # 1,5 s de parole, 1,5 s de silence
+        frame = rtc.AudioFrame.create(sample_rate, 1, samples_per_frame)
+        data = frame.data
+        if speaking:
+            for n in range(samples_per_frame):
+                t = (t0 + n) / sample_rate
+                data[n] = int(8000 * math.sin(2 * math.pi * 220 * t) * (0.6 + 0.4 * math.sin(2 * math.pi * 3 * t)))
+        frames.append(frame)
+    return frames
+
+async def simulate_call(profile, vad, input_frames, tts_frames):
+    """
+    Rejouer le chemin par trame d'un appel : entrée WebRTC -> VAD/STT, puis TTS -> WebRTC
+
+    Args:
+        profile: Profil audio testé
+        vad: Modèle VAD chargé à la fréquence du profil
+        input_frames: Trames 48 kHz reçues du participant
+        tts_frames: Trames produites par le TTS à la fréquence du profil
+    """
+    # Équivalent de rtc.AudioStream(track, sample_rate=...)
+    stream_resampler = rtc.AudioResampler(WEBRTC_SAMPLE_RATE, profile.input_sample_rate, num_channels=1)
+    stt_resampler = None
+    if profile.stt_sample_rate != profile.input_sample_rate:
+        stt_resampler = rtc.AudioResampler(profile.input_sample_rate, profile.stt_sample_rate, num_channels=1)
+
+    vad_stream = vad.stream()
+    stt_bytes = 0
+
+    async def drain_vad():
+        async for _ in vad_stream:
+            pass
+
+    drain_task = asyncio.create_task(drain_vad())
+
+    for i, frame in enumerate(input_frames):
+        for f in stream_resampler.push(frame):
+            vad_stream.push_frame(f)
+            if stt_resampler:
+                for g in stt_resampler.push(f):
+                    stt_bytes += len(g.data.tobytes())
+            else:
+                stt_bytes += len(f.data.tobytes())
+        if i % 10 == 0:
+            await asyncio.sleep(0)
+
+    # Côté sortie : l'AudioSource publiée est rééchantillonnée vers 48 kHz pour Opus
+    output_resampler = rtc.AudioResampler(profile.tts_sample_rate, WEBRTC_SAMPLE_RATE, num_channels=1)
+    for frame in tts_frames:
+        output_resampler.push(frame)
+
+    vad_stream.end_input()
+    await drain_task
+    await vad_stream.aclose()
+    return stt_bytes
+
+async def run_profile(profile, calls, seconds):
+    """Mesurer le temps CPU consommé par N appels simultanés pour un profil"""
+    vad = profile.load_vad()
+    input_frames = make_frames(WEBRTC_SAMPLE_RATE, seconds)
+    # L'agent parle environ la moitié du temps
+    tts_frames = make_frames(profile.tts_sample_rate, seconds / 2)
+
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    stt_bytes = await asyncio.gather(
+        *[simulate_call(profile, vad, input_frames, tts_frames) for _ in range(calls)]
+    )
+    cpu = time.process_time() - cpu_start
+    wall = time.perf_counter() - wall_start
+
+    return {
+        "cpu_s": cpu,
+        "wall_s": wall,
+        "cpu_ms_per_call_second": cpu * 1000 / (calls * seconds),
+        "stt_kbps": sum(stt_bytes) * 8 / 1000 / (calls * seconds),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Mesurer le CPU par appel selon le profil audio')
+    parser.add_argument('--calls', '-c', type=int, default=10, help="Nombre d'appels simultanés simulés")
+    parser.add_argument('--seconds', '-s', type=float, default=30, help="Durée d'audio simulée par appel")
+    parser.add_argument('--profiles', '-p', nargs='+', default=list(PROFILES), help='Profils à comparer')
+    args = parser.parse_args()
+
+    print(f"=== {args.calls} appels simultanés, {args.seconds:.0f} s d'audio par appel ===")
+    results = {}
+    for name in args.profiles:
+        results[name] = asyncio.run(run_profile(PROFILES[name], args.calls, args.seconds))
+        r = results[name]
+        print(
+            f"{name:>10}: CPU {r['cpu_s']:.2f} s (mur {r['wall_s']:.2f} s) - "
+            f"{r['cpu_ms_per_call_second']:.2f} ms CPU par seconde d'appel - "
+            f"STT {r['stt_kbps']:.0f} kbit/s"
+        )
+
+    if "telephony" in results and "wideband" in results:
+        gain = 1 - results["telephony"]["cpu_s"] / results["wideband"]["cpu_s"]
+        print(f"Gain CPU du profil téléphonie: {gain:.0%}")
+
+if __name__ == "__main__":
+    main()
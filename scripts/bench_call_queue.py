@@ -0,0 +1,241 @@
+import asyncio
+import argparse
+import collections
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+# La file et son scheduler sont définis dans le code de l'API
+root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(root_dir, "api"))
+
+from call_queue import CallQueueStore
+from call_queue_scheduler import CallQueueScheduler
+from redial import RedialEngine
+from predictive_pacing import AnswerStats
+
+class FakeLiveKitAPI:
+    """API LiveKit simulée : rooms créées par les dispatchs, consultées à la reprise"""
+
+    def __init__(self):
+        self.rooms = set()
+        self.room = self
+
+    async def list_rooms(self, request):
+        class Rooms:
+            rooms = [name for name in request.names if name in self.rooms]
+        return Rooms()
+
+class FakeDispatch:
+    """Dispatch simulé : latence de l'API, puis l'appel dure quelques secondes"""
+
+    def __init__(self, livekit_api, latency, call_seconds):
+        self.livekit_api = livekit_api
+        self.latency = latency
+        self.call_seconds = call_seconds
+        self.calls = []
+        self.ended = {}
+
+    async def __call__(self, livekit_api, phone_number, trunk_id=None, room_name=None, extra_metadata=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        self.livekit_api.rooms.add(room_name)
+        self.calls.append((time.monotonic(), trunk_id, extra_metadata["queue"]["id"], extra_metadata["queue"]["priority"]))
+        self.ended[room_name] = (time.time() + random.uniform(*self.call_seconds), extra_metadata["queue"]["id"],
+                                 phone_number, trunk_id)
+
+        class Dispatch:
+            room = room_name
+            id = f"AD_{len(self.calls)}"
+        return Dispatch()
+
+class FakeHistory:
+    """CDR simulés : écrits quand la durée de l'appel est écoulée"""
+
+    def __init__(self, dispatch):
+        self.dispatch = dispatch
+        self.records = []
+
+    def since(self, after_id, limit=1000):
+        now = time.time()
+        for room_name, (ended_at, call_id, phone_number, trunk_id) in list(self.dispatch.ended.items()):
+            if ended_at <= now:
+                del self.dispatch.ended[room_name]
+                self.records.append({
+                    "id": len(self.records) + 1, "room_name": room_name, "phone_number": phone_number,
+                    "trunk_id": trunk_id, "started_at": ended_at, "hangup_at": ended_at,
+                    "outcome": "answered", "end_reason": "hangup",
+                    "extra": {"queue": {"id": call_id}, "sip": {"outcome": "answered"}},
+                })
+        return self.records[after_id:after_id + limit]
+
+def fill(store, count, trunks, future_share=0.2):
+    """Appels répartis sur les trunks, priorités aléatoires, une part avec une fenêtre à venir"""
+    now = time.time()
+    store.enqueue_many(
+        (
+            f"+336{i:08d}",
+            trunks[i % len(trunks)],
+            random.randint(0, 9),
+            now + random.uniform(60, 86400) if random.random() < future_share else None,
+            None,
+            {"campaign": "bench"},
+            f"bench-{i}",
+        )
+        for i in range(count)
+    )
+
+def measure_ops(path, sizes, trunks, samples=300):
+    """Latence des opérations de la file selon le nombre d'appels en attente"""
+    results = []
+    store = CallQueueStore(path)
+    filled = 0
+    for size in sizes:
+        start = time.perf_counter()
+        fill_count = size - filled
+        store.enqueue_many(
+            (f"+337{filled + i:08d}", trunks[i % len(trunks)], random.randint(0, 9),
+             time.time() + random.uniform(60, 86400) if i % 5 == 0 else None, None, None, None)
+            for i in range(fill_count)
+        )
+        insert_rate = fill_count / (time.perf_counter() - start)
+        filled = size
+
+        timings = collections.defaultdict(list)
+        for _ in range(samples):
+            for name, fnc in (
+                ("enqueue", lambda: store.enqueue("+33600000000", trunks[0], priority=5)),
+                ("claim", lambda: store.claim(trunks[0], limit=1)),
+                ("ready_trunks", store.ready_trunks),
+                ("active_count", lambda: store.active_count(trunks[0])),
+                ("promote_due", store.promote_due),
+            ):
+                t = time.perf_counter()
+                fnc()
+                timings[name].append((time.perf_counter() - t) * 1e6)
+        results.append((size, insert_rate, {name: statistics.median(values) for name, values in timings.items()}))
+        # Les appels réservés pour la mesure ne comptent pas dans la concurrence
+        reserved = store.in_progress()
+        for row in reserved:
+            store.mark_dispatched(row["id"], row["room_name"], None)
+        store.finish((row["id"], None, None) for row in reserved)
+    store.close()
+    return results
+
+async def run_drain(store, duration, limits, latency, call_seconds):
+    """Vider la file pendant `duration` secondes avec des appels qui durent"""
+    livekit_api = FakeLiveKitAPI()
+    dispatch = FakeDispatch(livekit_api, latency, call_seconds)
+    scheduler = CallQueueScheduler(store=store, livekit_api=livekit_api,
+                                   redial=RedialEngine(store=store, history=FakeHistory(dispatch)),
+                                   stats=AnswerStats(path=None),
+                                   limits=limits, poll_interval=0.1, reconcile_interval=0.5,
+                                   dispatch_fnc=dispatch)
+    peak = collections.Counter()
+
+    async def watch():
+        while True:
+            for trunk_id in limits:
+                peak[trunk_id] = max(peak[trunk_id], store.active_count(trunk_id))
+            await asyncio.sleep(0.1)
+
+    watcher = asyncio.create_task(watch())
+    task = asyncio.create_task(scheduler.run())
+    await asyncio.sleep(duration)
+    task.cancel()
+    watcher.cancel()
+    await asyncio.gather(task, watcher, return_exceptions=True)
+    return dispatch, peak
+
+async def run_restart(store, trunk_id, crashed):
+    """
+    Reprise après un arrêt brutal : une partie des appels réservés avaient déjà été lancés (room créée)
+    sans que le lancement ne soit enregistré
+
+    Returns:
+        (lancements par appel, appels ni lancés ni en file)
+    """
+    livekit_api = FakeLiveKitAPI()
+    dispatch = FakeDispatch(livekit_api, 0.001, (3600, 3600))
+    calls = []
+    while len(calls) < crashed:
+        calls += store.claim(trunk_id, limit=crashed - len(calls))
+    for call in calls[::2]:
+        # Dispatch parti avant l'arrêt, mark_dispatched jamais exécuté
+        await dispatch(livekit_api, call["phone_number"], trunk_id, room_name=call["room_name"],
+                       extra_metadata={"queue": {"id": call["id"], "priority": call["priority"]}})
+
+    scheduler = CallQueueScheduler(store=store, livekit_api=livekit_api,
+                                   redial=RedialEngine(store=store, history=FakeHistory(dispatch)),
+                                   stats=AnswerStats(path=None),
+                                   limits={trunk_id: {"cps": 1000, "burst": 100, "concurrency": crashed * 2}},
+                                   poll_interval=0.05, dispatch_fnc=dispatch)
+    task = asyncio.create_task(scheduler.run())
+    ids = {call["id"] for call in calls}
+    while True:
+        await asyncio.sleep(0.1)
+        rows = [store.get(call_id) for call_id in ids]
+        if all(row["status"] == "dispatched" for row in rows):
+            break
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    dispatches = collections.Counter(call_id for _, _, call_id, _ in dispatch.calls if call_id in ids)
+    lost = [call_id for call_id in ids if dispatches[call_id] == 0]
+    return dispatches, lost
+
+def main():
+    parser = argparse.ArgumentParser(description="Mesurer la file d'appels sortants et son débit par trunk")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help="Tailles de file mesurées (appels en attente)")
+    parser.add_argument('--trunks', type=int, default=3, help='Nombre de trunks')
+    parser.add_argument('--cps', type=float, default=10, help='Appels par seconde autorisés par trunk')
+    parser.add_argument('--concurrency', type=int, default=40, help='Appels simultanés autorisés par trunk')
+    parser.add_argument('--duration', type=float, default=10, help='Durée du vidage simulé (secondes)')
+    parser.add_argument('--latency', type=float, default=0.05, help="Latence du dispatch (secondes)")
+    parser.add_argument('--call-seconds', type=float, nargs=2, default=(2.0, 6.0), metavar=('MIN', 'MAX'),
+                        help="Durée des appels simulés (secondes)")
+    parser.add_argument('--seed', type=int, default=1, help='Graine des tirages aléatoires')
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    trunks = [f"ST_bench{i}" for i in range(args.trunks)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print("=== Opérations de la file (médiane) selon le nombre d'appels en attente ===")
+        print(f"{'file':>8} {'insertion':>12} {'enqueue':>9} {'claim':>9} {'trunks':>9} {'actifs':>9} {'fenêtres':>9}")
+        for size, insert_rate, ops in measure_ops(os.path.join(tmp, "ops.db"), sorted(args.sizes), trunks):
+            print(f"{size:>8} {insert_rate:>9,.0f}/s {ops['enqueue']:>6.0f} µs {ops['claim']:>6.0f} µs "
+                  f"{ops['ready_trunks']:>6.0f} µs {ops['active_count']:>6.0f} µs {ops['promote_due']:>6.0f} µs")
+
+        path = os.path.join(tmp, "drain.db")
+        store = CallQueueStore(path)
+        fill(store, max(args.sizes), trunks)
+        limits = {trunk: {"cps": args.cps, "burst": 1, "concurrency": args.concurrency} for trunk in trunks}
+        dispatch, peak = asyncio.run(run_drain(store, args.duration, limits, args.latency, args.call_seconds))
+
+        print(f"\n=== Vidage pendant {args.duration:.0f} s : {args.cps:g} appels/s et {args.concurrency} appels simultanés par trunk ===")
+        for trunk in trunks:
+            calls = [call for call in dispatch.calls if call[1] == trunk]
+            if len(calls) < 2:
+                print(f"{trunk}: {len(calls)} appel(s) lancé(s)")
+                continue
+            gaps = [b[0] - a[0] for a, b in zip(calls, calls[1:])]
+            priorities = [call[3] for call in calls]
+            inversions = sum(1 for a, b in zip(priorities, priorities[1:]) if b > a)
+            print(f"{trunk}: {len(calls)} lancés, {len(calls) / (calls[-1][0] - calls[0][0]):.1f} appels/s, "
+                  f"écart minimal {min(gaps) * 1000:.0f} ms, concurrence max {peak[trunk]}/{args.concurrency}, "
+                  f"priorité non décroissante {inversions} fois")
+
+        store.close()
+        store = CallQueueStore(path)
+        dispatches, lost = asyncio.run(run_restart(store, trunks[0], crashed=50))
+        duplicated = [call_id for call_id, count in dispatches.items() if count > 1]
+        print(f"\n=== Reprise après arrêt brutal avec 50 appels réservés (25 déjà lancés) ===")
+        print(f"Appels relancés une seule fois: {sum(1 for count in dispatches.values() if count == 1)}, "
+              f"en double: {len(duplicated)}, perdus: {len(lost)}")
+        store.close()
+
+if __name__ == "__main__":
+    main()
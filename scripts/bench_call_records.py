@@ -0,0 +1,77 @@
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+# Le stockage des CDR est écrit par l'agent et consulté par l'API
+root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(root_dir, "agent"))
+sys.path.insert(0, os.path.join(root_dir, "api"))
+
+from call_records import CallRecord, CallRecordStore
+from call_history import CallHistory
+
+def make_record(i, now, rng):
+    record = CallRecord(room_name=f"call-{i:08x}", job_id=f"AJ_{i}", started_at=now - rng.random() * 30 * 86400)
+    record.phone_number = f"+336{rng.randrange(10 ** 6):08d}"
+    record.trunk_id = "ST_bench"
+    record.dispatched_at = record.started_at - 0.2
+    record.dial_at = record.started_at + 0.5
+    record.answered_at = record.dial_at + rng.random() * 20
+    record.first_audio_at = record.answered_at + 0.8
+    record.hangup_at = record.answered_at + rng.random() * 300
+    record.outcome = "answered"
+    record.end_reason = "hangup"
+    record.turns = rng.randrange(20)
+    record.tool_calls = rng.randrange(3)
+    return record
+
+def timed(fnc, repeat=200):
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fnc()
+        durations.append((time.perf_counter() - start) * 1000)
+    return statistics.median(durations), max(durations)
+
+def main():
+    parser = argparse.ArgumentParser(description="Mesurer l'écriture et la consultation des CDR")
+    parser.add_argument('--records', '-n', type=int, default=200000, help='Nombre de CDR écrits')
+    parser.add_argument('--batch-size', type=int, default=500, help='Taille des lots')
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    now = time.time()
+    records = [make_record(i, now, rng) for i in range(args.records)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "calls.db")
+        store = CallRecordStore(path, batch_size=args.batch_size)
+
+        start = time.perf_counter()
+        for record in records:
+            store.submit(record)
+        submit_s = time.perf_counter() - start
+        store.flush(timeout=600)
+        total_s = time.perf_counter() - start
+
+        print(f"=== {args.records} CDR, lots de {args.batch_size} ===")
+        print(f"Soumission (boucle d'événements): {submit_s / args.records * 1e6:.1f} µs par CDR")
+        print(f"Écriture: {store.written / total_s:,.0f} CDR/s - {os.path.getsize(path) / 1e6:.0f} Mo")
+
+        history = CallHistory(path)
+        sample = rng.choice(records)
+        for label, fnc in (
+            ("par room", lambda: history.find(room_name=sample.room_name)),
+            ("par numéro", lambda: history.find(phone_number=sample.phone_number)),
+            ("par période (1 h)", lambda: history.find(since=now - 86400, until=now - 82800)),
+            ("numéro + période", lambda: history.find(phone_number=sample.phone_number, since=now - 7 * 86400)),
+        ):
+            median, worst = timed(fnc)
+            print(f"Recherche {label}: médiane {median:.2f} ms, max {worst:.2f} ms")
+
+if __name__ == "__main__":
+    main()
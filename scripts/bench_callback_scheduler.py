@@ -0,0 +1,95 @@
+import asyncio
+import argparse
+import os
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+
+# Le store et le scheduler sont définis dans le code de l'API
+root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(root_dir, "api"))
+
+from callback_store import CallbackStore
+from callback_scheduler import CallbackScheduler
+from call_queue_scheduler import TrunkPacers
+
+class FakeDispatch:
+    """Dispatch simulé : enregistre l'heure de chaque lancement"""
+
+    def __init__(self):
+        self.times = []
+
+    async def __call__(self, livekit_api, phone_number, trunk_id=None, room_name=None, **kwargs):
+        self.times.append(time.monotonic())
+
+        class Dispatch:
+            room = room_name
+            id = f"AD_{len(self.times)}"
+        return Dispatch()
+
+def rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+async def run_burst(store, burst, cps):
+    """Lancer une rafale de rappels échus au même instant et mesurer le débit effectif"""
+    now = time.time()
+    store.add_many((f"+3360{i:07d}", now - 1, None, None) for i in range(burst))
+    dispatch = FakeDispatch()
+    pacers = TrunkPacers(defaults={"cps": cps, "burst": 1, "concurrency": burst})
+    scheduler = CallbackScheduler(store=store, livekit_api=object(), pacers=pacers, dispatch_fnc=dispatch)
+    start = time.monotonic()
+    while await scheduler.run_once():
+        pass
+    elapsed = time.monotonic() - start
+    gaps = [b - a for a, b in zip(dispatch.times, dispatch.times[1:])]
+    return elapsed, len(dispatch.times), min(gaps) if gaps else 0
+
+def main():
+    parser = argparse.ArgumentParser(description='Mesurer le stockage et le lancement des rappels')
+    parser.add_argument('--pending', '-n', type=int, default=300000, help='Nombre de rappels en attente')
+    parser.add_argument('--burst', '-b', type=int, default=200, help='Taille de la rafale échue')
+    parser.add_argument('--cps', type=float, default=50, help='Appels par seconde autorisés')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "callbacks.db")
+        store = CallbackStore(path)
+        rss_before = rss_mb()
+
+        # Rappels étalés sur 30 jours, avec un pic à 9h00
+        base = time.time() + 3600
+        start = time.perf_counter()
+        store.add_many(
+            (f"+336{i:08d}", base + (random.random() * 30 * 86400 if i % 3 else (i % 30) * 86400), None,
+             {"room": f"call-{i:08x}"})
+            for i in range(args.pending)
+        )
+        insert_s = time.perf_counter() - start
+        print(f"=== {args.pending} rappels en attente ===")
+        print(f"Insertion: {args.pending / insert_s:,.0f} rappels/s")
+        print(f"Taille de la base: {os.path.getsize(path) / 1e6:.1f} Mo - RSS: {rss_mb():.0f} Mo (+{rss_mb() - rss_before:.0f} Mo)")
+
+        peek = []
+        for _ in range(1000):
+            t = time.perf_counter()
+            store.next_due_at()
+            peek.append((time.perf_counter() - t) * 1e6)
+        print(f"Prochaine échéance: médiane {statistics.median(peek):.0f} µs, max {max(peek):.0f} µs")
+
+        claims = []
+        for _ in range(200):
+            t = time.perf_counter()
+            store.claim_due(now=base + 15 * 86400, limit=50)
+            claims.append((time.perf_counter() - t) * 1e3)
+        print(f"Réservation de 50 rappels: médiane {statistics.median(claims):.2f} ms, max {max(claims):.2f} ms")
+
+        elapsed, dispatched, min_gap = asyncio.run(run_burst(store, args.burst, args.cps))
+        print(f"Rafale de {args.burst} rappels à {args.cps} appels/s: {dispatched} lancés en {elapsed:.1f}s "
+              f"({dispatched / elapsed:.1f} appels/s, écart minimal {min_gap * 1000:.0f} ms)")
+        store.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import argparse
+import csv
+import io
+import json
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+import psutil
+
+# Import de campagne défini dans le code de l'API
+root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(root_dir, "api"))
+
+from call_queue import CallQueueStore
+from campaign_upload import import_campaign, FORMAT_CSV, FORMAT_NDJSON
+from dispatch import parse_e164
+
+TRUNK_ID = "ST_bench"
+
+def phone_variant(number, rng):
+    """Numéro mobile français écrit comme dans les fichiers clients"""
+    national = f"0{number}"
+    return rng.choice((
+        f"+33{number}",
+        national,
+        " ".join(national[i:i + 2] for i in range(0, 10, 2)),
+        ".".join(national[i:i + 2] for i in range(0, 10, 2)),
+        f"0033{number}",
+    ))
+
+def write_file(path, rows, fmt, duplicates, invalid, seed):
+    """Fichier de contacts écrit en flux, avec une part de doublons et de numéros invalides"""
+    rng = random.Random(seed)
+    with open(path, "w", newline="", encoding="utf-8") as out:
+        writer = csv.writer(out)
+        if fmt == FORMAT_CSV:
+            writer.writerow(["nom", "telephone", "ville"])
+        for i in range(rows):
+            draw = rng.random()
+            if draw < invalid:
+                phone = rng.choice(("n/a", "12", "+33 6 12", "abcdefghij"))
+            else:
+                index = rng.randrange(i) if draw < invalid + duplicates and i else i
+                phone = phone_variant(600000000 + index, rng)
+            if fmt == FORMAT_CSV:
+                writer.writerow([f"Client {i}", phone, rng.choice(("Paris", "Lyon", "Lille"))])
+            else:
+                out.write(json.dumps({"phone": phone, "context": {"nom": f"Client {i}"}}) + "\n")
+    return os.path.getsize(path)
+
+def naive_import(path, store, fmt, campaign):
+    """Chargement de tout le fichier en mémoire, tel qu'un endpoint classique le ferait"""
+    with open(path, "rb") as body_file:
+        body = body_file.read().decode("utf-8")
+    if fmt == FORMAT_CSV:
+        records = list(csv.DictReader(io.StringIO(body)))
+    else:
+        records = [json.loads(line) for line in body.splitlines() if line.strip()]
+    seen, calls = set(), []
+    for record in records:
+        number = parse_e164(record.pop("telephone", None) or record.pop("phone", ""))
+        if number is None or number in seen:
+            continue
+        seen.add(number)
+        calls.append((f"+{number}", TRUNK_ID, 0, None, None, {"campaign": campaign, "context": record},
+                      f"campaign:{campaign}:+{number}"))
+    queued = store.enqueue_many(calls)
+    return {"rows": len(records), "queued": queued}
+
+def run(mode, path, fmt, db_path, batch_size, results):
+    """Import dans un processus à part : pic de mémoire propre à la méthode mesurée"""
+    start_rss = psutil.Process().memory_info().rss
+    store = CallQueueStore(db_path)
+    start = time.perf_counter()
+    if mode == "flux":
+        with open(path, "rb") as stream:
+            report = import_campaign(stream, store, TRUNK_ID, fmt=fmt, campaign="bench", batch_size=batch_size)
+    else:
+        report = naive_import(path, store, fmt, "bench")
+    elapsed = time.perf_counter() - start
+    store.close()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    results.put({**report, "elapsed": elapsed, "peak": peak, "growth": peak - start_rss})
+
+def measure(mode, path, fmt, db_path, batch_size):
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    process = context.Process(target=run, args=(mode, path, fmt, db_path, batch_size, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Débit et mémoire de l'import de campagne en flux")
+    parser.add_argument('--rows', '-n', type=int, nargs='+', default=[100000, 1000000], help="Lignes par fichier")
+    parser.add_argument('--format', choices=(FORMAT_CSV, FORMAT_NDJSON), nargs='+', default=[FORMAT_CSV, FORMAT_NDJSON],
+                        help="Formats mesurés")
+    parser.add_argument('--duplicates', type=float, default=0.05, help="Part de doublons")
+    parser.add_argument('--invalid', type=float, default=0.01, help="Part de numéros invalides")
+    parser.add_argument('--batch-size', type=int, default=5000, help="Appels insérés par transaction")
+    parser.add_argument('--naive', action='store_true', help="Mesurer aussi le chargement complet en mémoire")
+    parser.add_argument('--seed', type=int, default=1, help='Graine des tirages aléatoires')
+    args = parser.parse_args()
+
+    modes = ["flux"] + (["mémoire"] if args.naive else [])
+    print(f"{'format':>7} {'lignes':>9} {'taille':>8} {'méthode':>8} {'en file':>9} {'durée':>8} "
+          f"{'lignes/s':>10} {'pic RSS':>9} {'hausse':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt in args.format:
+            for rows in args.rows:
+                path = os.path.join(tmp, f"contacts-{rows}.{fmt}")
+                size = write_file(path, rows, fmt, args.duplicates, args.invalid, args.seed)
+                for mode in modes:
+                    db_path = os.path.join(tmp, f"{mode}-{fmt}-{rows}.db")
+                    result = measure(mode, path, fmt, db_path, args.batch_size)
+                    print(f"{fmt:>7} {rows:>9,} {size / 1e6:>6.0f} Mo {mode:>8} {result['queued']:>9,} "
+                          f"{result['elapsed']:>6.1f} s {result['rows'] / result['elapsed']:>10,.0f} "
+                          f"{result['peak'] / 2 ** 20:>6.0f} Mo {result['growth'] / 2 ** 20:>5.0f} Mo")
+                    os.remove(db_path)
+                os.remove(path)
+
+if __name__ == "__main__":
+    main()
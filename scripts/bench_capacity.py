@@ -0,0 +1,150 @@
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+import time
+
+# Capacité d'un worker : appels simultanés soutenables par cœur, STT, LLM et TTS simulés
+root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(root_dir, "agent"))
+
+from livekit import rtc
+from audio_profile import PROFILES
+from worker_load import LoopLagMonitor
+from bench_audio_profile import make_frames, WEBRTC_SAMPLE_RATE, FRAME_MS
+
+# Tour de conversation simulé : parole de l'appelant, réponse du LLM puis du TTS
+CALLER_TURN_S = 4.0
+LLM_TTFT_S = 0.4
+LLM_TOKENS = 40
+LLM_TOKENS_PER_S = 50
+TTS_REPLY_S = 2.5
+TTS_FRAME_MS = 20
+
+async def simulate_call(profile, vad, input_frames, tts_frames, seconds):
+    """
+    Un appel en temps réel dans son processus : entrée audio -> VAD/STT, puis réponse LLM -> TTS -> sortie
+
+    Returns:
+        (retard p99 de la boucle en ms, retard maximal en ms, retard cumulé de l'entrée audio en ms)
+    """
+    lag = LoopLagMonitor(report_dir=None).start()
+    stream_resampler = rtc.AudioResampler(WEBRTC_SAMPLE_RATE, profile.input_sample_rate, num_channels=1)
+    output_resampler = rtc.AudioResampler(profile.tts_sample_rate, WEBRTC_SAMPLE_RATE, num_channels=1)
+    vad_stream = vad.stream()
+    stt_bytes = 0
+
+    async def drain_vad():
+        async for _ in vad_stream:
+            pass
+
+    async def reply():
+        # LLM simulé : premier token puis débit constant, sans CPU
+        await asyncio.sleep(LLM_TTFT_S + LLM_TOKENS / LLM_TOKENS_PER_S)
+        # TTS simulé : trames produites au rythme de la lecture, rééchantillonnées pour WebRTC
+        start = time.perf_counter()
+        for i in range(int(TTS_REPLY_S * 1000 / TTS_FRAME_MS)):
+            output_resampler.push(tts_frames[i % len(tts_frames)])
+            await asyncio.sleep(max(0.0, start + (i + 1) * TTS_FRAME_MS / 1000 - time.perf_counter()))
+
+    drain_task = asyncio.create_task(drain_vad())
+    reply_tasks = []
+    start = time.perf_counter()
+    late_ms = 0.0
+    frames_per_turn = int(CALLER_TURN_S * 1000 / FRAME_MS)
+    for i in range(int(seconds * 1000 / FRAME_MS)):
+        due = start + i * FRAME_MS / 1000
+        delay = due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        else:
+            late_ms = max(late_ms, -delay * 1000)
+        for frame in stream_resampler.push(input_frames[i % len(input_frames)]):
+            vad_stream.push_frame(frame)
+            stt_bytes += len(frame.data) * 2
+        if i % frames_per_turn == frames_per_turn - 1:
+            reply_tasks.append(asyncio.create_task(reply()))
+
+    await asyncio.gather(*reply_tasks)
+    vad_stream.end_input()
+    await drain_task
+    await vad_stream.aclose()
+    await lag.aclose()
+    return lag.percentile(0.99), lag.max_ms, late_ms
+
+def run_call(profile_name, seconds, barrier, results):
+    profile = PROFILES[profile_name]
+    # Préchauffage comme au prewarm du worker, hors mesure
+    vad = profile.load_vad()
+    input_frames = make_frames(WEBRTC_SAMPLE_RATE, 3)
+    tts_frames = make_frames(profile.tts_sample_rate, 1)
+    barrier.wait()
+    cpu_start = time.process_time()
+    p99, max_ms, late_ms = asyncio.run(simulate_call(profile, vad, input_frames, tts_frames, seconds))
+    results.put((p99, max_ms, late_ms, time.process_time() - cpu_start))
+
+def run_step(profile_name, calls, seconds):
+    """Lancer N appels simultanés, un processus par appel comme le worker"""
+    ctx = multiprocessing.get_context("spawn")
+    barrier = ctx.Barrier(calls)
+    results = ctx.Queue()
+    procs = [ctx.Process(target=run_call, args=(profile_name, seconds, barrier, results)) for _ in range(calls)]
+    for proc in procs:
+        proc.start()
+    samples = [results.get() for _ in procs]
+    for proc in procs:
+        proc.join()
+    return {
+        "p99_ms": max(sample[0] for sample in samples),
+        "max_ms": max(sample[1] for sample in samples),
+        "late_ms": max(sample[2] for sample in samples),
+        "cpu": sum(sample[3] for sample in samples) / (seconds * os.cpu_count()),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Appels simultanés soutenables par cœur (STT, LLM et TTS simulés)")
+    parser.add_argument('--profile', '-p', default='telephony', choices=list(PROFILES), help='Profil audio')
+    parser.add_argument('--seconds', '-s', type=float, default=20, help="Durée de chaque palier (secondes)")
+    parser.add_argument('--max-calls', type=int, default=256, help="Nombre maximal d'appels testés")
+    parser.add_argument('--lag-budget', type=float, default=50, help='Retard p99 toléré de la boucle (ms)')
+    parser.add_argument('--cpu-budget', type=float, default=0.8, help='Utilisation CPU tolérée (0-1)')
+    args = parser.parse_args()
+
+    cores = os.cpu_count()
+    print(f"=== Profil {args.profile}, {cores} cœurs, paliers de {args.seconds:.0f} s ===")
+    print(f"{'appels':>7} {'lag p99':>9} {'lag max':>9} {'retard entrée':>14} {'CPU':>6}")
+
+    def sustainable(calls):
+        r = run_step(args.profile, calls, args.seconds)
+        ok = r["p99_ms"] <= args.lag_budget and r["cpu"] <= args.cpu_budget
+        print(
+            f"{calls:>7} {r['p99_ms']:>6.1f} ms {r['max_ms']:>6.1f} ms {r['late_ms']:>11.1f} ms "
+            f"{r['cpu']:>5.0%} {'ok' if ok else 'saturé'}"
+        )
+        return ok
+
+    # Doublement jusqu'à saturation, puis dichotomie entre le dernier palier tenu et le premier saturé
+    good, bad, calls = 0, None, 1
+    while calls <= args.max_calls:
+        if not sustainable(calls):
+            bad = calls
+            break
+        good, calls = calls, calls * 2
+    if bad is None:
+        bad = min(calls, args.max_calls + 1)
+    while bad - good > 1:
+        middle = (good + bad) // 2
+        if sustainable(middle):
+            good = middle
+        else:
+            bad = middle
+
+    if not good:
+        print("Un seul appel dépasse déjà les budgets")
+        return
+    print(f"Capacité soutenable: {good} appels, soit {good / cores:.1f} par cœur")
+    print(f"Réglage suggéré: WORKER_CALLS_PER_CORE={good / cores:.1f}")
+
+if __name__ == "__main__":
+    main()
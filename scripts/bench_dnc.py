@@ -0,0 +1,112 @@
+import argparse
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+import psutil
+
+# Liste d'opposition définie dans le code de l'API
+root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(root_dir, "api"))
+
+from dnc import DncList, build_dnc
+
+def write_sources(directory, count, seed):
+    """Deux listes sources (opposition nationale et désinscriptions), qui se recouvrent en partie"""
+    rng = random.Random(seed)
+    numbers = rng.sample(range(600000000, 800000000), count)
+    split = count * 9 // 10
+    with open(os.path.join(directory, "bloctel.csv"), "w") as source:
+        source.write("numero,date_inscription\n")
+        source.writelines(f"0{number},2024-01-01\n" for number in numbers[:split])
+    with open(os.path.join(directory, "optout.txt"), "w") as source:
+        source.write("# désinscriptions\n")
+        source.writelines(f"+33{number}\n" for number in numbers[split - count // 50:])
+    return numbers
+
+def latency(dnc, phone_numbers):
+    samples = []
+    for phone_number in phone_numbers:
+        t = time.perf_counter()
+        dnc.blocked(phone_number)
+        samples.append((time.perf_counter() - t) * 1e6)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99)]
+
+def worker(path, phone_numbers, results):
+    """Worker de l'API : ouverture de la liste et consultations, mémoire privée mesurée (USS)"""
+    process = psutil.Process()
+    before = process.memory_full_info()
+    dnc = DncList(path)
+    blocked = sum(1 for phone_number in phone_numbers if dnc.blocked(phone_number))
+    after = process.memory_full_info()
+    results.put((after.uss - before.uss, after.rss - before.rss, blocked))
+
+def naive_worker(numbers, results):
+    """Liste chargée dans un set Python par chaque worker"""
+    process = psutil.Process()
+    before = process.memory_full_info().uss
+    loaded = {f"+33{number}" for number in numbers}
+    results.put((process.memory_full_info().uss - before, 0, len(loaded)))
+
+def run_workers(target, args_list):
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    processes = [context.Process(target=target, args=(*args, results)) for args in args_list]
+    for process in processes:
+        process.start()
+    values = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return values
+
+def main():
+    parser = argparse.ArgumentParser(description="Taille, construction et latence de la liste d'opposition")
+    parser.add_argument('--numbers', '-n', type=int, default=10000000, help="Numéros sur liste d'opposition")
+    parser.add_argument('--lookups', type=int, default=200000, help="Consultations mesurées par cas")
+    parser.add_argument('--workers', type=int, default=4, help="Workers consultant la même liste")
+    parser.add_argument('--bloom-bits', type=float, nargs='+', default=[0, 10], help="Réglages du filtre de Bloom comparés")
+    parser.add_argument('--naive', action='store_true', help="Mesurer aussi un set Python par worker")
+    parser.add_argument('--seed', type=int, default=1, help='Graine des tirages aléatoires')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        sources = os.path.join(tmp, "sources")
+        os.mkdir(sources)
+        numbers = write_sources(sources, args.numbers, args.seed)
+        hits = [f"+33{number}" for number in rng.sample(numbers, min(args.lookups, len(numbers)))]
+        misses = [f"+33{number}" for number in rng.sample(range(800000000, 900000000), args.lookups)]
+        path = os.path.join(tmp, "dnc.bin")
+
+        print(f"=== {args.numbers:,} numéros sur liste d'opposition ===")
+        for bloom_bits in args.bloom_bits:
+            report = build_dnc(sources, path, bloom_bits=bloom_bits)
+            dnc = DncList(path)
+            hit = latency(dnc, hits)
+            miss = latency(dnc, misses)
+            label = f"Bloom {bloom_bits:g} bits" if bloom_bits else "sans Bloom"
+            print(f"{label}: construction {report['elapsed_s']} s, fichier {report['bytes'] / 2 ** 20:.0f} Mo, "
+                  f"présent médiane {hit[0]:.1f} µs (p99 {hit[1]:.1f}), "
+                  f"absent médiane {miss[0]:.1f} µs (p99 {miss[1]:.1f})")
+            false_positives = sum(1 for phone_number in misses if dnc.blocked(phone_number))
+            if false_positives:
+                print(f"  {false_positives} numéro(s) absent(s) signalé(s) à tort")
+
+        chunk = args.lookups // args.workers
+        values = run_workers(worker, [(path, hits[i * chunk:(i + 1) * chunk] + misses[i * chunk:(i + 1) * chunk])
+                                      for i in range(args.workers)])
+        print(f"\n{args.workers} workers, {2 * chunk:,} consultations chacun : mémoire privée "
+              f"{max(uss for uss, _, _ in values) / 2 ** 20:.1f} Mo max par worker, pages partagées lues "
+              f"{max(rss for _, rss, _ in values) / 2 ** 20:.0f} Mo, "
+              f"{sum(blocked for _, _, blocked in values):,} numéros bloqués")
+        if args.naive:
+            values = run_workers(naive_worker, [(numbers,)])
+            print(f"Set Python chargé par worker : {values[0][0] / 2 ** 20:.0f} Mo de mémoire privée par worker")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+import argparse
+import asyncio
+import gc
+import logging
+import os
+import random
+import selectors
+import statistics
+import sys
+import time
+
+import psutil
+
+# OutboundCaller à grande échelle : room et API SIP simulées dans une seule boucle d'événements
+root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(root_dir, "agent"))
+
+from livekit import rtc
+from livekit.protocol.sip import SIPParticipantInfo
+from outbound_caller import OutboundCaller
+
+class CountingSelector(selectors.DefaultSelector):
+    """Sélecteur de la boucle comptant ses réveils (un appel à select par itération)"""
+
+    wakeups = 0
+
+    def select(self, timeout=None):
+        CountingSelector.wakeups += 1
+        return super().select(timeout)
+
+class FakeParticipant:
+    def __init__(self, identity, call_status):
+        self.identity = identity
+        self.attributes = {"sip.callStatus": call_status}
+
+class FakeRoom(rtc.EventEmitter):
+    """
+    Room simulée : le participant SIP rejoint, change de statut puis quitte selon le scénario
+    """
+
+    def __init__(self, name):
+        super().__init__()
+        self.name = name
+        self.remote_participants = {}
+        self.joined_at = None
+        self.hangup_at = None
+
+    def join(self, identity, ring, duration):
+        loop = asyncio.get_running_loop()
+        participant = FakeParticipant(identity, "dialing" if ring > 0 else "active")
+        self.remote_participants[identity] = participant
+        self.joined_at = time.perf_counter()
+        self.emit("participant_connected", participant)
+        if ring > 0:
+            loop.call_later(ring, participant.attributes.__setitem__, "sip.callStatus", "active")
+        loop.call_later(ring + duration, self.hangup, identity)
+
+    def hangup(self, identity):
+        participant = self.remote_participants.get(identity)
+        if participant is None or self.hangup_at is not None:
+            return
+        participant.attributes["sip.callStatus"] = "hangup"
+        self.hangup_at = time.perf_counter()
+        # Le participant SIP quitte la room peu après le raccroché
+        asyncio.get_running_loop().call_later(0.5, self.leave, identity)
+
+    def leave(self, identity):
+        participant = self.remote_participants.pop(identity, None)
+        if participant is not None:
+            self.emit("participant_disconnected", participant)
+
+    def handlers(self):
+        return sum(len(callbacks) for callbacks in self._events.values())
+
+class FakeSipService:
+    def __init__(self, api):
+        self.api = api
+
+    async def create_sip_participant(self, request, timeout=None):
+        scenario = self.api.scenario
+        await asyncio.sleep(scenario["api_latency"])
+        room = self.api.rooms[request.room_name]
+        if request.wait_until_answered:
+            # Réponse de l'API au décroché : le participant est déjà actif
+            await asyncio.sleep(random.uniform(*scenario["join_delay"]) + scenario["ring"])
+            room.join(request.participant_identity, 0, random.uniform(*scenario["call_seconds"]))
+        else:
+            asyncio.get_running_loop().call_later(
+                random.uniform(*scenario["join_delay"]), room.join, request.participant_identity,
+                scenario["ring"], random.uniform(*scenario["call_seconds"]),
+            )
+        return SIPParticipantInfo(
+            participant_id=f"PA_{request.participant_identity}",
+            participant_identity=request.participant_identity,
+            room_name=request.room_name,
+            sip_call_id=f"SCL_{request.room_name}",
+        )
+
+class FakeRoomService:
+    def __init__(self, api):
+        self.api = api
+
+    async def remove_participant(self, request):
+        await asyncio.sleep(self.api.scenario["api_latency"])
+        room = self.api.rooms.get(request.room)
+        if room is not None:
+            room.hangup(request.identity)
+
+class FakeLiveKitAPI:
+    """API LiveKit simulée (sip et room), partagée par tous les appels comme ctx.api"""
+
+    def __init__(self, scenario):
+        self.scenario = scenario
+        self.rooms = {}
+        self.sip = FakeSipService(self)
+        self.room = FakeRoomService(self)
+
+async def simulate_call(index, fake_api, results):
+    room = FakeRoom(f"call-{index}")
+    fake_api.rooms[room.name] = room
+    caller = OutboundCaller(api=fake_api, room=room, trunk_id="ST_bench")
+    try:
+        participant = await caller.start_call(f"+336{index:08d}")
+        joined = time.perf_counter()
+        await caller.monitor_call_status(participant)
+        hung_up = time.perf_counter()
+        await caller.end_call(participant)
+        results.append({
+            "join_ms": (joined - room.joined_at) * 1000,
+            "hangup_ms": (hung_up - room.hangup_at) * 1000,
+            "handlers": room.handlers(),
+        })
+    except Exception as e:
+        results.append({"error": str(e)})
+    finally:
+        del fake_api.rooms[room.name]
+
+async def run_bench(calls, ramp, scenario):
+    """
+    Lancer N appels dans la boucle courante, répartis sur `ramp` secondes
+
+    Returns:
+        (résultats par appel, échantillons par seconde : réveils, CPU, RSS, appels en cours)
+    """
+    fake_api = FakeLiveKitAPI(scenario)
+    results = []
+    samples = []
+    process = psutil.Process()
+
+    async def sample():
+        wakeups, cpu = CountingSelector.wakeups, time.process_time()
+        while True:
+            await asyncio.sleep(1)
+            samples.append({
+                "wakeups": CountingSelector.wakeups - wakeups,
+                "cpu": time.process_time() - cpu,
+                "rss_mb": process.memory_info().rss / (1024 * 1024),
+                "calls": len(fake_api.rooms),
+            })
+            wakeups, cpu = CountingSelector.wakeups, time.process_time()
+
+    sampler = asyncio.create_task(sample())
+    tasks = []
+    for index in range(calls):
+        tasks.append(asyncio.create_task(simulate_call(index, fake_api, results)))
+        if ramp > 0:
+            await asyncio.sleep(ramp / calls)
+    await asyncio.gather(*tasks)
+    sampler.cancel()
+    return results, samples
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark d'OutboundCaller avec room et API SIP simulées")
+    parser.add_argument('--calls', '-c', type=int, default=1000, help="Nombre d'appels simulés")
+    parser.add_argument('--ramp', type=float, default=10, help='Durée de lancement des appels (secondes)')
+    parser.add_argument('--join-delay', type=float, nargs=2, default=(1.0, 5.0), metavar=('MIN', 'MAX'),
+                        help="Délai entre la requête SIP et l'arrivée du participant (secondes)")
+    parser.add_argument('--ring', type=float, default=2.0, help="Durée du statut 'dialing' après l'arrivée (secondes)")
+    parser.add_argument('--call-seconds', type=float, nargs=2, default=(10.0, 30.0), metavar=('MIN', 'MAX'),
+                        help="Durée de l'appel décroché (secondes)")
+    parser.add_argument('--api-latency', type=float, default=0.05, help="Latence des requêtes à l'API (secondes)")
+    parser.add_argument('--seed', type=int, default=1, help='Graine des délais aléatoires')
+    parser.add_argument('--log', action='store_true', help="Garder les logs INFO d'OutboundCaller (coût inclus dans la mesure)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.log else logging.WARNING)
+    random.seed(args.seed)
+    scenario = {
+        "join_delay": args.join_delay,
+        "ring": args.ring,
+        "call_seconds": args.call_seconds,
+        "api_latency": args.api_latency,
+    }
+
+    gc.collect()
+    rss_start = psutil.Process().memory_info().rss / (1024 * 1024)
+    loop = asyncio.SelectorEventLoop(CountingSelector())
+    start = time.perf_counter()
+    try:
+        results, samples = loop.run_until_complete(run_bench(args.calls, args.ramp, scenario))
+    finally:
+        loop.close()
+    wall = time.perf_counter() - start
+    gc.collect()
+    rss_end = psutil.Process().memory_info().rss / (1024 * 1024)
+
+    print(f"=== {args.calls} appels simulés dans une boucle, lancés sur {args.ramp:.0f} s ({wall:.1f} s au total) ===")
+    failed = [result for result in results if "error" in result]
+    done = [result for result in results if "error" not in result]
+    print(f"Appels terminés: {len(done)}, en erreur: {len(failed)}")
+    if failed:
+        print(f"  première erreur: {failed[0]['error']}")
+    if done:
+        for key, label in (("join_ms", "détection de l'arrivée"), ("hangup_ms", "détection du raccroché")):
+            values = [result[key] for result in done]
+            print(f"{label:>24}: p50 {percentile(values, 0.5):.1f} ms, p99 {percentile(values, 0.99):.1f} ms, max {max(values):.1f} ms")
+        print(f"Callbacks restés sur la room après l'appel: {statistics.mean(result['handlers'] for result in done):.1f} par appel")
+
+    busy = [sample for sample in samples if sample["calls"] >= max(sample["calls"] for sample in samples) * 0.9] or samples
+    if busy:
+        peak_calls = max(sample["calls"] for sample in busy)
+        wakeups = statistics.mean(sample["wakeups"] for sample in busy)
+        print(f"Réveils de la boucle: {wakeups:.0f} par seconde avec ~{peak_calls} appels en cours, soit {wakeups / max(1, peak_calls):.2f} par appel")
+        print(f"CPU: {statistics.mean(sample['cpu'] for sample in busy):.0%} d'un cœur en pointe")
+    peak_rss = max((sample["rss_mb"] for sample in samples), default=rss_end)
+    print(f"Mémoire: {rss_start:.1f} Mo au départ, {peak_rss:.1f} Mo en pointe, {rss_end:.1f} Mo à la fin "
+          f"({(rss_end - rss_start) * 1024 / max(1, args.calls):.1f} Ko conservés par appel)")
+
+if __name__ == "__main__":
+    main()
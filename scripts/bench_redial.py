@@ -0,0 +1,144 @@
+import argparse
+import collections
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+import psutil
+
+# Moteur de rappel de l'API alimenté par des CDR écrits comme par l'agent
+root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(root_dir, "api"))
+sys.path.insert(0, os.path.join(root_dir, "agent"))
+
+from call_records import CallRecord, CallRecordStore
+from call_history import CallHistory
+from call_queue import CallQueueStore
+from redial import RedialEngine, RedialPolicy
+
+# Répartition des issues d'une campagne (part des appels)
+OUTCOMES = {
+    "answered": 0.35,
+    "no_answer": 0.35,
+    "busy": 0.12,
+    "network_error": 0.08,
+    "rejected": 0.05,
+    "invalid_number": 0.05,
+}
+SIP_CODES = {"no_answer": 480, "busy": 486, "network_error": 503, "rejected": 603, "invalid_number": 404}
+TRUNK_ID = "ST_bench"
+
+def write_records(path, calls, round_index, queued_ids):
+    """CDR d'une vague d'appels : une part lancée depuis la file, le reste par /api/call"""
+    store = CallRecordStore(path)
+    names, weights = zip(*OUTCOMES.items())
+    now = time.time()
+    for i in range(calls):
+        outcome = random.choices(names, weights)[0]
+        record = CallRecord(room_name=f"call-{round_index}-{i}", started_at=now)
+        record.phone_number = f"+336{i:08d}"
+        record.trunk_id = TRUNK_ID
+        record.hangup_at = now
+        record.outcome = "answered" if outcome == "answered" else "not_answered"
+        record.extra["sip"] = {"outcome": outcome, "status_code": SIP_CODES.get(outcome)}
+        if i < len(queued_ids):
+            record.extra["queue"] = {"id": queued_ids[i], "attempt": round_index + 1}
+        record.end_reason = None if outcome == "answered" else f"SIP {SIP_CODES[outcome]}"
+        store.submit(record)
+    store.flush(timeout=120)
+
+def dispatch_all(store, count):
+    """Appels en file lancés (état 'dispatched'), comme après le passage du scheduler"""
+    ids = []
+    while len(ids) < count:
+        calls = store.claim(TRUNK_ID, limit=min(1000, count - len(ids)))
+        if not calls:
+            break
+        for call in calls:
+            store.mark_dispatched(call["id"], call["room_name"], None)
+        ids.extend(call["id"] for call in calls)
+    return ids
+
+def run_round(engine, label):
+    process = psutil.Process()
+    cpu, start = process.cpu_times(), time.perf_counter()
+    batches = []
+    while True:
+        t = time.perf_counter()
+        processed = engine.poll()
+        if not processed:
+            break
+        batches.append((time.perf_counter() - t) * 1000)
+    elapsed = time.perf_counter() - start
+    cpu_end = process.cpu_times()
+    records = engine.counts["records"]
+    print(f"{label}: {records} CDR en {elapsed:.2f} s ({records / elapsed:,.0f} CDR/s, "
+          f"CPU {(cpu_end.user + cpu_end.system - cpu.user - cpu.system) / elapsed:.0%}), "
+          f"lot de {engine.batch_size}: médiane {statistics.median(batches):.0f} ms, max {max(batches):.0f} ms")
+    print(f"  reprogrammés en file: {engine.counts['rescheduled']}, nouveaux appels: {engine.counts['redialed']}, "
+          f"abandonnés: {engine.counts['abandoned']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Débit du moteur de rappel sur une grande vague d'échecs")
+    parser.add_argument('--calls', '-n', type=int, default=100000, help="Nombre d'appels par vague")
+    parser.add_argument('--queued', type=float, default=0.8, help="Part des appels lancés depuis la file")
+    parser.add_argument('--rounds', type=int, default=2, help='Nombre de vagues successives sur les mêmes numéros')
+    parser.add_argument('--batch-size', type=int, default=1000, help='CDR traités par transaction')
+    parser.add_argument('--seed', type=int, default=1, help='Graine des tirages aléatoires')
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        calls_path = os.path.join(tmp, "calls.db")
+        queue_path = os.path.join(tmp, "call_queue.db")
+        store = CallQueueStore(queue_path)
+        queued = int(args.calls * args.queued)
+        store.enqueue_many((f"+336{i:08d}", TRUNK_ID, 0, None, None, None, None) for i in range(queued))
+        ids = dispatch_all(store, queued)
+
+        print(f"=== {args.calls} appels par vague, {queued} depuis la file ===")
+        policy = RedialPolicy(rng=random.Random(args.seed))
+        for round_index in range(args.rounds):
+            # Vague suivante : seuls les appels reprogrammés de la file sont relancés
+            if round_index:
+                store.promote_due(now=time.time() + 30 * 86400, limit=args.calls)
+                ids = dispatch_all(store, queued)
+            write_records(calls_path, args.calls, round_index, ids)
+            engine = RedialEngine(store=store, history=CallHistory(calls_path), policy=policy,
+                                  batch_size=args.batch_size)
+            run_round(engine, f"Vague {round_index + 1}")
+
+        # Rejouer les CDR (position de lecture perdue) ne crée aucun rappel en double
+        counts = store.stats()["counts"]
+        store.apply_outcomes("redial", 0, [])
+        engine = RedialEngine(store=store, history=CallHistory(calls_path), policy=policy, batch_size=args.batch_size)
+        while engine.poll():
+            pass
+        replayed = store.stats()["counts"]
+        print(f"Relecture de tous les CDR: {sum(replayed.values()) - sum(counts.values())} appel(s) en file ajouté(s)")
+
+        delays = collections.defaultdict(list)
+        conn = sqlite3.connect(queue_path)
+        for outcome, retry_at, at in conn.execute("SELECT outcome, retry_at, at FROM call_attempts WHERE retry_at IS NOT NULL"):
+            delays[outcome].append(retry_at - at)
+        print("Délais de rappel (min - max) par issue:")
+        for outcome, values in sorted(delays.items()):
+            print(f"  {outcome:>14}: {len(values):>6} rappels, {min(values) / 60:.1f} - {max(values) / 60:.1f} min")
+
+        samples = []
+        for i in random.sample(range(args.calls), 500):
+            t = time.perf_counter()
+            store.attempts(f"+336{i:08d}")
+            samples.append((time.perf_counter() - t) * 1e6)
+        print(f"Historique d'un numéro: médiane {statistics.median(samples):.0f} µs "
+              f"({conn.execute('SELECT COUNT(*) FROM call_attempts').fetchone()[0]} tentatives enregistrées)")
+        conn.close()
+        print(f"RSS: {psutil.Process().memory_info().rss / (1024 * 1024):.0f} Mo")
+        store.close()
+
+if __name__ == "__main__":
+    main()
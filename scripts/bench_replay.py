@@ -0,0 +1,456 @@
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import statistics
+import sys
+import time
+import wave
+
+import psutil
+
+# Rejeu hors ligne d'une conversation dans le pipeline vocal de l'agent : audio de l'appelant
+# enregistré (WAV) ou synthétique, STT, LLM et TTS remplacés par des doublures locales déterministes
+root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(root_dir, "agent"))
+
+from livekit import rtc
+from livekit.agents import llm, metrics, stt, tts, utils
+from livekit.agents.llm import ChatContext
+from livekit.agents.types import DEFAULT_API_CONNECT_OPTIONS
+from livekit.agents.pipeline import VoicePipelineAgent, human_input, pipeline_agent
+from audio_profile import PROFILES
+from barge_in import BargeInTracker, BARGE_IN_SPEECH_DURATION
+from endpointing import AdaptiveEndpointing
+from context_window import ContextWindow
+from profiles import SYSTEM_PROMPT
+from worker_load import LoopLagMonitor
+from bench_audio_profile import make_frames
+
+# Latences des fournisseurs simulées (secondes, tokens par seconde)
+LATENCY_PROFILES = {
+    "fast": {"stt": 0.1, "llm_ttft": 0.25, "llm_tokens_per_s": 80, "tts_ttfb": 0.1},
+    "typical": {"stt": 0.25, "llm_ttft": 0.5, "llm_tokens_per_s": 50, "tts_ttfb": 0.2},
+    "slow": {"stt": 0.5, "llm_ttft": 1.2, "llm_tokens_per_s": 25, "tts_ttfb": 0.4},
+}
+
+DEFAULT_TEXT = "Bonjour, j'appelle au sujet de ma commande."
+DEFAULT_REPLY = "Très bien, je regarde votre commande. Pouvez-vous me donner votre numéro de client ?"
+FRAME_MS = 10
+# Débit de parole du TTS simulé (secondes d'audio par caractère)
+TTS_SECONDS_PER_CHAR = 0.06
+# Pause de l'appelant après la réponse de l'agent, avant le tour suivant (secondes)
+CALLER_PAUSE = 0.5
+
+def load_wav(path, sample_rate):
+    """
+    Lire un enregistrement de l'appelant (WAV PCM 16 bits mono) en trames de 10 ms
+
+    Args:
+        path: Fichier WAV
+        sample_rate: Fréquence de l'entrée du profil audio (rééchantillonnage comme l'AudioStream)
+    """
+    with wave.open(path, "rb") as wav:
+        if wav.getnchannels() != 1 or wav.getsampwidth() != 2:
+            raise ValueError(f"{path}: WAV PCM 16 bits mono attendu")
+        rate = wav.getframerate()
+        pcm = wav.readframes(wav.getnframes())
+    samples_per_frame = rate * FRAME_MS // 1000
+    resampler = rtc.AudioResampler(rate, sample_rate, num_channels=1) if rate != sample_rate else None
+    frames = []
+    for offset in range(0, len(pcm) - samples_per_frame * 2 + 1, samples_per_frame * 2):
+        frame = rtc.AudioFrame(pcm[offset:offset + samples_per_frame * 2], rate, 1, samples_per_frame)
+        frames.extend(resampler.push(frame) if resampler else [frame])
+    if resampler:
+        frames.extend(resampler.flush())
+    return frames
+
+def load_scenario(path, sample_rate, turns):
+    """
+    Tours de l'appelant : fichier de scénario ou parole synthétique
+
+    Le scénario est un JSON {"turns": [{"audio": "tour1.wav", "text": "...", "reply": "..."}]},
+    chemins relatifs au fichier ; "text" est la transcription rendue par le STT simulé et
+    "reply" la réponse du LLM simulé.
+    """
+    if path is None:
+        # Parole synthétique (1,5 s, détectée comme parole par Silero)
+        frames = make_frames(sample_rate, 1.5)
+        return [{"frames": frames, "text": DEFAULT_TEXT, "reply": DEFAULT_REPLY} for _ in range(turns)]
+    with open(path, encoding="utf-8") as scenario_file:
+        scenario = json.load(scenario_file)
+    base_dir = os.path.dirname(os.path.abspath(path))
+    return [
+        {
+            "frames": load_wav(os.path.join(base_dir, turn["audio"]), sample_rate),
+            "text": turn.get("text", DEFAULT_TEXT),
+            "reply": turn.get("reply", DEFAULT_REPLY),
+        }
+        for turn in scenario["turns"]
+    ]
+
+class Replay:
+    """
+    Déroulé d'une conversation rejouée : tour en cours et mesures par tour
+    """
+
+    def __init__(self, turns, latency):
+        self.turns = turns
+        self.latency = latency
+        self.current = None
+        self.results = []
+        self.reply_done = asyncio.Event()
+        self.finished = asyncio.Event()
+
+    def begin_turn(self, turn):
+        self.current = {
+            "turn": turn, "caller_end": None, "eou_s": None,
+            "standin_s": 0.0, "tts_counted": False, "started": None,
+        }
+        self.results.append(self.current)
+        self.reply_done.clear()
+
+    def attach(self, agent):
+        @agent.on("metrics_collected")
+        def _on_metrics_collected(collected):
+            if isinstance(collected, metrics.PipelineEOUMetrics) and self.current["eou_s"] is None:
+                self.current["eou_s"] = collected.end_of_utterance_delay
+
+        @agent.on("agent_started_speaking")
+        def _on_agent_started_speaking():
+            if self.current["caller_end"] is not None and self.current["started"] is None:
+                self.current["started"] = time.perf_counter()
+
+        @agent.on("agent_stopped_speaking")
+        def _on_agent_stopped_speaking():
+            if self.current["started"] is not None:
+                self.reply_done.set()
+
+    def add_standin_delay(self, seconds):
+        """Attente imposée par une doublure avant le premier son de la réponse"""
+        if self.current is not None and self.current["started"] is None:
+            self.current["standin_s"] += seconds
+
+    def turn_summaries(self):
+        summaries = []
+        for result in self.results:
+            if result["started"] is None or result["eou_s"] is None:
+                summaries.append(None)
+                continue
+            response_s = result["started"] - result["caller_end"]
+            summaries.append({
+                "response_ms": response_s * 1000,
+                "eou_ms": result["eou_s"] * 1000,
+                "standin_ms": result["standin_s"] * 1000,
+                # Temps du pipeline hors attente de fin de tour et des fournisseurs
+                "overhead_ms": (response_s - result["eou_s"] - result["standin_s"]) * 1000,
+            })
+        return summaries
+
+class ReplaySTT(stt.STT):
+    """
+    STT simulé : transcription du tour en cours, rendue `stt` secondes après la fin de parole
+
+    Non streaming : le pipeline l'enveloppe dans un StreamAdapter piloté par le VAD.
+    """
+
+    def __init__(self, replay):
+        super().__init__(capabilities=stt.STTCapabilities(streaming=False, interim_results=False))
+        self.replay = replay
+
+    async def _recognize_impl(self, buffer, *, language=None, conn_options=None):
+        await asyncio.sleep(self.replay.latency["stt"])
+        text = self.replay.current["turn"]["text"] if self.replay.current else ""
+        return stt.SpeechEvent(
+            type=stt.SpeechEventType.FINAL_TRANSCRIPT,
+            request_id=utils.shortuuid(),
+            alternatives=[stt.SpeechData(language="fr", text=text)],
+        )
+
+class _ReplayLLMStream(llm.LLMStream):
+    def __init__(self, replay_llm, chat_ctx, fnc_ctx, conn_options):
+        super().__init__(replay_llm, chat_ctx=chat_ctx, fnc_ctx=fnc_ctx, conn_options=conn_options)
+        self._replay_llm = replay_llm
+
+    async def _run(self):
+        replay = self._replay_llm.replay
+        latency = replay.latency
+        reply = replay.current["turn"]["reply"] if replay.current else DEFAULT_REPLY
+        tokens = [word + " " for word in reply.split()]
+        if self._replay_llm.record:
+            # Premier son possible à la fin de la première phrase (découpage par phrase avant le TTS)
+            first_sentence = next((i + 1 for i, token in enumerate(tokens) if token.rstrip()[-1] in ".?!"), len(tokens))
+            replay.add_standin_delay(latency["llm_ttft"] + (first_sentence - 1) / latency["llm_tokens_per_s"])
+        request_id = utils.shortuuid()
+        await asyncio.sleep(latency["llm_ttft"])
+        for i, token in enumerate(tokens):
+            if i:
+                await asyncio.sleep(1 / latency["llm_tokens_per_s"])
+            self._event_ch.send_nowait(llm.ChatChunk(
+                request_id=request_id,
+                choices=[llm.Choice(delta=llm.ChoiceDelta(role="assistant", content=token))],
+            ))
+        self._event_ch.send_nowait(llm.ChatChunk(
+            request_id=request_id,
+            usage=llm.CompletionUsage(completion_tokens=len(tokens), prompt_tokens=0, total_tokens=len(tokens)),
+        ))
+
+class ReplayLLM(llm.LLM):
+    """
+    LLM simulé : réponse du scénario, premier token après `llm_ttft`, puis `llm_tokens_per_s`
+    """
+
+    def __init__(self, replay, record=True):
+        """
+        Args:
+            replay: Conversation rejouée
+            record: Compter l'attente dans le délai des doublures (faux pour le LLM des résumés)
+        """
+        super().__init__()
+        self.replay = replay
+        self.record = record
+
+    def chat(self, *, chat_ctx, conn_options=DEFAULT_API_CONNECT_OPTIONS, fnc_ctx=None, **kwargs):
+        return _ReplayLLMStream(self, chat_ctx, fnc_ctx, conn_options)
+
+class _ReplayChunkedStream(tts.ChunkedStream):
+    def __init__(self, replay_tts, text, conn_options):
+        super().__init__(tts=replay_tts, input_text=text, conn_options=conn_options)
+        self._replay_tts = replay_tts
+
+    async def _run(self):
+        replay_tts = self._replay_tts
+        replay = replay_tts.replay
+        if replay.current is not None and not replay.current["tts_counted"]:
+            # Seule la première phrase d'une réponse retarde le premier son
+            replay.current["tts_counted"] = True
+            replay.add_standin_delay(replay.latency["tts_ttfb"])
+        await asyncio.sleep(replay.latency["tts_ttfb"])
+        request_id = utils.shortuuid()
+        samples_per_frame = replay_tts.sample_rate * 20 // 1000
+        frames = max(1, int(len(self._input_text) * TTS_SECONDS_PER_CHAR * 50))
+        for i in range(frames):
+            frame = replay_tts.frames[i % len(replay_tts.frames)]
+            self._event_ch.send_nowait(tts.SynthesizedAudio(frame=frame, request_id=request_id))
+            if i % 25 == 24:
+                await asyncio.sleep(0)
+
+class ReplayTTS(tts.TTS):
+    """
+    TTS simulé : premier son après `tts_ttfb`, audio proportionnel au texte
+    """
+
+    def __init__(self, replay, sample_rate):
+        super().__init__(capabilities=tts.TTSCapabilities(streaming=False), sample_rate=sample_rate, num_channels=1)
+        self.replay = replay
+        self.frames = _split_frames(make_frames(sample_rate, 1.5), 2)
+
+    def synthesize(self, text, *, conn_options=None):
+        return _ReplayChunkedStream(self, text, conn_options)
+
+def _split_frames(frames, group):
+    # Trames de 20 ms (deux trames de 10 ms) comme celles du TTS
+    return [utils.combine_frames(frames[i:i + group]) for i in range(0, len(frames) - group + 1, group)]
+
+class _FakePublication:
+    def __init__(self, sid, track=None):
+        self.sid = sid
+        self.source = rtc.TrackSource.SOURCE_MICROPHONE
+        self.subscribed = True
+        self.track = track
+
+    def set_subscribed(self, subscribed):
+        self.subscribed = subscribed
+
+    async def wait_for_subscription(self):
+        return
+
+class _FakeParticipant:
+    def __init__(self, identity):
+        self.identity = identity
+        self.track_publications = {}
+        self.attributes = {}
+
+    async def publish_track(self, track, options=None):
+        publication = _FakePublication(f"TR_{self.identity}_{len(self.track_publications)}", track)
+        self.track_publications[publication.sid] = publication
+        return publication
+
+    async def set_attributes(self, attributes):
+        self.attributes.update(attributes)
+
+    async def publish_transcription(self, transcription):
+        return
+
+class ReplayRoom(rtc.EventEmitter):
+    """
+    Room simulée : un appelant dont le micro est la conversation rejouée, rien n'est publié
+    """
+
+    def __init__(self, caller_identity="sip_caller"):
+        super().__init__()
+        self.name = "replay"
+        self.local_participant = _FakeParticipant("agent")
+        caller = _FakeParticipant(caller_identity)
+        caller.track_publications["TR_caller"] = _FakePublication("TR_caller", track="TR_caller")
+        self.remote_participants = {caller_identity: caller}
+
+    def isconnected(self):
+        return False
+
+class _ReplayHumanInput(human_input.HumanInput):
+    """
+    HumanInput alimenté par la conversation rejouée au lieu de l'AudioStream du participant
+    """
+
+    replay_audio = None
+
+    def _subscribe_to_microphone(self, *args, **kwargs):
+        if self._recognize_atask is None:
+            self._subscribed_track = "TR_caller"
+            self._recognize_atask = asyncio.create_task(self._recognize_task(self.replay_audio()))
+
+async def caller_audio(replay, sample_rate, turn_timeout):
+    """Micro de l'appelant en temps réel : chaque tour, puis silence jusqu'à la fin de la réponse"""
+    silence = rtc.AudioFrame.create(sample_rate, 1, sample_rate * FRAME_MS // 1000)
+    start = time.perf_counter()
+    sent = 0
+
+    async def send(frame):
+        nonlocal sent
+        delay = start + sent * FRAME_MS / 1000 - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        sent += 1
+        return rtc.AudioFrameEvent(frame)
+
+    for turn in replay.turns:
+        replay.begin_turn(turn)
+        for frame in turn["frames"]:
+            yield await send(frame)
+        replay.current["caller_end"] = time.perf_counter()
+        deadline = time.perf_counter() + turn_timeout
+        while not replay.reply_done.is_set() and time.perf_counter() < deadline:
+            yield await send(silence)
+        pause_end = time.perf_counter() + CALLER_PAUSE
+        while time.perf_counter() < pause_end:
+            yield await send(silence)
+    replay.finished.set()
+
+async def replay_call(profile, vad, turns, latency, turn_timeout):
+    """
+    Une conversation rejouée dans le pipeline, construit comme dans l'entrypoint de l'agent
+
+    Returns:
+        (mesures par tour, résumé du retard de la boucle)
+    """
+    loop_lag = LoopLagMonitor(report_dir=None).start()
+    replay = Replay(turns, latency)
+    _ReplayHumanInput.replay_audio = staticmethod(lambda: caller_audio(replay, profile.input_sample_rate, turn_timeout))
+    pipeline_agent.HumanInput = _ReplayHumanInput
+
+    barge_in = BargeInTracker()
+    agent = VoicePipelineAgent(
+        vad=vad,
+        stt=ReplaySTT(replay),
+        llm=ReplayLLM(replay),
+        tts=ReplayTTS(replay, profile.tts_sample_rate),
+        chat_ctx=ChatContext().append(role="system", text=SYSTEM_PROMPT),
+        allow_interruptions=True,
+        interrupt_speech_duration=BARGE_IN_SPEECH_DURATION,
+        before_tts_cb=barge_in.before_tts_cb,
+    )
+    barge_in.attach(agent)
+    AdaptiveEndpointing().attach(agent)
+    context_window = ContextWindow(summary_llm=ReplayLLM(replay, record=False))
+    context_window.attach(agent)
+    replay.attach(agent)
+
+    room = ReplayRoom()
+    agent.start(room, "sip_caller")
+    await replay.finished.wait()
+
+    await agent.aclose()
+    await context_window.aclose()
+    await barge_in.aclose()
+    await loop_lag.aclose()
+    return replay.turn_summaries(), loop_lag.summary()
+
+def run_call(profile_name, scenario, turns, latency, turn_timeout, barrier, results):
+    # Un processus par appel, comme le worker : VAD chargé au préchauffage, hors mesure
+    logging.basicConfig(level=logging.WARNING)
+    profile = PROFILES[profile_name]
+    vad = profile.load_vad()
+    call_turns = load_scenario(scenario, profile.input_sample_rate, turns)
+    barrier.wait()
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    summaries, lag = asyncio.run(replay_call(profile, vad, call_turns, latency, turn_timeout))
+    memory = psutil.Process().memory_full_info()
+    results.put({
+        "turns": summaries,
+        "cpu_s": time.process_time() - cpu_start,
+        "wall_s": time.perf_counter() - wall_start,
+        "rss_mb": memory.rss / (1024 * 1024),
+        "uss_mb": memory.uss / (1024 * 1024),
+        "lag_p99_ms": lag["p99_ms"],
+    })
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+def main():
+    parser = argparse.ArgumentParser(description="Rejouer des conversations hors ligne dans le pipeline vocal (sans réseau)")
+    parser.add_argument('--scenario', help='Scénario JSON (WAV de l\'appelant, transcriptions, réponses) - parole synthétique sinon')
+    parser.add_argument('--turns', '-t', type=int, default=4, help='Tours synthétiques sans scénario')
+    parser.add_argument('--calls', '-c', type=int, default=1, help='Conversations rejouées simultanément (un processus chacune)')
+    parser.add_argument('--latency', '-l', default='typical', choices=list(LATENCY_PROFILES), help='Latences simulées des fournisseurs')
+    parser.add_argument('--profile', '-p', default='telephony', choices=list(PROFILES), help='Profil audio')
+    parser.add_argument('--turn-timeout', type=float, default=15, help='Attente maximale d\'une réponse (secondes)')
+    parser.add_argument('--max-overhead-ms', type=float, help='Échec (code 1) si le temps du pipeline p95 dépasse ce seuil')
+    args = parser.parse_args()
+
+    latency = LATENCY_PROFILES[args.latency]
+    print(f"=== {args.calls} conversation(s), latences {args.latency} {latency}, profil {args.profile} ===")
+
+    ctx = multiprocessing.get_context("spawn")
+    barrier = ctx.Barrier(args.calls)
+    results = ctx.Queue()
+    procs = [
+        ctx.Process(target=run_call, args=(args.profile, args.scenario, args.turns, latency, args.turn_timeout, barrier, results))
+        for _ in range(args.calls)
+    ]
+    for proc in procs:
+        proc.start()
+    calls = [results.get() for _ in procs]
+    for proc in procs:
+        proc.join()
+
+    turns = [turn for call in calls for turn in call["turns"]]
+    answered = [turn for turn in turns if turn is not None]
+    print(f"Tours répondus: {len(answered)}/{len(turns)}")
+    if answered:
+        print(f"{'par tour':>12} {'p50':>9} {'p95':>9} {'max':>9}")
+        for key, label in (("response_ms", "réponse"), ("eou_ms", "fin de tour"),
+                           ("standin_ms", "doublures"), ("overhead_ms", "pipeline")):
+            values = [turn[key] for turn in answered]
+            print(f"{label:>12} {percentile(values, 0.5):>6.0f} ms {percentile(values, 0.95):>6.0f} ms {max(values):>6.0f} ms")
+
+    cpu = [call["cpu_s"] / call["wall_s"] * 60 for call in calls]
+    print(f"CPU par appel: {statistics.mean(cpu):.2f} s par minute d'appel (max {max(cpu):.2f} s)")
+    print(
+        f"Mémoire par appel: RSS {statistics.mean(call['rss_mb'] for call in calls):.1f} Mo, "
+        f"USS {statistics.mean(call['uss_mb'] for call in calls):.1f} Mo"
+    )
+    print(f"Retard p99 de la boucle: {max(call['lag_p99_ms'] for call in calls):.1f} ms")
+
+    if len(answered) < len(turns):
+        sys.exit(1)
+    if args.max_overhead_ms is not None and percentile([turn["overhead_ms"] for turn in answered], 0.95) > args.max_overhead_ms:
+        print(f"Temps du pipeline p95 au-delà de {args.max_overhead_ms:.0f} ms")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
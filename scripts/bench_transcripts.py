@@ -0,0 +1,90 @@
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+# Les transcriptions sont écrites par l'agent et consultées par l'API
+root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(root_dir, "agent"))
+sys.path.insert(0, os.path.join(root_dir, "api"))
+
+from transcripts import TranscriptStore, ROLE_USER, ROLE_AGENT
+from transcript_search import TranscriptSearch
+
+VOCABULARY = (
+    "bonjour rendez-vous rappeler demain contrat facture résiliation conseiller tarif offre "
+    "livraison commande remboursement adresse problème merci disponible semaine matin après-midi "
+    "internet mobile forfait engagement option réclamation paiement prélèvement banque virement "
+    "urgence technicien panne installation box compteur énergie électricité gaz devis"
+).split()
+
+def make_turn(call, seq, phone_number, rng, now):
+    words = rng.choices(VOCABULARY, k=rng.randrange(4, 25))
+    role = ROLE_USER if seq % 2 else ROLE_AGENT
+    return (f"call-{call:08x}", phone_number, seq, role, " ".join(words), now + seq * 4.0, 0)
+
+def timed(fnc, repeat=200):
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fnc()
+        durations.append((time.perf_counter() - start) * 1000)
+    durations.sort()
+    return statistics.median(durations), durations[int(len(durations) * 0.99) - 1]
+
+def main():
+    parser = argparse.ArgumentParser(description="Mesurer l'écriture et la recherche plein texte des transcriptions")
+    parser.add_argument('--turns', '-n', type=int, default=1000000, help='Nombre de tours écrits')
+    parser.add_argument('--turns-per-call', type=int, default=20, help='Tours par appel')
+    parser.add_argument('--batch-size', type=int, default=500, help='Taille des lots')
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    now = time.time()
+    calls = args.turns // args.turns_per_call
+    phones = [f"+336{rng.randrange(10 ** 8):08d}" for _ in range(calls)]
+    turns = [
+        make_turn(call, seq, phones[call], rng, now)
+        for call in range(calls)
+        for seq in range(1, args.turns_per_call + 1)
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "transcripts.db")
+        store = TranscriptStore(path, log_dir=os.path.join(tmp, "transcripts"), batch_size=args.batch_size)
+
+        start = time.perf_counter()
+        for turn in turns:
+            store.submit(turn)
+        submit_s = time.perf_counter() - start
+        store.flush(timeout=3600)
+        total_s = time.perf_counter() - start
+
+        print(f"=== {len(turns)} tours ({calls} appels), lots de {args.batch_size} ===")
+        print(f"Soumission (boucle d'événements): {submit_s / len(turns) * 1e6:.1f} µs par tour")
+        print(f"Écriture (journal + index): {store.written / total_s:,.0f} tours/s - {os.path.getsize(path) / 1e6:.0f} Mo")
+
+        search = TranscriptSearch(path)
+        call = rng.randrange(calls)
+        room_name, phone_number = f"call-{call:08x}", phones[call]
+        deep = search.search("facture", limit=50)
+        for _ in range(20):
+            deep = search.search("facture", limit=50, before=deep["next"])
+
+        for label, fnc in (
+            ("mot fréquent", lambda: search.search("facture")),
+            ("deux mots", lambda: search.search("remboursement virement")),
+            ("préfixe", lambda: search.search("rembours*")),
+            ("mot + room", lambda: search.search("facture", room_name=room_name)),
+            ("mot + numéro", lambda: search.search("contrat", phone_number=phone_number)),
+            ("page 21 (curseur)", lambda: search.search("facture", before=deep["next"])),
+            ("transcription d'un appel", lambda: search.get_transcript(room_name)),
+        ):
+            median, p99 = timed(fnc)
+            print(f"Recherche {label}: médiane {median:.2f} ms, p99 {p99:.2f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import argparse
+import heapq
+import os
+import random
+import statistics
+import sys
+import time
+import logging
+
+# La file de transfert est définie dans le code de l'API
+root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(root_dir, "api"))
+
+from transfer_queue import TransferQueue, CATEGORY_BOOSTS
+
+CATEGORIES = list(CATEGORY_BOOSTS)
+
+class SimClock:
+    """Horloge simulée pilotée par la boucle d'événements du benchmark"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def simulate(calls, agents, arrival_rate, handle_time, abandon_after, seed=1):
+    """
+    Simulation à événements discrets d'une file de transfert chargée
+
+    Args:
+        calls: Nombre d'appels à transférer
+        agents: Nombre d'agents humains
+        arrival_rate: Arrivées par seconde
+        handle_time: Durée moyenne de traitement (secondes)
+        abandon_after: Patience moyenne des appelants (secondes)
+
+    Returns:
+        Dictionnaire de résultats
+    """
+    rng = random.Random(seed)
+    clock = SimClock()
+    queue = TransferQueue(clock=clock)
+    events = []
+    seq = 0
+
+    def schedule(at, kind, data):
+        nonlocal seq
+        seq += 1
+        heapq.heappush(events, (at, seq, kind, data))
+
+    t = 0.0
+    for i in range(calls):
+        t += rng.expovariate(arrival_rate)
+        schedule(t, "arrival", i)
+    for a in range(agents):
+        schedule(0.0, "free", f"agent-{a}")
+
+    predicted, errors, waits = {}, [], []
+    max_waiting = 0
+    queue_ops = 0
+    op_time = 0.0
+
+    while events:
+        at, _, kind, data = heapq.heappop(events)
+        clock.now = at
+        start = time.perf_counter()
+        if kind == "arrival":
+            ticket = queue.enqueue(f"room-{data}", f"phone_user_{data}",
+                                   category=rng.choice(CATEGORIES), customer_value=rng.random())
+            predicted[ticket.id] = queue.estimated_wait(ticket)
+            if ticket.status == "waiting":
+                schedule(at + rng.expovariate(1 / abandon_after), "abandon", ticket.id)
+            else:
+                schedule(at + rng.expovariate(1 / handle_time), "free", ticket.agent.id)
+                waits.append(0.0)
+        elif kind == "abandon":
+            queue.cancel(data)
+        elif kind == "free":
+            ticket = queue.agent_available(data, sip_uri=f"sip:{data}@example.com")
+            if ticket is not None:
+                wait = at - ticket.enqueued_at
+                waits.append(wait)
+                errors.append(abs(predicted.pop(ticket.id) - wait))
+                schedule(at + rng.expovariate(1 / handle_time), "free", data)
+        op_time += time.perf_counter() - start
+        queue_ops += 1
+        max_waiting = max(max_waiting, queue.stats()["waiting"])
+
+    stats = queue.stats()
+    return {
+        "events": queue_ops,
+        "us_per_event": op_time / queue_ops * 1e6,
+        "max_waiting": max_waiting,
+        "assigned": stats["assigned"],
+        "cancelled": stats["cancelled"],
+        "median_wait": statistics.median(waits) if waits else 0,
+        "eta_mae": statistics.mean(errors) if errors else 0,
+        "mean_wait_served": statistics.mean([w for w in waits if w > 0] or [0]),
+        "median_wait_served": statistics.median([w for w in waits if w > 0] or [0]),
+    }
+
+def micro_benchmark(sizes):
+    """Coût moyen d'un ajout + retrait selon la taille de la file (doit croître en log n)"""
+    results = []
+    for size in sizes:
+        clock = SimClock()
+        queue = TransferQueue(clock=clock)
+        rng = random.Random(size)
+        for i in range(size):
+            clock.now = i * 0.01
+            queue.enqueue(f"room-{i}", f"p-{i}", category=rng.choice(CATEGORIES), customer_value=rng.random())
+        start = time.perf_counter()
+        rounds = 5000
+        for i in range(rounds):
+            clock.now += 0.01
+            queue.enqueue("room-x", f"x-{i}", category=rng.choice(CATEGORIES), customer_value=rng.random())
+            queue.agent_available(f"agent-{i}")
+        results.append((size, (time.perf_counter() - start) / rounds * 1e6))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Simuler une file de transfert vers les agents humains')
+    parser.add_argument('--calls', '-n', type=int, default=20000, help="Nombre d'appels transférés")
+    parser.add_argument('--agents', '-a', type=int, default=40, help="Nombre d'agents humains")
+    parser.add_argument('--arrival-rate', type=float, default=1.0, help='Arrivées par seconde')
+    parser.add_argument('--handle-time', type=float, default=240, help='Durée moyenne de traitement (s)')
+    parser.add_argument('--patience', type=float, default=1800, help='Patience moyenne des appelants (s)')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    r = simulate(args.calls, args.agents, args.arrival_rate, args.handle_time, args.patience)
+    print(f"=== {args.calls} appels, {args.agents} agents, {args.arrival_rate} arrivées/s ===")
+    print(f"Événements: {r['events']} - {r['us_per_event']:.1f} µs par événement")
+    print(f"File maximale: {r['max_waiting']} appels en attente")
+    print(f"Transférés: {r['assigned']} - abandons: {r['cancelled']}")
+    print(f"Attente des appels servis après attente: médiane {r['median_wait_served']:.0f}s, moyenne {r['mean_wait_served']:.0f}s")
+    print(f"Erreur moyenne de l'attente estimée: {r['eta_mae']:.0f}s")
+
+    print("=== Coût d'un ajout + attribution selon la taille de la file ===")
+    for size, us in micro_benchmark([1000, 10000, 100000]):
+        print(f"{size:>7} appels en attente: {us:.1f} µs")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+
+import psutil
+
+# Mémoire des processus de job et CPU du VAD par appel, modèle ONNX du plugin contre modèle compilé
+root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(root_dir, "agent"))
+
+from audio_profile import PROFILES
+from bench_audio_profile import make_frames
+
+MODELS = {"onnx": "0", "ort": "1"}
+
+async def run_vad(vad, frames):
+    vad_stream = vad.stream()
+
+    async def drain_vad():
+        async for _ in vad_stream:
+            pass
+
+    drain_task = asyncio.create_task(drain_vad())
+    for i, frame in enumerate(frames):
+        vad_stream.push_frame(frame)
+        if i % 10 == 0:
+            await asyncio.sleep(0)
+    vad_stream.end_input()
+    await drain_task
+    await vad_stream.aclose()
+
+def run_process(profile_name, seconds, barrier, results):
+    # Même enchaînement qu'un processus de job : prewarm puis un appel
+    from vad_model import vad_usage
+    profile = PROFILES[profile_name]
+    baseline = psutil.Process().memory_full_info()
+    vad = profile.load_vad()
+    frames = make_frames(profile.input_sample_rate, seconds)
+    # Mesure quand tous les processus sont chargés, pour répartir les pages partagées (PSS)
+    barrier.wait()
+    memory = psutil.Process().memory_full_info()
+    barrier.wait()
+    asyncio.run(run_vad(vad, frames))
+    usage = vad_usage()
+    results.put({
+        "model": usage["model"],
+        "rss_mb": memory.rss / (1024 * 1024),
+        "uss_mb": memory.uss / (1024 * 1024),
+        "pss_mb": memory.pss / (1024 * 1024),
+        "vad_uss_mb": (memory.uss - baseline.uss) / (1024 * 1024),
+        "cpu_ms": usage["cpu_ms"],
+    })
+
+def run_model(model, profile_name, processes, seconds):
+    """Lancer N processus de job (démarrage spawn, comme le worker) avec le modèle donné"""
+    # Lu à l'import de vad_model dans chaque processus
+    os.environ["VAD_SHARED_MODEL"] = MODELS[model]
+    ctx = multiprocessing.get_context("spawn")
+    barrier = ctx.Barrier(processes)
+    results = ctx.Queue()
+    procs = [ctx.Process(target=run_process, args=(profile_name, seconds, barrier, results)) for _ in range(processes)]
+    for proc in procs:
+        proc.start()
+    samples = [results.get() for _ in procs]
+    for proc in procs:
+        proc.join()
+    average = {key: sum(sample[key] for sample in samples) / len(samples) for key in samples[0] if key != "model"}
+    average["model"] = samples[0]["model"]
+    return average
+
+def main():
+    parser = argparse.ArgumentParser(description="Mémoire par processus et CPU du VAD par appel selon le modèle chargé")
+    parser.add_argument('--profile', '-p', default='telephony', choices=list(PROFILES), help='Profil audio')
+    parser.add_argument('--processes', '-n', type=int, default=4, help='Processus de job simultanés')
+    parser.add_argument('--seconds', '-s', type=float, default=60, help="Durée d'audio par appel (secondes)")
+    args = parser.parse_args()
+
+    # Compilation hors mesure (faite une fois par le premier processus en production)
+    from vad_model import compile_vad_model
+    compile_vad_model()
+
+    print(f"=== Profil {args.profile}, {args.processes} processus, {args.seconds:.0f} s d'audio par appel ===")
+    print(f"{'modèle':>7} {'RSS':>9} {'USS':>9} {'PSS':>9} {'USS VAD':>9} {'CPU VAD/min':>12}")
+    results = {}
+    for model in MODELS:
+        r = results[model] = run_model(model, args.profile, args.processes, args.seconds)
+        if r["model"] != model:
+            print(f"{model:>7}: modèle {r['model']} chargé à la place, voir les logs")
+        print(
+            f"{model:>7} {r['rss_mb']:>6.1f} Mo {r['uss_mb']:>6.1f} Mo {r['pss_mb']:>6.1f} Mo "
+            f"{r['vad_uss_mb']:>6.1f} Mo {r['cpu_ms'] * 60 / args.seconds:>9.0f} ms"
+        )
+
+    saved = results["onnx"]["uss_mb"] - results["ort"]["uss_mb"]
+    print(f"Mémoire privée économisée: {saved:.1f} Mo par processus, {saved * args.processes:.1f} Mo au total")
+
+if __name__ == "__main__":
+    main()
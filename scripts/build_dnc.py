@@ -0,0 +1,38 @@
+import os
+import sys
+import argparse
+import logging
+from dotenv import load_dotenv
+
+# Chercher le fichier .env à la racine du projet (chemins et réglages de la liste d'opposition)
+root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+load_dotenv(os.path.join(root_dir, ".env"))
+sys.path.insert(0, os.path.join(root_dir, "api"))
+
+from dnc import build_dnc, DNC_SOURCES, DNC_PATH, DNC_BLOOM_BITS, DNC_BUILD_RUN_SIZE
+
+def main():
+    parser = argparse.ArgumentParser(description="Compiler la liste d'opposition lue par l'API et les schedulers")
+    parser.add_argument('sources', nargs='?', default=DNC_SOURCES,
+                        help="Fichiers ou dossiers sources séparés par des virgules (DNC_SOURCES par défaut)")
+    parser.add_argument('--output', '-o', default=DNC_PATH, help="Fichier compilé (DNC_PATH par défaut)")
+    parser.add_argument('--bloom-bits', type=float, default=DNC_BLOOM_BITS,
+                        help="Bits du filtre de Bloom par numéro (0 pour s'en passer)")
+    parser.add_argument('--run-size', type=int, default=DNC_BUILD_RUN_SIZE, help="Numéros triés en mémoire par tranche")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    try:
+        report = build_dnc(args.sources, args.output, bloom_bits=args.bloom_bits, run_size=args.run_size)
+    except OSError as e:
+        # Une source manquante ne doit pas remplacer la liste en service par une liste vide
+        print(f"Erreur: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"{report['numbers']:,} numéro(s) distinct(s) depuis {report['files']} fichier(s) "
+          f"({report['valid']:,} lus, {report['invalid']:,} invalides) en {report['elapsed_s']} s")
+    print(f"{args.output}: {report['bytes'] / 2 ** 20:.1f} Mo"
+          + (f", filtre de Bloom {report['bloom_bits'] // 8 / 2 ** 20:.1f} Mo ({report['hashes']} hachages)"
+             if report['bloom_bits'] else ""))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+#!/bin/bash
+# Démarrage du conteneur : API (gunicorn) et processus de dispatch planifié (rappels, file d'appels,
+# rappel des échecs, file de transfert), équivalent des deux lignes du procfile.
+# RUN_SCHEDULER=0 pour les répliques supplémentaires : un seul scheduler par déploiement.
+set -u
+cd /app
+
+pids=()
+if [ "${RUN_SCHEDULER:-1}" != "0" ]; then
+    python api/scheduler.py &
+    pids+=($!)
+fi
+gunicorn --chdir api -b "0.0.0.0:${PORT:-8080}" --timeout "${GUNICORN_TIMEOUT:-120}" app:app &
+pids+=($!)
+
+# Transmettre l'arrêt du conteneur aux deux processus
+stopping=0
+trap 'stopping=1; kill -TERM "${pids[@]}" 2>/dev/null' TERM INT
+
+# Si l'un des deux s'arrête, arrêter l'autre et sortir en erreur pour que le conteneur soit redémarré
+wait -n
+status=$?
+if [ "$stopping" = "1" ]; then
+    wait
+    exit 0
+fi
+echo "Un processus du conteneur s'est arrêté (code $status), arrêt du conteneur" >&2
+kill -TERM "${pids[@]}" 2>/dev/null
+wait
+exit $(( status == 0 ? 1 : status ))
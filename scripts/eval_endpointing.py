@@ -0,0 +1,177 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import wave
+
+# Évaluation hors ligne de la fin de tour : délais fixes contre délai adaptatif (agent/endpointing.py)
+root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(root_dir, "agent"))
+
+from endpointing import EndpointingController
+
+# Profils de pauses en milieu de tour (médiane et dispersion log-normale, secondes)
+SYNTHETIC_PROFILES = {
+    "rapide": (0.3, 0.4),
+    "moyen": (0.6, 0.5),
+    "lent": (1.1, 0.5),
+}
+
+def synthetic_timeline(profile, turns, rng):
+    """
+    Segments de parole simulés d'un appelant
+
+    Returns:
+        Liste de (début, fin, fin_de_tour) en secondes
+    """
+    median, sigma = SYNTHETIC_PROFILES[profile]
+    segments, t = [], rng.uniform(1, 3)
+    for _ in range(turns):
+        for part in range(rng.choice((1, 1, 2, 3, 4))):
+            if part:
+                t += rng.lognormvariate(0, sigma) * median
+            start, t = t, t + rng.uniform(0.4, 3.0)
+            segments.append([start, t, False])
+        segments[-1][2] = True
+        # Réponse de l'agent avant le tour suivant
+        t += rng.uniform(2.0, 6.0)
+    return [tuple(segment) for segment in segments]
+
+async def vad_segments(path, min_silence_duration):
+    """
+    Segments de parole d'un enregistrement (WAV mono 16 bits, canal de l'appelant) selon Silero
+
+    Returns:
+        Liste de (début, fin) en secondes
+    """
+    from livekit import rtc
+    from livekit.plugins import silero
+
+    with wave.open(path, "rb") as wav:
+        sample_rate, channels = wav.getframerate(), wav.getnchannels()
+        pcm = wav.readframes(wav.getnframes())
+    if channels != 1:
+        raise ValueError(f"{path}: enregistrement mono attendu (canal de l'appelant)")
+
+    vad = silero.VAD.load(
+        sample_rate=8000 if sample_rate == 8000 else 16000,
+        min_silence_duration=min_silence_duration,
+    )
+    stream = vad.stream()
+    chunk = sample_rate // 100
+    for offset in range(0, len(pcm) // 2 - chunk + 1, chunk):
+        stream.push_frame(rtc.AudioFrame(pcm[offset * 2:(offset + chunk) * 2], sample_rate, 1, chunk))
+    stream.end_input()
+
+    segments, start = [], None
+    async for event in stream:
+        t = event.samples_index / vad._opts.sample_rate
+        if event.type == "start_of_speech":
+            start = max(0.0, t - event.speech_duration)
+        elif event.type == "end_of_speech" and start is not None:
+            segments.append((start, t - event.silence_duration))
+            start = None
+    await stream.aclose()
+    return segments
+
+def label_turns(segments, turn_ends=None, turn_gap=1.5):
+    """
+    Marquer les fins de tour réelles : horodatages annotés, sinon pauses d'au moins turn_gap
+    """
+    labelled = []
+    for i, (start, end) in enumerate(segments):
+        if turn_ends is not None:
+            is_end = any(abs(end - t) < 0.5 for t in turn_ends)
+        else:
+            is_end = i == len(segments) - 1 or segments[i + 1][0] - end >= turn_gap
+        labelled.append((start, end, is_end))
+    return labelled
+
+def simulate(timeline, controller, vad_silence, reply_latency):
+    """
+    Rejouer un appel avec un contrôleur de fin de tour
+
+    Returns:
+        (latences de réponse sur les vraies fins de tour, nombre de coupures, nombre de validations)
+    """
+    latencies, cutoffs, validations = [], 0, 0
+    for i, (start, end, is_turn_end) in enumerate(timeline):
+        next_start = timeline[i + 1][0] if i + 1 < len(timeline) else float("inf")
+        if next_start - end < vad_silence:
+            # Pause trop courte pour le VAD : même segment
+            continue
+        end_event = end + vad_silence
+        controller.speech_ended(end_event)
+        validated_at = end_event + controller.delay
+        if next_start < validated_at:
+            controller.speech_started(next_start)
+            continue
+
+        controller.turn_validated(validated_at)
+        validations += 1
+        if is_turn_end:
+            latencies.append(validated_at - end)
+            controller.reply_started(validated_at + reply_latency)
+        else:
+            cutoffs += 1
+            if next_start >= validated_at + reply_latency:
+                # L'agent a déjà commencé à répondre : l'appelant lui coupe la parole
+                controller.reply_started(validated_at + reply_latency)
+        if next_start != float("inf"):
+            controller.speech_started(next_start)
+    return latencies, cutoffs, validations
+
+def main():
+    parser = argparse.ArgumentParser(description="Évaluer la fin de tour (latence médiane et coupures prématurées)")
+    parser.add_argument('recordings', nargs='*', help="Enregistrements WAV mono du canal de l'appelant "
+                        "(annotations facultatives dans <fichier>.turns.json : liste des fins de tour en secondes)")
+    parser.add_argument('--synthetic', type=int, default=0, help='Nombre d\'appels simulés par profil de pauses')
+    parser.add_argument('--turns', type=int, default=12, help='Tours par appel simulé')
+    parser.add_argument('--fixed', type=float, nargs='*', default=[0.2, 0.5, 1.0], help='Délais fixes comparés (secondes)')
+    parser.add_argument('--vad-silence', type=float, default=0.55, help='Silence minimal du VAD (secondes)')
+    parser.add_argument('--turn-gap', type=float, default=1.5, help='Pause minimale d\'une fin de tour sans annotation')
+    parser.add_argument('--reply-latency', type=float, default=0.8, help='Délai entre validation et début de réponse')
+    args = parser.parse_args()
+
+    calls = []
+    for path in args.recordings:
+        segments = asyncio.run(vad_segments(path, args.vad_silence))
+        labels_path = f"{path}.turns.json"
+        turn_ends = json.load(open(labels_path)) if os.path.exists(labels_path) else None
+        calls.append((os.path.basename(path), label_turns(segments, turn_ends, args.turn_gap)))
+
+    rng = random.Random(1)
+    for profile in SYNTHETIC_PROFILES if args.synthetic else ():
+        for i in range(args.synthetic):
+            calls.append((f"{profile}-{i}", synthetic_timeline(profile, args.turns, rng)))
+
+    if not calls:
+        parser.error("aucun enregistrement ni appel simulé (--synthetic)")
+
+    controllers = [(f"fixe {delay:.2f}s", lambda delay=delay: EndpointingController(
+        initial_delay=delay, min_delay=delay, max_delay=delay)) for delay in args.fixed]
+    controllers.append(("adaptatif", EndpointingController))
+
+    groups = sorted({name.rsplit("-", 1)[0] if args.synthetic else "enregistrements" for name, _ in calls})
+    print(f"=== {len(calls)} appels - latence mesurée de la fin de parole à la validation ===")
+    for group in groups:
+        members = [timeline for name, timeline in calls
+                   if (name.rsplit("-", 1)[0] if args.synthetic else "enregistrements") == group]
+        print(f"\n{group} ({len(members)} appels)")
+        for label, factory in controllers:
+            latencies, cutoffs, validations = [], 0, 0
+            for timeline in members:
+                call_latencies, call_cutoffs, call_validations = simulate(
+                    timeline, factory(), args.vad_silence, args.reply_latency)
+                latencies += call_latencies
+                cutoffs += call_cutoffs
+                validations += call_validations
+            median = statistics.median(latencies) * 1000 if latencies else float("nan")
+            rate = cutoffs / validations if validations else 0
+            print(f"  {label:<12} latence médiane {median:6.0f} ms - coupures prématurées {rate:6.1%}")
+
+if __name__ == "__main__":
+    main()
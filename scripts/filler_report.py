@@ -0,0 +1,59 @@
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+
+# Fréquence des relances sonores et silence perçu après la fin de tour, enregistrés dans les CDR (extra.fillers)
+root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(root_dir, "api"))
+
+from call_history import CALL_RECORDS_DB_PATH
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def main():
+    parser = argparse.ArgumentParser(description="Relances sonores : fréquence et silence perçu avec et sans relance")
+    parser.add_argument('--db', default=CALL_RECORDS_DB_PATH, help='Base des CDR')
+    parser.add_argument('--days', type=float, default=7, help='Période analysée (jours)')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"Base introuvable: {args.db}")
+        return
+
+    conn = sqlite3.connect(f"file:{args.db}?mode=ro", uri=True)
+    rows = conn.execute(
+        "SELECT json_extract(extra, '$.fillers') FROM call_records "
+        "WHERE started_at >= ? AND json_extract(extra, '$.fillers') IS NOT NULL",
+        (time.time() - args.days * 86400,)
+    ).fetchall()
+    conn.close()
+
+    calls = turns = fired = 0
+    heard, without_filler = [], []
+    for (fillers,) in rows:
+        fillers = json.loads(fillers)
+        calls += 1
+        turns += fillers["turns"]
+        fired += fillers["fired"]
+        heard.extend(fillers["silence_ms"])
+        without_filler.extend(fillers["silence_without_filler_ms"])
+
+    if not turns:
+        print("Aucun tour relevé sur la période")
+        return
+
+    print(f"Appels: {calls} - tours: {turns} - relances jouées: {fired} ({fired / turns:.0%} des tours)")
+    print(f"{'silence perçu':<22} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8}")
+    for label, values in (("avec relances", heard), ("sans relances", without_filler)):
+        stats = [percentile(values, q) for q in (0.5, 0.9, 0.99)] + [max(values) if values else None]
+        print(f"{label:<22} " + " ".join(f"{value:>5} ms" if value is not None else f"{'-':>8}" for value in stats))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+# Taux de tokens de prompt servis depuis le cache du fournisseur, enregistré dans les CDR (extra.prompt_cache)
+root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(root_dir, "api"))
+
+from call_history import CALL_RECORDS_DB_PATH
+
+def main():
+    parser = argparse.ArgumentParser(description="Taux de cache du prompt LLM par campagne")
+    parser.add_argument('--db', default=CALL_RECORDS_DB_PATH, help='Base des CDR')
+    parser.add_argument('--days', type=float, default=7, help='Période analysée (jours)')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"Base introuvable: {args.db}")
+        return
+
+    conn = sqlite3.connect(f"file:{args.db}?mode=ro", uri=True)
+    rows = conn.execute(
+        """
+        SELECT COALESCE(json_extract(extra, '$.campaign'), '(sans campagne)') AS campaign,
+               COUNT(*),
+               SUM(json_extract(extra, '$.prompt_cache.requests')),
+               SUM(json_extract(extra, '$.prompt_cache.prompt_tokens')),
+               SUM(json_extract(extra, '$.prompt_cache.cached_tokens')),
+               AVG(json_extract(extra, '$.latency.median_total_ms'))
+        FROM call_records
+        WHERE started_at >= ? AND json_extract(extra, '$.prompt_cache.requests') > 0
+        GROUP BY campaign
+        ORDER BY campaign
+        """,
+        (time.time() - args.days * 86400,)
+    ).fetchall()
+    conn.close()
+
+    if not rows:
+        print("Aucune requête LLM relevée sur la période")
+        return
+
+    print(f"{'campagne':<24} {'appels':>7} {'requêtes':>9} {'tokens prompt':>14} {'en cache':>9} {'latence méd.':>13}")
+    for campaign, calls, requests, prompt_tokens, cached_tokens, latency in rows:
+        ratio = cached_tokens / prompt_tokens if prompt_tokens else 0
+        latency = f"{latency:.0f} ms" if latency is not None else "-"
+        print(f"{campaign:<24} {calls:>7} {requests:>9} {prompt_tokens:>14} {ratio:>8.0%} {latency:>13}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+import argparse
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+# Statistiques de décroché et calcul du nombre d'appels définis dans le code de l'API
+root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(root_dir, "api"))
+
+from predictive_pacing import AnswerStats, PredictivePacer, PACING_TIMEZONE
+
+TRUNK_ID = "ST_sim"
+
+class Campaign:
+    """
+    Comportement des numéros appelés : taux de décroché selon l'heure, temps de décroché et durée des conversations
+    """
+
+    def __init__(self, answer_rate, swing, tta_median, tta_sigma, talk_mean, ring_timeout, rng):
+        self.answer_rate = answer_rate
+        self.swing = swing
+        self.tta_median = tta_median
+        self.tta_sigma = tta_sigma
+        self.talk_mean = talk_mean
+        self.ring_timeout = ring_timeout
+        self.rng = rng
+
+    def rate(self, hour):
+        """Taux de décroché de l'heure : creux le matin, pic en fin de journée"""
+        return min(0.95, max(0.01, self.answer_rate * (1 + self.swing * math.sin((hour - 12) * math.pi / 6))))
+
+    def dial(self, hour):
+        """
+        Issue d'un appel lancé
+
+        Returns:
+            (délai de décroché ou None, délai de fin si non décroché)
+        """
+        if self.rng.random() < self.rate(hour):
+            tta = self.rng.lognormvariate(math.log(self.tta_median), self.tta_sigma)
+            if tta < self.ring_timeout:
+                return tta, None
+            return None, self.ring_timeout
+        # Occupé ou numéro injoignable : fin rapide ; sinon sonnerie jusqu'au bout
+        return None, self.rng.choice((self.rng.uniform(2, 6), self.ring_timeout))
+
+    def talk(self):
+        return self.rng.expovariate(1 / self.talk_mean)
+
+def simulate(mode, campaign, args, start):
+    """
+    Simuler une journée d'appels à la seconde près
+
+    Returns:
+        Dictionnaire des résultats
+    """
+    stats = AnswerStats(ring_timeout=args.ring_timeout, path=None)
+    pacer = PredictivePacer(stats, ring_timeout=args.ring_timeout)
+    duration = args.hours * 3600
+    # Appels en cours : [lancé à, décroché à ou None, fin à ou None (sonnerie), en conversation]
+    calls = []
+    counts = {"dialed": 0, "answered": 0, "abandoned": 0}
+    busy_seconds = 0.0
+    tokens = args.cps
+    cpu = time.process_time()
+
+    for second in range(duration):
+        now = start + second
+        hour = stats.hour(now)
+        talking = 0
+        remaining = []
+        for call in sorted(calls, key=lambda call: call[1] or call[2]):
+            dialed_at, answer_at, end_at, connected = call
+            if connected:
+                if end_at > now:
+                    remaining.append(call)
+                    talking += 1
+                continue
+            if answer_at is not None and answer_at <= now:
+                counts["answered"] += 1
+                stats.observe(TRUNK_ID, dialed_at, True, answer_at - dialed_at)
+                if talking >= args.capacity:
+                    # Personne n'est libre pour prendre l'appel décroché
+                    counts["abandoned"] += 1
+                    continue
+                talking += 1
+                remaining.append([dialed_at, answer_at, answer_at + campaign.talk(), True])
+            elif answer_at is None and end_at <= now:
+                stats.observe(TRUNK_ID, dialed_at, False, end_at - dialed_at)
+            else:
+                remaining.append(call)
+        calls = remaining
+        busy_seconds += talking
+
+        tokens = min(args.cps, tokens + args.cps)
+        budget = min(args.lines - len(calls), int(tokens))
+        if mode == "fixed":
+            # Un appel par place de conversation libre, sonneries comprises
+            budget = min(budget, args.capacity - len(calls))
+        elif budget > 0:
+            ages = [now - call[0] for call in calls]
+            budget = min(budget, pacer.dial_budget(TRUNK_ID, ages, args.capacity, args.abandon_rate, now))
+        for _ in range(max(0, budget)):
+            tokens -= 1
+            counts["dialed"] += 1
+            tta, end_after = campaign.dial(hour)
+            if tta is not None:
+                calls.append([now, now + tta, None, False])
+            else:
+                calls.append([now, None, now + end_after, False])
+
+    answered = counts["answered"]
+    return {
+        "utilization": busy_seconds / (args.capacity * duration),
+        "abandon_rate": counts["abandoned"] / answered if answered else 0.0,
+        "dials_per_hour": counts["dialed"] / args.hours,
+        "connected_per_hour": (answered - counts["abandoned"]) / args.hours,
+        "learned_rate": stats.answer_rate(TRUNK_ID, start + duration - 1),
+        "cpu": time.process_time() - cpu,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Comparer le lancement fixe et le lancement prédictif sur une journée simulée")
+    parser.add_argument('--hours', type=int, default=8, help="Durée de la journée simulée (heures)")
+    parser.add_argument('--start-hour', type=int, default=9, help="Heure de début de la journée")
+    parser.add_argument('--capacity', type=int, default=10, help="Conversations simultanées possibles")
+    parser.add_argument('--lines', type=int, default=60, help="Appels simultanés autorisés par le trunk")
+    parser.add_argument('--cps', type=float, default=5, help="Appels par seconde autorisés par le trunk")
+    parser.add_argument('--answer-rate', type=float, default=0.25, help="Taux de décroché moyen")
+    parser.add_argument('--swing', type=float, default=0.4, help="Variation relative du taux de décroché selon l'heure")
+    parser.add_argument('--tta-median', type=float, default=12, help="Temps de décroché médian (secondes)")
+    parser.add_argument('--tta-sigma', type=float, default=0.5, help="Dispersion (lognormale) du temps de décroché")
+    parser.add_argument('--talk-mean', type=float, default=120, help="Durée moyenne d'une conversation (secondes)")
+    parser.add_argument('--ring-timeout', type=float, default=40, help="Durée maximale de sonnerie (secondes)")
+    parser.add_argument('--abandon-rate', type=float, nargs='+', default=[0.01, 0.03, 0.05],
+                        help="Taux d'abandon visés en mode prédictif")
+    parser.add_argument('--seed', type=int, default=1, help='Graine des tirages aléatoires')
+    args = parser.parse_args()
+
+    start = datetime.now(ZoneInfo(PACING_TIMEZONE)).replace(hour=args.start_hour, minute=0, second=0,
+                                                            microsecond=0).timestamp()
+    print(f"=== {args.hours} h à partir de {args.start_hour} h, {args.capacity} conversations, "
+          f"{args.lines} lignes, {args.cps:g} appels/s ===")
+    print(f"Décroché {args.answer_rate:.0%} +/- {args.swing:.0%} selon l'heure, "
+          f"en {args.tta_median:g} s (médiane), conversations de {args.talk_mean:g} s en moyenne\n")
+    print(f"{'mode':>18} {'occupation':>11} {'abandons':>9} {'appels/h':>9} {'conversations/h':>16} "
+          f"{'décroché appris':>16} {'CPU':>7}")
+    runs = [("fixe", "fixed", None)] + [(f"prédictif {rate:.0%}", "predictive", rate) for rate in args.abandon_rate]
+    for label, mode, abandon_rate in runs:
+        run_args = argparse.Namespace(**{**vars(args), "abandon_rate": abandon_rate or 0.0})
+        campaign = Campaign(args.answer_rate, args.swing, args.tta_median, args.tta_sigma, args.talk_mean,
+                            args.ring_timeout, random.Random(args.seed))
+        result = simulate(mode, campaign, run_args, start)
+        learned = f"{result['learned_rate']:.0%}" if mode == "predictive" else "-"
+        print(f"{label:>18} {result['utilization']:>10.0%} {result['abandon_rate']:>8.1%} "
+              f"{result['dials_per_hour']:>9,.0f} {result['connected_per_hour']:>16,.0f} "
+              f"{learned:>16} {result['cpu']:>6.1f}s")
+
+if __name__ == "__main__":
+    main()
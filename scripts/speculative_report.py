@@ -0,0 +1,55 @@
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+# Bilan du mode spéculatif enregistré dans les CDR (extra.speculative)
+root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(root_dir, "api"))
+
+from call_history import CALL_RECORDS_DB_PATH
+
+def main():
+    parser = argparse.ArgumentParser(description="Comparer tokens perdus et latence gagnée par réglage du mode spéculatif")
+    parser.add_argument('--db', default=CALL_RECORDS_DB_PATH, help='Base des CDR')
+    parser.add_argument('--days', type=float, default=7, help='Période analysée (jours)')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"Base introuvable: {args.db}")
+        return
+
+    conn = sqlite3.connect(f"file:{args.db}?mode=ro", uri=True)
+    rows = conn.execute(
+        """
+        SELECT json_extract(extra, '$.speculative.stable_delay') AS stable_delay,
+               json_extract(extra, '$.speculative.match_threshold') AS match_threshold,
+               COUNT(*),
+               SUM(json_extract(extra, '$.speculative.started')),
+               SUM(json_extract(extra, '$.speculative.adopted')),
+               SUM(json_extract(extra, '$.speculative.wasted_completion_tokens')),
+               SUM(json_extract(extra, '$.speculative.wasted_prompt_tokens')),
+               SUM(json_extract(extra, '$.speculative.saved_ms'))
+        FROM call_records
+        WHERE started_at >= ? AND json_extract(extra, '$.speculative') IS NOT NULL
+        GROUP BY stable_delay, match_threshold
+        ORDER BY stable_delay, match_threshold
+        """,
+        (time.time() - args.days * 86400,)
+    ).fetchall()
+    conn.close()
+
+    if not rows:
+        print("Aucun appel avec le mode spéculatif sur la période")
+        return
+
+    print(f"{'stabilité':>9} {'seuil':>6} {'appels':>7} {'adoptées':>9} {'tok. perdus/appel':>18} {'gain/adoption':>14}")
+    for stable_delay, threshold, calls, started, adopted, wasted_out, wasted_in, saved_ms in rows:
+        adoption = adopted / started if started else 0
+        wasted = (wasted_out + wasted_in) / calls
+        saving = saved_ms / adopted if adopted else 0
+        print(f"{stable_delay:>8.2f}s {threshold:>6.2f} {calls:>7} {adoption:>8.0%} {wasted:>18.0f} {saving:>11.0f} ms")
+
+if __name__ == "__main__":
+    main()